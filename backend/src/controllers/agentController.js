@@ -1,8 +1,10 @@
 // c:\Users\guilherme.ferreira\Desktop\Doc-IT\backend\src\controllers\agentController.js
 const prisma = require('../../prisma/prismaClient');
+const { applyInventoryDelta } = require('../services/inventoryDeltaService');
+const { supportedRequestEncodings } = require('../middleware/requestDecompression');
 
 async function checkIn(req, res) {
-  const { agentId, hostname, osUsername, ipAddress, agentVersion, guiVersion, osInfo, additionalData } = req.body;
+  const { agentId, hostname, osUsername, ipAddress, agentVersion, guiVersion, osInfo, additionalData, additionalDataDelta } = req.body;
 
   // Força o mTLS para o Agente (certificado válido assinado pela nossa CA)
   const isDirectMTLS = req.socket.authorized;
@@ -38,6 +40,28 @@ async function checkIn(req, res) {
       where: { agentId: agentId }, // Query by agentId in the Device model
     });
 
+    // Inventário: documento completo (com hash) ou delta sobre o último snapshot reconhecido.
+    // undefined = o Prisma não toca na coluna.
+    let inventoryData = additionalData;
+    let inventoryHash = additionalData !== undefined ? (req.body.inventoryHash || null) : undefined;
+    let inventoryResync = false;
+
+    if (additionalDataDelta) {
+      inventoryData = undefined;
+      inventoryHash = undefined;
+      if (existingDevice && existingDevice.inventoryHash && existingDevice.inventoryHash === additionalDataDelta.baseHash) {
+        try {
+          inventoryData = applyInventoryDelta(existingDevice.additionalData, additionalDataDelta.ops);
+          inventoryHash = additionalDataDelta.hash;
+        } catch (deltaError) {
+          console.warn(`Delta de inventário do agente ${agentId} não aplicável: ${deltaError.message}`);
+          inventoryResync = true;
+        }
+      } else {
+        inventoryResync = true;
+      }
+    }
+
     if (existingDevice) {
       // Device (agent) already exists, update its information and lastSeenAt
       device = await prisma.device.update({ // Changed from agentHost
@@ -49,7 +73,8 @@ async function checkIn(req, res) {
           agentVersion,
           guiVersion,
           osInfo,
-          additionalData,
+          additionalData: inventoryData,
+          inventoryHash,
           lastSeenAt: now,
           // O status não é alterado aqui pelo agente
         },
@@ -69,7 +94,8 @@ async function checkIn(req, res) {
           osInfo,
           type: osInfo ? `SO: ${osInfo.substring(0,50)}` : 'Descoberto por Agente',
           location: 'Detectado via Agente',
-          additionalData,
+          additionalData: inventoryData,
+          inventoryHash,
           status: 'pending',
           source: 'agent',
           createdAt: now,
@@ -87,7 +113,10 @@ async function checkIn(req, res) {
       deviceId: device.id,     // Return the database ID of the device
       message: message,
       tamperEnabled: device.tamperEnabled || false,
-      tamperPassword: device.tamperPassword || null
+      tamperPassword: device.tamperPassword || null,
+      inventoryHash: device.inventoryHash || null,
+      inventoryResync,
+      acceptEncodings: supportedRequestEncodings()
     });
 
 
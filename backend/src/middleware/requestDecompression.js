@@ -0,0 +1,69 @@
+// src/middleware/requestDecompression.js
+const zlib = require('zlib');
+
+/**
+ * Corpos comprimidos enviados pelo agente (check-in/inventário).
+ *
+ * gzip e deflate já são tratados pelo próprio express.json() (body-parser).
+ * zstd só existe no zlib do Node >= 22.15 / 23.8; quando disponível, este middleware
+ * descomprime e parseia o corpo e marca req._body para o express.json() pular a requisição.
+ * O check-in anuncia ao agente apenas os encodings que este processo realmente aceita.
+ *
+ * Montado só em /agent/check-in (antes do express.json() global). O mesmo JSON_BODY_LIMIT do
+ * express.json() vale aqui para o corpo comprimido (contado conforme chega) e para o descomprimido:
+ * acima dele a resposta é 413, sem acumular o corpo em memória.
+ */
+const ZSTD_SUPPORTED = typeof zlib.zstdDecompress === 'function';
+const JSON_BODY_LIMIT = Number(process.env.JSON_BODY_LIMIT_BYTES) || 100 * 1024;
+
+const tooLarge = (res) => res.status(413).set('Connection', 'close')
+  .json({ error: `Corpo da requisição acima do limite de ${JSON_BODY_LIMIT} bytes.` });
+
+const supportedRequestEncodings = () => (ZSTD_SUPPORTED ? ['zstd', 'gzip'] : ['gzip']);
+
+const decompressZstdBody = (req, res, next) => {
+  const encoding = (req.headers['content-encoding'] || '').toLowerCase();
+  if (encoding !== 'zstd') return next();
+
+  if (!ZSTD_SUPPORTED) {
+    return res.status(415).json({ error: 'Content-Encoding zstd não suportado por este servidor.' });
+  }
+
+  if (Number(req.headers['content-length']) > JSON_BODY_LIMIT) {
+    req.resume(); // descarta o corpo sem guardar
+    return tooLarge(res);
+  }
+
+  const chunks = [];
+  let received = 0;
+  let aborted = false;
+  req.on('data', chunk => {
+    if (aborted) return;
+    received += chunk.length;
+    if (received > JSON_BODY_LIMIT) {
+      aborted = true;
+      chunks.length = 0;
+      return tooLarge(res);
+    }
+    chunks.push(chunk);
+  });
+  req.on('error', next);
+  req.on('end', () => {
+    if (aborted) return;
+    zlib.zstdDecompress(Buffer.concat(chunks), { maxOutputLength: JSON_BODY_LIMIT }, (err, decoded) => {
+      if (err) {
+        if (err.code === 'ERR_BUFFER_TOO_LARGE') return tooLarge(res);
+        return res.status(400).json({ error: 'Corpo zstd inválido.' });
+      }
+      try {
+        req.body = decoded.length ? JSON.parse(decoded.toString('utf8')) : {};
+      } catch (parseError) {
+        return res.status(400).json({ error: 'JSON inválido no corpo zstd.' });
+      }
+      req._body = true;
+      next();
+    });
+  });
+};
+
+module.exports = { decompressZstdBody, supportedRequestEncodings, JSON_BODY_LIMIT };
@@ -50,6 +50,21 @@ const authMiddleware = require('../middleware/auth');
  *           type: object
  *           description: Dados adicionais em formato JSON que o agente queira enviar (opcional).
  *           example: { "cpu_model": "Intel Core i7", "ram_total_gb": 16 }
+ *         inventoryHash:
+ *           type: string
+ *           description: SHA-256 do additionalData canônico enviado completo (opcional).
+ *         additionalDataDelta:
+ *           type: object
+ *           description: Alternativa ao additionalData. Operações sobre o inventário identificado por baseHash (opcional).
+ *           properties:
+ *             baseHash:
+ *               type: string
+ *             hash:
+ *               type: string
+ *             ops:
+ *               type: array
+ *               items:
+ *                 type: object
  *     AgentCheckInResponse:
  *       type: object
  *       properties:
@@ -65,6 +80,18 @@ const authMiddleware = require('../middleware/auth');
  *           type: string
  *           description: Mensagem informativa sobre o resultado do check-in.
  *           example: "Check-in do agente processado. Status atual: pending."
+ *         inventoryHash:
+ *           type: string
+ *           nullable: true
+ *           description: Hash do inventário agora armazenado (base para o próximo delta).
+ *         inventoryResync:
+ *           type: boolean
+ *           description: true quando o delta não pôde ser aplicado e o agente deve reenviar o inventário completo.
+ *         acceptEncodings:
+ *           type: array
+ *           items:
+ *             type: string
+ *           description: Content-Encodings aceitos no corpo das próximas requisições do agente (ex. ["zstd", "gzip"]).
  *     AgentHost:
  *       type: object
  *       properties:
@@ -26,6 +26,7 @@ const fs = require('fs');
 const path = require('path');
 
 const cookieParser = require('cookie-parser');
+const { decompressZstdBody, JSON_BODY_LIMIT } = require('./middleware/requestDecompression');
 
 const app = express();
 const PORT = process.env.PORT || 3000;
@@ -39,7 +40,9 @@ app.use(cors({
   },
   credentials: true // Permits sending cookies
 }));
-app.use(express.json());
+// zstd só no check-in do agente (precisa vir antes do express.json, que recusaria o encoding)
+app.use('/agent/check-in', decompressZstdBody);
+app.use(express.json({ limit: JSON_BODY_LIMIT })); // gzip/deflate ficam com o express.json()
 app.use(cookieParser());
 
 app.use('/auth', authRoutes);
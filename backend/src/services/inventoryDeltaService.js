@@ -0,0 +1,77 @@
+// backend/src/services/inventoryDeltaService.js
+'use strict';
+
+/**
+ * Aplica os deltas de inventário enviados pelo agente (client/docit_common/inventory_delta.py).
+ *
+ * Operações:
+ *   { op: 'set',  path: [...], value }        -> chave nova/alterada (path [] troca a raiz)
+ *   { op: 'del',  path: [...] }               -> chave removida
+ *   { op: 'list', path: [...], add, remove }  -> remove a 1ª ocorrência de cada item e anexa os novos
+ *
+ * O hash do documento resultante é calculado pelo agente e apenas armazenado aqui: a
+ * garantia de consistência vem do baseHash, que precisa bater com o que o Device guarda.
+ */
+
+function stableStringify(value) {
+  if (Array.isArray(value)) {
+    return `[${value.map(stableStringify).join(',')}]`;
+  }
+  if (value && typeof value === 'object') {
+    const keys = Object.keys(value).sort();
+    return `{${keys.map(k => `${JSON.stringify(k)}:${stableStringify(value[k])}`).join(',')}}`;
+  }
+  return JSON.stringify(value);
+}
+
+function applyInventoryDelta(document, ops) {
+  if (!Array.isArray(ops)) throw new Error('Delta inválido: ops ausente.');
+  let result = document === null || document === undefined ? {} : JSON.parse(JSON.stringify(document));
+
+  for (const op of ops) {
+    const path = Array.isArray(op.path) ? op.path : [];
+    if (path.length === 0) {
+      if (op.op !== 'set') throw new Error(`Operação '${op.op}' inválida na raiz.`);
+      result = op.value;
+      continue;
+    }
+
+    let parent = result;
+    for (const key of path.slice(0, -1)) {
+      if (!parent || typeof parent !== 'object' || Array.isArray(parent) || !(key in parent)) {
+        throw new Error(`Caminho inexistente: ${path.join('.')}`);
+      }
+      parent = parent[key];
+    }
+    if (!parent || typeof parent !== 'object' || Array.isArray(parent)) {
+      throw new Error(`Caminho inexistente: ${path.join('.')}`);
+    }
+    const leaf = path[path.length - 1];
+
+    if (op.op === 'set') {
+      parent[leaf] = op.value;
+    } else if (op.op === 'del') {
+      delete parent[leaf];
+    } else if (op.op === 'list') {
+      if (!Array.isArray(parent[leaf])) throw new Error(`Caminho não é lista: ${path.join('.')}`);
+      const current = parent[leaf].slice();
+      const keys = current.map(stableStringify);
+      for (const item of op.remove || []) {
+        const idx = keys.indexOf(stableStringify(item));
+        if (idx !== -1) {
+          current.splice(idx, 1);
+          keys.splice(idx, 1);
+        }
+      }
+      parent[leaf] = current.concat(op.add || []);
+    } else {
+      throw new Error(`Operação desconhecida: ${op.op}`);
+    }
+  }
+  return result;
+}
+
+module.exports = {
+  applyInventoryDelta,
+  stableStringify
+};
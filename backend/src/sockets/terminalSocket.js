@@ -1,3 +1,4 @@
+const crypto = require('crypto');
 const socketIo = require('socket.io');
 const jwt = require('jsonwebtoken');
 const { logAudit } = require('../services/auditService');
@@ -6,6 +7,14 @@ const { logAudit } = require('../services/auditService');
     const onlineAgents = new Map();
     // Map para tracking de visualizadores de Remote Desktop: agentId -> Set de socketIds
     const desktopViewers = new Map();
+    // Live queries em andamento: queryId -> { socketId do browser que pediu, agentId }
+    const liveQueries = new Map();
+    // Teto de linhas por live query: o agente interrompe a consulta ao atingi-lo
+    const OSQUERY_MAX_ROWS = parseInt(process.env.OSQUERY_MAX_ROWS, 10) || 100000;
+
+    // Sequência dos eventos de entrada da sessão (começa em 1 a cada desktop:start): o agente
+    // despacha cada evento numa thread própria e reordena por este número antes de injetar
+    const nextInputSeq = (viewer) => (viewer.inputSeq = (viewer.inputSeq || 0) + 1);
 
     module.exports = function configureSockets(server) {
       // Inicialização do Socket.IO permitindo requisições do frontend
@@ -170,13 +179,37 @@ const { logAudit } = require('../services/auditService');
         });
     
         // Frame de video recebido do Agente (Python) -> Frontend (React)
-        socket.on('desktop:frame', ({ agentId, imageB64, width, height }, callback) => {
+        // `frame` é binário (Buffer): cabeçalho compacto + JPEG. Repassado como veio, sem decodificar.
+        socket.on('desktop:frame', ({ agentId, frame }) => {
           // REPASSA APENAS PARA QUEM ESTÁ NA SALA DO AGENTE (Isolamento de Tráfego)
-          io.to(`agent_data_${agentId}`).emit('desktop:frame', { agentId, imageB64, width, height });
-          
-          // Confirma o recebimento para destravar o ws_busy do python (Controle de Fluxo)
-          if (typeof callback === 'function') {
-              callback();
+          io.to(`agent_data_${agentId}`).emit('desktop:frame', { agentId, frame });
+        });
+
+        // Ack do frame desenhado (Frontend -> Agente): controle de fluxo por créditos no agente.
+        // Só o dono da sessão confirma, e o ack vai direto ao socket do agente (sem broadcast).
+        socket.on('desktop:ack', ({ agentId, streamId, seq }) => {
+          const viewer = desktopViewers.get(agentId);
+          const agentSocketId = onlineAgents.get(agentId);
+          if (viewer && viewer.socketId === socket.id && agentSocketId) {
+            io.to(agentSocketId).emit('desktop:ack', { agentId, streamId, seq });
+          }
+        });
+
+        // Aba do visualizador escondida/visível: o agente pausa a captura enquanto ninguém está olhando
+        socket.on('desktop:visibility', ({ agentId, hidden }) => {
+          const viewer = desktopViewers.get(agentId);
+          const agentSocketId = onlineAgents.get(agentId);
+          if (viewer && viewer.socketId === socket.id && agentSocketId) {
+            io.to(agentSocketId).emit('desktop:visibility', { agentId, hidden: !!hidden });
+          }
+        });
+
+        // Pedido de keyframe (Frontend -> Agente): o visualizador perdeu a base dos frames por região
+        socket.on('desktop:keyframe', ({ agentId }) => {
+          const viewer = desktopViewers.get(agentId);
+          const agentSocketId = onlineAgents.get(agentId);
+          if (viewer && viewer.socketId === socket.id && agentSocketId) {
+            io.to(agentSocketId).emit('desktop:keyframe', { agentId });
           }
         });
 
@@ -199,35 +232,35 @@ const { logAudit } = require('../services/auditService');
         socket.on('desktop:mouse_move', ({ agentId, x, y, width, height }) => {
           const viewer = desktopViewers.get(agentId);
           if (viewer && viewer.socketId === socket.id) {
-             io.emit('desktop:mouse_move', { agentId, x, y, width, height });
+             io.emit('desktop:mouse_move', { agentId, x, y, width, height, seq: nextInputSeq(viewer) });
           }
         });
     
         socket.on('desktop:mouse_down', ({ agentId, button, x, y, width, height }) => {
           const viewer = desktopViewers.get(agentId);
           if (viewer && viewer.socketId === socket.id) {
-             io.emit('desktop:mouse_down', { agentId, button, x, y, width, height });
+             io.emit('desktop:mouse_down', { agentId, button, x, y, width, height, seq: nextInputSeq(viewer) });
           }
         });
 
         socket.on('desktop:mouse_up', ({ agentId, button, x, y, width, height }) => {
           const viewer = desktopViewers.get(agentId);
           if (viewer && viewer.socketId === socket.id) {
-             io.emit('desktop:mouse_up', { agentId, button, x, y, width, height });
+             io.emit('desktop:mouse_up', { agentId, button, x, y, width, height, seq: nextInputSeq(viewer) });
           }
         });
 
         socket.on('desktop:mouse_scroll', ({ agentId, clicks }) => {
           const viewer = desktopViewers.get(agentId);
           if (viewer && viewer.socketId === socket.id) {
-             io.emit('desktop:mouse_scroll', { agentId, clicks });
+             io.emit('desktop:mouse_scroll', { agentId, clicks, seq: nextInputSeq(viewer) });
           }
         });
     
         socket.on('desktop:key_down', ({ agentId, key }) => {
           const viewer = desktopViewers.get(agentId);
           if (viewer && viewer.socketId === socket.id) {
-             io.emit('desktop:key_down', { agentId, key });
+             io.emit('desktop:key_down', { agentId, key, seq: nextInputSeq(viewer) });
           }
         });
     
@@ -243,20 +276,46 @@ const { logAudit } = require('../services/auditService');
         });
     
         // --- Eventos de Osquery (Live Queries) ---
-        socket.on('osquery:query', async ({ agentId, sql }) => {
+        // Cada query tem um queryId: o agente roda várias ao mesmo tempo e o resultado volta só para quem pediu.
+        // O resultado chega em páginas ({ page, rows: texto JSON }) e termina com um resumo ({ done }).
+        socket.on('osquery:query', async ({ agentId, sql, queryId }) => {
           const viewerName = socket.user?.username || 'Administrador';
-          console.log(`[Socket] Usuário ${viewerName} enviou query Osquery para Agente ${agentId}: ${sql}`);
-          
-          // Repassa para o agente específico
-          io.emit('osquery:query', { agentId, sql });
+          const id = queryId || crypto.randomUUID();
+          console.log(`[Socket] Usuário ${viewerName} enviou query Osquery ${id} para Agente ${agentId}: ${sql}`);
+
+          const agentSocketId = onlineAgents.get(agentId);
+          if (!agentSocketId) {
+            socket.emit('osquery:results', { agentId, queryId: id, done: true, error: 'Agente offline.' });
+            return;
+          }
+
+          // Repassa direto para o socket do agente
+          liveQueries.set(id, { socketId: socket.id, agentId });
+          io.to(agentSocketId).emit('osquery:query', { agentId, sql, queryId: id, maxRows: OSQUERY_MAX_ROWS });
 
           // Log de auditoria para compliance
           await logAudit('OSQUERY_QUERY', socket.user?.id, 'COMMAND', 'OSQUERY', { agentId, sql }, socket.handshake.address);
         });
 
-        socket.on('osquery:results', ({ agentId, results, error }) => {
-          // Repassa o resultado para todos os browsers (ou podemos filtrar para quem pediu)
-          io.emit('osquery:results', { agentId, results, error });
+        // Cancelamento: só quem pediu a query pode cancelá-la
+        socket.on('osquery:cancel', ({ queryId }) => {
+          const query = liveQueries.get(queryId);
+          const agentSocketId = query && onlineAgents.get(query.agentId);
+          if (query && query.socketId === socket.id && agentSocketId) {
+            io.to(agentSocketId).emit('osquery:cancel', { agentId: query.agentId, queryId });
+          }
+        });
+
+        socket.on('osquery:results', (data) => {
+          const query = data.queryId && liveQueries.get(data.queryId);
+          if (query) {
+            // Páginas são repassadas como vieram (sem parse); o resumo final encerra a query
+            if (data.page === undefined) liveQueries.delete(data.queryId);
+            io.to(query.socketId).emit('osquery:results', data);
+          } else {
+            // Agente antigo (sem queryId): repassa para todos os browsers, como antes
+            io.emit('osquery:results', data);
+          }
         });
 
         socket.on('disconnect', () => {
@@ -266,6 +325,12 @@ const { logAudit } = require('../services/auditService');
           if (socket.isAgent && socket.agentId) {
             onlineAgents.delete(socket.agentId);
             desktopViewers.delete(socket.agentId); // Limpa as sessoés desse agente que caiu
+            for (const [queryId, query] of liveQueries.entries()) {
+                if (query.agentId === socket.agentId) {
+                    io.to(query.socketId).emit('osquery:results', { agentId: query.agentId, queryId, done: true, error: 'Agente desconectou durante a consulta.' });
+                    liveQueries.delete(queryId);
+                }
+            }
             io.emit('agent:offline', { agentId: socket.agentId });
             console.log(`[Socket] Agente ${socket.agentId} OFFLINE. Total online: ${onlineAgents.size}`);
           } else {
@@ -277,6 +342,14 @@ const { logAudit } = require('../services/auditService');
                      desktopViewers.delete(agentId);
                  }
              }
+             // Queries de quem saiu não têm mais destino: cancela no agente
+             for (const [queryId, query] of liveQueries.entries()) {
+                 if (query.socketId === socket.id) {
+                     const agentSocketId = onlineAgents.get(query.agentId);
+                     if (agentSocketId) io.to(agentSocketId).emit('osquery:cancel', { agentId: query.agentId, queryId });
+                     liveQueries.delete(queryId);
+                 }
+             }
           }
         });
       });
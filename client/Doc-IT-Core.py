@@ -1,5 +1,5 @@
 import json, socket, time, re
-import ctypes, psutil, os, sys
+import psutil, os, sys
 import threading
 import subprocess
 from datetime import datetime
@@ -20,20 +20,41 @@ import win32profile
 import socketio
 from cryptography.fernet import Fernet
 import base64
-import win32file
-import win32pipe
-import pywintypes
 import win32crypt
 from cryptography import x509
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.x509.oid import NameOID
 
+import docit_common
+from docit_common.log_writer import AsyncLogWriter
+from docit_common import ipc
+from docit_common.ipc_async import AsyncIPCServer
+from docit_common.http_session import get_session, invalidate_session, post_json
+from docit_common import inventory_delta
+from docit_common import versions
+from docit_common.config_store import ConfigStore
+from docit_common.endpoints import EndpointSelector
+from docit_common.circuit import CircuitRegistry
+from docit_common.spool import Spool
+from docit_common.supervisor import ModuleSupervisor, ProcessLauncher
+from docit_common import frames
+from docit_common.flow_control import CreditWindow
+from docit_common.input_queue import InputQueue, MOVE_RATE
+from docit_common.osquery_pool import (OsqueryPool, OsqueryShellProcess, OsqueryOneShotProcess,
+                                       EngineError, QueryError)
+from docit_common.live_query import LiveQueryScheduler, MAX_WORKERS as LIVE_QUERY_WORKERS, PAGE_ROWS, PAGE_BYTES, MAX_ROWS
+from docit_common.pid_registry import PidRegistry, load_state, kill_entries, STATE_FILE as PID_STATE_FILE
+
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
 # --- Configurações Básicas ----
 CONFIG_FILE = "Doc-IT.dat"
+# Payloads não entregues (servidor inalcançável), cifrados como o .dat
+SPOOL_DIR = "spool"
+# Último inventário reconhecido pelo servidor (base dos check-ins delta), cifrado como o .dat
+INVENTORY_SNAPSHOT_FILE = "Doc-IT-inventory.dat"
 LOG_FILE = "agent-core.log"
 AGENT_VERSION = "2.3.0"
 
@@ -82,13 +103,12 @@ def init_cipher():
 # --- Configurações IPC ---
 IPC_PIPE_NAME = r'\\.\pipe\DocIT_Core_IPC'
 
-def get_pipe_client_exe(pipe_handle):
+def get_ipc_peer_exe(stream):
     try:
-        pid = ctypes.c_ulong(0)
         # kernel32.GetNamedPipeClientProcessId está disponível a partir do Windows Vista/2008
-        success = ctypes.windll.kernel32.GetNamedPipeClientProcessId(int(pipe_handle), ctypes.byref(pid))
-        if not success or pid.value == 0: return None
-        return psutil.Process(pid.value).exe()
+        pid = stream.peer_pid()
+        if not pid: return None
+        return psutil.Process(pid).exe()
     except Exception as e:
         log_event(f"Falha ao rastrear PID do cliente IPC: {e}", "WARNING")
         return None
@@ -104,24 +124,15 @@ DEFAULT_CONFIG = {
     "tamper_password": None
 }
 
-LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
 config = {}
 
 # --- Logger Centralizado (Core) ---
+# Fila + thread escritora única: log nunca bloqueia um frame ou uma resposta IPC.
+# Mensagens abaixo do log_level do config são descartadas antes de formatar.
+logger = AsyncLogWriter(LOG_FILE, "CORE", level_getter=lambda: config.get("log_level", "INFO"))
+
 def log_event(message, level="INFO"):
-    global config
-    min_level_str = config.get("log_level", "INFO").upper()
-    min_level = LOG_LEVELS.get(min_level_str, 20)
-    msg_level = LOG_LEVELS.get(level.upper(), 20)
-    
-    if msg_level >= min_level:
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_entry = f"{timestamp} [{level.upper()}] [CORE] - {message}\n"
-        try:
-            with open(LOG_FILE, "a", encoding='utf-8') as f:
-                f.write(log_entry)
-        except Exception as e:
-            print(f"Falha ao escrever no arquivo de log: {e}")
+    logger.log(message, level)
 
 # Hooks e Tratamento de Exceções
 def handle_exception(exc_type, exc_value, exc_traceback):
@@ -137,6 +148,7 @@ def handle_thread_exception(args):
     log_event(f"CRASH CORE (Thread {args.thread.name}):\n" + "".join(traceback.format_exception(args.exc_type, args.exc_value, args.exc_traceback)), "CRITICAL")
 
 threading.excepthook = handle_thread_exception
+docit_common.set_log_handler(log_event)
 
 
 # --- Gerenciamento de Configuração Básica (Criptografada) ---
@@ -152,6 +164,7 @@ def load_config():
                 encrypted_data = f.read()
                 decrypted_data = cipher_suite.decrypt(encrypted_data)
                 loaded_config = json.loads(decrypted_data.decode('utf-8'))
+                config_store.seed(decrypted_data)
                 
             # Garante que campos padrão existam
             for key, value in DEFAULT_CONFIG.items():
@@ -166,22 +179,144 @@ def load_config():
     save_config(DEFAULT_CONFIG)
     return DEFAULT_CONFIG
 
-def save_config(config_data):
+def _encrypt_config(plaintext):
     global cipher_suite
-    try:
-        json_str = json.dumps(config_data, ensure_ascii=False)
-        encrypted_data = cipher_suite.encrypt(json_str.encode('utf-8'))
-        
-        with open(CONFIG_FILE, "wb") as f:
-            f.write(encrypted_data)
-            
+    if not cipher_suite:
+        init_cipher()
+    return cipher_suite.encrypt(plaintext)
+
+# Gravação write-behind: coalesce chamadas próximas, pula conteúdo idêntico e troca o .dat atomicamente
+config_store = ConfigStore(CONFIG_FILE, _encrypt_config, finalize=lambda path: apply_strict_acl(path))
+
+def _decrypt_config(data):
+    if not cipher_suite:
+        init_cipher()
+    return cipher_suite.decrypt(data)
+
+def save_config(config_data, immediate=False):
+    """Agenda a persistência do config. immediate=True grava na hora (credenciais, saída do processo)."""
+    return config_store.save(config_data, immediate=immediate)
+
+def flush_config():
+    return config_store.flush()
+
+def get_server_urls():
+    return config.get("server_urls", [config.get("server_base_url")])
+
+def probe_endpoint(url, timeout):
+    """Sondagem leve de saúde usada pela corrida entre servidores."""
+    session = get_session(config.get("cert_path"), config.get("key_path"), config.get("ca_path"))
+    return session.get(f"{url}/VerifyHealth", timeout=timeout).status_code < 500
+
+# Circuit breaker por URL, compartilhado por todas as chamadas de saída do Core
+circuit_breakers = CircuitRegistry()
+
+# Placar por URL + corrida escalonada: check-in, enroll e WebSocket tentam primeiro o melhor servidor
+endpoint_selector = EndpointSelector(probe_endpoint, breakers=circuit_breakers)
+
+# Inventários coletados offline: só o mais recente é mantido e reenviado quando o servidor voltar
+offline_spool = Spool(SPOOL_DIR, _encrypt_config, _decrypt_config, finalize=lambda path: apply_strict_acl(path))
+# Só inventários vão para o spool: o check-in sem inventário é um heartbeat de estado, e o próximo
+# (a cada 300s ou no retorno do servidor) já leva o estado atual; reenviar os perdidos só repetiria dado velho.
+spool_replay_lock = threading.Lock()
+
+# Entrega de inventário (IPC e spool) serializada e em ordem de coleta: um inventário mais velho que o
+# último entregue nunca chega ao servidor (ele viraria a base do próximo delta)
+inventory_delivery_lock = threading.Lock()
+last_inventory_stamp = 0
+
+def deliver_inventory(inv_data, stamp):
+    """Check-in com o inventário coletado em `stamp` (time_ns). True se entregue ou já obsoleto."""
+    global last_inventory_stamp
+    with inventory_delivery_lock:
+        if stamp <= last_inventory_stamp:
+            log_event("Inventário mais velho que o último entregue ao servidor; descartado.", "DEBUG")
+            return True
+        success, _ = perform_core_check_in(config, inventory_payload=inv_data)
+        if success:
+            last_inventory_stamp = stamp
+        return success
+
+def _replay_spooled(kind, payload, stamp):
+    if kind == "inventory":
+        return deliver_inventory(payload, stamp)
+    log_event(f"Spool: tipo '{kind}' desconhecido, descartando.", "WARNING")
+    return True
+
+def start_spool_replay():
+    """Reenvia o spool em segundo plano (uma thread por vez) após um check-in bem-sucedido."""
+    if not len(offline_spool) or not spool_replay_lock.acquire(blocking=False):
+        return
+
+    def worker():
         try:
-            apply_strict_acl(CONFIG_FILE)
-        except Exception as acl_e:
-            log_event(f"Falha ao fixar ACL no .dat: {acl_e}", "WARNING")
-            
+            offline_spool.replay(_replay_spooled)
+        finally:
+            spool_replay_lock.release()
+
+    threading.Thread(target=worker, name="spool-replay", daemon=True).start()
+
+# Content-Encodings anunciados por cada servidor na última resposta de check-in
+server_accept_encodings = {}
+
+# Check-ins concorrentes (heartbeat x inventory_ready) não podem disputar a mesma base do delta
+inventory_snapshot_lock = threading.RLock()
+
+def load_inventory_snapshot():
+    """Retorna {"hash": ..., "data": ...} do último inventário aceito pelo servidor, ou None."""
+    if not os.path.exists(INVENTORY_SNAPSHOT_FILE):
+        return None
+    try:
+        if not cipher_suite:
+            init_cipher()
+        with open(INVENTORY_SNAPSHOT_FILE, "rb") as f:
+            snapshot = json.loads(cipher_suite.decrypt(f.read()).decode('utf-8'))
+        if snapshot.get("hash") and isinstance(snapshot.get("data"), dict):
+            return snapshot
+    except Exception as e:
+        log_event(f"Snapshot de inventário ilegível, próximo check-in será completo: {e}", "WARNING")
+    return None
+
+def save_inventory_snapshot(data, content_hash):
+    try:
+        json_str = json.dumps({"hash": content_hash, "data": data}, ensure_ascii=False)
+        tmp_file = INVENTORY_SNAPSHOT_FILE + ".tmp"
+        with open(tmp_file, "wb") as f:
+            f.write(cipher_suite.encrypt(json_str.encode('utf-8')))
+        os.replace(tmp_file, INVENTORY_SNAPSHOT_FILE)
+        try: apply_strict_acl(INVENTORY_SNAPSHOT_FILE)
+        except: pass
+    except Exception as e:
+        log_event(f"Falha ao salvar snapshot de inventário: {e}", "WARNING")
+
+def clear_inventory_snapshot():
+    try:
+        if os.path.exists(INVENTORY_SNAPSHOT_FILE):
+            os.remove(INVENTORY_SNAPSHOT_FILE)
     except Exception as e:
-        log_event(f"Erro ao salvar config criptografada: {e}", "CRITICAL")
+        log_event(f"Falha ao remover snapshot de inventário: {e}", "WARNING")
+
+def attach_inventory(payload, document, snapshot):
+    """
+    Anexa o inventário ao payload: delta contra o snapshot reconhecido, ou documento completo.
+    Retorna (documento como o servidor ficará, hash dele).
+    """
+    payload.pop("additionalData", None)
+    payload.pop("additionalDataDelta", None)
+    payload.pop("inventoryHash", None)
+
+    if snapshot:
+        ops = inventory_delta.diff(snapshot["data"], document)
+        applied = inventory_delta.apply_ops(snapshot["data"], ops)
+        applied_hash = inventory_delta.content_hash(applied)
+        payload["additionalDataDelta"] = {"baseHash": snapshot["hash"], "hash": applied_hash, "ops": ops}
+        log_event(f"Check-in delta: {len(ops)} operações sobre o snapshot {snapshot['hash'][:12]}.", "DEBUG")
+        return applied, applied_hash
+
+    document_hash = inventory_delta.content_hash(document)
+    payload["additionalData"] = document
+    payload["inventoryHash"] = document_hash
+    return document, document_hash
 
 def apply_strict_acl(filepath):
     """
@@ -262,31 +397,13 @@ def get_primary_ip():
 
 
 # --- Comunicação com Backend via mTLS (Check-in Leve) ---
-import ctypes
+# Versões dos executáveis em cache por caminho + tamanho + mtime (sidecar ao lado dos .exe)
+version_cache = versions.VersionCache(os.path.join(
+    os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else '.', versions.SIDECAR_NAME))
 
 def get_file_version(path):
-    """Lê a versão (ProductVersion) diretamente dos metadados do executável via API do Windows."""
-    if not os.path.exists(path):
-        return None
-    try:
-        size = ctypes.windll.version.GetFileVersionInfoSizeW(path, None)
-        if not size: return None
-        buffer = ctypes.create_string_buffer(size)
-        ctypes.windll.version.GetFileVersionInfoW(path, None, size, buffer)
-        length = ctypes.c_uint()
-        ptr = ctypes.c_void_p()
-        ctypes.windll.version.VerQueryValueW(buffer, '\\VarFileInfo\\Translation', ctypes.byref(ptr), ctypes.byref(length))
-        if length.value >= 4:
-            data = ctypes.string_at(ptr, 4)
-            lang = data[1] << 8 | data[0]
-            cp = data[3] << 8 | data[2]
-            key = f'\\StringFileInfo\\{lang:04x}{cp:04x}\\ProductVersion'
-            ctypes.windll.version.VerQueryValueW(buffer, key, ctypes.byref(ptr), ctypes.byref(length))
-            if length.value > 0:
-                return ctypes.wstring_at(ptr, length.value).strip('\x00')
-    except:
-        pass
-    return None
+    """Lê a versão (ProductVersion) do executável, reaproveitando o cache enquanto o arquivo não mudar."""
+    return version_cache.get(path)
 
 def enroll_agent(config, payload):
     log_event("Certificados mTLS ausentes. Iniciando fluxo de Enrollment (First Boot)...", "INFO")
@@ -330,15 +447,18 @@ def enroll_agent(config, payload):
             "csr": csr_pem
         }
         
-        # Failover de URL
-        server_urls = config.get("server_urls", [config.get("server_base_url")])
+        # Failover de URL (melhor servidor conhecido primeiro)
+        server_urls = endpoint_selector.ordered(config.get("server_urls", [config.get("server_base_url")]))
+        if not server_urls:
+            log_event("Enrollment adiado: todos os servidores estão com circuito aberto (backoff).", "WARNING")
+            return False
         for url in server_urls:
             try:
                 enroll_url = f"{url}/agent/enroll"
-                verify_ssl = ca_path if os.path.exists(ca_path) else True
-                
-                resp = requests.post(enroll_url, json=enroll_payload, timeout=15, verify=verify_ssl)
+                # Enrollment ainda não tem cert de cliente: só a CA entra na sessão
+                resp = get_session(ca_path=ca_path).post(enroll_url, json=enroll_payload, timeout=15)
                 resp.raise_for_status()
+                endpoint_selector.record_success(url, resp.elapsed.total_seconds())
                 
                 data = resp.json()
                 if "cert" in data:
@@ -349,7 +469,10 @@ def enroll_agent(config, payload):
                     # Embedding de Payload no Config (Cofre Seguro .dat)
                     config["agent_cert_pem"] = cert_pem
                     config["agent_key_pem"] = private_key_pem.decode('utf-8')
-                    save_config(config)
+                    if not save_config(config, immediate=True):
+                        log_event("Credenciais do enrollment ainda não gravadas no .dat; nova tentativa agendada.", "WARNING")
+                    # Cert novo no mesmo caminho: conexões antigas ainda usam o anterior
+                    invalidate_session()
                     
                     log_event("Enrollment bem-sucedido. Credenciais persistidas no .dat (Self-Healing Ready).", "INFO")
                     try: apply_strict_acl(cert_path)
@@ -357,6 +480,7 @@ def enroll_agent(config, payload):
                     return True
             except Exception as ep:
                 log_event(f"Tentativa de enrollment em {url} falhou: {ep}", "WARNING")
+                endpoint_selector.record_error(url, ep)
                 continue
                 
         log_event("Falha absoluta no fluxo de Enrollment (Nenhuma URL respondeu corretamente).", "ERROR")
@@ -390,15 +514,11 @@ def perform_core_check_in(config, inventory_payload=None):
     }
 
     if inventory_payload:
-        payload["additionalData"] = inventory_payload
         if "network_interfaces" in inventory_payload:
             for d in inventory_payload["network_interfaces"]:
                 for ip in d.get("ipv4_addresses", []):
                     payload["ipAddress"] = ip.get("ip_address", payload["ipAddress"])
     
-    if "additionalData" not in payload or payload["additionalData"] is None:
-        payload["additionalData"] = {}
-    
     # Coleta versões reais dos executáveis no disco
     mod_versions = {"core": AGENT_VERSION}
     try:
@@ -414,11 +534,28 @@ def perform_core_check_in(config, inventory_payload=None):
     except:
         pass
     
-    payload["additionalData"]["module_versions"] = mod_versions
-
     if not payload["agentId"]:
         return False, None
 
+    with inventory_snapshot_lock:
+        return _send_core_check_in(config, payload, inventory_payload, mod_versions)
+
+
+def _send_core_check_in(config, payload, inventory_payload, mod_versions):
+    # Heartbeat sem inventário novo parte do último snapshot aceito: só module_versions muda,
+    # em vez de sobrescrever o inventário do servidor com um additionalData quase vazio.
+    snapshot = load_inventory_snapshot()
+    if inventory_payload:
+        document = dict(inventory_payload)
+    elif snapshot:
+        document = dict(snapshot["data"])
+    else:
+        document = {}
+    document["module_versions"] = mod_versions
+    # Reinícios/crash loop por módulo (supervisor), junto das versões no heartbeat
+    document["module_health"] = module_supervisor.stats()
+    applied, applied_hash = attach_inventory(payload, document, snapshot)
+
     cert_path = config.get("cert_path")
     key_path = config.get("key_path")
     ca_path = config.get("ca_path")
@@ -456,23 +593,42 @@ def perform_core_check_in(config, inventory_payload=None):
             return False, None
     # --- FIM SELF-HEALING ---
 
-    # Failover: tenta cada URL da lista até uma funcionar
-    server_urls = config.get("server_urls", [config.get("server_base_url")])
+    # Failover: tenta cada URL na ordem do placar (sondagem paralela se nenhuma estiver saudável)
+    server_urls = endpoint_selector.ordered(config.get("server_urls", [config.get("server_base_url")]))
+    if not server_urls:
+        log_event("Check-in adiado: todos os servidores estão com circuito aberto (backoff).", "WARNING")
+        return False, None
     
     for url in server_urls:
         try:
             check_in_url = f"{url}/agent/check-in"
             
-            # Se o ca.crt não existir, o requests tentará usar os certificados do sistema
-            verify_ssl = ca_path if (ca_path and os.path.exists(ca_path)) else True
-            
-            # Garanta que estamos enviando os certificados se eles existirem
-            certs = None
-            if cert_path and key_path and os.path.exists(cert_path) and os.path.exists(key_path):
-                certs = (cert_path, key_path)
+            # Sessão keep-alive: check-in e settings compartilham a mesma conexão mTLS.
+            # Se o ca.crt não existir, o requests usa os certificados do sistema.
+            session = get_session(cert_path, key_path, ca_path)
 
-            response = requests.post(check_in_url, json=payload, timeout=10, cert=certs, verify=verify_ssl)
+            response = post_json(session, check_in_url, payload, server_accept_encodings.get(url), timeout=10)
             response.raise_for_status()
+            endpoint_selector.record_success(url, response.elapsed.total_seconds())
+            checkin_resp = response.json()
+            server_accept_encodings[url] = checkin_resp.get("acceptEncodings") or []
+
+            # Servidor perdeu a base do delta (ou não conseguiu aplicá-lo): reenvia completo
+            if checkin_resp.get("inventoryResync") and "additionalDataDelta" in payload:
+                log_event("Servidor pediu ressincronização do inventário. Enviando documento completo...", "WARNING")
+                clear_inventory_snapshot()
+                snapshot = None
+                applied, applied_hash = attach_inventory(payload, document, None)
+                response = post_json(session, check_in_url, payload, server_accept_encodings.get(url), timeout=10)
+                response.raise_for_status()
+                checkin_resp = response.json()
+
+            if checkin_resp.get("inventoryHash") == applied_hash:
+                if not snapshot or snapshot["hash"] != applied_hash:
+                    save_inventory_snapshot(applied, applied_hash)
+            elif snapshot:
+                # Servidor antigo (sem suporte a delta) ou resposta inesperada: volta ao modo completo
+                clear_inventory_snapshot()
             
             # Sucesso! Persiste essa URL como a ativa
             if url != config.get("server_base_url"):
@@ -481,7 +637,6 @@ def perform_core_check_in(config, inventory_payload=None):
                 log_event(f"Servidor ativo descoberto: {url}", "INFO")
                 
             # Atualização do modelo Tamper usando a resposta JSON normal do Check-in
-            checkin_resp = response.json()
             tamper_changed = False
             
             if "tamperEnabled" in checkin_resp:
@@ -503,9 +658,7 @@ def perform_core_check_in(config, inventory_payload=None):
             
             settings_url = f"{url}/settings/agent"
             # Mesma lógica de bypass de hostname removida por segurança v2.1.3
-            verify_ssl = ca_path if (ca_path and os.path.exists(ca_path)) else True
-            
-            set_response = requests.get(settings_url, timeout=10, cert=certs, verify=verify_ssl)
+            set_response = session.get(settings_url, timeout=10)
             if set_response.status_code == 200:
                 log_event("Check-in periódico realizado com sucesso.", "INFO")
                 return True, set_response.json()
@@ -515,6 +668,7 @@ def perform_core_check_in(config, inventory_payload=None):
         except requests.exceptions.SSLError as se:
             log_event(f"AUTO-CURA: Rejeição de TLS/SSL detectada em {url}. Possível revogação ou erro server-side. Iniciando Onboarding Fallback...", "WARNING")
             # Limpa credenciais problemáticas para forçar um refresh total
+            invalidate_session()
             config["agent_cert_pem"] = None
             config["agent_key_pem"] = None
             if enroll_agent(config, payload):
@@ -524,6 +678,9 @@ def perform_core_check_in(config, inventory_payload=None):
             continue
         except Exception as e:
             log_event(f"Tentativa de check-in em {url} falhou: {e}", "WARNING")
+            endpoint_selector.record_error(url, e)
+            # Renegocia a compressão na próxima tentativa (servidor pode ter sido trocado/rebaixado)
+            server_accept_encodings.pop(url, None)
             continue
     
     log_event("Nenhum servidor respondeu ao check-in. Todas as URLs falharam.", "ERROR")
@@ -531,9 +688,25 @@ def perform_core_check_in(config, inventory_payload=None):
 
 
 # --- Orquestração de Submódulos ---
-def cleanup_ghost_processes():
-    target_exes = ["Doc-IT-Inventory.exe", "Doc-IT-Remote.exe", "Doc-IT-Updater.exe", "Doc-IT-GUI.exe"]
+# PIDs (com horário de criação) de tudo o que o Core cria, expostos via IPC ("get_pids")
+# e espelhados em disco para GUI/Updater e para a limpeza da próxima execução.
+pid_registry = PidRegistry(PID_STATE_FILE)
+
+def cleanup_ghost_processes(previous_run=False):
+    """
+    Encerra submódulos e osqueryi criados pelo Core, pelo registro de PIDs.
+    previous_run=True (na subida do serviço): usa o arquivo espelho da execução anterior, que o
+    registro ainda não sobrescreveu. Sem arquivo (primeira subida após atualização), cai na varredura antiga.
+    """
     try:
+        if not previous_run or os.path.exists(PID_STATE_FILE):
+            entries = load_state(PID_STATE_FILE) if previous_run else pid_registry.snapshot()
+            # O próprio Core fica de fora (restart_request/SvcStop ainda precisam gravar config e log)
+            killed = kill_entries({pid: e for pid, e in entries.items() if e.get("name") != "core"})
+            if killed:
+                log_event(f"{killed} processo(s) do agente encerrado(s) pelo registro de PIDs.", "WARNING" if previous_run else "INFO")
+            return
+        target_exes = [m["exe"] for m in MODULES.values()] + ["osqueryi.exe"]
         for proc in psutil.process_iter(['name']):
             try:
                 if proc.info['name'] in target_exes:
@@ -541,7 +714,7 @@ def cleanup_ghost_processes():
             except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
                 pass
     except Exception as e:
-        log_event(f"Aviso ao varrer processos fantasmas: {e}", "WARNING")
+        log_event(f"Aviso ao encerrar processos fantasmas: {e}", "WARNING")
 
 MODULES = {
     "inventory": {"exe": "Doc-IT-Inventory.exe", "process": None},
@@ -553,8 +726,9 @@ MODULES = {
 IPC_PIPE_NAME = r'\\.\pipe\DocIT_Core_IPC'
 
 class Win32ProcessWrapper:
-    def __init__(self, hProcess):
+    def __init__(self, hProcess, pid=None):
         self.hProcess = hProcess
+        self.pid = pid
     def poll(self):
         try:
             code = win32process.GetExitCodeProcess(self.hProcess)
@@ -563,6 +737,10 @@ class Win32ProcessWrapper:
     def kill(self):
         try: win32api.TerminateProcess(self.hProcess, 1)
         except: pass
+    def wait(self):
+        """Bloqueia até o processo terminar (notificação do kernel, sem polling)."""
+        win32event.WaitForSingleObject(self.hProcess, win32event.INFINITE)
+        return self.poll()
 
 def spawn_process_in_session_1(exe_path):
     """Bypasses Session 0 Isolation to launch a GUI-capable process in the active user session."""
@@ -592,13 +770,12 @@ def spawn_process_in_session_1(exe_path):
             os.path.dirname(os.path.abspath(exe_path)),
             si
         )
-        return Win32ProcessWrapper(hProcess)
+        return Win32ProcessWrapper(hProcess, dwProcessId)
     except Exception as e:
         log_event(f"Erro Crítico de IPC/Session 0 Bypass ao instanciar {exe_path}: {e}", "CRITICAL")
         return None
 
-def start_module(module_name):
-    """Verifica e inicia um módulo. Se ele já estiver rodando, não faz nada."""
+def resolve_module_exe(module_name):
     exe_name = f"Doc-IT-{module_name.capitalize()}.exe"
     
     if getattr(sys, 'frozen', False):
@@ -610,75 +787,107 @@ def start_module(module_name):
         # Fallback for dev mode
         if not os.path.exists(exe_name):
             log_event(f"Atenção: Submódulo {exe_name} não encontrado no disco local.", "WARNING")
-            return
-        else:
-            exe_path = os.path.abspath(exe_name)
+            return None
+        exe_path = os.path.abspath(exe_name)
+    return exe_path
 
-    p = MODULES[module_name]["process"]
-    # Verifica se o processo existe e se está realmente respondendo/rodando
-    is_alive = False
-    if p:
-        try:
-            if p.poll() is None:
-                is_alive = True
-        except: pass
-        
-    if is_alive:
-        return 
+class AgentModuleLauncher(ProcessLauncher):
+    """Remote e GUI sobem na sessão do usuário logado; os demais como filhos diretos do serviço."""
 
-    try:
-        log_event(f"Spawnando Submódulo: {exe_name}...", "INFO")
-        
+    def launch(self, module_name):
+        exe_path = resolve_module_exe(module_name)
+        if not exe_path:
+            return None
+        log_event(f"Spawnando Submódulo: {os.path.basename(exe_path)}...", "INFO")
         if module_name in ["remote", "gui"]:
-            new_process = spawn_process_in_session_1(exe_path)
-            if new_process:
-                MODULES[module_name]["process"] = new_process
+            process = spawn_process_in_session_1(exe_path)
         else:
-            new_process = subprocess.Popen([exe_path], 
-                                         stdout=subprocess.DEVNULL, 
-                                         stderr=subprocess.DEVNULL,
-                                         creationflags=subprocess.CREATE_NO_WINDOW)
-            MODULES[module_name]["process"] = new_process
-    except Exception as e:
-        log_event(f"Erro ao instanciar módulo {module_name}: {e}", "ERROR")
-
-def keep_modules_alive_loop():
-    """Thread em background que garante que todos os módulos rodando e faz o heartbeat."""
+            process = subprocess.Popen([exe_path], 
+                                     stdout=subprocess.DEVNULL, 
+                                     stderr=subprocess.DEVNULL,
+                                     creationflags=subprocess.CREATE_NO_WINDOW)
+        MODULES[module_name]["process"] = process
+        return process
+
+# Reinício por notificação de saída, com backoff e detecção de crash loop.
+# A GUI entra também: deve ficar sempre na bandeja e reabre se crashear ou for encerrada externamente.
+module_supervisor = ModuleSupervisor(
+    AgentModuleLauncher(), ["inventory", "updater", "remote", "gui"],
+    on_start=lambda name, handle: pid_registry.register(name, handle.pid, MODULES[name]["exe"]),
+    on_exit=lambda name, handle, code: pid_registry.unregister(handle.pid))
+
+def stop_modules():
+    module_supervisor.stop()
+    module_supervisor.kill_all()
+    for m in MODULES.values():
+        if m["process"]:
+            try: m["process"].kill()
+            except: pass
+    if osquery_pool:
+        osquery_pool.close()
+
+# --- Motor Osquery (processos de longa duração, compartilhados com o Inventory via IPC) ---
+def get_osquery_path():
+    # Caminho absoluto para evitar erro de path e usar caminho real do PyInstaller
+    base_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+    return os.path.join(base_dir, "assets", "bin", "osqueryi.exe")
+
+# Criados na primeira query: o tamanho depende de osquery_max_concurrency, lido do config no main.
+osquery_pool = None
+live_queries = None
+osquery_lock = threading.Lock()
+
+def get_osquery_pool():
+    global osquery_pool
+    with osquery_lock:
+        if osquery_pool is None:
+            osquery_pool = OsqueryPool(
+                lambda: OsqueryShellProcess(get_osquery_path()),
+                fallback_factory=lambda: OsqueryOneShotProcess(get_osquery_path()),
+                size=config.get("osquery_max_concurrency", LIVE_QUERY_WORKERS),
+                on_spawn=lambda engine: pid_registry.register("osqueryi", engine.pid, "osqueryi.exe"),
+                on_exit=lambda engine: pid_registry.unregister(engine.pid))
+        return osquery_pool
+
+def report_live_query(query_id, message):
+    if message.get("done"):
+        if "error" not in message:
+            log_event(f"Live Query {query_id} executada com sucesso. {message['rowCount']} linhas em "
+                      f"{message['pages']} página(s), {message['durationMs']} ms (fila: {message['queuedMs']} ms)"
+                      f"{' - truncada no limite de linhas' if message['truncated'] else ''}.", "INFO")
+        else:
+            log_event(f"Live Query {query_id} sem resultado: {message['error']}",
+                      "INFO" if message.get("cancelled") else "ERROR")
+    sio.emit('osquery:results', dict(message, agentId=config.get('agent_id'), queryId=query_id))
+
+def get_live_queries():
+    """Agendador das live queries: roda fora da thread de eventos do Socket.IO, com cancelamento."""
+    global live_queries
+    pool = get_osquery_pool()
+    with osquery_lock:
+        if live_queries is None:
+            live_queries = LiveQueryScheduler(
+                lambda query_id, sql, token: pool.stream(sql, timeout=30, token=token),
+                report_live_query, max_workers=pool.size,
+                page_rows=config.get("osquery_page_rows", PAGE_ROWS),
+                page_bytes=config.get("osquery_page_bytes", PAGE_BYTES),
+                max_rows=config.get("osquery_max_rows", MAX_ROWS))
+        return live_queries
+
+def heartbeat_loop():
+    """Thread em background que faz o heartbeat periódico (a supervisão dos módulos é orientada a eventos)."""
     global config
-    last_heartbeat = time.time()
     HEARTBEAT_INTERVALSeconds = 300 # 5 Minutos
     
     while True:
+        time.sleep(HEARTBEAT_INTERVALSeconds)
+        log_event("Iniciando heartbeat periódico do Core...", "DEBUG")
         try:
-            # Módulos Críticos de Background
-            start_module("inventory")
-            start_module("updater")
-            start_module("remote")
-            
-            # A GUI é opcional mas o Core garante que ela se mantenha aberta se o usuário não fechou.
-            # Nota: Se o usuário fechar a GUI pelo menu, o status dela aqui será None/Dead e o Core vai reabrir?
-            # Por design, o Doc-IT Agent GUI deve ficar sempre na bandeja. 
-            # Reabre apenas se crashear ou for encerrado externamente.
-            start_module("gui")
-            
+            success, _ = perform_core_check_in(config)
+            if success:
+                start_spool_replay()
         except Exception as e:
-            log_event(f"Erro no loop de monitoramento de módulos: {e}", "ERROR")
-            
-        # Periodic Heartbeat
-        now = time.time()
-        if now - last_heartbeat >= HEARTBEAT_INTERVALSeconds:
-            log_event("Iniciando heartbeat periódico do Core...", "DEBUG")
-            try:
-                perform_core_check_in(config)
-            except Exception as e:
-                log_event(f"Falha ao realizar heartbeat periódico: {e}", "WARNING")
-            finally:
-                last_heartbeat = time.time()
-        
-        # Throttling: Não consome 100% de CPU checando processos
-        time.sleep(10)
-                
-        time.sleep(10) # Checa a cada 10s
+            log_event(f"Falha ao realizar heartbeat periódico: {e}", "WARNING")
 
 
 # --- Servidor IPC Local (via Named Pipes) ---
@@ -704,112 +913,92 @@ def get_pipe_acl():
     sa.bInheritHandle = False
     return sa
 
-def ipc_local_server():
-    """Servidor Named Pipe para receber dados dos módulos."""
-    sa = get_pipe_acl()
-    
-    while True:
-        try:
-            pipe = win32pipe.CreateNamedPipe(
-                IPC_PIPE_NAME,
-                win32pipe.PIPE_ACCESS_DUPLEX,
-                win32pipe.PIPE_TYPE_MESSAGE | win32pipe.PIPE_READMODE_MESSAGE | win32pipe.PIPE_WAIT,
-                255, 65536, 65536,
-                0,
-                sa
-            )
-            
-            try:
-                win32pipe.ConnectNamedPipe(pipe, None)
-                threading.Thread(target=handle_ipc_client, args=(pipe,), daemon=True).start()
-            except pywintypes.error as e:
-                if e.winerror == 535: # ERROR_PIPE_CONNECTED
-                    threading.Thread(target=handle_ipc_client, args=(pipe,), daemon=True).start()
-                elif e.winerror == 232: # ERROR_NO_DATA (Client disconnected before we could accept)
-                    win32file.CloseHandle(pipe)
-                else:
-                    log_event(f"Erro Conectando ao IPC (Named Pipe): {e}", "ERROR")
-                    try: win32file.CloseHandle(pipe)
-                    except: pass
-                    time.sleep(1)
-        except Exception as e:
-            log_event(f"Erro Criando Servidor IPC (Named Pipe): {e}", "ERROR")
-            try: win32file.CloseHandle(pipe)
-            except: pass
-            time.sleep(1)
+ipc_server = None
 
-# Controle de Fluxo WebSocket para não congestionar a rede do agente
-ws_busy = False
-ws_busy_timer = None
-
-def on_emit_done():
-    global ws_busy, ws_busy_timer
-    ws_busy = False
-    # Cancela o timer de segurança se o callback chegou a tempo
-    if ws_busy_timer:
-        ws_busy_timer.cancel()
-        ws_busy_timer = None
-
-def ws_busy_timeout():
-    """Safety net: reseta ws_busy se o callback não chegar em 3 segundos."""
-    global ws_busy, ws_busy_timer
-    if ws_busy:
-        ws_busy = False
-        ws_busy_timer = None
-
-def handle_ipc_client(pipe):
-    global ws_busy
-    try:
-        # Buffer de leitura
-        data = b""
-        while True:
-            resp, chunk = win32file.ReadFile(pipe, 4096)
-            data += chunk
-            if resp == 0: # Success
-                break
-        
-        payload = json.loads(data.decode('utf-8'))
-        
-        # VALIDAÇÃO FÍSICA DO CLIENTE (KERNEL PID VALIDATION)
-        client_exe = get_pipe_client_exe(pipe)
-        if not client_exe:
-            log_event("BLOQUEIO IPC: Tentativa de conexão sem PID rastreável.", "CRITICAL")
-            return
+# Ações que fazem I/O de rede/disco demorado: vão para o pool de trabalho limitado
+IPC_BLOCKING_ACTIONS = ["inventory_ready", "restart_request", "osquery_query"]
+IPC_MAX_WORKERS = 2
+IPC_MAX_QUEUE = 8
 
-        expected_dir = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
-        client_exe_lower = client_exe.lower()
-        expected_dir_lower = expected_dir.lower()
+def ipc_local_server():
+    """Servidor IPC persistente (asyncio): uma conexão de longa duração por submódulo, concorrência limitada."""
+    global ipc_server
+    ipc_server = AsyncIPCServer(
+        ipc.make_transport(IPC_PIPE_NAME, get_pipe_acl() if sys.platform == "win32" else None),
+        handle_ipc_message,
+        authorize=authorize_ipc_client,
+        blocking_actions=IPC_BLOCKING_ACTIONS,
+        max_workers=IPC_MAX_WORKERS,
+        max_queue=IPC_MAX_QUEUE
+    )
+    ipc_server.serve_forever()
+
+# Controle de Fluxo do Remote Desktop: janela de créditos dimensionada pelos acks do visualizador
+frame_flow = CreditWindow()
+
+def push_frame_credits():
+    """Empurra ao Remote o último ack e a janela atual; é ele quem descarta frames antes de codificar."""
+    send_ipc_fire_and_forget("remote", {"cmd": "desktop_credit", "data": frame_flow.state()})
+
+def authorize_ipc_client(stream):
+    """VALIDAÇÃO FÍSICA DO CLIENTE (KERNEL PID VALIDATION), feita uma única vez por conexão."""
+    client_exe = get_ipc_peer_exe(stream)
+    if not client_exe:
+        log_event("BLOQUEIO IPC: Tentativa de conexão sem PID rastreável.", "CRITICAL")
+        return False
 
-        is_authorized = False
-        allowed_modules = ["Doc-IT-GUI.exe", "Doc-IT-Updater.exe", "Doc-IT-Remote.exe", "Doc-IT-Inventory.exe"]
-        
-        # Permite rodar via VSCode / Terminal para testes (Correção v2.0.25)
-        if not getattr(sys, 'frozen', False):
-             allowed_modules.append("python.exe")
-             allowed_modules.append("python3.exe")
-        
-        # Valida se o executável pertence ao diretório do agente e é um módulo autorizado
-        if client_exe_lower.startswith(expected_dir_lower) or not getattr(sys, 'frozen', False):
-            for mod in allowed_modules:
-                if mod.lower() in client_exe_lower:
-                    is_authorized = True
-                    break
-        
-        if not is_authorized:
-            log_event(f"TENTATIVA DE INVASÃO IPC: Processo não autorizado '{client_exe}' tentou enviar comandos ao Core.", "CRITICAL")
-            return
+    expected_dir = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
+    client_exe_lower = client_exe.lower()
+    expected_dir_lower = expected_dir.lower()
 
+    allowed_modules = ["Doc-IT-GUI.exe", "Doc-IT-Updater.exe", "Doc-IT-Remote.exe", "Doc-IT-Inventory.exe"]
+    
+    # Permite rodar via VSCode / Terminal para testes (Correção v2.0.25)
+    if not getattr(sys, 'frozen', False):
+         allowed_modules.append("python.exe")
+         allowed_modules.append("python3.exe")
+    
+    # Valida se o executável pertence ao diretório do agente e é um módulo autorizado
+    if client_exe_lower.startswith(expected_dir_lower) or not getattr(sys, 'frozen', False):
+        for mod in allowed_modules:
+            if mod.lower() in client_exe_lower:
+                return True
+    
+    log_event(f"TENTATIVA DE INVASÃO IPC: Processo não autorizado '{client_exe}' tentou enviar comandos ao Core.", "CRITICAL")
+    return False
+
+def handle_ipc_message(conn, payload, blob):
+    """Despacha uma mensagem recebida em uma conexão IPC. O retorno vira a resposta de pedidos."""
+    try:
         action = payload.get("action")
         
         if action == "inventory_ready":
             inv_data = payload.get("data")
             log_event("Inventário recebido via IPC! Repassando ao Backend...", "INFO")
-            perform_core_check_in(config, inventory_payload=inv_data)
+            stamp = time.time_ns()
+            if deliver_inventory(inv_data, stamp):
+                # Inventário novo entregue: os do spool coletados antes dele ficaram obsoletos
+                offline_spool.discard("inventory", up_to=stamp)
+            elif inv_data:
+                offline_spool.put("inventory", inv_data, stamp=stamp)
         
         elif action == "get_config":
             log_event("Submódulo solicitou configuração via IPC.", "DEBUG")
-            response = {"status": "success", "config": config}
-            win32file.WriteFile(pipe, json.dumps(response).encode('utf-8'))
+            return {"status": "success", "config": config}
+
+        elif action == "osquery_query":
+            # Inventory reaproveita os processos osquery já quentes do Core
+            if not os.path.exists(get_osquery_path()):
+                return {"status": "error", "message": "Motor Osquery não encontrado no agente."}
+            try:
+                return {"status": "success", "rows": get_osquery_pool().query(payload.get("sql", ""), timeout=payload.get("timeout", 30))}
+            except QueryError as e:
+                return {"status": "error", "message": str(e)}
+            except EngineError as e:
+                return {"status": "engine_error", "message": str(e)}
+
+        elif action == "get_pids":
+            return {"status": "success", "pids": pid_registry.snapshot()}
 
         elif action in ["save_config", "update_config"]:
             # --- BLINDAGEM TAMPER AUTH  ---
@@ -818,9 +1007,7 @@ def handle_ipc_client(pipe):
                 expected_pwd = config.get("tamper_password")
                 if auth_provided != expected_pwd:
                     log_event(f"BLOQUEIO CRÍTICO: Tentativa de alteração de configuração sem senha válida via IPC.", "CRITICAL")
-                    response = {"status": "error", "message": "Proteção ativa. Senha necessária."}
-                    win32file.WriteFile(pipe, json.dumps(response).encode('utf-8'))
-                    return
+                    return {"status": "error", "message": "Proteção ativa. Senha necessária."}
             # ----------------------------------------
             log_event(f"Alteração de configuração via IPC ({action}).", "INFO")
             new_cfg = payload.get("config", {})
@@ -840,37 +1027,27 @@ def handle_ipc_client(pipe):
                 except: pass
             
             save_config(config)
-            response = {"status": "success"}
-            win32file.WriteFile(pipe, json.dumps(response).encode('utf-8'))
+            return {"status": "success"}
 
         elif action == "restart_request":
             log_event("O Sub-Updater ou GUI pediu reinicialização do Agente.", "WARNING")
-            for m_name, m_data in MODULES.items():
-                if m_data["process"]:
-                    try: m_data["process"].kill()
-                    except: pass
+            stop_modules()
             cleanup_ghost_processes()
+            flush_config()
+            logger.flush()
             time.sleep(1)
-            try: win32file.CloseHandle(pipe)
-            except: pass
             os._exit(1)
 
         elif action == "desktop_frame":
-            # Flow Control: Só envia se o WebSocket não estiver ocupado
-            if ws_busy: return
+            # Flow Control: o Remote só produz frames dentro da janela de créditos; aqui só se registra o envio
             if 'sio' in globals() and sio.connected:
-                ws_busy = True
-                # Timer de segurança: reseta ws_busy se o callback não chegar em 3 segundos
-                global ws_busy_timer
-                ws_busy_timer = threading.Timer(3.0, ws_busy_timeout)
-                ws_busy_timer.daemon = True
-                ws_busy_timer.start()
+                header, _ = frames.unpack_header(blob)
+                frame_flow.on_sent(header["streamId"], header["seq"], len(blob))
+                # Cabeçalho binário + regiões já montados pelo Remote: vão como anexo binário, sem base64/JSON
                 sio.emit('desktop:frame', {
                     'agentId': config.get("agent_id"),
-                    'imageB64': payload["data"]["imageB64"],
-                    'width': payload["data"]["width"],
-                    'height': payload["data"]["height"]
-                }, callback=on_emit_done)
+                    'frame': blob
+                })
                 
         elif action == "terminal_output":
             if 'sio' in globals() and sio.connected:
@@ -879,6 +1056,12 @@ def handle_ipc_client(pipe):
                     'data': payload["data"]["text"]
                 })
                 
+        elif action == "input_stats":
+            log_event(f"Latência de entrada do Remote (chegada -> injeção): {payload.get('data')}", "INFO")
+
+        elif action == "stream_stats":
+            log_event(f"Pipeline de streaming do Remote (tempo por estágio): {payload.get('data')}", "INFO")
+
         elif action == "monitor_list":
             if 'sio' in globals() and sio.connected:
                 sio.emit('desktop:monitor_list', {
@@ -888,80 +1071,69 @@ def handle_ipc_client(pipe):
             
     except Exception as e:
         log_event(f"Erro mapeando payload IPC local: {e}", "ERROR")
-    finally:
-        try: win32file.CloseHandle(pipe)
-        except: pass
+        return {"status": "error", "message": str(e)}
 
 
 def send_ipc_command(module_name, payload):
-    """Envia um comando via Named Pipe para um submódulo com lógica de retry."""
-    pipe_path = None
-    if module_name == "remote": pipe_path = r"\\.\pipe\DocIT_Remote_IPC"
-    
-    if not pipe_path: return
-    
-    # Tenta até 3 vezes em caso de colisão
-    for i in range(3):
-        try:
-            # Se o pipe estiver ocupado, espera até 500ms
-            try:
-                win32pipe.WaitNamedPipe(pipe_path, 500)
-            except:
-                pass
-
-            handle = win32file.CreateFile(
-                pipe_path,
-                win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-                0, None,
-                win32file.OPEN_EXISTING,
-                0, None
-            )
-            win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-            win32file.WriteFile(handle, json.dumps(payload).encode('utf-8'))
-            win32file.CloseHandle(handle)
-            return True # Sucesso!
-        except pywintypes.error as e:
-            if e.winerror == 231: # Pipe is busy
-                time.sleep(0.1)
-                continue
-            log_event(f"Falha ao enviar IPC para o submódulo '{module_name}' (Tentativa {i+1}): {e}", "WARNING")
-        finally:
-            try: win32file.CloseHandle(handle)
-            except: pass
+    """Envia um comando ao submódulo pela conexão persistente que ele mantém com o Core."""
+    if ipc_server and ipc_server.send_to(module_name, payload):
+        return True
+    log_event(f"Falha ao enviar IPC para o submódulo '{module_name}': módulo não conectado ao Core.", "WARNING")
     return False
 
 
 def send_ipc_fire_and_forget(module_name, payload):
-    """Versão não-bloqueante de send_ipc_command para eventos de alta frequência (mouse/teclado).
-    Executa em thread separada, sem retries, sem WaitNamedPipe longo.
-    Se falhar, descarta silenciosamente (mouse skip é imperceptível)."""
-    pipe_path = None
-    if module_name == "remote": pipe_path = r"\\.\pipe\DocIT_Remote_IPC"
-    if not pipe_path: return
-    
-    handle = None
+    """Versão silenciosa de send_ipc_command para eventos de alta frequência (créditos de frame).
+    Se o submódulo não estiver conectado, descarta."""
+    if ipc_server:
+        ipc_server.send_to(module_name, payload)
+
+
+# Fila de entrada da sessão de Remote Desktop atual: um despachante, ordem preservada,
+# movimentos de mouse coalescidos a remote_mouse_rate_hz.
+input_session = None
+input_session_lock = threading.Lock()
+
+def dispatch_remote_input(cmd, data):
+    if not (ipc_server and ipc_server.send_to("remote", {"cmd": cmd, "data": data})):
+        log_event(f"Evento de entrada '{cmd}' não entregue: Remote não conectado ao Core.", "DEBUG")
+
+def open_input_session():
+    """Nova sessão (desktop:start): a fila anterior termina de despachar o que já tinha e é trocada."""
+    global input_session
+    with input_session_lock:
+        if input_session:
+            input_session.close()
+        input_session = InputQueue(dispatch_remote_input, move_rate=config.get("remote_mouse_rate_hz", MOVE_RATE),
+                                   name="remote-input")
+        return input_session
+
+def close_input_session(final_cmd=None):
+    """Encerra a sessão. final_cmd (ex: stop_desktop) vai pela mesma fila, depois das entradas pendentes."""
+    global input_session
+    with input_session_lock:
+        session, input_session = input_session, None
+    if session is None:
+        if final_cmd:
+            send_ipc_command("remote", {"cmd": final_cmd})
+        return
+    if final_cmd:
+        session.put(final_cmd, {})
+    session.close()
+    log_event(f"Sessão de entrada encerrada: {session.stats()}", "DEBUG")
+
+def queue_remote_input(cmd, data):
+    """
+    Enfileira sem bloquear o event loop do Socket.IO; 'ts' permite ao Remote medir a latência até a injeção.
+    Cada handler do Socket.IO roda numa thread própria: a fila reordena pelo 'seq' que o backend carimba.
+    """
+    data["ts"] = time.time()
     try:
-        # Timeout curtíssimo: se o pipe não estiver livre em 20ms, desiste
-        try:
-            win32pipe.WaitNamedPipe(pipe_path, 20)
-        except:
-            return  # Pipe ocupado, descarta este evento
-        
-        handle = win32file.CreateFile(
-            pipe_path,
-            win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-            0, None,
-            win32file.OPEN_EXISTING,
-            0, None
-        )
-        win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-        win32file.WriteFile(handle, json.dumps(payload).encode('utf-8'))
-    except:
-        pass  # Silencioso: perder 1 evento de mouse não é perceptível
-    finally:
-        try:
-            if handle: win32file.CloseHandle(handle)
-        except: pass
+        seq = int(data["seq"]) if data.get("seq") is not None else None
+    except (TypeError, ValueError):
+        seq = None
+    session = input_session or open_input_session()
+    session.put(cmd, data, seq=seq)
 
 
 # --- Websocket (Conector Mestre de Comandos de Tela/Terminal) ---
@@ -969,8 +1141,9 @@ sio = socketio.Client(ssl_verify=False)
 
 @sio.event
 def connect():
-    global ws_busy
-    ws_busy = False  # Reset: garante que o fluxo não fique travado após reconexão
+    # Reset: acks de frames enviados antes da queda não chegarão, devolve os créditos ao Remote
+    frame_flow.reset()
+    push_frame_credits()
     log_event("Websocket do Core conectado!", "INFO")
 
 @sio.on('terminal:start')
@@ -991,12 +1164,34 @@ def proxy_terminal_data(data):
 @sio.on('desktop:start')
 def proxy_desktop_start(data):
     if data.get('agentId') != config.get('agent_id'): return
+    open_input_session()
     send_ipc_command("remote", {"cmd": "start_desktop", "data": data})
 
 @sio.on('desktop:stop')
 def proxy_desktop_stop(data):
     if data.get('agentId') != config.get('agent_id'): return
-    send_ipc_command("remote", {"cmd": "stop_desktop"})
+    close_input_session(final_cmd="stop_desktop")
+
+@sio.on('desktop:ack')
+def proxy_desktop_ack(data):
+    if data.get('agentId') != config.get('agent_id'): return
+    try:
+        if frame_flow.on_ack(int(data.get('streamId', 0)), int(data.get('seq', 0))):
+            push_frame_credits()
+    except (TypeError, ValueError):
+        pass
+
+@sio.on('desktop:visibility')
+def proxy_desktop_visibility(data):
+    # Aba do visualizador escondida: o Remote pausa a captura (nada é codificado nem enviado)
+    if data.get('agentId') != config.get('agent_id'): return
+    send_ipc_command("remote", {"cmd": "desktop_visibility", "data": {"hidden": bool(data.get('hidden'))}})
+
+@sio.on('desktop:keyframe')
+def proxy_desktop_keyframe(data):
+    # Visualizador sem base para os deltas (frame perdido/reconexão): pede a tela inteira
+    if data.get('agentId') != config.get('agent_id'): return
+    send_ipc_command("remote", {"cmd": "desktop_keyframe"})
 
 @sio.on('desktop:get_monitors')
 def proxy_get_monitors(data):
@@ -1006,23 +1201,22 @@ def proxy_get_monitors(data):
 @sio.on('desktop:mouse_move')
 def proxy_mouse_move(data):
     if data.get('agentId') != config.get('agent_id'): return
-    # Fire-and-forget em thread separada para NÃO bloquear o event loop do Socket.IO
-    threading.Thread(target=send_ipc_fire_and_forget, args=("remote", {"cmd": "mouse_move", "data": data}), daemon=True).start()
+    queue_remote_input("mouse_move", data)
 
 @sio.on('desktop:mouse_down')
 def proxy_mouse_down(data):
     if data.get('agentId') != config.get('agent_id'): return
-    threading.Thread(target=send_ipc_fire_and_forget, args=("remote", {"cmd": "mouse_down", "data": data}), daemon=True).start()
+    queue_remote_input("mouse_down", data)
 
 @sio.on('desktop:mouse_up')
 def proxy_mouse_up(data):
     if data.get('agentId') != config.get('agent_id'): return
-    threading.Thread(target=send_ipc_fire_and_forget, args=("remote", {"cmd": "mouse_up", "data": data}), daemon=True).start()
+    queue_remote_input("mouse_up", data)
 
 @sio.on('desktop:mouse_scroll')
 def proxy_mouse_scroll(data):
     if data.get('agentId') != config.get('agent_id'): return
-    threading.Thread(target=send_ipc_fire_and_forget, args=("remote", {"cmd": "mouse_scroll", "data": data}), daemon=True).start()
+    queue_remote_input("mouse_scroll", data)
 
 @sio.on('tamper:update')
 def handle_tamper_update(data):
@@ -1046,71 +1240,39 @@ def handle_tamper_update(data):
 
 @sio.on('osquery:query')
 def handle_osquery_query(data):
-    """Executa uma query SQL solicitada pelo servidor via Osquery."""
+    """Enfileira uma query SQL solicitada pelo servidor; o resultado sai paginado em osquery:results com o mesmo queryId."""
     global config
     if data.get('agentId') != config.get('agent_id'): return
     
     sql = data.get('sql')
     if not sql: return
+    # Servidor antigo não manda queryId: o resultado vai sem correlação, como antes
+    query_id = data.get('queryId') or f"local-{time.monotonic_ns()}"
 
-    log_event(f"Executando Live Query: {sql}", "INFO")
+    log_event(f"Live Query {query_id} recebida: {sql}", "INFO")
     
-    try:
-        # Localiza o binário - Mudança para absoluto para evitar erro de path e usar caminho real do PyInstaller
-        base_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
-        osquery_path = os.path.join(base_dir, "assets", "bin", "osqueryi.exe")
-        
-        if not os.path.exists(osquery_path):
-             sio.emit('osquery:results', {
-                'agentId': config.get('agent_id'),
-                'error': "Motor Osquery não encontrado no agente."
-            })
-             log_event("Falha Live Query: Binário osqueryi.exe ausente.", "ERROR")
-             return
-
-        # Executa com timeout para evitar travamentos
-        process = subprocess.Popen(
-            [osquery_path, "--json", sql],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            creationflags=subprocess.CREATE_NO_WINDOW
-        )
-        
-        try:
-            stdout, stderr = process.communicate(timeout=30)
-            if process.returncode == 0:
-                results = json.loads(stdout)
-                sio.emit('osquery:results', {
-                    'agentId': config.get('agent_id'),
-                    'results': results
-                })
-                log_event(f"Live Query executada com sucesso. {len(results)} linhas retornadas.", "INFO")
-            else:
-                sio.emit('osquery:results', {
-                    'agentId': config.get('agent_id'),
-                    'error': stderr.strip() or "Erro desconhecido na execução."
-                })
-                log_event(f"Erro na Live Query: {stderr}", "ERROR")
-        except subprocess.TimeoutExpired:
-            process.kill()
-            sio.emit('osquery:results', {
-                'agentId': config.get('agent_id'),
-                'error': "Timeout de 30s atingido na consulta."
-            })
-            log_event("Live Query interrompida por timeout.", "WARNING")
-
-    except Exception as e:
-        log_event(f"Falha interna ao processar Live Query: {e}", "ERROR")
+    if not os.path.exists(get_osquery_path()):
         sio.emit('osquery:results', {
             'agentId': config.get('agent_id'),
-            'error': str(e)
+            'queryId': query_id,
+            'done': True,
+            'error': "Motor Osquery não encontrado no agente."
         })
+        log_event("Falha Live Query: Binário osqueryi.exe ausente.", "ERROR")
+        return
+
+    get_live_queries().submit(query_id, sql, max_rows=data.get('maxRows'))
+
+@sio.on('osquery:cancel')
+def handle_osquery_cancel(data):
+    if data.get('agentId') != config.get('agent_id'): return
+    if live_queries and live_queries.cancel(data.get('queryId')):
+        log_event(f"Live Query {data.get('queryId')} cancelada pelo servidor.", "INFO")
 
 @sio.on('desktop:key_down')
 def proxy_key_down(data):
     if data.get('agentId') != config.get('agent_id'): return
-    threading.Thread(target=send_ipc_fire_and_forget, args=("remote", {"cmd": "key_down", "data": data}), daemon=True).start()
+    queue_remote_input("key_down", data)
 
 
 class DocITAgentService(win32serviceutil.ServiceFramework):
@@ -1128,13 +1290,11 @@ class DocITAgentService(win32serviceutil.ServiceFramework):
         win32event.SetEvent(self.hWaitStop)
         self.is_running = False
         log_event("Recebido sinal de parada do Windows Service. Finalizando módulos suavemente...", "INFO")
-        for m in MODULES.values():
-            if m["process"]:
-                try: m["process"].kill()
-                except: pass
+        stop_modules()
         
         # Aggressive cleanup on stop via native API instead of taskkill
         cleanup_ghost_processes()
+        flush_config()
 
     def SvcDoRun(self):
         # Reporta que o serviço está iniciando
@@ -1161,30 +1321,36 @@ class DocITAgentService(win32serviceutil.ServiceFramework):
             save_config(config)
 
         # Cleanup Any Ghost Processes Before Spawning New Ones (Native approach)
-        log_event("Garantindo ambiente limpo. Purgando processos fantasmas via psutil...", "INFO")
-        cleanup_ghost_processes()
+        log_event("Garantindo ambiente limpo. Purgando processos fantasmas da execução anterior...", "INFO")
+        cleanup_ghost_processes(previous_run=True)
+        pid_registry.register("core", os.getpid(), "Doc-IT-Core.exe")
 
         threading.Thread(target=ipc_local_server, daemon=True).start()
 
         success, settings = perform_core_check_in(config)
+        if success:
+            start_spool_replay()
 
-        threading.Thread(target=keep_modules_alive_loop, daemon=True).start()
-        
-        # Failover de WebSocket: tenta cada URL da lista
-        server_urls = config.get('server_urls', [config.get('server_base_url')])
+        module_supervisor.start()
+        threading.Thread(target=heartbeat_loop, daemon=True).start()
         
+        # Primária volta a ser preferida assim que o re-probe a vê respondendo
+        endpoint_selector.start_reprobe(get_server_urls)
+
+        # Failover de WebSocket: tenta as URLs na ordem do placar
         while self.is_running:
-            for socket_url in server_urls:
+            for socket_url in (endpoint_selector.ordered(get_server_urls()) if not sio.connected else []):
                 if not self.is_running:
                     break
                 try:
-                    if not sio.connected:
-                        sio.connect(socket_url, headers={'x-agent-id': config.get("agent_id")})
-                        if sio.connected:
-                            log_event(f"WebSocket conectado com sucesso em: {socket_url}", "INFO")
-                            break
+                    sio.connect(socket_url, headers={'x-agent-id': config.get("agent_id")})
+                    if sio.connected:
+                        log_event(f"WebSocket conectado com sucesso em: {socket_url}", "INFO")
+                        endpoint_selector.record_success(socket_url)
+                        break
                 except Exception as e:
-                    pass
+                    log_event(f"Falha ao conectar WebSocket em {socket_url}: {e}", "WARNING")
+                    endpoint_selector.record_failure(socket_url)
             
             if not self.is_running:
                 break
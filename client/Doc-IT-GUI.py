@@ -1,13 +1,9 @@
 import os
 import sys
-import json
 import time
 import threading
-from datetime import datetime
 import customtkinter as ctk
-import psutil
 import pystray
-import subprocess
 from PIL import Image, ImageDraw, ImageTk
 import win32api
 import win32con
@@ -15,9 +11,12 @@ import win32security
 from cryptography.fernet import Fernet
 
 import socket
-import win32pipe
-import win32file
-import pywintypes
+
+import docit_common
+from docit_common.log_writer import AsyncLogWriter
+from docit_common import ipc
+from docit_common import versions
+from docit_common import pid_registry
 
 # --- Constantes IPC ----
 CORE_IPC_PIPE = r'\\.\pipe\DocIT_Core_IPC'
@@ -26,81 +25,47 @@ CORE_IPC_PIPE = r'\\.\pipe\DocIT_Core_IPC'
 AGENT_VERSION = "2.3.0"
 LOG_FILE = "agent-gui.log"
 
+# Fila + thread escritora única com rotação (docit_common.log_writer)
+logger = AsyncLogWriter(LOG_FILE, "GUI")
+
 def log_event(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp} [{level}] [GUI] - {message}\n"
-    try:
-        with open(LOG_FILE, "a", encoding='utf-8') as f:
-            f.write(log_entry)
-            
-        if os.path.exists(LOG_FILE) and os.path.getsize(LOG_FILE) > 2 * 1024 * 1024:
-            os.replace(LOG_FILE, LOG_FILE + ".bak")
-    except:
-        pass
+    logger.log(message, level)
+
+docit_common.set_log_handler(log_event)
+
+core_link = ipc.IPCClient(ipc.make_transport(CORE_IPC_PIPE), "gui", connect_timeout=1.0)
 
 def request_config_from_core():
-    """Solicita a configuração ativa ao processo Core via Named Pipe com suporte a retries."""
+    """Solicita a configuração ativa ao processo Core pela conexão IPC persistente, com retries."""
     
-    # Tenta até 5 vezes em caso de pipe ocupado ou erro temporário
+    # Tenta até 5 vezes em caso de Core reiniciando ou erro temporário
     for attempt in range(5):
-        handle = None
         try:
-            # Se o pipe estiver ocupado, espera até 1 segundo
-            try:
-                win32pipe.WaitNamedPipe(CORE_IPC_PIPE, 1000)
-            except:
-                pass
-
-            payload = {
-                "action": "get_config",
-            }
-            
-            handle = win32file.CreateFile(
-                CORE_IPC_PIPE,
-                win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-                0, None,
-                win32file.OPEN_EXISTING,
-                0, None
-            )
-            win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-            win32file.WriteFile(handle, json.dumps(payload).encode('utf-8'))
-            
-            # Leitura da resposta
-            data = b""
-            while True:
-                resp, chunk = win32file.ReadFile(handle, 4096)
-                data += chunk
-                if resp == 0: break
-                
-            response = json.loads(data.decode('utf-8'))
-            if response.get("status") == "success":
+            response = core_link.request({"action": "get_config"}, timeout=5.0)
+            if response and response.get("status") == "success":
                 return response.get("config", {})
-                
-        except pywintypes.error as e:
-            if e.winerror == 231: # Pipe is busy
-                log_event(f"Pipe ocupado (Tentativa {attempt+1}/5). Aguardando...", "DEBUG")
-                time.sleep(0.5)
-                continue
+        except ipc.IPCError as e:
             log_event(f"Falha ao solicitar config ao Core (Tentativa {attempt+1}/5): {e}", "WARNING")
         except Exception as e:
             log_event(f"Erro inesperado no IPC do GUI: {e}", "ERROR")
-        finally:
-            if handle:
-                try: win32file.CloseHandle(handle)
-                except: pass
         
         time.sleep(1) # Espera antes do próximo retry
 
     return None
 
-def check_process_running(process_name):
-    for proc in psutil.process_iter(['name']):
-        try:
-            if proc.info['name'] == process_name:
-                return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-            pass
-    return False
+def get_agent_pids():
+    """Registro de PIDs mantido pelo Core (via IPC), com o arquivo espelho como reserva se o Core não responder."""
+    try:
+        response = core_link.request({"action": "get_pids"}, timeout=2.0)
+        if response and response.get("status") == "success":
+            return response.get("pids", {})
+    except Exception:
+        pass
+    return pid_registry.load_state(os.path.join(GUI_BASE_DIR, pid_registry.STATE_FILE))
+
+def check_process_running(module_name, pids=None):
+    """Consulta O(1) por PID registrado (com verificação do horário de criação) em vez de varrer os processos."""
+    return pid_registry.is_alive(get_agent_pids() if pids is None else pids, module_name)
 
 def check_service_running(service_name):
     import win32serviceutil
@@ -111,28 +76,14 @@ def check_service_running(service_name):
     except:
         return False
 
-import ctypes
+GUI_BASE_DIR = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+
+# Compartilha o sidecar com o Core: a bandeja consulta a cada 5s e só relê binários alterados
+version_cache = versions.VersionCache(os.path.join(GUI_BASE_DIR, versions.SIDECAR_NAME))
+
 def get_file_version(path):
-    """Lê a versão (ProductVersion) diretamente dos metadados do executável via API do Windows."""
-    if not os.path.exists(path): return None
-    try:
-        size = ctypes.windll.version.GetFileVersionInfoSizeW(path, None)
-        if not size: return None
-        buffer = ctypes.create_string_buffer(size)
-        ctypes.windll.version.GetFileVersionInfoW(path, None, size, buffer)
-        length = ctypes.c_uint()
-        ptr = ctypes.c_void_p()
-        ctypes.windll.version.VerQueryValueW(buffer, '\\VarFileInfo\\Translation', ctypes.byref(ptr), ctypes.byref(length))
-        if length.value >= 4:
-            data = ctypes.string_at(ptr, 4)
-            lang = data[1] << 8 | data[0]
-            cp = data[3] << 8 | data[2]
-            key = f'\\StringFileInfo\\{lang:04x}{cp:04x}\\ProductVersion'
-            ctypes.windll.version.VerQueryValueW(buffer, key, ctypes.byref(ptr), ctypes.byref(length))
-            if length.value > 0:
-                return ctypes.wstring_at(ptr, length.value).strip('\x00')
-    except: pass
-    return None
+    """Lê a versão (ProductVersion) do executável, reaproveitando o cache enquanto o arquivo não mudar."""
+    return version_cache.get(path)
 
 def get_local_gui_version():
     """Tenta ler a versão do próprio executável ou fallback."""
@@ -316,26 +267,13 @@ class DocITDashboard(ctk.CTk):
                     "update_check_interval_minutes": self.input_update_interval.get()
                 }
             }
-            handle = win32file.CreateFile(CORE_IPC_PIPE, win32file.GENERIC_READ | win32file.GENERIC_WRITE, 0, None, win32file.OPEN_EXISTING, 0, None)
-            win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-            win32file.WriteFile(handle, json.dumps(payload).encode('utf-8'))
-            
-            data = b""
-            while True:
-                resp, chunk = win32file.ReadFile(handle, 4096)
-                data += chunk
-                if resp == 0: break
-            win32file.CloseHandle(handle)
-            res = json.loads(data.decode('utf-8'))
+            res = core_link.request(payload, timeout=10.0) or {}
             if res.get("status") == "success":
                 self.lbl_cfg_locked.configure(text="✅ Configuração Salva! Reiniciando agente...", text_color="#28a745")
                 self.lbl_cfg_locked.pack(pady=20)
                 self.restart_agent()
         except Exception as e:
             log_event(f"Falha ao enviar save_config: {e}", "ERROR")
-        finally:
-            try: win32file.CloseHandle(handle)
-            except: pass
 
     def refresh_tamper_ui(self):
         tamper_enabled = self.config_data.get("tamper_enabled", True)
@@ -417,10 +355,12 @@ class DocITDashboard(ctk.CTk):
         self.after(5000, self.update_status_loop)
 
     def _check_status_worker(self):
-        core_running = check_service_running("DocITAgent") or check_process_running("Doc-IT-Core.exe")
-        remote_running = check_process_running("Doc-IT-Remote.exe")
-        inv_running = check_process_running("Doc-IT-Inventory.exe")
-        updater_running = check_process_running("Doc-IT-Updater.exe")
+        # Uma consulta ao registro de PIDs por ciclo, compartilhada pelas quatro verificações
+        pids = get_agent_pids()
+        core_running = check_service_running("DocITAgent") or check_process_running("core", pids)
+        remote_running = check_process_running("remote", pids)
+        inv_running = check_process_running("inventory", pids)
+        updater_running = check_process_running("updater", pids)
         
         # Puxa a configuração fresquinha do Core se ele estiver rodando (correção v2.0.25)
         if core_running:
@@ -429,7 +369,7 @@ class DocITDashboard(ctk.CTk):
                 self.config_data = new_cfg
         
         # Define o diretório base dinamicamente para ler as versões
-        base_dir = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+        base_dir = GUI_BASE_DIR
         
         # Coleta a versão dos submódulos
         core_ver = get_file_version(os.path.join(base_dir, "Doc-IT-Core.exe")) or "Desconhecido"
@@ -437,17 +377,12 @@ class DocITDashboard(ctk.CTk):
         inv_ver = get_file_version(os.path.join(base_dir, "Doc-IT-Inventory.exe")) or "Desconhecido"
         updater_ver = get_file_version(os.path.join(base_dir, "Doc-IT-Updater.exe")) or "Desconhecido"
 
-        # Busca versão do osquery via binário local
-        try:
-            exe_osq = os.path.join(base_dir, "assets", "bin", "osqueryi.exe")
-            if os.path.exists(exe_osq):
-                output = subprocess.check_output([exe_osq, "--version"], text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-                parts = output.strip().split(" ")
-                osq_ver = parts[2] if len(parts) > 2 else parts[1]
-            else:
-                osq_ver = "Não Instalado"
-        except:
-            osq_ver = "Erro"
+        # Busca versão do osquery via binário local (só executa --version se o binário mudou)
+        exe_osq = os.path.join(base_dir, "assets", "bin", "osqueryi.exe")
+        if os.path.exists(exe_osq):
+            osq_ver = version_cache.get(exe_osq, resolver=versions.read_osquery_version) or "Erro"
+        else:
+            osq_ver = "Não Instalado"
 
         self.after(0, self._apply_status_ui, core_running, remote_running, inv_running, updater_running, core_ver, remote_ver, inv_ver, updater_ver, osq_ver)
 
@@ -470,25 +405,18 @@ class DocITDashboard(ctk.CTk):
                 "action": "restart_request",
                 "data": "user_ui_request"
             }
-            handle = win32file.CreateFile(CORE_IPC_PIPE, win32file.GENERIC_READ | win32file.GENERIC_WRITE, 0, None, win32file.OPEN_EXISTING, 0, None)
-            win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-            win32file.WriteFile(handle, json.dumps(payload).encode('utf-8'))
-            win32file.CloseHandle(handle)
+            if not core_link.send_event(payload):
+                raise ipc.IPCConnectionClosed("Core indisponível")
             self.lbl_tamper.configure(text="✅ Reiniciando em 5-10s...")
         except Exception as e:
             log_event(f"Falha ao enviar restart_request via IPC: {e}", "ERROR")
             self.lbl_tamper.configure(text="❌ Erro IPC na Reinicialização")
-        finally:
-            try: win32file.CloseHandle(handle)
-            except: pass
             
     def force_sync(self):
         if not self.is_unlocked: return
         log_event("Usuário local solicitou sincronização forçada via GUI.", "INFO")
         try:
-            for proc in psutil.process_iter(['name']):
-                if proc.info['name'] == 'Doc-IT-Inventory.exe':
-                    proc.kill()
+            pid_registry.kill_entries(get_agent_pids(), "inventory")
             self.lbl_tamper.configure(text="✅ Sincronização em Background")
         except:
             pass
@@ -497,6 +425,7 @@ class DocITDashboard(ctk.CTk):
 
 def on_quit_clicked(icon, item):
     icon.stop()
+    logger.flush()
     os._exit(0)
 
 def on_show_clicked(icon, item):
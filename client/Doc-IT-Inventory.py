@@ -15,12 +15,14 @@ try:
     import wmi
     import pythoncom
     import win32ts
-    import win32pipe
-    import win32file
-    import pywintypes
 except ImportError:
     pass
 
+import docit_common
+from docit_common.log_writer import AsyncLogWriter
+from docit_common import ipc
+from docit_common.osquery_pool import OsqueryPool, OsqueryShellProcess, OsqueryOneShotProcess
+
 # --- Configurações IPC ----
 CORE_IPC_PIPE = r'\\.\pipe\DocIT_Core_IPC'
 
@@ -30,21 +32,18 @@ BASE_DIR = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else
 LOG_FILE = os.path.join(BASE_DIR, "agent-inventory.log")
 AGENT_VERSION = "2.3.0"
 
+# Fila + thread escritora única com rotação (docit_common.log_writer)
+logger = AsyncLogWriter(LOG_FILE, "INVENTORY", echo=True)
+
 def log_event(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp} [{level.upper()}] [INVENTORY] - {message}\n"
-    try:
-        with open(LOG_FILE, "a", encoding='utf-8') as f:
-            f.write(log_entry)
-        print(log_entry.strip())
-    except:
-        pass
+    logger.log(message, level)
 
 def handle_exception(exc_type, exc_value, exc_traceback):
     log_event(f"CRASH: " + "".join(traceback.format_exception(exc_type, exc_value, exc_traceback)), "CRITICAL")
     sys.exit(1)
 
 sys.excepthook = handle_exception
+docit_common.set_log_handler(log_event)
 
 
 # =========================================================
@@ -276,6 +275,7 @@ class OsqueryClient:
     def __init__(self, bin_path=None):
         self.bin_path = bin_path or self._find_osquery()
         self.version = self.get_version() if self.bin_path else None
+        self._local_pool = None
 
     def _find_osquery(self):
         # Locais de busca: pasta bin real da instalação do agente
@@ -305,17 +305,38 @@ class OsqueryClient:
     def is_available(self):
         return self.bin_path is not None
 
+    def _run_local(self, query):
+        # Reserva (Core fora/ocupado): um osqueryi local reaproveitado pelas queries deste ciclo
+        if self._local_pool is None:
+            self._local_pool = OsqueryPool(lambda: OsqueryShellProcess(self.bin_path),
+                                           fallback_factory=lambda: OsqueryOneShotProcess(self.bin_path))
+        return self._local_pool.query(query)
+
     def run_query(self, query):
         if not self.is_available():
             return None
         try:
-            cmd = [self.bin_path, "--json", query]
-            output = subprocess.check_output(cmd, text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            return json.loads(output)
+            # Preferência: processos osquery já quentes do Core
+            try:
+                response = core_link.request({"action": "osquery_query", "sql": query}, timeout=35.0)
+            except ipc.IPCError:
+                response = None
+            if response and response.get("status") == "success":
+                return response.get("rows")
+            if response and response.get("status") == "error":
+                log_event(f"Osquery Query Error: {response.get('message')}", "WARNING")
+                return None
+            return self._run_local(query)
         except Exception as e:
             log_event(f"Osquery Query Error: {e}", "WARNING")
             return None
 
+    def close(self):
+        """Encerra o osqueryi local, se algum foi aberto (o módulo dorme uma hora entre ciclos)."""
+        if self._local_pool is not None:
+            self._local_pool.close()
+            self._local_pool = None
+
 def get_additional_inventory_data():
     """Compila todo o json de telemetria (Híbrido: Osquery + Legacy Fallback)"""
     log_event(f"Gerando JSON de inventário...", "INFO")
@@ -470,31 +491,23 @@ def get_additional_inventory_data():
     data["windows_updates"] = get_windows_updates()
     data["security"] = get_security_info()
     data["collection_timestamp"] = datetime.now().isoformat()
+    osq.close()
     return data
 
 
 # --- Comunicação com o Core (IPC) ---
+core_link = ipc.IPCClient(ipc.make_transport(CORE_IPC_PIPE), "inventory", connect_timeout=5.0)
+
 def push_inventory_to_core(payload):
-    """Abre Named Pipe para o Core e empurra o payload."""
-    try:
-        ipc_message = {
-            "action": "inventory_ready",
-            "data": payload
-        }
-        
-        handle = win32file.CreateFile(
-            CORE_IPC_PIPE,
-            win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-            0, None,
-            win32file.OPEN_EXISTING,
-            0, None
-        )
-        win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-        win32file.WriteFile(handle, json.dumps(ipc_message).encode('utf-8'))
-        win32file.CloseHandle(handle)
+    """Empurra o payload pela conexão IPC persistente com o Core."""
+    ipc_message = {
+        "action": "inventory_ready",
+        "data": payload
+    }
+    if core_link.send_event(ipc_message):
         log_event(f"Dados enviados com sucesso para o IPC do Core.", "INFO")
-    except Exception as e:
-         log_event(f"Falha ao empurrar dados de inventário pro Core IPC (Pipe {CORE_IPC_PIPE}). O Core está rodando? Erro: {e}", "ERROR")
+    else:
+        log_event(f"Falha ao empurrar dados de inventário pro Core IPC (Pipe {CORE_IPC_PIPE}). O Core está rodando?", "ERROR")
 
 
 # =========================================================
@@ -5,43 +5,40 @@ import time
 import socket
 import threading
 import subprocess
-import base64
-from datetime import datetime
 import traceback
-import win32pipe
-import win32file
-import win32security
-import win32con
-import pywintypes
-import ctypes, psutil
+import psutil
 
 # Bibliotecas pesadas focadas em Interface de Usuário
-import mss
 try:
     from PIL import Image
     import io
 except ImportError:
     pass
 
-try:
-    import pyautogui
-    pyautogui.FAILSAFE = False
-except ImportError:
-    pass
 
+import docit_common
+from docit_common.log_writer import AsyncLogWriter
+from docit_common import ipc
+from docit_common import frames
+from docit_common import flow_control
+from docit_common.change_detect import ChangeDetector
+from docit_common.pipeline import FramePipeline
+from docit_common.rate_control import AdaptiveQuality
+from docit_common import region_codec
+from docit_common import frame_ops
+from docit_common import capture
+from docit_common.injector import InputInjector, SendInputBackend, RecordingBackend
 
 # --- Configurações IPC ---
 CORE_IPC_PIPE = r'\\.\pipe\DocIT_Core_IPC'
-MY_IPC_PIPE = r'\\.\pipe\DocIT_Remote_IPC'
 
-def get_pipe_client_exe(pipe_handle):
+def get_ipc_peer_exe(stream):
     try:
-        pid = ctypes.c_ulong(0)
-        success = ctypes.windll.kernel32.GetNamedPipeClientProcessId(int(pipe_handle), ctypes.byref(pid))
-        if not success or pid.value == 0: return None
-        return psutil.Process(pid.value).exe()
+        pid = stream.peer_pid()
+        if not pid: return None
+        return psutil.Process(pid).exe()
     except Exception as e:
-        log_event(f"Falha ao rastrear PID do cliente IPC: {e}", "WARNING")
+        log_event(f"Falha ao rastrear PID do servidor IPC: {e}", "WARNING")
         return None
 
 LOG_FILE = "agent-remote.log"
@@ -49,21 +46,18 @@ AGENT_VERSION = "2.3.0"
 
 config = {}
 
+# Fila + thread escritora única com rotação (docit_common.log_writer)
+logger = AsyncLogWriter(LOG_FILE, "REMOTE", echo=True)
+
 def log_event(message, level="INFO"):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp} [{level.upper()}] [REMOTE] - {message}\n"
-    try:
-        with open(LOG_FILE, "a", encoding='utf-8') as f:
-            f.write(log_entry)
-        print(log_entry.strip())
-    except:
-        pass
+    logger.log(message, level)
 
 def handle_exception(exc_type, exc_value, exc_traceback):
     log_event(f"CRASH: " + "".join(traceback.format_exception(exc_type, exc_value, exc_traceback)), "CRITICAL")
     sys.exit(1)
 
 sys.excepthook = handle_exception
+docit_common.set_log_handler(log_event)
 
 
 # --- Variáveis de Estado de Sessão ---
@@ -73,6 +67,17 @@ current_stream_id = 0
 active_monitor_idx = 1
 cached_monitor_geometry = {"left": 0, "top": 0, "width": 1920, "height": 1080}
 osd_process = None
+active_pipeline = None  # Pipeline do stream atual (tempos por estágio em get_stream_stats)
+active_encoder = None   # Codificador por regiões do stream atual (keyframe sob demanda)
+BASE_DIR = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+
+# Créditos de frame empurrados pelo Core (último ack do visualizador, janela e RTO do stream atual)
+frame_credits = {"streamId": 0, "acked": 0, "window": flow_control.INITIAL_WINDOW, "rto": flow_control.MAX_RTO}
+frame_credit_event = threading.Event()
+
+# Aba do visualizador escondida (desktop:visibility): a captura pausa até ela voltar
+viewer_visible_event = threading.Event()
+viewer_visible_event.set()
 
 # --- OSD Subprocess Hijack ---
 # O OSD (On Screen Display) é instanciado chamando esse mesmo executável com flag --osd
@@ -99,49 +104,59 @@ if len(sys.argv) >= 3 and sys.argv[1] == "--osd":
         log_event(f"Erro ao instanciar Tkinter no Subprocesso OSD: {e}", "ERROR")
     sys.exit(0)
 
+# --- Modo Benchmark de Codecs ---
+# Doc-IT-Remote.exe --codec-benchmark [pasta] [capturas]: captura telas reais desta máquina (uma a cada
+# 2s) se a pasta estiver vazia, compara JPEG/WebP/PNG por classe de região e grava a política
+# recomendada em Doc-IT-codecs.json, que o streaming passa a usar.
+if len(sys.argv) >= 2 and sys.argv[1] == "--codec-benchmark":
+    corpus_dir = sys.argv[2] if len(sys.argv) >= 3 else os.path.join(BASE_DIR, "codec-corpus")
+    captures = int(sys.argv[3]) if len(sys.argv) >= 4 else 10
+    try:
+        os.makedirs(corpus_dir, exist_ok=True)
+        if not region_codec.corpus_paths(corpus_dir):
+            region_codec.capture_corpus(capture.MssCapture(), corpus_dir, captures, interval=2.0)
+        result = region_codec.run_benchmark(corpus_dir, os.path.join(BASE_DIR, region_codec.POLICY_FILE))
+        log_event(f"Benchmark de codecs ({result['blocks']} blocos de {result['images']} telas): "
+                  f"{json.dumps(result['results'])}", "INFO")
+        log_event(f"Política de codecs recomendada: {result['policy']}", "INFO")
+    except Exception as e:
+        log_event(f"Falha no benchmark de codecs: {e}", "ERROR")
+    logger.flush()
+    sys.exit(0)
+
 
 # =========================================================
 # FUNÇÕES DE STREAMING (Migradas).
 # =========================================================
 
-def push_to_core(action, data):
-    """Envia um payload de resposta de volta pro Core via TCP IPC"""
-    try:
-        payload = {
-            "action": action,
-            "data": data
-        }
-        
-        # Se for um frame, tenta esperar pouco. Se falhar, pula o frame (Frame Skipping)
-        try:
-             win32pipe.WaitNamedPipe(CORE_IPC_PIPE, 50)
-        except:
-             return False # Core ocupado, aborta push (pula frame)
-
-        handle = win32file.CreateFile(
-            CORE_IPC_PIPE,
-            win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-            0, None,
-            win32file.OPEN_EXISTING,
-            0, None
-        )
-        win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-        win32file.WriteFile(handle, json.dumps(payload).encode('utf-8'))
-        win32file.CloseHandle(handle)
+def push_to_core(action, data, blob=b""):
+    """Envia um payload de resposta de volta pro Core pela conexão IPC persistente"""
+    # Se o Core não estiver conectado, o envio falha na hora e o frame é pulado (Frame Skipping)
+    return core_link.send_event({
+        "action": action,
+        "data": data
+    }, blob)
+
+def has_frame_credit(stream_id, seq, last_send_time):
+    """True se há espaço na janela de créditos; sem acks por mais de um RTO, libera um frame de sondagem."""
+    credits = frame_credits
+    if credits.get("streamId") == stream_id:
+        acked, window = credits.get("acked", 0), credits.get("window", flow_control.INITIAL_WINDOW)
+    else:
+        acked, window = 0, flow_control.INITIAL_WINDOW
+    if seq - acked < window:
         return True
-    except Exception:
-        return False
-    finally:
-        try: win32file.CloseHandle(handle)
-        except: pass
+    return time.time() - last_send_time >= credits.get("rto", flow_control.MAX_RTO)
 
-def stream_screen(monitor_idx, quality_profile, stream_id):
-    """Laço infinito de captura de tela com Frame Skipping e Detecção de Tela Estática"""
-    global desktop_streaming
+def stream_screen(monitor_idx, quality_profile, stream_id, source=None):
+    """Streaming de tela em pipeline (captura -> conversão/escala -> JPEG -> envio) com Frame Skipping,
+    Detecção de Tela Estática e qualidade/escala/fps adaptativos dentro do perfil escolhido.
+    source: CaptureSource ainda fechada (padrão: a tela real via mss); é aberta nesta thread."""
+    global desktop_streaming, active_pipeline, active_encoder
     
-    # Perfis de qualidade otimizados para BANDA REAL (MJPEG sobre WebSocket + Base64)
-    # Base64 adiciona ~33% overhead, então JPEG quality precisa ser conservador
+    # Perfis de qualidade otimizados para BANDA REAL (MJPEG binário sobre WebSocket)
     # Alvo de banda: low ~1Mbps, medium ~3Mbps, high ~6Mbps, ultra ~10Mbps
+    # O perfil é o teto: o controle adaptativo reduz qualidade, escala e fps conforme RTT, banda e CPU
     profiles = {
         'low':    {'max_w': 854,  'max_h': 480,  'jpeg_q': 25, 'target_fps': 10},
         'medium': {'max_w': 1280, 'max_h': 720,  'jpeg_q': 35, 'target_fps': 15},
@@ -152,83 +167,186 @@ def stream_screen(monitor_idx, quality_profile, stream_id):
     p = profiles.get(quality_profile, profiles['medium'])
     max_w = p['max_w']
     max_h = p['max_h']
-    jpeg_quality = p['jpeg_q']
-    min_frame_interval = 1.0 / p['target_fps']  # Intervalo mínimo entre frames
+    rate = AdaptiveQuality(p['jpeg_q'], p['target_fps'])
     
-    last_frame_hash = None  # Para detecção de tela estática
-    static_count = 0        # Quantos frames consecutivos foram idênticos
-    last_send_time = 0      # Timestamp do último frame enviado
+    detector = ChangeDetector()  # Detecção de tela estática no buffer cru, antes de codificar
+    # Só as regiões que mudaram, cada uma no codec da sua classe (PNG paleta / WebP / JPEG);
+    # o diff por blocos roda na captura, sobre o BGRA cru, e o encode recebe só a grade suja
+    encoder = region_codec.RegionEncoder(region_codec.load_policy(os.path.join(BASE_DIR, region_codec.POLICY_FILE)))
+    # BGRX -> RGBX (e redução em fator inteiro) com NumPy direto do BGRA capturado, em arrays de
+    # um pool: o convert pega um, o encode devolve (release) depois de codificar
+    scaler = frame_ops.FrameScaler() if frame_ops.available() else None
+    header_size = frames.FRAME_HEADER.size
+    # Estado compartilhado entre a captura e o envio (threads diferentes do pipeline)
+    state = {
+        "static_count": 0,      # Quantos frames consecutivos foram idênticos
+        "last_capture": 0,      # Timestamp da última captura
+        "last_send_time": 0,    # Timestamp do último frame enviado
+        "seq": 0,               # Sequência dos frames enviados neste stream
+    }
+
+    def streaming():
+        return desktop_streaming and current_stream_id == stream_id
 
+    def capture():
+        # Visualizador com a aba escondida: não captura nada até ela voltar
+        if not viewer_visible_event.is_set():
+            viewer_visible_event.wait(0.5)
+            return None
+        
+        credits = frame_credits
+        if credits.get("streamId") == stream_id:
+            rate.on_credits(credits.get("acked", 0), credits.get("rtt"))
+        if rate.update():
+            log_event(f"Streaming adaptativo ({rate.last_reason}): {rate.state()}", "DEBUG")
+        
+        # Respeita o FPS alvo (atual): não captura mais rápido do que o necessário
+        frame_interval = rate.frame_interval
+        elapsed = time.time() - state["last_capture"]
+        if elapsed < frame_interval:
+            time.sleep(frame_interval - elapsed)
+        
+        # Janela cheia (contando os frames ainda no pipeline): não captura e espera um ack
+        frame_credit_event.clear()
+        if not has_frame_credit(stream_id, state["seq"] + pipeline.in_flight, state["last_send_time"]):
+            rate.on_stall()
+            frame_credit_event.wait(frame_interval)
+            return None
+        
+        state["last_capture"] = time.time()
+        started = time.perf_counter()
+        sct_img = source.grab(monitor)
+        
+        # Detecção de Tela Estática: compara o BGRA capturado com o último frame enviado
+        # Se a tela não mudou, não converte, não codifica e não envia (economia de CPU e banda)
+        if not detector.check(sct_img.raw, sct_img.width, sct_img.height):
+            state["static_count"] += 1
+            # Tela parada: reduz polling progressivamente (0.2s → 0.5s → 1s)
+            if state["static_count"] > 30:
+                time.sleep(1.0)
+            elif state["static_count"] > 10:
+                time.sleep(0.5)
+            else:
+                time.sleep(0.2)
+            return None
+        state["static_count"] = 0
+        # Referência avança já na captura; se o frame se perder adiante, on_drop força a próxima mudança
+        detector.commit()
+        # Blocos sujos contra a captura anterior (guardada por referência, sem cópia)
+        ticket = encoder.track(sct_img.raw, sct_img.width, sct_img.height)
+        pipeline.record("capture", time.perf_counter() - started)
+        return sct_img, ticket
+
+    def release(frame):
+        if scaler and not isinstance(frame, Image.Image):
+            scaler.release(frame)
+
+    def convert(captured):
+        sct_img, ticket = captured
+        started = time.perf_counter()
+        scale = rate.scale
+        target_w, target_h = int(max_w * scale), int(max_h * scale)
+        if scaler:
+            # Conversão BGRX -> RGBX (e média de área k x k) num array do pool, sem imagem PIL
+            factor = frame_ops.area_factor(sct_img.width, sct_img.height, target_w, target_h)
+            frame = scaler.downscale(sct_img.raw, sct_img.width, sct_img.height, factor)
+            height, width = frame.shape[:2]
+            if width > target_w or height > target_h:
+                # Sobra fracionária: o PIL termina sobre a imagem mapeada no array (thumbnail gera uma nova)
+                frame_img = region_codec.region_image(frame)
+                frame_img.thumbnail((target_w, target_h), Image.Resampling.BILINEAR)
+                release(frame)
+                frame = frame_img
+        else:
+            # Sem NumPy: sct_img.raw (sem cópia) com decoder BGRX para evitar problemas de padding (stride)
+            frame = Image.frombuffer("RGB", sct_img.size, sct_img.raw, "raw", "BGRX", 0, 1)
+            if frame.width > target_w or frame.height > target_h:
+                frame.thumbnail((target_w, target_h), Image.Resampling.BILINEAR)
+        rate.on_work("convert", time.perf_counter() - started)
+        return frame, ticket
+
+    def encode(converted):
+        frame, ticket = converted
+        started = time.perf_counter()
+        width, height = region_codec.frame_size(frame)
+        try:
+            keyframe, regions = encoder.encode(frame, rate.quality, ticket)
+        finally:
+            release(frame)
+        if not regions:
+            # Mudança que sumiu na escala: nada a enviar
+            return None
+        # Reserva o cabeçalho binário e grava as regiões logo depois, no mesmo buffer
+        buffer = io.BytesIO()
+        buffer.write(bytes(header_size))
+        frames.write_regions(buffer, regions, keyframe)
+        rate.on_work("encode", time.perf_counter() - started)
+        return buffer, width, height
+
+    def transmit(encoded):
+        buffer, width, height = encoded
+        frame_buffer = buffer.getbuffer()
+        state["seq"] += 1
+        frames.pack_header_into(frame_buffer, stream_id, state["seq"], width, height,
+                                version=frames.REGION_FRAME_VERSION)
+        
+        # Push de frame pro Orquestrador (Core) com FRAME SKIPPING: bytes crus no blob do IPC
+        success = push_to_core("desktop_frame", {}, frame_buffer)
+        state["last_send_time"] = time.time()
+        
+        # Se o pipe estava ocupado, descansa um pouco antes da próxima tentativa
+        if not success:
+            time.sleep(0.05)
+            return None
+        rate.on_sent(state["seq"], len(frame_buffer) - header_size)
+        return True
+
+    def on_drop(stage, item, reason):
+        # Frame velho substituído antes de codificar: o ticket do próximo cobre a grade deste,
+        # só devolve o array ao pool.
+        # Frame já codificado que não saiu (ou erro): os deltas seguintes ficariam sem base no
+        # visualizador, então a próxima captura conta como mudança e sai como keyframe.
+        if stage == "encode" and reason == "stale":
+            release(item[0])
+        if stage == "transmit" or reason == "error":
+            encoder.request_keyframe()
+            detector.reset()
+
+    pipeline = FramePipeline([("convert", convert), ("encode", encode), ("transmit", transmit)],
+                             on_drop=on_drop, name="desktop-stream")
+
+    source = source or capture.MssCapture()
     try:
-        with mss.mss() as sct:
-            if monitor_idx < 0 or monitor_idx >= len(sct.monitors): 
+        with source:
+            monitors = source.monitors()
+            if monitor_idx < 0 or monitor_idx >= len(monitors): 
                 monitor_idx = 1
                 
-            monitor = sct.monitors[monitor_idx]
+            monitor = monitors[monitor_idx]
             
             global cached_monitor_geometry
             cached_monitor_geometry = monitor
-            
-            while desktop_streaming and current_stream_id == stream_id:
-                try:
-                    # Respeita o FPS alvo: não captura mais rápido do que o necessário
-                    elapsed = time.time() - last_send_time
-                    if elapsed < min_frame_interval:
-                        time.sleep(min_frame_interval - elapsed)
-                    
-                    sct_img = sct.grab(monitor)
-                    # Usando sct_img.bgra com decoder BGRX para evitar problemas de padding (stride) nas resoluções do Windows
-                    img = Image.frombytes("RGB", sct_img.size, sct_img.bgra, "raw", "BGRX")
-                    
-                    if img.width > max_w or img.height > max_h:
-                        img.thumbnail((max_w, max_h), Image.Resampling.BILINEAR)
-                    
-                    buffer = io.BytesIO()
-                    img.save(buffer, format="JPEG", quality=jpeg_quality)
-                    frame_bytes = buffer.getvalue()
-                    
-                    # Detecção de Tela Estática: compara hash rápido do frame comprimido
-                    # Se a tela não mudou, não envia o frame (economia massiva de banda)
-                    import hashlib
-                    frame_hash = hashlib.md5(frame_bytes).digest()
-                    
-                    if frame_hash == last_frame_hash:
-                        static_count += 1
-                        # Tela parada: reduz polling progressivamente (0.2s → 0.5s → 1s)
-                        if static_count > 30:
-                            time.sleep(1.0)
-                        elif static_count > 10:
-                            time.sleep(0.5)
-                        else:
-                            time.sleep(0.2)
-                        continue
-                    
-                    # Tela mudou: reseta contador e envia
-                    last_frame_hash = frame_hash
-                    static_count = 0
-                    
-                    b64_img = base64.b64encode(frame_bytes).decode('utf-8')
-                    
-                    # Push de frame pro Orquestrador (Core) com FRAME SKIPPING
-                    success = push_to_core("desktop_frame", {
-                        "imageB64": b64_img,
-                        "width": img.width,
-                        "height": img.height
-                    })
-                    
-                    last_send_time = time.time()
-                    
-                    # Se o pipe estava ocupado, descansa um pouco antes da próxima tentativa
-                    if not success:
-                        time.sleep(0.05)
-                        continue
+            active_pipeline = pipeline
+            active_encoder = encoder
 
+            def guarded_capture():
+                try:
+                    return capture()
                 except Exception as e:
-                     log_event(f"Erro capturando tela: {e}", "ERROR")
-                     time.sleep(1) 
+                    log_event(f"Erro capturando tela: {e}", "ERROR")
+                    time.sleep(1)
+                    return None
+
+            pipeline.run(guarded_capture, streaming)
     except Exception as e:
          log_event(f"Falha gravíssima ao injetar Mss loop: {e}", "CRITICAL")
-         
+    
+    stats = pipeline.stats()
+    stats["adaptive"] = rate.state()
+    stats["codecs"] = encoder.state()
+    stats["scaler"] = scaler.stats() if scaler else None
+    log_event(f"Tempos do pipeline de streaming por estágio: {stats}", "INFO")
+    push_to_core("stream_stats", stats)
     log_event("Laço de Streaming Oculto (Thread) Encerrado.", "INFO")
 
 
@@ -250,6 +368,41 @@ def term_read_stdout():
 # LÓGICA DO SERVIDOR IPC (Aguardando Comandos do Core)
 # =========================================================
 
+INPUT_COMMANDS = ("mouse_move", "mouse_down", "mouse_up", "mouse_scroll", "key_down")
+
+def viewer_to_screen(data):
+    """Converte a posição no canvas do visualizador para coordenadas de tela do monitor em stream."""
+    mon = cached_monitor_geometry
+    target_x = mon["left"] + (data.get("x", 0) / (data.get("width") or mon["width"])) * mon["width"]
+    target_y = mon["top"] + (data.get("y", 0) / (data.get("height") or mon["height"])) * mon["height"]
+    return int(round(target_x)), int(round(target_y))
+
+def make_injection_backend():
+    if sys.platform == "win32":
+        return SendInputBackend()
+    log_event("Injeção de entrada nativa indisponível fora do Windows: usando backend de gravação.", "WARNING")
+    return RecordingBackend()
+
+def run_queued_command(cmd, data):
+    execute_ipc_command({"cmd": cmd, "data": data})
+
+# Injeção fora da thread leitora do IPC (créditos de frame não esperam o mouse): um SendInput
+# por tick com tudo o que chegou, em ordem. stop_desktop entra na mesma fila para não passar
+# na frente das entradas pendentes.
+input_injector = InputInjector(make_injection_backend(), viewer_to_screen, passthrough=run_queued_command,
+                               name="remote-injector")
+
+def handle_core_message(conn, payload, blob):
+    """Handler da conexão com o Core: os comandos chegam como eventos no canal persistente."""
+    cmd = payload.get("cmd")
+    if cmd in INPUT_COMMANDS:
+        if desktop_streaming:
+            input_injector.submit(cmd, payload.get("data") or {})
+    elif cmd == "stop_desktop":
+        input_injector.submit(cmd, payload.get("data") or {})
+    else:
+        execute_ipc_command(payload)
+
 def execute_ipc_command(payload):
     global terminal_process, desktop_streaming, current_stream_id, osd_process
     
@@ -292,10 +445,11 @@ def execute_ipc_command(payload):
         # Cacheia geometria do monitor ativo para uso nos handlers de mouse
         # Evita criar mss.mss() a cada evento de mouse (era ~20x/s, causava crash)
         try:
-            with mss.mss() as sct:
-                if monitor_idx < 0 or monitor_idx >= len(sct.monitors):
+            with capture.MssCapture() as source:
+                monitors = source.monitors()
+                if monitor_idx < 0 or monitor_idx >= len(monitors):
                     monitor_idx = 1
-                cached_monitor_geometry = sct.monitors[monitor_idx]
+                cached_monitor_geometry = monitors[monitor_idx]
         except:
             cached_monitor_geometry = {"left": 0, "top": 0, "width": 1920, "height": 1080}
         
@@ -321,13 +475,37 @@ def execute_ipc_command(payload):
             except: pass
 
         log_event(f"IPC: Iniciando Captura de Tela M:{monitor_idx}, Q:{quality}", "INFO")
+        viewer_visible_event.set()
         current_stream_id += 1
         desktop_streaming = True
         threading.Thread(target=stream_screen, args=(monitor_idx, quality, current_stream_id), daemon=True).start()
 
+    elif cmd == "desktop_visibility":
+        # Aba do visualizador escondida/visível: pausa/retoma a captura
+        if data.get("hidden"):
+            viewer_visible_event.clear()
+        else:
+            viewer_visible_event.set()
+            frame_credit_event.set()
+        log_event(f"IPC: Visualizador {'escondeu' if data.get('hidden') else 'voltou para'} a aba do Remote Desktop.", "DEBUG")
+
+    elif cmd == "desktop_keyframe":
+        # Visualizador perdeu a base dos deltas (frame fora de ordem/perdido, reconexão): tela inteira
+        if active_encoder:
+            active_encoder.request_keyframe()
+
+    elif cmd == "desktop_credit":
+        global frame_credits
+        frame_credits = data
+        frame_credit_event.set()
+
     elif cmd == "stop_desktop":
         log_event("IPC: Parando captura de tela", "INFO")
+        stats = input_injector.stats()
+        if stats["events"]:
+            push_to_core("input_stats", stats)
         desktop_streaming = False
+        viewer_visible_event.set()
         current_stream_id += 1
         try:
             if osd_process and osd_process.poll() is None:
@@ -335,153 +513,68 @@ def execute_ipc_command(payload):
                 osd_process = None
         except: pass
 
-    elif cmd == "mouse_move":
-         if not desktop_streaming: return
-         try:
-            mon = cached_monitor_geometry
-            target_x = mon["left"] + (data.get("x", 0) / data.get("width", mon["width"])) * mon["width"]
-            target_y = mon["top"] + (data.get("y", 0) / data.get("height", mon["height"])) * mon["height"]
-            pyautogui.moveTo(target_x, target_y)
-         except: pass
+    elif cmd == "get_input_stats":
+        push_to_core("input_stats", input_injector.stats())
 
-    elif cmd == "mouse_down":
-         if not desktop_streaming: return
-         try:
-            mon = cached_monitor_geometry
-            target_x = mon["left"] + (data.get("x", 0) / data.get("width", mon["width"])) * mon["width"]
-            target_y = mon["top"] + (data.get("y", 0) / data.get("height", mon["height"])) * mon["height"]
-            pyautogui.mouseDown(x=target_x, y=target_y, button=data.get("button", "left"))
-         except: pass
+    elif cmd == "get_stream_stats":
+        if active_pipeline:
+            push_to_core("stream_stats", active_pipeline.stats())
 
-    elif cmd == "mouse_up":
-         if not desktop_streaming: return
+    elif cmd == "get_monitors":
          try:
-            mon = cached_monitor_geometry
-            target_x = mon["left"] + (data.get("x", 0) / data.get("width", mon["width"])) * mon["width"]
-            target_y = mon["top"] + (data.get("y", 0) / data.get("height", mon["height"])) * mon["height"]
-            pyautogui.mouseUp(x=target_x, y=target_y, button=data.get("button", "left"))
+            with capture.MssCapture() as source:
+                monitors_info = [{"index": i, "name": "Todas as Telas" if i==0 else f"Monitor {i}", "width": m["width"], "height": m["height"]} for i, m in enumerate(source.monitors())]
+                push_to_core("monitor_list", {"monitors": monitors_info})
          except: pass
 
-    elif cmd == "mouse_scroll":
-         if not desktop_streaming: return
-         try:
-            # e.deltaY > 0 in browser means scroll down -> clicks positive.
-            # pyautogui requires negative value to scroll down.
-            scroll_amount = int(data.get("clicks", 0)) * -120
-            pyautogui.scroll(scroll_amount)
-         except: pass
 
-    elif cmd == "key_down":
-         if not desktop_streaming: return
-         try:
-            key_map = {'ArrowDown': 'down', 'ArrowUp': 'up', 'ArrowLeft': 'left', 'ArrowRight': 'right', 'Enter': 'enter', 'Escape': 'esc', 'Backspace': 'backspace', 'Tab': 'tab', 'Delete':'delete', ' ': 'space'}
-            raw_key = data.get("key", "")
-            py_key = key_map.get(raw_key, raw_key.lower())
-            pyautogui.press(py_key)
-         except: pass
+def authorize_core_server(stream):
+    """VALIDAÇÃO FÍSICA DO SERVIDOR (KERNEL PID VALIDATION): apenas o Core pode comandar o Remote."""
+    server_exe = get_ipc_peer_exe(stream)
+    if not server_exe:
+        log_event("BLOQUEIO IPC REMOTE: Servidor IPC sem PID rastreável.", "CRITICAL")
+        return False
 
-    elif cmd == "get_monitors":
-         try:
-            with mss.mss() as sct:
-                monitors_info = [{"index": i, "name": "Todas as Telas" if i==0 else f"Monitor {i}", "width": m["width"], "height": m["height"]} for i, m in enumerate(sct.monitors)]
-                push_to_core("monitor_list", {"monitors": monitors_info})
-         except: pass
+    expected_dir = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
+    server_exe_lower = server_exe.lower()
+    expected_dir_lower = expected_dir.lower()
+
+    allowed_modules = ["Doc-IT-Core.exe"] # Apenas o Core pode comandar o Remote
+    
+    # Se estiver em modo dev, permite python.exe
+    if not getattr(sys, 'frozen', False):
+         allowed_modules.append("python.exe")
 
+    if server_exe_lower.startswith(expected_dir_lower) or not getattr(sys, 'frozen', False):
+        for mod in allowed_modules:
+            if mod.lower() in server_exe_lower:
+                return True
 
-def get_pipe_acl():
-    sd = win32security.SECURITY_DESCRIPTOR()
-    dacl = win32security.ACL()
-    sid_system = win32security.ConvertStringSidToSid("S-1-5-18")
-    sid_admins = win32security.ConvertStringSidToSid("S-1-5-32-544")
-    dacl.AddAccessAllowedAce(win32security.ACL_REVISION, win32con.GENERIC_ALL, sid_system)
-    dacl.AddAccessAllowedAce(win32security.ACL_REVISION, win32con.GENERIC_ALL, sid_admins)
-    sd.SetSecurityDescriptorDacl(1, dacl, 0)
-    sa = win32security.SECURITY_ATTRIBUTES()
-    sa.SECURITY_DESCRIPTOR = sd
-    return sa
+    log_event(f"TENTATIVA DE INVASÃO IPC REMOTE: Processo não autorizado '{server_exe}' se passou pelo servidor do Core.", "CRITICAL")
+    return False
+
+core_link = ipc.IPCClient(
+    ipc.make_transport(CORE_IPC_PIPE),
+    "remote",
+    handler=handle_core_message,
+    authorize=authorize_core_server
+)
 
 def ipc_listener_loop():
-    sa = get_pipe_acl()
-    
+    """Mantém a conexão com o Core viva; os comandos chegam pelo thread leitor da conexão."""
     while True:
-        try:
-            pipe = win32pipe.CreateNamedPipe(
-                MY_IPC_PIPE,
-                win32pipe.PIPE_ACCESS_DUPLEX,
-                win32pipe.PIPE_TYPE_MESSAGE | win32pipe.PIPE_READMODE_MESSAGE | win32pipe.PIPE_WAIT,
-                255, 65536, 65536,
-                0,
-                sa
-            )
-            try:
-                win32pipe.ConnectNamedPipe(pipe, None)
-                threading.Thread(target=handle_remote_ipc_client, args=(pipe,), daemon=True).start()
-            except pywintypes.error as e:
-                if e.winerror == 535: # ERROR_PIPE_CONNECTED
-                    threading.Thread(target=handle_remote_ipc_client, args=(pipe,), daemon=True).start()
-                elif e.winerror == 232: # ERROR_NO_DATA (Client disconnected before we could accept)
-                    win32file.CloseHandle(pipe)
-                else:
-                    log_event(f"Erro Conectando ao IPC (Remote Pipe): {e}", "ERROR")
-                    try: win32file.CloseHandle(pipe)
-                    except: pass
-                    time.sleep(1)
-        except Exception as e:
-            log_event(f"Erro Criando Servidor IPC (Remote Pipe): {e}", "ERROR")
-            try: win32file.CloseHandle(pipe)
-            except: pass
+        if core_link.connect() is None:
             time.sleep(1)
-
-def handle_remote_ipc_client(pipe):
-    try:
-        # Leitura do comando do Core
-        data = b""
-        while True:
-            resp, chunk = win32file.ReadFile(pipe, 4096)
-            data += chunk
-            if resp == 0: break
-        
-        payload = json.loads(data.decode('utf-8'))
-        
-        # VALIDAÇÃO FÍSICA DO CLIENTE (KERNEL PID VALIDATION)
-        client_exe = get_pipe_client_exe(pipe)
-        if not client_exe:
-            log_event("BLOQUEIO IPC REMOTE: Tentativa de conexão sem PID rastreável.", "CRITICAL")
-            return
-
-        expected_dir = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
-        client_exe_lower = client_exe.lower()
-        expected_dir_lower = expected_dir.lower()
-
-        is_authorized = False
-        allowed_modules = ["Doc-IT-Core.exe"] # Apenas o Core pode comandar o Remote
-        
-        # Se estiver em modo dev, permite python.exe
-        if not getattr(sys, 'frozen', False):
-             allowed_modules.append("python.exe")
-
-        if client_exe_lower.startswith(expected_dir_lower) or not getattr(sys, 'frozen', False):
-            for mod in allowed_modules:
-                if mod.lower() in client_exe_lower:
-                    is_authorized = True
-                    break
-        
-        if is_authorized:
-            execute_ipc_command(payload)
-        else:
-            log_event(f"TENTATIVA DE INVASÃO IPC REMOTE: Processo não autorizado '{client_exe}' tentou comandar o Remote.", "CRITICAL")
-            
-    except Exception as e:
-        log_event(f"Erro processando cliente IPC no Remote: {e}", "ERROR")
-    finally:
-        try: win32file.CloseHandle(pipe)
-        except: pass
+            continue
+        log_event("Canal IPC com o Core estabelecido.", "INFO")
+        core_link.wait_closed()
+        log_event("Canal IPC com o Core encerrado. Reconectando...", "WARNING")
 
 # =========================================================
 # MAIN ENTRYPOINT
 # =========================================================
 if __name__ == "__main__":
     log_event("==== DOC-IT REMOTE MODULE INITIALIZED ====", "INFO")
-    # Este módulo fica eternamente travado no loop de escuta de Socket 
+    # Este módulo fica eternamente travado no loop da conexão IPC com o Core
     # Ate o Core matar o processo ou a máquina desligar.
     ipc_listener_loop()
@@ -4,13 +4,9 @@ import json
 import time
 import re
 import socket
-import datetime
 import traceback
 import hashlib
-import subprocess
-import psutil
 
-import requests
 import urllib3
 import base64
 from cryptography.hazmat.primitives import hashes
@@ -20,9 +16,14 @@ from cryptography.hazmat.primitives import serialization
 # urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning) # Removido por segurança v2.1.2
 
 
-import win32pipe
-import win32file
-import pywintypes
+import docit_common
+from docit_common.log_writer import AsyncLogWriter
+from docit_common import ipc
+from docit_common.http_session import get_session
+from docit_common import versions
+from docit_common.endpoints import EndpointSelector
+from docit_common.circuit import CircuitRegistry
+from docit_common import pid_registry
 
 # --- Configurações IPC ---
 CORE_IPC_PIPE = r'\\.\pipe\DocIT_Core_IPC'
@@ -34,82 +35,49 @@ AGENT_VERSION = "2.3.0"
 config = {}
 
 
+# Fila + thread escritora única com rotação (docit_common.log_writer)
+logger = AsyncLogWriter(LOG_FILE, "UPDATER", echo=True)
+
 def log_event(message, level="INFO"):
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_entry = f"{timestamp} [{level.upper()}] [UPDATER] - {message}\n"
-    try:
-        with open(LOG_FILE, "a", encoding='utf-8') as f:
-            f.write(log_entry)
-        print(log_entry.strip())
-    except:
-        pass
+    logger.log(message, level)
 
 def handle_exception(exc_type, exc_value, exc_traceback):
     log_event(f"CRASH: " + "".join(traceback.format_exception(exc_type, exc_value, exc_traceback)), "CRITICAL")
     sys.exit(1)
 
 sys.excepthook = handle_exception
+docit_common.set_log_handler(log_event)
+
+core_link = ipc.IPCClient(ipc.make_transport(CORE_IPC_PIPE), "updater", connect_timeout=5.0)
 
 def request_config_from_core():
-    """Solicita a configuração ativa ao processo Core via Named Pipe."""
+    """Solicita a configuração ativa ao processo Core pela conexão IPC persistente."""
     try:
-        payload = {
-            "action": "get_config"
-        }
-        
-        handle = win32file.CreateFile(
-            CORE_IPC_PIPE,
-            win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-            0, None,
-            win32file.OPEN_EXISTING,
-            0, None
-        )
-        win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-        win32file.WriteFile(handle, json.dumps(payload).encode('utf-8'))
-        
-        data = b""
-        while True:
-            resp, chunk = win32file.ReadFile(handle, 4096)
-            data += chunk
-            if resp == 0: break
-            
-        win32file.CloseHandle(handle)
-        response = json.loads(data.decode('utf-8'))
-        if response.get("status") == "success":
+        response = core_link.request({"action": "get_config"}, timeout=10.0)
+        if response and response.get("status") == "success":
             return response.get("config", {})
     except Exception as e:
         log_event(f"Falha ao carregar config via IPC (Core offline?): {e}", "WARNING")
-    finally:
-        try: win32file.CloseHandle(handle)
-        except: pass
     return {}
 
-import ctypes
-
-def get_file_version(path):
-    """Lê a versão (ProductVersion) diretamente dos metadados do executável via API do Windows."""
-    if not os.path.exists(path):
-        return None
+def get_agent_pids():
+    """Registro de PIDs mantido pelo Core (via IPC), com o arquivo espelho como reserva se o Core não responder."""
     try:
-        size = ctypes.windll.version.GetFileVersionInfoSizeW(path, None)
-        if not size: return None
-        buffer = ctypes.create_string_buffer(size)
-        ctypes.windll.version.GetFileVersionInfoW(path, None, size, buffer)
-        length = ctypes.c_uint()
-        ptr = ctypes.c_void_p()
-        # Tenta obter a informação de tradução (idioma/codepage)
-        ctypes.windll.version.VerQueryValueW(buffer, '\\VarFileInfo\\Translation', ctypes.byref(ptr), ctypes.byref(length))
-        if length.value >= 4:
-            data = ctypes.string_at(ptr, 4)
-            lang = data[1] << 8 | data[0]
-            cp = data[3] << 8 | data[2]
-            key = f'\\StringFileInfo\\{lang:04x}{cp:04x}\\ProductVersion'
-            ctypes.windll.version.VerQueryValueW(buffer, key, ctypes.byref(ptr), ctypes.byref(length))
-            if length.value > 0:
-                return ctypes.wstring_at(ptr, length.value).strip('\x00')
+        response = core_link.request({"action": "get_pids"}, timeout=5.0)
+        if response and response.get("status") == "success":
+            return response.get("pids", {})
     except Exception as e:
-        log_event(f"Erro ao extrair versão de {path}: {e}", "WARNING")
-    return None
+        log_event(f"Registro de PIDs indisponível via IPC, usando arquivo espelho: {e}", "DEBUG")
+    return pid_registry.load_state(os.path.join(get_install_dir(), pid_registry.STATE_FILE))
+
+# Cache de versões compartilhado com Core/GUI (sidecar ao lado dos .exe)
+version_cache = versions.VersionCache(os.path.join(
+    os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__)),
+    versions.SIDECAR_NAME))
+
+def get_file_version(path):
+    """Lê a versão (ProductVersion) do executável, reaproveitando o cache enquanto o arquivo não mudar."""
+    return version_cache.get(path)
 
 def read_local_module_version(mod_key):
     """Lê a versão do módulo diretamente do .exe no diretório atual."""
@@ -162,12 +130,7 @@ def check_and_update_osquery(working_url, remote_version):
     
     local_version = "None"
     if os.path.exists(target_path):
-        try:
-            output = subprocess.check_output([target_path, "--version"], text=True, creationflags=subprocess.CREATE_NO_WINDOW)
-            parts = output.strip().split(" ")
-            local_version = parts[2] if len(parts) > 2 else parts[1]
-        except:
-            local_version = "Corrupt"
+        local_version = version_cache.get(target_path, resolver=versions.read_osquery_version) or "Corrupt"
 
     if remote_version == "latest":
         if local_version not in ["None", "Corrupt"]:
@@ -178,6 +141,7 @@ def check_and_update_osquery(working_url, remote_version):
 
     log_event(f"Atualizando Osquery: {local_version} -> {remote_version}", "WARNING")
     
+    r = None
     try:
         download_url = f"{working_url}/agent/osquery/{remote_version}"
         
@@ -186,13 +150,7 @@ def check_and_update_osquery(working_url, remote_version):
         key_path = config.get("key_path", os.path.join(install_dir, "certs", "agent.key"))
         ca_path = config.get("ca_path", os.path.join(install_dir, "certs", "ca.crt"))
         
-        verify_ssl = ca_path if (ca_path and os.path.exists(ca_path)) else True
-
-        certs = None
-        if cert_path and key_path and os.path.exists(cert_path) and os.path.exists(key_path):
-            certs = (cert_path, key_path)
-
-        r = requests.get(download_url, cert=certs, verify=verify_ssl, stream=True, timeout=60)
+        r = get_session(cert_path, key_path, ca_path).get(download_url, stream=True, timeout=60)
         
         if r.status_code == 200:
             expected_hash = r.headers.get('X-Osquery-Hash')
@@ -215,10 +173,7 @@ def check_and_update_osquery(working_url, remote_version):
                     os.remove(target_path)
                 except:
                     log_event("Detectado binário em uso. Tentando encerrar processos osqueryi...", "WARNING")
-                    for proc in psutil.process_iter(['name']):
-                        if proc.info['name'] == 'osqueryi.exe':
-                            try: proc.kill()
-                            except: pass
+                    pid_registry.kill_entries(get_agent_pids(), "osqueryi")
                     time.sleep(2)
                     try: os.remove(target_path)
                     except: 
@@ -231,9 +186,14 @@ def check_and_update_osquery(working_url, remote_version):
             return True
         else:
             log_event(f"Falha ao baixar Osquery: status {r.status_code}. Verifique se a versão está sincronizada no servidor.", "ERROR")
+            endpoint_selector.record_error(working_url, r)
             return False
     except Exception as e:
         log_event(f"Erro Crítico na atualização do Osquery: {e}", "ERROR")
+        # Sem resposta (conexão, timeout) ou erro do requests no meio do download: conta para o circuito.
+        # Falha de disco local não diz nada sobre o servidor.
+        if r is None or hasattr(e, "request"):
+            endpoint_selector.record_error(working_url, e)
         if os.path.exists(temp_path): os.remove(temp_path)
         return False
 
@@ -243,28 +203,13 @@ def check_and_update_osquery(working_url, remote_version):
 # =========================================================
 
 def push_restart_to_core():
-    """Avisa o Core via Named Pipe que atualizações foram baixadas e requerem Restart Geral"""
-    try:
-        ipc_message = {
-            "action": "restart_request", 
-            "data": "update_applied",
-        }
-        
-        handle = win32file.CreateFile(
-            CORE_IPC_PIPE,
-            win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-            0, None,
-            win32file.OPEN_EXISTING,
-            0, None
-        )
-        win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-        win32file.WriteFile(handle, json.dumps(ipc_message).encode('utf-8'))
-        win32file.CloseHandle(handle)
-    except Exception as e:
-        log_event(f"Erro ao pedir restart ao Core via Pipe {CORE_IPC_PIPE}: {e}", "CRITICAL")
-    finally:
-        try: win32file.CloseHandle(handle)
-        except: pass
+    """Avisa o Core pelo canal IPC que atualizações foram baixadas e requerem Restart Geral"""
+    ipc_message = {
+        "action": "restart_request", 
+        "data": "update_applied",
+    }
+    if not core_link.send_event(ipc_message):
+        log_event(f"Erro ao pedir restart ao Core via Pipe {CORE_IPC_PIPE}: Core indisponível.", "CRITICAL")
 
 def verify_manifest_signature(manifest, public_key_path):
     """Verifica a assinatura digital RSA do manifesto version.json."""
@@ -321,6 +266,16 @@ def cleanup_old_files():
         pass
 
 
+def probe_endpoint(url, timeout):
+    """Sondagem leve de saúde usada pela corrida entre servidores."""
+    session = get_session(config.get("cert_path", "./certs/agent.crt"), config.get("key_path", "./certs/agent.key"), config.get("ca_path", "./certs/ca.crt"))
+    return session.get(f"{url}/VerifyHealth", timeout=timeout).status_code < 500
+
+# Placar + circuit breaker por URL: o ciclo seguinte começa pelo servidor que respondeu melhor
+# e pula os que estão em backoff
+endpoint_selector = EndpointSelector(probe_endpoint, breakers=CircuitRegistry())
+
+
 def check_and_apply_updates():
     """Varre o Manifesto da API buscando desvios de Hash/Versão em cada módulo. Itera por server_urls."""
     log_event("Checando manifesto de versões modular...", "INFO")
@@ -329,21 +284,23 @@ def check_and_apply_updates():
     key_path = config.get("key_path", "./certs/agent.key")
     ca_path = config.get("ca_path", "./certs/ca.crt")
     
-    server_urls = config.get("server_urls", [config.get('server_base_url', 'https://localhost:3000')])
+    server_urls = endpoint_selector.ordered(config.get("server_urls", [config.get('server_base_url', 'https://localhost:3000')]))
     response = None
     working_url = None
     
     for url in server_urls:
         try:
             version_url = f"{url}/agent/version"
-            verify_ssl = ca_path if (ca_path and os.path.exists(ca_path)) else True
-            response = requests.get(version_url, cert=(cert_path, key_path), verify=verify_ssl, timeout=10)
+            response = get_session(cert_path, key_path, ca_path).get(version_url, timeout=10)
             
             if response.status_code == 200:
+                endpoint_selector.record_success(url, response.elapsed.total_seconds())
                 working_url = url
                 break
+            endpoint_selector.record_error(url, response)
         except Exception as e:
             log_event(f"Tentativa de check em {url} falhou: {e}", "WARNING")
+            endpoint_selector.record_error(url, e)
             continue
     
     if not response or response.status_code != 200:
@@ -398,13 +355,13 @@ def download_module_safe(mod_key, target_file, expected_hash, base_url=None):
     temp_save = f"{target_file}.tmp"
     old_save = f"{target_file}.old"
     
+    r = None
     try:
         cert_path = config.get("cert_path", "./certs/agent.crt")
         key_path = config.get("key_path", "./certs/agent.key")
         ca_path = config.get("ca_path", "./certs/ca.crt")
         
-        verify_ssl = ca_path if (ca_path and os.path.exists(ca_path)) else True
-        r = requests.get(file_url, cert=(cert_path, key_path), verify=verify_ssl, stream=True, timeout=30)
+        r = get_session(cert_path, key_path, ca_path).get(file_url, stream=True, timeout=30)
         
         if r.status_code == 200:
             sha256 = hashlib.sha256()
@@ -423,10 +380,7 @@ def download_module_safe(mod_key, target_file, expected_hash, base_url=None):
             # 0. Garante que o processo não esteja travando o arquivo (especial para GUI)
             if mod_key == "gui":
                 log_event("Solicitando encerramento da GUI para atualização...", "INFO")
-                for proc in psutil.process_iter(['name']):
-                    if proc.info['name'] == target_file:
-                        try: proc.kill()
-                        except: pass
+                pid_registry.kill_entries(get_agent_pids(), "gui")
                 time.sleep(1)
 
             # 1. Deleta o .old anterior se existir
@@ -466,9 +420,12 @@ def download_module_safe(mod_key, target_file, expected_hash, base_url=None):
                 
         else:
              log_event(f"Falha HTTP ao baixar {target_file}: {r.status_code}", "ERROR")
+             endpoint_selector.record_error(base_url, r)
              return False
     except Exception as e:
         log_event(f"Erro durante download de componente: {e}", "ERROR")
+        if r is None or hasattr(e, "request"):  # Mesma regra do download do Osquery
+            endpoint_selector.record_error(base_url, e)
         # Limpa arquivo temporário se existir
         if os.path.exists(temp_save):
             try: os.remove(temp_save)
@@ -499,7 +456,7 @@ if __name__ == "__main__":
             polling_interval = 60
 
         try:
-            server_urls = config.get("server_urls", [config.get('server_base_url')])
+            server_urls = endpoint_selector.ordered(config.get("server_urls", [config.get('server_base_url')]))
             cert_path = config.get("cert_path", "./certs/agent.crt")
             key_path = config.get("key_path", "./certs/agent.key")
             ca_path = config.get("ca_path", "./certs/ca.crt")
@@ -507,10 +464,10 @@ if __name__ == "__main__":
             for url in server_urls:
                 try:
                     settings_url = f"{url}/settings/agent"
-                    verify_ssl = ca_path if (ca_path and os.path.exists(ca_path)) else True
-                    r = requests.get(settings_url, cert=(cert_path, key_path), verify=verify_ssl, timeout=10)
+                    r = get_session(cert_path, key_path, ca_path).get(settings_url, timeout=10)
                         
                     if r.status_code == 200:
+                        endpoint_selector.record_success(url, r.elapsed.total_seconds())
                         settings_data = r.json()
                         if "updateCheckIntervalMinutes" in settings_data:
                             polling_interval = int(settings_data["updateCheckIntervalMinutes"])
@@ -519,7 +476,9 @@ if __name__ == "__main__":
                         if remote_osq_ver:
                             check_and_update_osquery(url, remote_osq_ver)
                         break
-                except:
+                    endpoint_selector.record_error(url, r)
+                except Exception as e:
+                    endpoint_selector.record_error(url, e)
                     continue
         except:
             pass
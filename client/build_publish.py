@@ -49,6 +49,22 @@ def calculate_sha256(filepath):
             sha256_hash.update(byte_block)
     return sha256_hash.hexdigest()
 
+SHARED_PACKAGE_DIR = "docit_common"
+
+def calculate_sources_hash(src):
+    """Hash do script do módulo + pacote compartilhado (embutido pelo PyInstaller em todos os .exe)."""
+    sha256_hash = hashlib.sha256()
+    sha256_hash.update((calculate_sha256(src) or "").encode())
+    if os.path.isdir(SHARED_PACKAGE_DIR):
+        for root, dirs, files in os.walk(SHARED_PACKAGE_DIR):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(files):
+                if name.endswith(".py"):
+                    path = os.path.join(root, name)
+                    sha256_hash.update(path.replace(os.sep, "/").encode())
+                    sha256_hash.update((calculate_sha256(path) or "").encode())
+    return sha256_hash.hexdigest()
+
 def load_build_cache():
     if os.path.exists(BUILD_CACHE_FILE):
         try:
@@ -158,7 +174,7 @@ def process_modules():
     for mod_key, mod_info in MODULES.items():
         src = mod_info["src"]
         
-        current_src_hash = calculate_sha256(src)
+        current_src_hash = calculate_sources_hash(src)
         cached_src_hash = cache.get(mod_key, {}).get("src_hash")
         dist_exe_path = os.path.join("dist", src.replace(".py", ".exe"))
         
@@ -211,7 +227,7 @@ def process_modules():
                 os.remove("version_info.txt")
             
             # Atualiza Cache
-            cache[mod_key] = {"src_hash": calculate_sha256(src)}
+            cache[mod_key] = {"src_hash": calculate_sources_hash(src)}
             modules_to_update[mod_key] = new_version
         else:
             print(f"[{mod_key.upper()}] Nenhuma alteração. Reutilizando build anterior (v{current_version}).")
@@ -0,0 +1,24 @@
+"""
+Biblioteca compartilhada entre os módulos do Agente Doc-IT (Core, Remote, Inventory, Updater e GUI).
+
+Os scripts Doc-IT-*.py importam este pacote diretamente; o PyInstaller segue os imports e
+embute o pacote em cada .exe, então não há nada extra para distribuir no instalador.
+Nada aqui pode depender de pywin32 em tempo de import: os componentes precisam carregar
+no Linux para testes de carga e bancada.
+"""
+
+_log_handler = None
+
+
+def set_log_handler(handler):
+    """Registra o log_event do módulo hospedeiro para as mensagens internas da biblioteca."""
+    global _log_handler
+    _log_handler = handler
+
+
+def log_event(message, level="INFO"):
+    if _log_handler:
+        try:
+            _log_handler(message, level)
+        except Exception:
+            pass
@@ -0,0 +1,171 @@
+"""
+Fontes de captura de tela do Remote Desktop.
+
+O streaming pede cada frame a uma CaptureSource em vez de chamar o mss direto:
+  - MssCapture: a tela real (mss, BGRA do GDI no Windows);
+  - SyntheticCapture: telas de escritório artificiais e determinísticas (fundo liso, janelas com
+    linhas de "texto", cursor piscando, relógio, área de vídeo opcional), para rodar o pipeline,
+    o diff por blocos e o benchmark de codecs no Linux, sem tela.
+
+Contrato de grab(monitor): devolve um Frame com `raw` (BGRA, 4 bytes por pixel, sem padding entre
+linhas), `width` e `height`. Cada chamada devolve um buffer novo, como o mss: o frame anterior
+continua intacto e pode ser guardado como referência do diff sem cópia.
+monitors() segue a convenção do mss: índice 0 é a área de todos os monitores, 1 em diante cada um.
+A fonte é aberta e usada na mesma thread (o mss exige isso no Windows).
+"""
+import random
+
+try:
+    import mss
+except ImportError:
+    mss = None
+
+
+class Frame:
+    """Um frame capturado: buffer BGRA e dimensões."""
+
+    __slots__ = ("raw", "width", "height")
+
+    def __init__(self, raw, width, height):
+        self.raw = raw
+        self.width = width
+        self.height = height
+
+    @property
+    def size(self):
+        return self.width, self.height
+
+
+class CaptureSource:
+    """Interface de uma fonte de captura; use com `with` (open/close)."""
+
+    def open(self):
+        return self
+
+    def monitors(self):
+        raise NotImplementedError
+
+    def grab(self, monitor):
+        """monitor: um dict de monitors() (left, top, width, height). Devolve um Frame."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class MssCapture(CaptureSource):
+
+    def __init__(self):
+        self._sct = None
+
+    def open(self):
+        if mss is None:
+            raise RuntimeError("mss não instalado.")
+        self._sct = mss.mss()
+        return self
+
+    def monitors(self):
+        return self._sct.monitors
+
+    def grab(self, monitor):
+        shot = self._sct.grab(monitor)
+        return Frame(shot.raw, shot.width, shot.height)
+
+    def close(self):
+        if self._sct is not None:
+            self._sct.close()
+            self._sct = None
+
+
+class SyntheticCapture(CaptureSource):
+    """
+    Tela artificial. A cada frame o cursor pisca; a cada `clock_every` frames o relógio muda;
+    `video` (x, y, largura, altura) é uma área de ruído que muda a cada frame. static=True congela
+    tudo (tela parada). Mesma semente, mesma sequência de frames.
+    """
+
+    BACKGROUND = (0x6b, 0x4a, 0x1e, 0xff)  # BGRA: azul do papel de parede
+    WINDOW = (0xf0, 0xf0, 0xf0, 0xff)
+    TITLE = (0x99, 0x5c, 0x00, 0xff)
+    TEXT = (0x20, 0x20, 0x20, 0xff)
+
+    def __init__(self, width=1280, height=720, clock_every=10, video=None, static=False, seed=0):
+        self.width = width
+        self.height = height
+        self.clock_every = max(1, clock_every)
+        self.video = video
+        self.static = static
+        self.seed = seed
+        self.frames = 0
+        self._base = None
+
+    def open(self):
+        self._base = self._desktop()
+        return self
+
+    def monitors(self):
+        area = {"left": 0, "top": 0, "width": self.width, "height": self.height}
+        return [dict(area), dict(area)]
+
+    def _fill(self, buf, x, y, w, h, color):
+        x, y = max(0, x), max(0, y)
+        w, h = min(w, self.width - x), min(h, self.height - y)
+        if w <= 0 or h <= 0:
+            return
+        row = bytes(color) * w
+        stride = self.width * 4
+        for line in range(y, y + h):
+            start = line * stride + x * 4
+            buf[start:start + w * 4] = row
+
+    def _desktop(self):
+        buf = bytearray(bytes(self.BACKGROUND) * (self.width * self.height))
+        rng = random.Random(self.seed)
+        for index in range(3):
+            w, h = self.width // 3, self.height // 2
+            x = 40 + index * (self.width // 4)
+            y = 30 + index * (self.height // 8)
+            self._fill(buf, x, y, w, h, self.WINDOW)
+            self._fill(buf, x, y, w, 24, self.TITLE)
+            # Linhas de "texto": traços de largura variável, como palavras
+            for line_y in range(y + 40, y + h - 12, 18):
+                cursor_x = x + 12
+                while cursor_x < x + w - 60:
+                    word = rng.randint(12, 48)
+                    self._fill(buf, cursor_x, line_y, word, 8, self.TEXT)
+                    cursor_x += word + 8
+        return buf
+
+    def grab(self, monitor):
+        if self._base is None:
+            self.open()
+        tick = 0 if self.static else self.frames
+        self.frames += 1
+        raw = bytearray(self._base)
+        # Cursor de texto piscando na primeira janela
+        if tick % 2:
+            self._fill(raw, 46, 80, 2, 16, self.TEXT)
+        # Relógio da barra de tarefas: muda a cada clock_every frames
+        minute = tick // self.clock_every
+        for digit in range(4):
+            shade = (minute * 7 + digit * 31) % 200 + 40
+            self._fill(raw, self.width - 90 + digit * 18, self.height - 28, 14, 20, (shade, shade, shade, 0xff))
+        if self.video:
+            x, y, w, h = self.video
+            w, h = min(w, self.width - x), min(h, self.height - y)
+            noise = random.Random(self.seed * 1000003 + tick)
+            stride = self.width * 4
+            for line in range(y, y + h):
+                start = line * stride + x * 4
+                raw[start:start + w * 4] = noise.randbytes(w * 4)
+        return Frame(raw, self.width, self.height)
+
+    def close(self):
+        self._base = None
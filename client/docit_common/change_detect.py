@@ -0,0 +1,69 @@
+"""
+Detecção de tela estática sobre o buffer cru da captura (BGRA do mss), antes de qualquer codificação.
+
+O Remote só descobria que a tela não mudou depois de pagar Image.frombytes, o redimensionamento
+e o JPEG inteiro (o MD5 era do JPEG). Aqui a decisão sai do buffer capturado:
+  1. hash rápido (CRC32) de uma amostra de linhas espaçadas de `row_step` em `row_step`;
+     hash diferente do último frame enviado -> mudou, sem olhar o resto;
+  2. hash igual -> comparação completa com o último frame enviado (memcmp), que pega mudanças
+     fora das linhas amostradas (cursor piscando, relógio).
+A referência só avança em commit(): se o envio falhar, o próximo frame é comparado com o
+último que chegou de fato ao Core e a mudança não se perde.
+"""
+import zlib
+
+ROW_STEP = 8
+
+
+class ChangeDetector:
+
+    def __init__(self, row_step=ROW_STEP):
+        self.row_step = max(1, row_step)
+        self.frames = 0
+        self.unchanged = 0
+        self.full_compares = 0
+        self._reference = None
+        self._reference_digest = None
+        self._reference_size = None
+        self._pending = None
+
+    def _digest(self, view, width, height, bytes_per_pixel):
+        row_bytes = width * bytes_per_pixel
+        digest = 0
+        for row in range(self.row_step // 2, height, self.row_step):
+            start = row * row_bytes
+            digest = zlib.crc32(view[start:start + row_bytes], digest)
+        return digest
+
+    def check(self, raw, width, height, bytes_per_pixel=4):
+        """
+        True se `raw` (bytes/bytearray do frame, sem padding entre linhas) difere do último frame
+        confirmado com commit(). O frame fica pendente até o commit().
+        """
+        self.frames += 1
+        size = (width, height)
+        view = memoryview(raw)
+        digest = self._digest(view, width, height, bytes_per_pixel)
+        self._pending = (raw, digest, size)
+        if self._reference is None or size != self._reference_size or digest != self._reference_digest:
+            return True
+        self.full_compares += 1
+        # bytes/bytearray comparam com memcmp (memoryview compararia item a item)
+        if raw == self._reference:
+            self.unchanged += 1
+            return False
+        return True
+
+    def commit(self):
+        """O frame pendente foi enviado: passa a ser a referência (só guarda a referência, sem cópia)."""
+        if self._pending is not None:
+            self._reference, self._reference_digest, self._reference_size = self._pending
+            self._pending = None
+
+    def reset(self):
+        """Força o próximo frame a ser tratado como mudança (ex: novo visualizador, troca de monitor)."""
+        self._reference = None
+        self._pending = None
+
+    def stats(self):
+        return {"frames": self.frames, "unchanged": self.unchanged, "fullCompares": self.full_compares}
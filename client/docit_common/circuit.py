@@ -0,0 +1,160 @@
+"""
+Circuit breaker por URL de servidor (closed / open / half-open) com backoff exponencial e jitter.
+
+Com o backend fora do ar, cada módulo tentava de novo no seu ritmo fixo (heartbeat de 300s,
+WebSocket a cada 5s) e a frota inteira voltava a bater no servidor ao mesmo tempo quando ele
+subia. Aqui, após FAILURE_THRESHOLD falhas seguidas a URL fica "open" por um intervalo que
+dobra a cada reabertura (até MAX_BACKOFF), sorteado entre metade e o valor cheio para
+dessincronizar os agentes. Vencido o intervalo, a URL fica "half-open": só o primeiro chamador
+de available() leva a tentativa de teste (os demais continuam vendo o circuito fechado para eles
+até o resultado, ou até TRIAL_TIMEOUT se o teste nunca for registrado). Sucesso fecha o circuito,
+falha reabre com o próximo degrau. Retry-After (429/503) manda no intervalo mínimo.
+Só contam como falha erros de conexão, 5xx e 429 (is_server_failure): um 4xx é o servidor respondendo.
+"""
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+from . import log_event
+
+FAILURE_THRESHOLD = 2
+BASE_BACKOFF = 5.0
+MAX_BACKOFF = 300.0
+TRIAL_TIMEOUT = 30.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+def parse_retry_after(value):
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos, ou None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def retry_after_from(error_or_response):
+    """Extrai Retry-After de uma resposta do requests ou de uma exceção HTTPError."""
+    response = getattr(error_or_response, "response", None)
+    if response is None:
+        response = error_or_response
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    return parse_retry_after(headers.get("Retry-After"))
+
+
+def is_server_failure(error_or_response):
+    """True para erro de conexão/timeout (sem resposta), 5xx ou 429; 4xx e sucesso não abrem o circuito."""
+    response = getattr(error_or_response, "response", None)
+    if response is None:
+        response = error_or_response
+    status = getattr(response, "status_code", None)
+    if status is None:
+        return True
+    return status >= 500 or status == 429
+
+
+class CircuitBreaker:
+
+    def __init__(self, name, threshold=FAILURE_THRESHOLD, base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF,
+                 trial_timeout=TRIAL_TIMEOUT):
+        self.name = name
+        self.threshold = threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.trial_timeout = trial_timeout
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0.0
+        self._state = CLOSED
+        self._trial_until = 0.0
+
+    @property
+    def state(self):
+        if self._state == OPEN and time.monotonic() >= self.open_until:
+            return HALF_OPEN
+        return self._state
+
+    def available(self):
+        """Em half-open, o primeiro chamador reserva a tentativa de teste; os outros recebem False."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == OPEN:
+            return False
+        now = time.monotonic()
+        if now < self._trial_until:
+            return False
+        self._trial_until = now + self.trial_timeout
+        return True
+
+    def record_success(self):
+        if self._state != CLOSED:
+            log_event(f"Circuito de {self.name} fechado (servidor respondeu).", "INFO")
+        self._state = CLOSED
+        self._trial_until = 0.0
+        self.failures = 0
+        self.opens = 0
+
+    def record_failure(self, retry_after=None):
+        self._trial_until = 0.0
+        self.failures += 1
+        half_open = self.state == HALF_OPEN
+        if not half_open and self.failures < self.threshold and retry_after is None:
+            return
+        ceiling = min(self.max_backoff, self.base_backoff * (2 ** self.opens))
+        delay = random.uniform(ceiling / 2, ceiling)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.opens += 1
+        self._state = OPEN
+        self.open_until = time.monotonic() + delay
+        log_event(f"Circuito de {self.name} aberto por {delay:.0f}s ({self.failures} falhas seguidas).", "WARNING")
+
+    def remaining(self):
+        return max(0.0, self.open_until - time.monotonic()) if self.state == OPEN else 0.0
+
+
+class CircuitRegistry:
+    """Um breaker por URL, compartilhado por todas as chamadas de saída do processo."""
+
+    def __init__(self, **breaker_kwargs):
+        self._breaker_kwargs = breaker_kwargs
+        self._lock = threading.Lock()
+        self._breakers = {}
+
+    def get(self, url):
+        with self._lock:
+            breaker = self._breakers.get(url)
+            if breaker is None:
+                breaker = self._breakers[url] = CircuitBreaker(url, **self._breaker_kwargs)
+            return breaker
+
+    def available(self, url):
+        with self._lock:
+            breaker = self._breakers.get(url)
+            return breaker is None or breaker.available()
+
+    def record_success(self, url):
+        breaker = self.get(url)
+        with self._lock:
+            breaker.record_success()
+
+    def record_failure(self, url, retry_after=None):
+        breaker = self.get(url)
+        with self._lock:
+            breaker.record_failure(retry_after)
+
+    def states(self):
+        with self._lock:
+            return {url: b.state for url, b in self._breakers.items()}
@@ -0,0 +1,121 @@
+"""
+Persistência write-behind do arquivo de configuração cifrado (Doc-IT.dat).
+
+save() só compara o JSON com o último conteúdo salvo e agenda a gravação: várias
+chamadas dentro da janela (failover de URL + tamper + settings no mesmo check-in) viram
+uma única escrita. Conteúdo idêntico não gera escrita nenhuma. A gravação é atômica
+(arquivo temporário + os.replace), então um crash nunca deixa um .dat truncado.
+Cifragem, fsync e ACL rodam fora do lock de estado: save() nunca espera o disco. Se a gravação
+falhar, o conteúdo continua pendente e uma nova tentativa é agendada com backoff.
+"""
+import os
+import json
+import threading
+
+from . import log_event
+
+COALESCE_WINDOW = 0.5
+MAX_RETRY_DELAY = 30.0
+
+
+class ConfigStore:
+
+    def __init__(self, path, encrypt, finalize=None, window=COALESCE_WINDOW):
+        """
+        encrypt: bytes -> bytes (ex: Fernet.encrypt).
+        finalize: chamado com o caminho do temporário antes do replace (ex: aplicar ACL restrita).
+        """
+        self.path = path
+        self.encrypt = encrypt
+        self.finalize = finalize
+        self.window = window
+        self.changes = 0
+        self.writes = 0
+        self.failures = 0
+        self._lock = threading.Lock()         # estado (_pending/_persisted/_timer)
+        self._write_lock = threading.Lock()   # uma gravação em disco por vez
+        self._persisted = None
+        self._pending = None
+        self._timer = None
+
+    @staticmethod
+    def serialize(config_data):
+        return json.dumps(config_data, ensure_ascii=False).encode("utf-8")
+
+    @property
+    def dirty(self):
+        return self._pending is not None
+
+    def seed(self, plaintext):
+        """Informa o conteúdo já presente em disco (lido no load) para evitar regravá-lo."""
+        with self._lock:
+            self._persisted = plaintext
+
+    def save(self, config_data, immediate=False):
+        """Agenda a gravação. Retorna False se o conteúdo não mudou ou, com immediate, se a gravação falhou."""
+        plaintext = self.serialize(config_data)
+        with self._lock:
+            current = self._pending if self._pending is not None else self._persisted
+            if plaintext == current:
+                return False
+            self.changes += 1
+            self._pending = plaintext
+            if not immediate:
+                self._schedule(self.window)
+        if immediate:
+            return self.flush()
+        return True
+
+    def _schedule(self, delay):
+        """Agenda um flush (chamado com self._lock); não duplica se já houver um agendado."""
+        if self._timer is None:
+            self._timer = threading.Timer(delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Grava agora o conteúdo pendente, se houver. False se a gravação falhou (nova tentativa agendada)."""
+        # O lock de gravação vem antes da leitura do pendente: dois flushes nunca gravam fora de ordem
+        with self._write_lock:
+            with self._lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                plaintext = self._pending
+                if plaintext is None:
+                    return True
+                if plaintext == self._persisted:
+                    self._pending = None
+                    return True
+
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, "wb") as f:
+                    f.write(self.encrypt(plaintext))
+                    f.flush()
+                    os.fsync(f.fileno())
+                if self.finalize:
+                    # A ACL aplicada no temporário acompanha o arquivo no rename
+                    try:
+                        self.finalize(tmp_path)
+                    except Exception as acl_e:
+                        log_event(f"Falha ao fixar ACL em {tmp_path}: {acl_e}", "WARNING")
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                try: os.remove(tmp_path)
+                except OSError: pass
+                with self._lock:
+                    # Continua pendente: save() com o mesmo conteúdo não reagenda, então o retry é daqui
+                    self.failures += 1
+                    delay = min(MAX_RETRY_DELAY, self.window * 2 ** self.failures)
+                    self._schedule(delay)
+                log_event(f"Erro ao salvar config criptografada (nova tentativa em {delay:.1f}s): {e}", "CRITICAL")
+                return False
+
+            with self._lock:
+                self._persisted = plaintext
+                if self._pending == plaintext:
+                    self._pending = None
+                self.failures = 0
+                self.writes += 1
+            return True
@@ -0,0 +1,211 @@
+"""
+Seleção de servidor estilo happy-eyeballs entre as server_urls do agente.
+
+Antes, cada check-in/enroll/update percorria a lista em série, pagando o timeout inteiro
+(10-15s) de cada URL morta antes de chegar a uma viva. Aqui:
+  - cada URL tem um placar (latência EWMA, falhas consecutivas, último sucesso);
+  - ordered() devolve a lista na ordem em que vale a pena tentar: primária saudável
+    primeiro, depois as saudáveis por latência, as suspeitas por último;
+  - quando não há nenhuma URL sabidamente saudável, race() sonda todas em paralelo com
+    partidas escalonadas e a primeira que responde vira a preferida;
+  - um re-probe em segundo plano sonda a primária (e as suspeitas) e a promove de volta
+    assim que ela se recupera;
+  - com um CircuitRegistry (docit_common.circuit), URLs com circuito aberto ficam fora da
+    lista até o backoff vencer.
+"""
+import time
+import queue
+import threading
+
+from . import log_event
+from .circuit import is_server_failure, retry_after_from
+
+STAGGER_DELAY = 0.25
+PROBE_TIMEOUT = 5
+REPROBE_INTERVAL = 60
+LATENCY_ALPHA = 0.3
+
+
+class EndpointScore:
+    __slots__ = ("latency", "failures", "last_ok", "last_failure")
+
+    def __init__(self):
+        self.latency = None
+        self.failures = 0
+        self.last_ok = 0.0
+        self.last_failure = 0.0
+
+    @property
+    def healthy(self):
+        return self.failures == 0 and self.last_ok > 0
+
+    def as_dict(self):
+        return {
+            "latencyMs": round(self.latency * 1000, 1) if self.latency is not None else None,
+            "failures": self.failures,
+            "lastOk": self.last_ok or None,
+        }
+
+
+class EndpointSelector:
+
+    def __init__(self, probe, stagger=STAGGER_DELAY, probe_timeout=PROBE_TIMEOUT, breakers=None):
+        """probe(url, timeout) -> bool. Exceções contam como falha."""
+        self.probe = probe
+        self.breakers = breakers
+        self.stagger = stagger
+        self.probe_timeout = probe_timeout
+        self._lock = threading.Lock()
+        self._scores = {}
+        self._reprobe_thread = None
+
+    def _score(self, url):
+        score = self._scores.get(url)
+        if score is None:
+            score = self._scores[url] = EndpointScore()
+        return score
+
+    def record_success(self, url, latency=None):
+        with self._lock:
+            score = self._score(url)
+            recovered = score.failures > 0
+            score.failures = 0
+            score.last_ok = time.time()
+            if latency is not None:
+                score.latency = latency if score.latency is None else (
+                    LATENCY_ALPHA * latency + (1 - LATENCY_ALPHA) * score.latency)
+        if self.breakers:
+            self.breakers.record_success(url)
+        if recovered:
+            log_event(f"Servidor {url} voltou a responder.", "INFO")
+
+    def record_failure(self, url, retry_after=None):
+        with self._lock:
+            score = self._score(url)
+            score.failures += 1
+            score.last_failure = time.time()
+        if self.breakers:
+            self.breakers.record_failure(url, retry_after)
+
+    def record_error(self, url, error_or_response):
+        """
+        Resposta não-200 ou exceção de uma chamada. Só erro de conexão, 5xx e 429 contam como falha;
+        um 4xx mostra que o servidor está no ar (libera a tentativa half-open sem abrir o circuito).
+        """
+        if is_server_failure(error_or_response):
+            self.record_failure(url, retry_after_from(error_or_response))
+        elif self.breakers:
+            self.breakers.record_success(url)
+
+    def available(self, url):
+        return self.breakers is None or self.breakers.available(url)
+
+    def scores(self):
+        with self._lock:
+            return {url: score.as_dict() for url, score in self._scores.items()}
+
+    def _rank(self, urls):
+        primary = urls[0]
+
+        def key(url):
+            score = self._scores.get(url) or EndpointScore()
+            if score.healthy:
+                # Primária saudável sempre na frente; as demais por latência
+                return (0, 0 if url == primary else 1, score.latency if score.latency is not None else 0.0)
+            if score.failures == 0:
+                # Nunca testada: mantém a ordem configurada, atrás das saudáveis
+                return (1, urls.index(url), 0.0)
+            return (2, score.failures, urls.index(url))
+
+        with self._lock:
+            return sorted(urls, key=key)
+
+    def ordered(self, urls):
+        """
+        Ordem de tentativa para esta chamada. Se nenhuma URL está saudável, corre uma sondagem antes.
+        URLs com circuito aberto ficam de fora (lista vazia = todos os servidores em backoff).
+        """
+        configured = [u for u in dict.fromkeys(urls or []) if u]
+        urls = [u for u in configured if self.available(u)]
+        if len(urls) <= 1:
+            return urls
+        with self._lock:
+            any_healthy = any(self._scores.get(u) and self._scores[u].healthy for u in urls)
+        if not any_healthy:
+            self.race(urls)
+            urls = [u for u in urls if self.available(u)]
+            if not urls:
+                return []
+        # Rank sobre a lista configurada para a primária continuar sendo a primeira da config
+        return [u for u in self._rank(configured) if u in urls]
+
+    def _timed_probe(self, url):
+        start = time.perf_counter()
+        try:
+            ok = bool(self.probe(url, self.probe_timeout))
+        except Exception:
+            ok = False
+        if ok:
+            self.record_success(url, time.perf_counter() - start)
+        else:
+            self.record_failure(url)
+        return ok
+
+    def race(self, urls):
+        """
+        Sonda as URLs com partidas escalonadas (a próxima começa após stagger ou quando a anterior falha).
+        Retorna a primeira que responder, ou None. As sondagens perdedoras terminam em segundo plano
+        e também atualizam o placar.
+        """
+        results = queue.Queue()
+
+        def run(url):
+            results.put((url, self._timed_probe(url)))
+
+        pending = 0
+        winner = None
+        deadline = time.monotonic() + self.probe_timeout + self.stagger * len(urls)
+        candidates = list(urls)
+        while candidates or pending:
+            if candidates:
+                threading.Thread(target=run, args=(candidates.pop(0),), daemon=True).start()
+                pending += 1
+            wait = self.stagger if candidates else max(0.0, deadline - time.monotonic())
+            try:
+                url, ok = results.get(timeout=wait)
+                pending -= 1
+                if ok:
+                    winner = url
+                    break
+            except queue.Empty:
+                if not candidates:
+                    break
+        if winner:
+            log_event(f"Sondagem paralela: {winner} respondeu primeiro.", "DEBUG")
+        else:
+            log_event("Sondagem paralela: nenhum servidor respondeu.", "WARNING")
+        return winner
+
+    def start_reprobe(self, get_urls, interval=REPROBE_INTERVAL):
+        """Thread que sonda periodicamente a primária e as URLs suspeitas para promovê-las de volta."""
+        if self._reprobe_thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    urls = [u for u in dict.fromkeys(get_urls() or []) if u]
+                    if len(urls) <= 1:
+                        continue
+                    with self._lock:
+                        stale = [u for u in urls if not (self._scores.get(u) and self._scores[u].healthy)]
+                    stale = [u for u in stale if self.available(u)]
+                    for url in stale:
+                        if self._timed_probe(url) and url == urls[0]:
+                            log_event(f"Servidor primário {url} recuperado. Promovido de volta.", "INFO")
+                except Exception as e:
+                    log_event(f"Erro no re-probe de servidores: {e}", "WARNING")
+
+        self._reprobe_thread = threading.Thread(target=loop, name="endpoint-reprobe", daemon=True)
+        self._reprobe_thread.start()
@@ -0,0 +1,122 @@
+"""
+Controle de fluxo por créditos dos frames de Remote Desktop.
+
+O visualizador confirma (desktop:ack) a sequência de cada frame desenhado; a confirmação é
+cumulativa, então um ack perdido é coberto pelo seguinte. O Core mede, a cada ack:
+  - RTT (envio do frame -> ack), com RTT mínimo e suavizado;
+  - taxa de entrega (bytes confirmados / tempo), guardando o máximo recente;
+e dimensiona a janela como o produto banda x atraso em frames:
+    janela = ceil(GAIN * taxa_max * rtt_min / tamanho_médio_do_frame), entre min e max.
+O estado (último ack, janela, RTO) é empurrado ao Remote, que deixa de capturar/codificar
+enquanto tiver `janela` frames sem confirmação. Se os acks sumirem por RTO, o Remote manda
+um frame de sondagem em vez de travar.
+"""
+import math
+import time
+import threading
+from collections import OrderedDict, deque
+
+INITIAL_WINDOW = 2
+MIN_WINDOW = 1
+MAX_WINDOW = 16
+GAIN = 2.0
+SAMPLES = 30
+MIN_RTO = 0.3
+MAX_RTO = 3.0
+
+
+class CreditWindow:
+
+    def __init__(self, min_window=MIN_WINDOW, max_window=MAX_WINDOW, initial_window=INITIAL_WINDOW, gain=GAIN):
+        self.min_window = min_window
+        self.max_window = max_window
+        self.initial_window = initial_window
+        self.gain = gain
+        self._lock = threading.Lock()
+        self._new_stream(0)
+
+    def _new_stream(self, stream_id):
+        self.stream_id = stream_id
+        self.window = self.initial_window
+        self.acked = 0
+        self.highest_sent = 0
+        self.srtt = None
+        self.rttvar = 0.0
+        self.avg_size = None
+        self.delivered = 0
+        self.delivered_time = time.monotonic()
+        self._in_flight = OrderedDict()
+        self._rtt_samples = deque(maxlen=SAMPLES)
+        self._rate_samples = deque(maxlen=SAMPLES)
+
+    def reset(self, stream_id=None):
+        """Esquece os frames em voo (ex: reconexão do WebSocket: os acks pendentes não virão mais)."""
+        with self._lock:
+            if stream_id is not None and stream_id != self.stream_id:
+                self._new_stream(stream_id)
+            else:
+                self.acked = self.highest_sent
+                self._in_flight.clear()
+
+    @property
+    def rto(self):
+        if self.srtt is None:
+            return MAX_RTO
+        return min(MAX_RTO, max(MIN_RTO, self.srtt + 4 * self.rttvar))
+
+    def on_sent(self, stream_id, seq, size, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if stream_id != self.stream_id:
+                self._new_stream(stream_id)
+            self.highest_sent = max(self.highest_sent, seq)
+            self._in_flight[seq] = (now, size, self.delivered, self.delivered_time)
+            self.avg_size = size if self.avg_size is None else 0.875 * self.avg_size + 0.125 * size
+
+    def on_ack(self, stream_id, seq, now=None):
+        """Processa um ack cumulativo. Retorna False se for de outro stream ou repetido."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if stream_id != self.stream_id or seq <= self.acked:
+                return False
+            record = self._in_flight.get(seq)
+            while self._in_flight:
+                first = next(iter(self._in_flight))
+                if first > seq:
+                    break
+                _, (_, size, _, _) = self._in_flight.popitem(last=False)
+                self.delivered += size
+            self.acked = seq
+            self.delivered_time = now
+            if record is not None:
+                self._sample(now, record)
+            return True
+
+    def _sample(self, now, record):
+        sent_at, _, delivered_at_send, delivered_time_at_send = record
+        rtt = max(1e-3, now - sent_at)
+        self._rtt_samples.append(rtt)
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+        interval = now - delivered_time_at_send
+        if interval > 0:
+            self._rate_samples.append((self.delivered - delivered_at_send) / interval)
+
+        if self._rate_samples and self.avg_size:
+            bdp_bytes = max(self._rate_samples) * min(self._rtt_samples)
+            window = math.ceil(self.gain * bdp_bytes / self.avg_size)
+            self.window = max(self.min_window, min(self.max_window, window))
+
+    def state(self):
+        with self._lock:
+            return {
+                "streamId": self.stream_id,
+                "acked": self.acked,
+                "window": self.window,
+                "rto": round(self.rto, 3),
+                "rtt": round(self.srtt, 4) if self.srtt is not None else None,
+            }
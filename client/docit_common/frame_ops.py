@@ -0,0 +1,180 @@
+"""
+Operações vetorizadas (NumPy) sobre os frames do Remote Desktop.
+
+O buffer BGRA do mss vira um array (altura, largura, 4) com np.frombuffer, sem cópia, e as
+operações por pixel saem do loop Python/PIL:
+  - TileDiff: grade de blocos sujos entre dois frames (uma comparação do frame inteiro, em palavras
+    de 8 bytes quando o alinhamento permite, e uma redução por bloco), no lugar do memcmp linha a
+    linha de region_codec.dirty_tiles. Roda direto sobre os buffers crus da captura;
+  - FrameScaler: redução por média de área em fator inteiro (cada pixel de saída é a média de um
+    bloco k x k: soma das k linhas de cada faixa, depois das k colunas de cada bloco), gravando
+    em RGBX: a conversão BGRX -> RGB sai na mesma cópia final, sem passo próprio. Fator 1 é só
+    essa conversão.
+Os arrays de trabalho são alocados uma vez e reaproveitados enquanto o tamanho do frame não muda;
+os de saída vêm de um pool pequeno: o frame convertido segue para outra thread do pipeline, que o
+devolve com release() depois de codificar. A saída em RGBX (4 bytes por pixel, X = 255) é o
+formato que o PIL mapeia sem cópia (Image.frombuffer): a imagem da tela inteira e a de cada
+região suja apontam para o array (region_buffer). A 20 fps a alocação por frame (imagem PIL
+cheia, thumbnail, tobytes) pesava na CPU e no GC do Remote.
+
+Sem NumPy instalado available() é False e quem usa volta para os caminhos PIL/Python puro.
+"""
+import threading
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+MAX_FACTOR = 16  # 16 x 16 x 255 ainda cabe no acumulador uint16
+POOL_SIZE = 3    # convert escrevendo + um na fila do encode + um sendo codificado
+
+
+def available():
+    return np is not None
+
+
+def bgra_view(raw, width, height, bytes_per_pixel=4):
+    """Array (altura, largura, canais) sobre o buffer capturado, sem cópia."""
+    return np.frombuffer(raw, dtype=np.uint8, count=width * height * bytes_per_pixel).reshape(
+        height, width, bytes_per_pixel)
+
+
+def region_buffer(frame, x=0, y=0):
+    """
+    Memória de um frame do FrameScaler a partir do pixel (x, y), para Image.frombuffer com o passo da
+    linha inteira (sem cópia). O PIL exige passo x altura bytes a partir do início da região: os
+    arrays do pool têm uma linha extra no fim para que regiões na borda inferior também caibam.
+    """
+    padded = frame.base if frame.base is not None else frame
+    return memoryview(padded).cast("B")[y * frame.strides[0] + x * frame.strides[1]:]
+
+
+def area_factor(width, height, max_w, max_h):
+    """
+    Maior fator inteiro que ainda deixa o frame reduzido do tamanho do alvo ou maior (o que faltar
+    fica para o redimensionamento do PIL, já sobre uma imagem menor). 1 = não há redução inteira.
+    """
+    factor = min(width // max(1, max_w), height // max(1, max_h)) if width > max_w or height > max_h else 1
+    return max(1, min(MAX_FACTOR, factor))
+
+
+class TileDiff:
+    """Grade de blocos que mudaram entre dois frames do mesmo tamanho (bytes, bytearray ou array)."""
+
+    def __init__(self, tile=64):
+        self.tile = tile
+        self._key = None
+        self._dtype = None
+        self._shape = None
+        self._mask = None
+        self._row_starts = None
+        self._col_starts = None
+
+    def _prepare(self, width, height, bytes_per_pixel):
+        key = (width, height, bytes_per_pixel)
+        if key == self._key:
+            return
+        self._key = key
+        row_bytes = width * bytes_per_pixel
+        tile_bytes = self.tile * bytes_per_pixel
+        # Maior palavra que divide a linha e o bloco: compara 8 bytes por vez em vez de 1
+        itemsize = next(n for n in (8, 4, 2, 1) if row_bytes % n == 0 and tile_bytes % n == 0)
+        self._dtype = np.dtype("u%d" % itemsize)
+        self._shape = (height, row_bytes // itemsize)
+        self._mask = np.empty(self._shape, dtype=bool)
+        self._row_starts = np.arange(0, height, self.tile)
+        self._col_starts = np.arange(0, width, self.tile) * bytes_per_pixel // itemsize
+
+    def grid(self, current, previous, width, height, bytes_per_pixel=3):
+        """Mesmo formato de region_codec.dirty_tiles: lista de linhas da grade, uma lista de bool por coluna."""
+        self._prepare(width, height, bytes_per_pixel)
+        count = self._shape[0] * self._shape[1]
+        a = np.frombuffer(current, dtype=self._dtype, count=count).reshape(self._shape)
+        b = np.frombuffer(previous, dtype=self._dtype, count=count).reshape(self._shape)
+        np.not_equal(a, b, out=self._mask)
+        # Reduz as linhas de cada faixa de blocos e depois as colunas (em bytes) de cada bloco
+        rows = np.logical_or.reduceat(self._mask, self._row_starts, axis=0)
+        return np.logical_or.reduceat(rows, self._col_starts, axis=1).tolist()
+
+
+class FrameScaler:
+    """Redução por média de área (fator inteiro) do BGRA capturado direto para RGBX, em buffers reaproveitados."""
+
+    def __init__(self, pool_size=POOL_SIZE):
+        self.pool_size = pool_size
+        self.frames = 0
+        self.reallocations = 0
+        self.allocations = 0
+        self._key = None
+        self._out_key = None
+        self._rows = None
+        self._sum = None
+        self._free = []
+        self._lock = threading.Lock()
+
+    def _prepare(self, out_w, out_h, factor):
+        key = (out_w, out_h, factor)
+        if key != self._key:
+            self._key = key
+            if factor > 1:
+                self._rows = np.empty((out_h, out_w * factor * 4), dtype=np.uint16)
+                self._sum = np.empty((out_h, out_w, 4), dtype=np.uint16)
+            self.reallocations += 1
+        if (out_w, out_h) != self._out_key:
+            with self._lock:
+                self._out_key = (out_w, out_h)
+                self._free = []
+
+    def _output(self, out_w, out_h):
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        self.allocations += 1
+        padded = np.empty((out_h + 1, out_w, 4), dtype=np.uint8)
+        padded[:, :, 3] = 255  # canal X: nunca é reescrito
+        return padded[:out_h]
+
+    def release(self, frame):
+        """Devolve ao pool o array de um frame já codificado ou descartado (chamar mais de uma vez não tem efeito)."""
+        with self._lock:
+            if (frame.shape[1], frame.shape[0]) != self._out_key or len(self._free) >= self.pool_size:
+                return
+            if any(item is frame for item in self._free):
+                return
+            self._free.append(frame)
+
+    def downscale(self, raw, width, height, factor):
+        """
+        Frame BGRA (width x height) reduzido `factor` vezes em cada eixo, em RGBX (altura, largura, 4).
+        Sobras de borda que não completam um bloco são descartadas (menos de `factor` pixels).
+        O array vem do pool: devolva com release() quando não precisar mais dele.
+        """
+        factor = max(1, min(MAX_FACTOR, factor))
+        out_w, out_h = width // factor, height // factor
+        self._prepare(out_w, out_h, factor)
+        self.frames += 1
+        view = bgra_view(raw, width, height)
+        out = self._output(out_w, out_h)
+        if factor == 1:
+            np.copyto(out[:, :, :3], view[:, :, 2::-1])
+            return out
+        # Visões sobre o buffer: linha i de cada faixa de k linhas, depois coluna j de cada bloco.
+        # Somar fatias inteiras (com o canal X junto) é bem mais rápido que np.sum em eixos intercalados.
+        rows = view[:out_h * factor, :out_w * factor].reshape(out_h * factor, out_w * factor * 4)
+        np.copyto(self._rows, rows[0::factor], casting="unsafe")
+        for i in range(1, factor):
+            np.add(self._rows, rows[i::factor], out=self._rows)
+        blocks = self._rows.reshape(out_h, out_w, factor, 4)
+        np.copyto(self._sum, blocks[:, :, 0])
+        for j in range(1, factor):
+            np.add(self._sum, blocks[:, :, j], out=self._sum)
+        area = factor * factor
+        np.add(self._sum, area // 2, out=self._sum)  # arredonda a média em vez de truncar
+        np.floor_divide(self._sum, area, out=self._sum)
+        np.copyto(out[:, :, :3], self._sum[:, :, 2::-1], casting="unsafe")
+        return out
+
+    def stats(self):
+        return {"frames": self.frames, "reallocations": self.reallocations, "allocations": self.allocations,
+                "size": self._key}
@@ -0,0 +1,74 @@
+"""
+Cabeçalho binário compacto dos frames de Remote Desktop.
+
+O frame viaja como bytes do Remote até o navegador: o Remote grava cabeçalho + JPEG num único
+buffer, o Core repassa esse blob como anexo binário do Socket.IO e o backend só retransmite.
+Nenhuma etapa faz base64 ou JSON do conteúdo da imagem.
+
+Layout (little-endian, FRAME_HEADER.size = 21 bytes), espelhado em RemoteDesktop.jsx:
+    [u8 versão][u32 stream_id][u32 seq][u16 largura][u16 altura][u64 timestamp_ms][JPEG...]
+
+Versão 2 (REGION_FRAME_VERSION): em vez de um JPEG inteiro, só as regiões que mudaram, cada uma
+com o seu codec (docit_common.region_codec). Depois do cabeçalho:
+    [u8 flags (bit 0: keyframe)][u16 n_regiões]
+    n x [u16 x][u16 y][u16 largura][u16 altura][u8 codec][u32 tamanho][bytes da imagem]
+O keyframe cobre a tela inteira; os demais só valem em cima do frame anterior do mesmo stream.
+"""
+import time
+import struct
+
+FRAME_VERSION = 1
+REGION_FRAME_VERSION = 2
+FRAME_HEADER = struct.Struct("<BIIHHQ")
+REGIONS_HEADER = struct.Struct("<BH")
+REGION_HEADER = struct.Struct("<HHHHBI")
+FLAG_KEYFRAME = 0x01
+
+
+def pack_header(stream_id, seq, width, height, timestamp_ms=None):
+    if timestamp_ms is None:
+        timestamp_ms = int(time.time() * 1000)
+    return FRAME_HEADER.pack(FRAME_VERSION, stream_id & 0xFFFFFFFF, seq & 0xFFFFFFFF,
+                             width, height, timestamp_ms)
+
+
+def unpack_header(data):
+    """Lê o cabeçalho de um frame. Retorna (dict, offset_do_jpeg)."""
+    version, stream_id, seq, width, height, timestamp_ms = FRAME_HEADER.unpack_from(data)
+    if version not in (FRAME_VERSION, REGION_FRAME_VERSION):
+        raise ValueError(f"Versão de frame desconhecida: {version}")
+    return {"streamId": stream_id, "seq": seq, "width": width, "height": height,
+            "timestamp": timestamp_ms, "version": version}, FRAME_HEADER.size
+
+
+def pack_header_into(buffer, stream_id, seq, width, height, timestamp_ms=None, version=FRAME_VERSION):
+    """Preenche o cabeçalho no início de um buffer já reservado (evita concatenar cabeçalho + JPEG)."""
+    if timestamp_ms is None:
+        timestamp_ms = int(time.time() * 1000)
+    FRAME_HEADER.pack_into(buffer, 0, version, stream_id & 0xFFFFFFFF, seq & 0xFFFFFFFF,
+                           width, height, timestamp_ms)
+
+
+def write_regions(stream, regions, keyframe):
+    """
+    Grava o bloco de regiões (versão 2) num stream que já tem FRAME_HEADER.size bytes reservados.
+    regions: lista de (x, y, largura, altura, codec, bytes).
+    """
+    stream.write(REGIONS_HEADER.pack(FLAG_KEYFRAME if keyframe else 0, len(regions)))
+    for x, y, width, height, codec, data in regions:
+        stream.write(REGION_HEADER.pack(x, y, width, height, codec, len(data)))
+        stream.write(data)
+
+
+def read_regions(data, offset=FRAME_HEADER.size):
+    """Lê o bloco de regiões de um frame versão 2. Retorna (keyframe, [(x, y, w, h, codec, memoryview)])."""
+    view = memoryview(data)
+    flags, count = REGIONS_HEADER.unpack_from(view, offset)
+    offset += REGIONS_HEADER.size
+    regions = []
+    for _ in range(count):
+        x, y, width, height, codec, size = REGION_HEADER.unpack_from(view, offset)
+        offset += REGION_HEADER.size
+        regions.append((x, y, width, height, codec, view[offset:offset + size]))
+        offset += size
+    return bool(flags & FLAG_KEYFRAME), regions
@@ -0,0 +1,118 @@
+"""
+Sessão HTTP mTLS compartilhada (keep-alive) para as chamadas do agente ao backend.
+
+Cada requests.get/post avulso abria uma conexão nova e refazia o handshake TLS completo
+com autenticação RSA do cliente. Aqui todas as chamadas (check-in, settings, versão,
+downloads) reaproveitam as conexões de um único pool por conjunto de credenciais.
+A sessão só é recriada quando cert/key/CA mudam ou quando invalidate() é chamado
+(ex: após um novo enrollment, que regrava os arquivos no mesmo caminho).
+"""
+import os
+import gzip
+import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from . import log_event
+
+# Conexões mantidas por host: check-in e settings sequenciais + um download em paralelo
+POOL_MAXSIZE = 4
+
+# Corpos menores que isso vão crus: o ganho não paga a CPU nem o cabeçalho
+COMPRESSION_THRESHOLD = 4096
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 6
+
+
+def resolve_credentials(cert_path=None, key_path=None, ca_path=None):
+    """Mesma regra usada em todo o agente: CA própria se existir, cert do cliente só se o par existir."""
+    verify = ca_path if (ca_path and os.path.exists(ca_path)) else True
+    cert = None
+    if cert_path and key_path and os.path.exists(cert_path) and os.path.exists(key_path):
+        cert = (cert_path, key_path)
+    return cert, verify
+
+
+class MTLSSessionManager:
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self.builds = 0
+        self._lock = threading.Lock()
+        self._session = None
+        self._key = None
+
+    def _build(self, cert, verify):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_maxsize, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.cert = cert
+        session.verify = verify
+        return session
+
+    def get(self, cert_path=None, key_path=None, ca_path=None):
+        cert, verify = resolve_credentials(cert_path, key_path, ca_path)
+        key = (cert, verify)
+        with self._lock:
+            if self._session is None or self._key != key:
+                if self._session is not None:
+                    log_event("Credenciais mTLS alteradas. Recriando pool de conexões HTTP.", "INFO")
+                    try: self._session.close()
+                    except Exception: pass
+                self._session = self._build(cert, verify)
+                self._key = key
+                self.builds += 1
+            return self._session
+
+    def invalidate(self):
+        """Descarta o pool atual (certificado renovado no mesmo caminho ou rejeição TLS)."""
+        with self._lock:
+            if self._session is not None:
+                try: self._session.close()
+                except Exception: pass
+            self._session = None
+            self._key = None
+
+
+sessions = MTLSSessionManager()
+
+
+def encode_body(body, accept_encodings=(), threshold=COMPRESSION_THRESHOLD):
+    """
+    Escolhe o Content-Encoding do corpo a partir do que o servidor anunciou (acceptEncodings
+    na resposta do check-in). Retorna (bytes, encoding ou None).
+    """
+    if not accept_encodings or len(body) < threshold:
+        return body, None
+    if "zstd" in accept_encodings and zstandard is not None:
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body), "zstd"
+    if "gzip" in accept_encodings:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def post_json(session, url, payload, accept_encodings=(), timeout=10, threshold=COMPRESSION_THRESHOLD):
+    """session.post(json=...) com compressão negociada do corpo."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    data, encoding = encode_body(body, accept_encodings, threshold)
+    headers = {"Content-Type": "application/json"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        log_event(f"Corpo comprimido com {encoding}: {len(body)} -> {len(data)} bytes.", "DEBUG")
+    return session.post(url, data=data, headers=headers, timeout=timeout)
+
+
+def get_session(cert_path=None, key_path=None, ca_path=None):
+    return sessions.get(cert_path, key_path, ca_path)
+
+
+def invalidate_session():
+    sessions.invalidate()
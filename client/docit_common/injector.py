@@ -0,0 +1,310 @@
+"""
+Injetor de entrada do Remote Desktop (mouse/teclado) com backend plugável.
+
+Substitui as chamadas avulsas ao pyautogui (que dormem pyautogui.PAUSE a cada chamada e
+refazem checagens de failsafe). O injetor:
+  - drena tudo o que chegou desde o último tick e faz UMA chamada ao backend por tick
+    (no Windows, um único SendInput com o lote inteiro), preservando a ordem;
+  - mantém o estado do cursor e pula movimentos para a posição onde ele já está;
+  - mede a latência de cada evento (carimbo 'ts' da chegada ao agente, ou da submissão) até a injeção.
+
+Eventos de baixo nível entregues ao backend:
+    ("move", x, y)  ("button", "left"|"right"|"middle", down)  ("wheel", delta)  ("key", tecla_do_browser, down)
+
+SendInputBackend é o backend real (Windows, via ctypes); RecordingBackend só grava os lotes,
+para exercitar comportamento e vazão no Linux.
+"""
+import time
+import ctypes
+import threading
+from collections import deque
+
+from . import log_event
+from .input_queue import LatencyStats
+
+TICK = 0.004
+WHEEL_DELTA = 120
+
+
+class InjectionBackend:
+    """Interface: inject(eventos) injeta um lote; cursor_position() devolve (x, y) atual ou None."""
+
+    def inject(self, events):
+        raise NotImplementedError
+
+    def cursor_position(self):
+        return None
+
+
+class RecordingBackend(InjectionBackend):
+    """Stand-in para testes: grava cada lote e simula o cursor. cost = segundos gastos por lote."""
+
+    def __init__(self, cost=0.0):
+        self.cost = cost
+        self.batches = []
+        self.cursor = None
+
+    def inject(self, events):
+        self.batches.append(list(events))
+        for event in events:
+            if event[0] == "move":
+                self.cursor = (event[1], event[2])
+        if self.cost:
+            time.sleep(self.cost)
+
+    def cursor_position(self):
+        return self.cursor
+
+    @property
+    def events(self):
+        return [event for batch in self.batches for event in batch]
+
+
+# --- Backend Windows (SendInput) ---
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_MIDDLEDOWN = 0x0020
+MOUSEEVENTF_MIDDLEUP = 0x0040
+MOUSEEVENTF_WHEEL = 0x0800
+MOUSEEVENTF_VIRTUALDESK = 0x4000
+MOUSEEVENTF_ABSOLUTE = 0x8000
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+SM_XVIRTUALSCREEN, SM_YVIRTUALSCREEN, SM_CXVIRTUALSCREEN, SM_CYVIRTUALSCREEN = 76, 77, 78, 79
+
+BUTTON_FLAGS = {
+    "left": (MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP),
+    "right": (MOUSEEVENTF_RIGHTDOWN, MOUSEEVENTF_RIGHTUP),
+    "middle": (MOUSEEVENTF_MIDDLEDOWN, MOUSEEVENTF_MIDDLEUP),
+}
+
+# Nomes de KeyboardEvent.key do browser -> Virtual-Key do Windows
+VK_KEYS = {
+    "Enter": 0x0D, "Escape": 0x1B, "Backspace": 0x08, "Tab": 0x09, " ": 0x20,
+    "Delete": 0x2E, "Insert": 0x2D, "Home": 0x24, "End": 0x23, "PageUp": 0x21, "PageDown": 0x22,
+    "ArrowLeft": 0x25, "ArrowUp": 0x26, "ArrowRight": 0x27, "ArrowDown": 0x28,
+    "Shift": 0x10, "Control": 0x11, "Alt": 0x12, "Meta": 0x5B, "CapsLock": 0x14, "ContextMenu": 0x5D,
+}
+VK_KEYS.update({f"F{n}": 0x6F + n for n in range(1, 13)})
+EXTENDED_KEYS = {"Delete", "Insert", "Home", "End", "PageUp", "PageDown",
+                 "ArrowLeft", "ArrowUp", "ArrowRight", "ArrowDown", "Meta", "ContextMenu"}
+
+_ULONG_PTR = ctypes.c_size_t
+
+
+class _MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", ctypes.c_long), ("dy", ctypes.c_long), ("mouseData", ctypes.c_ulong),
+                ("dwFlags", ctypes.c_ulong), ("time", ctypes.c_ulong), ("dwExtraInfo", _ULONG_PTR)]
+
+
+class _KEYBDINPUT(ctypes.Structure):
+    _fields_ = [("wVk", ctypes.c_ushort), ("wScan", ctypes.c_ushort), ("dwFlags", ctypes.c_ulong),
+                ("time", ctypes.c_ulong), ("dwExtraInfo", _ULONG_PTR)]
+
+
+class _HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [("uMsg", ctypes.c_ulong), ("wParamL", ctypes.c_ushort), ("wParamH", ctypes.c_ushort)]
+
+
+class _INPUTUNION(ctypes.Union):
+    _fields_ = [("mi", _MOUSEINPUT), ("ki", _KEYBDINPUT), ("hi", _HARDWAREINPUT)]
+
+
+class _INPUT(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_ulong), ("u", _INPUTUNION)]
+
+
+class _POINT(ctypes.Structure):
+    _fields_ = [("x", ctypes.c_long), ("y", ctypes.c_long)]
+
+
+class SendInputBackend(InjectionBackend):
+
+    def __init__(self):
+        self.user32 = ctypes.windll.user32
+        try:
+            # Mesmas coordenadas físicas que o mss usa na captura
+            self.user32.SetProcessDPIAware()
+        except Exception:
+            pass
+
+    def cursor_position(self):
+        point = _POINT()
+        if self.user32.GetCursorPos(ctypes.byref(point)):
+            return (point.x, point.y)
+        return None
+
+    def _mouse(self, flags, dx=0, dy=0, data=0):
+        item = _INPUT(type=INPUT_MOUSE)
+        item.u.mi = _MOUSEINPUT(dx, dy, data & 0xFFFFFFFF, flags, 0, 0)
+        return item
+
+    def _key(self, vk, scan, flags):
+        item = _INPUT(type=INPUT_KEYBOARD)
+        item.u.ki = _KEYBDINPUT(vk, scan, flags, 0, 0)
+        return item
+
+    def _key_events(self, key, down):
+        up_flag = 0 if down else KEYEVENTF_KEYUP
+        vk = VK_KEYS.get(key)
+        if vk is not None:
+            extended = KEYEVENTF_EXTENDEDKEY if key in EXTENDED_KEYS else 0
+            return [self._key(vk, 0, extended | up_flag)]
+        if not key or len(key) > 2:
+            log_event(f"Tecla sem mapeamento ignorada: {key!r}", "DEBUG")
+            return []
+        # Caractere literal (inclui maiúsculas/acentos): injeta como Unicode, unidade UTF-16 por unidade
+        units = key.encode("utf-16-le")
+        return [self._key(0, int.from_bytes(units[i:i + 2], "little"), KEYEVENTF_UNICODE | up_flag)
+                for i in range(0, len(units), 2)]
+
+    def inject(self, events):
+        vx = self.user32.GetSystemMetrics(SM_XVIRTUALSCREEN)
+        vy = self.user32.GetSystemMetrics(SM_YVIRTUALSCREEN)
+        vw = max(2, self.user32.GetSystemMetrics(SM_CXVIRTUALSCREEN))
+        vh = max(2, self.user32.GetSystemMetrics(SM_CYVIRTUALSCREEN))
+        inputs = []
+        for event in events:
+            kind = event[0]
+            if kind == "move":
+                dx = round((event[1] - vx) * 65535 / (vw - 1))
+                dy = round((event[2] - vy) * 65535 / (vh - 1))
+                inputs.append(self._mouse(MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE | MOUSEEVENTF_VIRTUALDESK, dx, dy))
+            elif kind == "button":
+                down_flag, up_flag = BUTTON_FLAGS.get(event[1], BUTTON_FLAGS["left"])
+                inputs.append(self._mouse(down_flag if event[2] else up_flag))
+            elif kind == "wheel":
+                inputs.append(self._mouse(MOUSEEVENTF_WHEEL, data=event[1]))
+            elif kind == "key":
+                inputs.extend(self._key_events(event[1], event[2]))
+        if not inputs:
+            return
+        array = (_INPUT * len(inputs))(*inputs)
+        sent = self.user32.SendInput(len(inputs), array, ctypes.sizeof(_INPUT))
+        if sent != len(inputs):
+            log_event(f"SendInput injetou {sent}/{len(inputs)} eventos (UIPI/sessão bloqueada?).", "WARNING")
+
+
+class InputInjector:
+
+    def __init__(self, backend, to_screen, passthrough=None, tick=TICK, name="injector"):
+        """
+        to_screen(data) -> (x, y) em coordenadas de tela para eventos com posição.
+        passthrough(cmd, data): comandos que não são de entrada, executados na ordem da fila (ex: stop_desktop).
+        """
+        self.backend = backend
+        self.to_screen = to_screen
+        self.passthrough = passthrough
+        self.tick = tick
+        self.latency = LatencyStats()
+        self.batches = 0
+        self.events = 0
+        self.skipped_moves = 0
+        self._cursor = None
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"{name}-tick", daemon=True)
+        self._thread.start()
+
+    def submit(self, cmd, data):
+        with self._cond:
+            if self._closed:
+                return False
+            self._items.append((cmd, data, time.time()))
+            self._cond.notify()
+        return True
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _move(self, batch, x, y):
+        if (x, y) == self._cursor:
+            self.skipped_moves += 1
+            return
+        if batch and batch[-1][0] == "move":
+            # Movimento intermediário do mesmo lote não tem efeito visível: fica só o último
+            batch[-1] = ("move", x, y)
+            self.skipped_moves += 1
+        else:
+            batch.append(("move", x, y))
+        self._cursor = (x, y)
+
+    def _translate(self, batch, cmd, data):
+        if cmd == "mouse_move":
+            self._move(batch, *self.to_screen(data))
+        elif cmd in ("mouse_down", "mouse_up"):
+            self._move(batch, *self.to_screen(data))
+            batch.append(("button", data.get("button", "left"), cmd == "mouse_down"))
+        elif cmd == "mouse_scroll":
+            # deltaY > 0 no browser = rolar para baixo = delta negativo no Windows
+            batch.append(("wheel", int(data.get("clicks", 0)) * -WHEEL_DELTA))
+        elif cmd == "key_down":
+            key = data.get("key", "")
+            batch.extend((("key", key, True), ("key", key, False)))
+        else:
+            return False
+        return True
+
+    def _flush(self, batch, pending):
+        if batch:
+            try:
+                self.backend.inject(batch)
+            except Exception as e:
+                log_event(f"Falha na injeção de entrada ({len(batch)} eventos): {e}", "ERROR")
+                # Estado do cursor desconhecido após falha: a próxima posição é reinjetada
+                self._cursor = None
+            self.batches += 1
+            self.events += len(batch)
+        now = time.time()
+        for cmd, data, submitted in pending:
+            self.latency.record(cmd, now - (data.get("ts") or submitted))
+        batch.clear()
+        pending.clear()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._items and not self._closed:
+                    self._cond.wait()
+                if not self._items:
+                    return
+                items = list(self._items)
+                self._items.clear()
+            started = time.monotonic()
+            cursor = self.backend.cursor_position()
+            if cursor is not None:
+                # Cursor pode ter sido movido localmente: a posição real manda no cache
+                self._cursor = cursor
+            batch, pending = [], []
+            for cmd, data, submitted in items:
+                try:
+                    translated = self._translate(batch, cmd, data)
+                except Exception as e:
+                    log_event(f"Evento de entrada inválido '{cmd}': {e}", "WARNING")
+                    continue
+                if translated:
+                    pending.append((cmd, data, submitted))
+                    continue
+                # Comando de controle: injeta o que veio antes dele e executa na ordem
+                self._flush(batch, pending)
+                if self.passthrough:
+                    try: self.passthrough(cmd, data)
+                    except Exception as e: log_event(f"Falha ao executar '{cmd}' na fila de entrada: {e}", "ERROR")
+            self._flush(batch, pending)
+            # Um lote por tick: o que chegar nesse intervalo vai junto na próxima chamada
+            remaining = self.tick - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+
+    def stats(self):
+        return {"batches": self.batches, "events": self.events, "skippedMoves": self.skipped_moves,
+                "latency": self.latency.snapshot()}
@@ -0,0 +1,177 @@
+"""
+Fila ordenada de eventos de entrada (mouse/teclado) do Remote Desktop.
+
+Uma fila por sessão com um único despachante. Movimentos de mouse consecutivos coalescem na
+última posição (só o mais recente importa) e saem no máximo a `move_rate` por segundo; cliques,
+scroll e teclas nunca são descartados nem reordenados.
+
+A ordem é a do número de sequência da sessão (`seq`, carimbado pelo backend a partir de 1), não a
+de chegada: o cliente Socket.IO roda cada handler numa thread própria, então um mouse_up pode
+chamar put() antes do seu mouse_down. Um evento adiantado fica retido até os anteriores chegarem;
+se o buraco durar mais que `reorder_window` (evento perdido numa reconexão), a fila segue do
+próximo retido. Um evento que chega depois disso já está atrasado: movimento é descartado, o
+resto ainda é despachado (um mouse_up tardio é melhor que um botão preso). Sem `seq`, vale a
+ordem de chegada.
+
+Usada no Core (socket -> IPC) e no Remote (IPC -> injeção), onde também mede o tempo entre a
+chegada do evento ao agente e a injeção (LatencyStats).
+"""
+import time
+import threading
+from collections import deque
+
+from . import log_event
+
+MOVE_RATE = 60.0
+COALESCE_COMMANDS = ("mouse_move",)
+LATENCY_WINDOW = 512
+REORDER_WINDOW = 0.1
+
+
+class InputQueue:
+
+    def __init__(self, dispatch, move_rate=MOVE_RATE, coalesce=COALESCE_COMMANDS, name="input",
+                 reorder_window=REORDER_WINDOW, first_seq=1):
+        """dispatch(cmd, data) é chamado na thread do despachante. move_rate=None desliga o limite de taxa."""
+        self.dispatch = dispatch
+        self.move_interval = 1.0 / move_rate if move_rate else 0.0
+        self.coalesce = set(coalesce)
+        self.reorder_window = reorder_window
+        self.queued = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.reordered = 0
+        self.skipped = 0
+        self.late = 0
+        self._items = deque()
+        self._held = {}
+        self._next_seq = first_seq
+        self._gap_since = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._next_move_at = 0.0
+        self._thread = threading.Thread(target=self._run, name=f"{name}-dispatcher", daemon=True)
+        self._thread.start()
+
+    def put(self, cmd, data, seq=None):
+        with self._cond:
+            if self._closed:
+                return False
+            self.queued += 1
+            if seq is None:
+                self._enqueue(cmd, data)
+            elif seq < self._next_seq:
+                self.late += 1
+                if cmd not in self.coalesce:
+                    self._enqueue(cmd, data)
+            else:
+                if seq > self._next_seq:
+                    self.reordered += 1
+                self._held[seq] = (cmd, data)
+                self._release()
+            self._cond.notify()
+        return True
+
+    def _enqueue(self, cmd, data):
+        if cmd in self.coalesce and self._items and self._items[-1][0] == cmd:
+            # Substitui o movimento ainda não despachado pela posição mais nova
+            self._items[-1] = (cmd, data)
+            self.coalesced += 1
+        else:
+            self._items.append((cmd, data))
+
+    def _release(self):
+        """Passa para a fila os retidos que já estão na vez (chamado com o lock)."""
+        while self._next_seq in self._held:
+            self._enqueue(*self._held.pop(self._next_seq))
+            self._next_seq += 1
+        if not self._held:
+            self._gap_since = None
+        elif self._gap_since is None:
+            self._gap_since = time.monotonic()
+
+    def _gap_wait(self):
+        """Segundos até desistir do buraco na sequência; None se nada está retido."""
+        if not self._held:
+            return None
+        remaining = self._gap_since + self.reorder_window - time.monotonic()
+        if remaining > 0 and not self._closed:
+            return remaining
+        # Evento perdido (ou sessão encerrada): segue do próximo retido
+        first = min(self._held)
+        self.skipped += first - self._next_seq
+        self._next_seq = first
+        self._gap_since = None
+        self._release()
+        return self._gap_wait()
+
+    def close(self):
+        """Encerra a sessão: o que já está na fila ainda é despachado, nada novo entra."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _next(self):
+        with self._cond:
+            while True:
+                gap_wait = self._gap_wait()
+                if not self._items:
+                    if self._closed and gap_wait is None:
+                        return None
+                    self._cond.wait(gap_wait)
+                    continue
+                cmd, data = self._items[0]
+                if cmd in self.coalesce and self.move_interval:
+                    wait = self._next_move_at - time.monotonic()
+                    if wait > 0:
+                        # Enquanto espera, movimentos novos coalescem neste mesmo item
+                        self._cond.wait(wait)
+                        continue
+                    self._next_move_at = time.monotonic() + self.move_interval
+                return self._items.popleft()
+
+    def _run(self):
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            try:
+                self.dispatch(*item)
+                self.dispatched += 1
+            except Exception as e:
+                log_event(f"Falha ao despachar evento de entrada '{item[0]}': {e}", "WARNING")
+
+    def stats(self):
+        with self._cond:
+            return {"queued": self.queued, "coalesced": self.coalesced, "dispatched": self.dispatched,
+                    "reordered": self.reordered, "skipped": self.skipped, "late": self.late,
+                    "pending": len(self._items) + len(self._held)}
+
+
+class LatencyStats:
+    """Contadores de latência (chegada -> injeção) por tipo de evento, sobre as últimas amostras."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+
+    def record(self, kind, seconds):
+        with self._lock:
+            samples = self._samples.setdefault(kind, deque(maxlen=self.window))
+            samples.append(seconds)
+            self._counts[kind] = self._counts.get(kind, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            result = {}
+            for kind, samples in self._samples.items():
+                ordered = sorted(samples)
+                result[kind] = {
+                    "count": self._counts[kind],
+                    "avg_ms": round(1000 * sum(ordered) / len(ordered), 2),
+                    "p95_ms": round(1000 * ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 2),
+                    "max_ms": round(1000 * ordered[-1], 2),
+                }
+            return result
@@ -0,0 +1,113 @@
+"""
+Diff estrutural do inventário contra o último snapshot reconhecido pelo servidor.
+
+Formato das operações (espelhado em backend/src/services/inventoryDeltaService.js):
+  {"op": "set",  "path": [..chaves..], "value": v}      -> chave nova/alterada (path [] troca a raiz)
+  {"op": "del",  "path": [..chaves..]}                  -> chave removida
+  {"op": "list", "path": [..chaves..], "add": [...], "remove": [...]}
+      -> multiconjunto: remove a primeira ocorrência de cada item e anexa os novos no fim
+
+Listas de inventário (software, discos, GPOs) são conjuntos, então a ordem final pode
+diferir da coleta. Por isso o hash enviado é sempre o do documento *aplicado*
+(apply_ops sobre o snapshot), que é exatamente o que o servidor passa a guardar.
+"""
+import copy
+import hashlib
+import json
+
+
+def canonical(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def content_hash(value):
+    return hashlib.sha256(canonical(value).encode("utf-8")).hexdigest()
+
+
+def _same(old, new):
+    """Igualdade como no JSON (e no hash): 1 == 1.0 == True no Python, mas não serializados."""
+    return old == new and canonical(old) == canonical(new)
+
+
+def _diff_list(old, new, path):
+    pending = {}
+    for item in old:
+        key = canonical(item)
+        pending.setdefault(key, []).append(item)
+    add = []
+    for item in new:
+        key = canonical(item)
+        if pending.get(key):
+            pending[key].pop()
+        else:
+            add.append(item)
+    remove = [item for items in pending.values() for item in items]
+    if not add and not remove:
+        return []
+    # Se a lista mudou quase toda, mandar o valor inteiro sai mais barato
+    if len(add) + len(remove) >= len(new):
+        return [{"op": "set", "path": list(path), "value": new}]
+    return [{"op": "list", "path": list(path), "add": add, "remove": remove}]
+
+
+def diff(old, new, path=()):
+    """Gera as operações que transformam old em new (chaves de dict recursivas, listas como multiconjunto)."""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "del", "path": list(path) + [key]})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "set", "path": list(path) + [key], "value": value})
+            elif not _same(old[key], value):
+                ops.extend(diff(old[key], value, tuple(path) + (key,)))
+        return ops
+    if isinstance(old, list) and isinstance(new, list):
+        return _diff_list(old, new, path)
+    if old == new and type(old) == type(new):
+        return []
+    return [{"op": "set", "path": list(path), "value": new}]
+
+
+def apply_ops(document, ops):
+    """Aplica as operações sobre uma cópia do documento. Levanta ValueError se o caminho não existir."""
+    result = copy.deepcopy(document)
+    for op in ops:
+        path = op.get("path") or []
+        kind = op.get("op")
+        if not path:
+            if kind != "set":
+                raise ValueError(f"Operação '{kind}' inválida na raiz")
+            result = copy.deepcopy(op.get("value"))
+            continue
+
+        parent = result
+        for key in path[:-1]:
+            if not isinstance(parent, dict) or key not in parent:
+                raise ValueError(f"Caminho inexistente: {path}")
+            parent = parent[key]
+        if not isinstance(parent, dict):
+            raise ValueError(f"Caminho inexistente: {path}")
+        leaf = path[-1]
+
+        if kind == "set":
+            parent[leaf] = copy.deepcopy(op.get("value"))
+        elif kind == "del":
+            parent.pop(leaf, None)
+        elif kind == "list":
+            current = parent.get(leaf)
+            if not isinstance(current, list):
+                raise ValueError(f"Caminho não é lista: {path}")
+            current = list(current)
+            for item in op.get("remove", []):
+                key = canonical(item)
+                for i, existing in enumerate(current):
+                    if canonical(existing) == key:
+                        del current[i]
+                        break
+            current.extend(copy.deepcopy(op.get("add", [])))
+            parent[leaf] = current
+        else:
+            raise ValueError(f"Operação desconhecida: {kind}")
+    return result
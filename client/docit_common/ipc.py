@@ -0,0 +1,615 @@
+"""
+Canal IPC persistente e multiplexado entre o Core e os submódulos.
+
+Cada módulo mantém UMA conexão de longa duração com o Core. Pedidos (com msg_id),
+respostas e eventos unidirecionais trafegam pelo mesmo canal, em quadros com
+prefixo de tamanho:
+
+    [u32 tamanho][u8 tipo][u32 msg_id][u32 json_len][json][blob]
+
+O cabeçalho JSON carrega o payload de sempre ({"action"/"cmd", "data"}); o blob
+opcional carrega bytes crus (ex: frames) sem passar por base64.
+
+O transporte fica atrás de IPCTransport: Named Pipes no Windows (overlapped, para
+permitir leitura e escrita simultâneas no mesmo handle) e Unix Domain Sockets no
+Linux, usado para testes de carga do protocolo.
+"""
+import os
+import sys
+import json
+import time
+import struct
+import socket
+import threading
+import itertools
+
+from . import log_event
+
+try:
+    import ctypes
+    import win32file
+    import win32pipe
+    import win32event
+    import pywintypes
+except ImportError:
+    pass
+
+
+KIND_REQUEST = 1
+KIND_RESPONSE = 2
+KIND_EVENT = 3
+
+_HEADER = struct.Struct("!IBII")
+_PREFIX = struct.Struct("!I")
+MAX_MESSAGE_SIZE = 32 * 1024 * 1024
+
+ERROR_IO_PENDING = 997
+ERROR_PIPE_CONNECTED = 535
+ERROR_PIPE_BUSY = 231
+ERROR_BROKEN_PIPE = 109
+ERROR_NO_DATA = 232
+
+
+class IPCError(Exception):
+    pass
+
+
+class IPCConnectionClosed(IPCError):
+    pass
+
+
+class IPCTimeout(IPCError):
+    pass
+
+
+def encode_frame(kind, msg_id, message, blob=b""):
+    header_json = json.dumps(message, ensure_ascii=False).encode("utf-8") if message is not None else b""
+    blob = blob or b""
+    total = _HEADER.size - _PREFIX.size + len(header_json) + len(blob)
+    return b"".join((_HEADER.pack(total, kind, msg_id, len(header_json)), header_json, blob))
+
+
+def read_frame(stream):
+    """Lê um quadro completo do stream. Retorna (kind, msg_id, message, blob)."""
+    total, kind, msg_id, json_len = _HEADER.unpack(stream.read_exactly(_HEADER.size))
+    offset = _HEADER.size - _PREFIX.size
+    if total > MAX_MESSAGE_SIZE or total < offset + json_len:
+        raise IPCError(f"Quadro IPC com tamanho inválido: {total}")
+    message = json.loads(stream.read_exactly(json_len).decode("utf-8")) if json_len else None
+    # Blob lido direto em um objeto próprio (sem fatiar o corpo inteiro): frames de tela não são copiados de novo
+    blob_len = total - offset - json_len
+    blob = stream.read_exactly(blob_len) if blob_len else b""
+    return kind, msg_id, message, blob
+
+
+# =========================================================
+# TRANSPORTES
+# =========================================================
+
+class IPCStream:
+    """Interface de um stream bidirecional de bytes já conectado."""
+
+    # True quando write() já entrega os quadros inteiros e em ordem (ex: stream de event loop)
+    serializes_writes = False
+
+    def read_exactly(self, n):
+        raise NotImplementedError
+
+    def write(self, data):
+        raise NotImplementedError
+
+    def peer_pid(self):
+        return None
+
+    def close(self):
+        raise NotImplementedError
+
+
+class IPCTransport:
+    """Interface de transporte: cria listeners (lado Core) e conecta clientes (submódulos)."""
+
+    def listen(self):
+        raise NotImplementedError
+
+    def connect(self, timeout=1.0):
+        raise NotImplementedError
+
+
+class SocketStream(IPCStream):
+    def __init__(self, sock):
+        self.sock = sock
+
+    def read_exactly(self, n):
+        chunks = []
+        remaining = n
+        while remaining:
+            try:
+                chunk = self.sock.recv(min(remaining, 1024 * 1024))
+            except OSError as e:
+                raise IPCConnectionClosed(str(e))
+            if not chunk:
+                raise IPCConnectionClosed("Peer encerrou a conexão")
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return b"".join(chunks)
+
+    def write(self, data):
+        try:
+            self.sock.sendall(data)
+        except OSError as e:
+            raise IPCConnectionClosed(str(e))
+
+    def peer_pid(self):
+        try:
+            creds = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+            return struct.unpack("3i", creds)[0]
+        except Exception:
+            return None
+
+    def close(self):
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except: pass
+        try: self.sock.close()
+        except: pass
+
+
+class UnixSocketListener:
+    def __init__(self, path):
+        self.path = path
+        try: os.unlink(path)
+        except FileNotFoundError: pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen(64)
+
+    def accept(self):
+        conn, _ = self.sock.accept()
+        return SocketStream(conn)
+
+    def close(self):
+        try: self.sock.close()
+        except: pass
+        try: os.unlink(self.path)
+        except: pass
+
+
+class UnixSocketTransport(IPCTransport):
+    """Backend Unix Domain Socket (Linux/macOS) para testes de carga do protocolo."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def listen(self):
+        return UnixSocketListener(self.path)
+
+    def connect(self, timeout=1.0):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(self.path)
+        except OSError as e:
+            sock.close()
+            raise IPCConnectionClosed(f"Falha ao conectar em {self.path}: {e}")
+        sock.settimeout(None)
+        return SocketStream(sock)
+
+
+class NamedPipeStream(IPCStream):
+    """Handle de Named Pipe em modo overlapped (leitura e escrita concorrentes no mesmo handle)."""
+
+    def __init__(self, handle, is_server):
+        self.handle = handle
+        self.is_server = is_server
+        self._rbuf = bytearray()
+        self._read_buffer = win32file.AllocateReadBuffer(65536)
+        self._read_ov = pywintypes.OVERLAPPED()
+        self._read_ov.hEvent = win32event.CreateEvent(None, True, False, None)
+        self._write_ov = pywintypes.OVERLAPPED()
+        self._write_ov.hEvent = win32event.CreateEvent(None, True, False, None)
+        self._closed = False
+
+    def _read_some(self):
+        try:
+            win32file.ReadFile(self.handle, self._read_buffer, self._read_ov)
+            n = win32file.GetOverlappedResult(self.handle, self._read_ov, True)
+        except pywintypes.error as e:
+            raise IPCConnectionClosed(f"Pipe encerrado na leitura: {e}")
+        if n == 0 and self._closed:
+            raise IPCConnectionClosed("Pipe encerrado")
+        return bytes(self._read_buffer[:n])
+
+    def read_exactly(self, n):
+        while len(self._rbuf) < n:
+            self._rbuf += self._read_some()
+        data = bytes(self._rbuf[:n])
+        del self._rbuf[:n]
+        return data
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            try:
+                win32file.WriteFile(self.handle, view, self._write_ov)
+                n = win32file.GetOverlappedResult(self.handle, self._write_ov, True)
+            except pywintypes.error as e:
+                raise IPCConnectionClosed(f"Pipe encerrado na escrita: {e}")
+            view = view[n:]
+
+    def peer_pid(self):
+        try:
+            pid = ctypes.c_ulong(0)
+            fn = ctypes.windll.kernel32.GetNamedPipeClientProcessId if self.is_server else ctypes.windll.kernel32.GetNamedPipeServerProcessId
+            if not fn(int(self.handle), ctypes.byref(pid)) or pid.value == 0:
+                return None
+            return pid.value
+        except Exception:
+            return None
+
+    def close(self):
+        if self._closed: return
+        self._closed = True
+        try: ctypes.windll.kernel32.CancelIoEx(int(self.handle), None)
+        except: pass
+        if self.is_server:
+            try: win32pipe.DisconnectNamedPipe(self.handle)
+            except: pass
+        try: win32file.CloseHandle(self.handle)
+        except: pass
+
+
+class NamedPipeListener:
+    def __init__(self, pipe_name, security_attributes=None):
+        self.pipe_name = pipe_name
+        self.security_attributes = security_attributes
+        self._closed = False
+
+    def accept(self):
+        while not self._closed:
+            pipe = win32pipe.CreateNamedPipe(
+                self.pipe_name,
+                win32pipe.PIPE_ACCESS_DUPLEX | win32file.FILE_FLAG_OVERLAPPED,
+                win32pipe.PIPE_TYPE_BYTE | win32pipe.PIPE_READMODE_BYTE | win32pipe.PIPE_WAIT,
+                win32pipe.PIPE_UNLIMITED_INSTANCES, 65536, 65536,
+                0,
+                self.security_attributes
+            )
+            ov = pywintypes.OVERLAPPED()
+            ov.hEvent = win32event.CreateEvent(None, True, False, None)
+            try:
+                rc = win32pipe.ConnectNamedPipe(pipe, ov)
+                if rc == ERROR_IO_PENDING:
+                    win32file.GetOverlappedResult(pipe, ov, True)
+                return NamedPipeStream(pipe, is_server=True)
+            except pywintypes.error as e:
+                if e.winerror == ERROR_PIPE_CONNECTED:
+                    return NamedPipeStream(pipe, is_server=True)
+                try: win32file.CloseHandle(pipe)
+                except: pass
+                if e.winerror != ERROR_NO_DATA: # Cliente desistiu antes do aceite: apenas recicla a instância
+                    raise
+        raise IPCConnectionClosed("Listener encerrado")
+
+    def close(self):
+        self._closed = True
+
+
+class NamedPipeTransport(IPCTransport):
+    """Backend Named Pipe (Windows), com a ACL definida pelo servidor."""
+
+    def __init__(self, pipe_name, security_attributes=None):
+        self.pipe_name = pipe_name
+        self.security_attributes = security_attributes
+
+    def listen(self):
+        return NamedPipeListener(self.pipe_name, self.security_attributes)
+
+    def connect(self, timeout=1.0):
+        deadline = time.time() + timeout
+        while True:
+            try:
+                handle = win32file.CreateFile(
+                    self.pipe_name,
+                    win32file.GENERIC_READ | win32file.GENERIC_WRITE,
+                    0, None,
+                    win32file.OPEN_EXISTING,
+                    win32file.FILE_FLAG_OVERLAPPED, None
+                )
+                return NamedPipeStream(handle, is_server=False)
+            except pywintypes.error as e:
+                remaining_ms = int((deadline - time.time()) * 1000)
+                if e.winerror != ERROR_PIPE_BUSY or remaining_ms <= 0:
+                    raise IPCConnectionClosed(f"Falha ao conectar em {self.pipe_name}: {e}")
+                try: win32pipe.WaitNamedPipe(self.pipe_name, remaining_ms)
+                except: pass
+
+
+def make_transport(pipe_name, security_attributes=None):
+    """Named Pipe no Windows; no Linux mapeia o mesmo nome para um Unix Socket em /tmp."""
+    if sys.platform == "win32":
+        return NamedPipeTransport(pipe_name, security_attributes)
+    base_name = pipe_name.replace("\\", "/").rstrip("/").split("/")[-1]
+    return UnixSocketTransport(os.path.join(os.environ.get("DOCIT_IPC_DIR", "/tmp"), f"{base_name}.sock"))
+
+
+# =========================================================
+# CONEXÃO MULTIPLEXADA
+# =========================================================
+
+class IPCConnection:
+    """
+    Uma conexão persistente. Uma thread leitora despacha respostas para quem as aguarda
+    e entrega pedidos/eventos ao handler(conn, message, blob). O retorno do handler para
+    um pedido vira a resposta (mesmo msg_id).
+    """
+
+    def __init__(self, stream, handler=None, name="ipc"):
+        self.stream = stream
+        self.handler = handler
+        self.name = name
+        self.module = None
+        self.peer_pid = None
+        self.closed = False
+        self._write_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._on_close = []
+        self._reader = None
+
+    def start(self):
+        self._reader = threading.Thread(target=self._reader_loop, name=f"{self.name}-reader", daemon=True)
+        self._reader.start()
+        return self
+
+    def on_close(self, callback):
+        self._on_close.append(callback)
+
+    def _write(self, kind, msg_id, message, blob=b""):
+        frame = encode_frame(kind, msg_id, message, blob)
+        if getattr(self.stream, "serializes_writes", False):
+            # Sem lock: a thread do loop nunca espera uma thread que aguarda o próprio loop
+            self._write_frame(frame)
+            return
+        with self._write_lock:
+            self._write_frame(frame)
+
+    def _write_frame(self, frame):
+        if self.closed:
+            raise IPCConnectionClosed("Conexão IPC encerrada")
+        try:
+            self.stream.write(frame)
+        except IPCError:
+            self.close()
+            raise
+
+    def send_event(self, message, blob=b""):
+        """Envio unidirecional. Retorna False se o canal caiu (o chamador decide se descarta)."""
+        try:
+            self._write(KIND_EVENT, 0, message, blob)
+            return True
+        except IPCError:
+            return False
+
+    def request(self, message, timeout=5.0, blob=b""):
+        msg_id = next(self._ids)
+        waiter = [threading.Event(), None, None]
+        with self._pending_lock:
+            self._pending[msg_id] = waiter
+        try:
+            self._write(KIND_REQUEST, msg_id, message, blob)
+            if not waiter[0].wait(timeout):
+                raise IPCTimeout(f"Sem resposta IPC em {timeout}s para {message.get('action') or message.get('cmd')}")
+            if waiter[1] is None and self.closed:
+                raise IPCConnectionClosed("Conexão IPC encerrada aguardando resposta")
+            return waiter[1]
+        finally:
+            with self._pending_lock:
+                self._pending.pop(msg_id, None)
+
+    def reply(self, msg_id, message, blob=b""):
+        try:
+            self._write(KIND_RESPONSE, msg_id, message, blob)
+            return True
+        except IPCError:
+            return False
+
+    def resolve(self, kind, msg_id, message, blob):
+        """Entrega uma resposta a quem a aguarda. Retorna False se o quadro não for resposta."""
+        if kind != KIND_RESPONSE:
+            return False
+        with self._pending_lock:
+            waiter = self._pending.get(msg_id)
+        if waiter:
+            waiter[1], waiter[2] = message, blob
+            waiter[0].set()
+        return True
+
+    def _reader_loop(self):
+        try:
+            while not self.closed:
+                kind, msg_id, message, blob = read_frame(self.stream)
+                if not self.resolve(kind, msg_id, message, blob):
+                    self.dispatch(kind, msg_id, message, blob)
+        except IPCError:
+            pass
+        except Exception as e:
+            log_event(f"Erro no leitor IPC ({self.name}): {e}", "ERROR")
+        finally:
+            self.close()
+
+    def dispatch(self, kind, msg_id, message, blob):
+        """Executa o handler no thread leitor (ordem preservada por conexão)."""
+        reply = None
+        try:
+            if self.handler:
+                reply = self.handler(self, message, blob)
+        except Exception as e:
+            log_event(f"Erro no handler IPC ({self.name}): {e}", "ERROR")
+            reply = {"status": "error", "message": str(e)}
+        if kind == KIND_REQUEST:
+            self.reply(msg_id, reply if reply is not None else {"status": "success"})
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        self.stream.close()
+        with self._pending_lock:
+            for waiter in self._pending.values():
+                waiter[0].set()
+        for callback in self._on_close:
+            try: callback(self)
+            except: pass
+
+
+class IPCServer:
+    """
+    Servidor do Core: aceita conexões persistentes, valida o processo par UMA vez por conexão
+    (authorize(stream) -> bool) e registra cada conexão pelo módulo anunciado no 'hello'.
+    """
+
+    def __init__(self, transport, handler, authorize=None, name="core-ipc"):
+        self.transport = transport
+        self.handler = handler
+        self.authorize = authorize
+        self.name = name
+        self.modules = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def serve_forever(self):
+        while True:
+            try:
+                if self._listener is None:
+                    self._listener = self.transport.listen()
+                stream = self._listener.accept()
+            except Exception as e:
+                log_event(f"Erro aceitando conexão IPC ({self.name}): {e}", "ERROR")
+                self._listener = None
+                time.sleep(1)
+                continue
+            try:
+                self._on_accept(stream)
+            except Exception as e:
+                log_event(f"Erro inicializando conexão IPC ({self.name}): {e}", "ERROR")
+                stream.close()
+
+    def _on_accept(self, stream):
+        if self.authorize and not self.authorize(stream):
+            stream.close()
+            return
+        conn = IPCConnection(stream, self._handle, name=self.name)
+        conn.peer_pid = stream.peer_pid()
+        conn.on_close(self._forget)
+        self.start_connection(conn)
+
+    def start_connection(self, conn):
+        conn.start()
+
+    def _handle(self, conn, message, blob):
+        if message and message.get("action") == "hello":
+            self.register(conn, message.get("module"))
+            return {"status": "success"}
+        return self.handler(conn, message, blob)
+
+    def register(self, conn, module):
+        conn.module = module
+        with self._lock:
+            previous = self.modules.get(module)
+            self.modules[module] = conn
+        if previous is not None and previous is not conn:
+            previous.close()
+
+    def _forget(self, conn):
+        with self._lock:
+            if conn.module and self.modules.get(conn.module) is conn:
+                del self.modules[conn.module]
+
+    def connection(self, module):
+        with self._lock:
+            conn = self.modules.get(module)
+        return conn if conn is not None and not conn.closed else None
+
+    def send_to(self, module, message, blob=b""):
+        conn = self.connection(module)
+        return conn.send_event(message, blob) if conn else False
+
+    def request_to(self, module, message, timeout=5.0):
+        conn = self.connection(module)
+        if not conn:
+            raise IPCConnectionClosed(f"Módulo '{module}' não está conectado ao Core")
+        return conn.request(message, timeout)
+
+
+class IPCClient:
+    """
+    Lado do submódulo: mantém a conexão persistente com o Core, reconectando sob demanda.
+    Depois de cada conexão envia o 'hello' com o nome do módulo e, se informado,
+    valida o processo servidor com authorize(stream).
+    """
+
+    def __init__(self, transport, module, handler=None, authorize=None, connect_timeout=1.0, retry_interval=0.5):
+        self.transport = transport
+        self.module = module
+        self.handler = handler
+        self.authorize = authorize
+        self.connect_timeout = connect_timeout
+        self.retry_interval = retry_interval
+        self._conn = None
+        self._lock = threading.Lock()
+        self._next_attempt = 0
+
+    @property
+    def connected(self):
+        return self._conn is not None and not self._conn.closed
+
+    def connect(self, timeout=None):
+        """Garante a conexão. Retorna a IPCConnection ou None (sem bloquear em rajadas de falha)."""
+        conn = self._conn
+        if conn is not None and not conn.closed:
+            return conn
+        with self._lock:
+            conn = self._conn
+            if conn is not None and not conn.closed:
+                return conn
+            if time.time() < self._next_attempt:
+                return None
+            try:
+                stream = self.transport.connect(timeout if timeout is not None else self.connect_timeout)
+            except IPCError:
+                self._next_attempt = time.time() + self.retry_interval
+                return None
+            if self.authorize and not self.authorize(stream):
+                stream.close()
+                self._next_attempt = time.time() + self.retry_interval
+                return None
+            conn = IPCConnection(stream, self.handler, name=f"{self.module}-ipc").start()
+            try:
+                conn.request({"action": "hello", "module": self.module}, timeout=5.0)
+            except IPCError as e:
+                log_event(f"Handshake IPC falhou para '{self.module}': {e}", "WARNING")
+                conn.close()
+                self._next_attempt = time.time() + self.retry_interval
+                return None
+            self._conn = conn
+            return conn
+
+    def send_event(self, message, blob=b""):
+        conn = self.connect()
+        return conn.send_event(message, blob) if conn else False
+
+    def request(self, message, timeout=5.0):
+        conn = self.connect(timeout)
+        if not conn:
+            raise IPCConnectionClosed(f"Core indisponível para '{self.module}'")
+        return conn.request(message, timeout)
+
+    def wait_closed(self, poll_interval=1.0):
+        """Bloqueia enquanto a conexão atual estiver aberta (laço principal de módulos passivos)."""
+        while self.connected:
+            time.sleep(poll_interval)
+
+    def close(self):
+        with self._lock:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,325 @@
+"""
+Front-end IPC do Core sobre um event loop asyncio, com concorrência limitada.
+
+Aceite, leitura e escrita de todas as conexões rodam no próprio loop, com I/O não bloqueante:
+  - Windows: o pipe é criado por nós (win32pipe, com a DACL customizada e FILE_FLAG_OVERLAPPED)
+    e entregue ao proactor (IOCP) do loop, que faz ConnectNamedPipe/ReadFile/WriteFile
+    overlapped. O asyncio não tem API pública para pipes com DACL própria: usamos o mesmo
+    IocpProactor (accept_pipe/recv/send) que ele usa nos próprios pipes.
+  - Linux (testes de carga): Unix socket não bloqueante com sock_accept/sock_recv/sock_sendall.
+Nenhuma thread fica presa a uma conexão: o custo de uma conexão ociosa é uma corrotina.
+
+Ações rápidas (a maioria: frames, saída de terminal, get_config) rodam no loop, na ordem de
+chegada de cada conexão; não podem bloquear. Ações marcadas como bloqueantes (ex:
+inventory_ready, que faz check-in na rede) vão para um pool de trabalho pequeno, com fila
+limitada. Com a fila cheia:
+  - pedidos recebem {"status": "busy"} na hora;
+  - eventos param a leitura daquela conexão até abrir vaga, o pipe enche e o produtor sente
+    a contrapressão na própria escrita.
+
+Escritas vindas de outras threads (respostas do pool, comandos do Socket.IO) são entregues ao
+loop e esperam o envio (contrapressão e erro síncronos); escritas do próprio loop só são
+enfileiradas. Em ambos os casos a ordem é a da chamada.
+"""
+import sys
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import log_event
+from . import ipc
+
+try:
+    import ctypes
+    import win32file
+    import win32pipe
+    from asyncio.windows_utils import PipeHandle
+except ImportError:
+    pass
+
+READ_CHUNK = 65536
+
+
+class LoopStream(ipc.IPCStream):
+    """Stream cujo I/O roda no event loop; write() pode ser chamado de qualquer thread."""
+
+    # As escritas já saem em ordem pelo loop: IPCConnection não precisa do lock de escrita
+    serializes_writes = True
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.closed = False
+        self._rbuf = bytearray()
+        self._send_lock = None
+
+    async def _recv(self):
+        raise NotImplementedError
+
+    async def _send_all(self, data):
+        raise NotImplementedError
+
+    async def read_exactly_async(self, n):
+        while len(self._rbuf) < n:
+            try:
+                chunk = await self._recv()
+            except (OSError, asyncio.CancelledError) as e:
+                raise ipc.IPCConnectionClosed(f"Conexão encerrada na leitura: {e}")
+            if not chunk:
+                raise ipc.IPCConnectionClosed("Peer encerrou a conexão")
+            self._rbuf += chunk
+        data = bytes(self._rbuf[:n])
+        del self._rbuf[:n]
+        return data
+
+    async def _send(self, data):
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        async with self._send_lock:
+            if self.closed:
+                raise ipc.IPCConnectionClosed("Conexão IPC encerrada")
+            try:
+                await self._send_all(data)
+            except OSError as e:
+                self.close()
+                raise ipc.IPCConnectionClosed(f"Conexão encerrada na escrita: {e}")
+
+    def _on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def write(self, data):
+        if self.closed:
+            raise ipc.IPCConnectionClosed("Conexão IPC encerrada")
+        if self._on_loop():
+            # Caminho rápido rodando no loop: só enfileira (esperar aqui travaria o loop)
+            task = self.loop.create_task(self._send(data))
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._send(data), self.loop).result()
+        except RuntimeError as e:
+            raise ipc.IPCConnectionClosed(f"Loop IPC encerrado: {e}")
+
+    def read_exactly(self, n):
+        raise ipc.IPCError("LoopStream só é lido pelo loop (read_exactly_async).")
+
+
+class PipeLoopStream(LoopStream):
+    """Instância de Named Pipe conectada, com I/O overlapped pelo proactor do loop."""
+
+    def __init__(self, loop, handle):
+        super().__init__(loop)
+        self.handle = handle
+
+    async def _recv(self):
+        return await self.loop._proactor.recv(self.handle, READ_CHUNK)
+
+    async def _send_all(self, data):
+        view = memoryview(data)
+        while view:
+            sent = await self.loop._proactor.send(self.handle, view)
+            view = view[sent:]
+
+    def peer_pid(self):
+        try:
+            pid = ctypes.c_ulong(0)
+            if not ctypes.windll.kernel32.GetNamedPipeClientProcessId(self.handle.handle, ctypes.byref(pid)):
+                return None
+            return pid.value or None
+        except Exception:
+            return None
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        try: win32pipe.DisconnectNamedPipe(self.handle.handle)
+        except Exception: pass
+        try: self.handle.close()  # Fechar o handle cancela o I/O pendente no proactor
+        except Exception: pass
+
+
+class PipeLoopListener:
+
+    def __init__(self, loop, transport):
+        self.loop = loop
+        self.transport = transport
+
+    async def accept(self):
+        while True:
+            pipe = win32pipe.CreateNamedPipe(
+                self.transport.pipe_name,
+                win32pipe.PIPE_ACCESS_DUPLEX | win32file.FILE_FLAG_OVERLAPPED,
+                win32pipe.PIPE_TYPE_BYTE | win32pipe.PIPE_READMODE_BYTE | win32pipe.PIPE_WAIT,
+                win32pipe.PIPE_UNLIMITED_INSTANCES, 65536, 65536,
+                0,
+                self.transport.security_attributes
+            )
+            handle = PipeHandle(pipe.Detach())
+            try:
+                await self.loop._proactor.accept_pipe(handle)
+                return PipeLoopStream(self.loop, handle)
+            except OSError as e:
+                handle.close()
+                if getattr(e, "winerror", None) != ipc.ERROR_NO_DATA:  # Cliente desistiu antes do aceite
+                    raise
+
+    def close(self):
+        pass
+
+
+class SocketLoopStream(LoopStream):
+
+    def __init__(self, loop, sock):
+        super().__init__(loop)
+        self.sock = sock
+
+    async def _recv(self):
+        return await self.loop.sock_recv(self.sock, READ_CHUNK)
+
+    async def _send_all(self, data):
+        await self.loop.sock_sendall(self.sock, data)
+
+    def peer_pid(self):
+        return ipc.SocketStream(self.sock).peer_pid()
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        ipc.SocketStream(self.sock).close()
+
+
+class SocketLoopListener:
+
+    def __init__(self, loop, transport):
+        self.loop = loop
+        self._listener = ipc.UnixSocketListener(transport.path)
+        self._listener.sock.setblocking(False)
+
+    async def accept(self):
+        sock, _ = await self.loop.sock_accept(self._listener.sock)
+        sock.setblocking(False)
+        return SocketLoopStream(self.loop, sock)
+
+    def close(self):
+        self._listener.close()
+
+
+def listen_on_loop(transport, loop):
+    """Listener com aceite não bloqueante no loop para os transportes de docit_common.ipc."""
+    if sys.platform == "win32" and isinstance(transport, ipc.NamedPipeTransport):
+        return PipeLoopListener(loop, transport)
+    if isinstance(transport, ipc.UnixSocketTransport):
+        return SocketLoopListener(loop, transport)
+    raise ipc.IPCError(f"Transporte sem suporte a asyncio: {type(transport).__name__}")
+
+
+async def read_frame_async(stream):
+    """Mesmo formato de ipc.read_frame, lido pelo loop. Retorna (kind, msg_id, message, blob)."""
+    total, kind, msg_id, json_len = ipc._HEADER.unpack(await stream.read_exactly_async(ipc._HEADER.size))
+    offset = ipc._HEADER.size - ipc._PREFIX.size
+    if total > ipc.MAX_MESSAGE_SIZE or total < offset + json_len:
+        raise ipc.IPCError(f"Quadro IPC com tamanho inválido: {total}")
+    body = await stream.read_exactly_async(total - offset)
+    message = json.loads(body[:json_len].decode("utf-8")) if json_len else None
+    return kind, msg_id, message, body[json_len:]
+
+
+class AsyncIPCServer(ipc.IPCServer):
+
+    def __init__(self, transport, handler, authorize=None, name="core-ipc",
+                 blocking_actions=(), max_workers=2, max_queue=8, max_connections=16):
+        super().__init__(transport, handler, authorize, name)
+        self.blocking_actions = set(blocking_actions)
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_connections = max_connections
+        self.loop = None
+        self.active_connections = 0
+        self.stats = {"busy_replies": 0, "refused_connections": 0}
+        self._work_pool = None
+        self._slots = None
+
+    def serve_forever(self):
+        # No Windows o loop padrão é o ProactorEventLoop (IOCP), necessário para os pipes
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._work_pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-work")
+        self._slots = asyncio.Semaphore(self.max_workers + self.max_queue)
+        try:
+            self.loop.run_until_complete(self._accept_loop())
+        finally:
+            self._work_pool.shutdown(wait=False)
+
+    def start(self):
+        """Sobe o loop numa thread dedicada e retorna imediatamente."""
+        threading.Thread(target=self.serve_forever, name=f"{self.name}-loop", daemon=True).start()
+
+    async def _accept_loop(self):
+        while True:
+            try:
+                if self._listener is None:
+                    self._listener = listen_on_loop(self.transport, self.loop)
+                stream = await self._listener.accept()
+            except Exception as e:
+                log_event(f"Erro aceitando conexão IPC ({self.name}): {e}", "ERROR")
+                if self._listener is not None:
+                    self._listener.close()
+                self._listener = None
+                await asyncio.sleep(1)
+                continue
+
+            if self.active_connections >= self.max_connections:
+                self.stats["refused_connections"] += 1
+                log_event(f"IPC ({self.name}): limite de {self.max_connections} conexões atingido. Conexão recusada.", "WARNING")
+                stream.close()
+                continue
+            self.active_connections += 1
+            self.loop.create_task(self._serve_connection(stream))
+
+    async def _serve_connection(self, stream):
+        conn = None
+        try:
+            # Validação do processo par (psutil) uma vez por conexão, fora do loop
+            if self.authorize and not await self.loop.run_in_executor(None, self.authorize, stream):
+                stream.close()
+                return
+            conn = ipc.IPCConnection(stream, self._handle, name=self.name)
+            conn.peer_pid = stream.peer_pid()
+            conn.on_close(self._forget)
+            while not conn.closed:
+                try:
+                    frame = await read_frame_async(stream)
+                except ipc.IPCError:
+                    break
+                if not conn.resolve(*frame):
+                    await self._dispatch(conn, *frame)
+        except Exception as e:
+            log_event(f"Erro na conexão IPC ({self.name}): {e}", "ERROR")
+        finally:
+            if conn is not None:
+                conn.close()
+            else:
+                stream.close()
+            self.active_connections -= 1
+
+    async def _dispatch(self, conn, kind, msg_id, message, blob):
+        action = (message or {}).get("action")
+        if action not in self.blocking_actions:
+            # Caminho rápido: executa no loop, em ordem, na vez desta conexão
+            conn.dispatch(kind, msg_id, message, blob)
+            return
+
+        if self._slots.locked():
+            if kind == ipc.KIND_REQUEST:
+                self.stats["busy_replies"] += 1
+                log_event(f"IPC ({self.name}): fila cheia, '{action}' recusado com busy.", "WARNING")
+                conn.reply(msg_id, {"status": "busy", "message": "Core ocupado. Tente novamente."})
+                return
+            log_event(f"IPC ({self.name}): fila cheia, aplicando contrapressão em '{conn.module}'.", "DEBUG")
+
+        await self._slots.acquire()
+        future = self.loop.run_in_executor(self._work_pool, conn.dispatch, kind, msg_id, message, blob)
+        future.add_done_callback(lambda _: self._slots.release())
@@ -0,0 +1,138 @@
+"""
+Agendador de live queries do osquery (dashboard -> agente).
+
+A query rodava dentro do handler do Socket.IO e segurava a thread de eventos por até 30s,
+atrasando tudo o que chegasse para o agente (inclusive mouse/teclado do Remote Desktop).
+Aqui o handler só enfileira: `max_workers` threads executam as queries (com o pool de
+osquery do mesmo tamanho), cada uma identificada pelo queryId vindo do servidor.
+  - fila limitada: acima de `max_queue` pendentes a query é recusada na hora;
+  - cancel(queryId): se ainda está na fila, nem roda; em andamento, o processo osquery dela é morto.
+O resultado sai em páginas conforme o osqueryi responde, limitadas em linhas e em bytes:
+  {"page": n, "rows": "<array JSON>", "rowCount": k}
+e termina com um resumo {"done": True, "rowCount", "pages", "truncated", "queuedMs", "durationMs"}
+(ou "error"). Os registros chegam do motor como texto JSON e a página só os concatena, sem
+parse/serialização no agente. Acima de `max_rows` linhas a query é interrompida (truncated).
+"""
+import time
+import queue
+import threading
+
+from . import log_event
+from .osquery_pool import CancelToken, QueryCancelled, QueryError, EngineError
+
+MAX_WORKERS = 2
+MAX_QUEUE = 16
+PAGE_ROWS = 500
+PAGE_BYTES = 256 * 1024
+MAX_ROWS = 100000
+
+
+class LiveQueryScheduler:
+
+    def __init__(self, run, report, max_workers=MAX_WORKERS, max_queue=MAX_QUEUE,
+                 page_rows=PAGE_ROWS, page_bytes=PAGE_BYTES, max_rows=MAX_ROWS):
+        """
+        run(query_id, sql, token) -> iterável do texto JSON de cada registro (ex: OsqueryPool.stream).
+        report(query_id, message): entrega cada página e o resumo final.
+        """
+        self.run = run
+        self.report = report
+        self.page_rows = page_rows
+        self.page_bytes = page_bytes
+        self.max_rows = max_rows
+        self.max_workers = max(1, max_workers)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._tokens = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        for index in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"live-query-{index}", daemon=True).start()
+
+    def submit(self, query_id, sql, max_rows=None):
+        """max_rows: limite pedido pelo servidor; vale o menor entre ele e o do agente."""
+        token = CancelToken()
+        with self._lock:
+            if query_id in self._tokens:
+                return False
+            self._tokens[query_id] = token
+        try:
+            limit = min(max_rows, self.max_rows) if max_rows else self.max_rows
+            self._queue.put_nowait((query_id, sql, token, limit, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self._tokens.pop(query_id, None)
+            self.rejected += 1
+            self.report(query_id, {"done": True, "error": "Agente ocupado: fila de live queries cheia. Tente novamente."})
+            return False
+        return True
+
+    def cancel(self, query_id):
+        with self._lock:
+            token = self._tokens.get(query_id)
+        if token is None:
+            return False
+        token.cancel()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._tokens)
+
+    def _send_page(self, query_id, number, rows):
+        self.report(query_id, {"page": number, "rows": "[" + ",".join(rows) + "]", "rowCount": len(rows)})
+
+    def _stream(self, query_id, sql, token, limit):
+        """Pagina o resultado; devolve (linhas, páginas, truncada)."""
+        rows = self.run(query_id, sql, token)
+        page, size, count, pages, truncated = [], 0, 0, 0, False
+        try:
+            for row in rows:
+                if count >= limit:
+                    truncated = True
+                    break
+                page.append(row)
+                size += len(row) + 1
+                count += 1
+                if len(page) >= self.page_rows or size >= self.page_bytes:
+                    self._send_page(query_id, pages, page)
+                    pages += 1
+                    page, size = [], 0
+        finally:
+            close = getattr(rows, "close", None)
+            if close:
+                close()
+        if page:
+            self._send_page(query_id, pages, page)
+            pages += 1
+        return count, pages, truncated
+
+    def _worker(self):
+        while True:
+            query_id, sql, token, limit, queued_at = self._queue.get()
+            started = time.monotonic()
+            message = {"done": True}
+            try:
+                if token.cancelled:
+                    raise QueryCancelled("Consulta cancelada.")
+                count, pages, truncated = self._stream(query_id, sql, token, limit)
+                message.update(rowCount=count, pages=pages, truncated=truncated)
+                self.completed += 1
+            except QueryCancelled:
+                message.update(error="Consulta cancelada.", cancelled=True)
+                self.cancelled += 1
+            except (QueryError, EngineError) as e:
+                message["error"] = str(e)
+            except Exception as e:
+                log_event(f"Falha interna ao processar Live Query {query_id}: {e}", "ERROR")
+                message["error"] = str(e)
+            finally:
+                with self._lock:
+                    self._tokens.pop(query_id, None)
+            message["queuedMs"] = round((started - queued_at) * 1000)
+            message["durationMs"] = round((time.monotonic() - started) * 1000)
+            try:
+                self.report(query_id, message)
+            except Exception as e:
+                log_event(f"Falha ao reportar resultado da Live Query {query_id}: {e}", "ERROR")
@@ -0,0 +1,179 @@
+"""
+Backend de log assíncrono compartilhado pelos módulos do agente.
+
+log() roda na thread de quem chama e só faz o mínimo: compara o nível (mensagens abaixo
+dele são descartadas antes de qualquer formatação) e enfileira numa fila limitada, sem
+bloquear. Uma única thread escritora drena a fila em lotes, mantém o arquivo aberto e
+rotaciona por tamanho ou virada de dia, guardando `backups` arquivos antigos (.1 = mais novo).
+Se a fila encher (disco travado, rajada de erros por frame), as mensagens excedentes são
+contadas e o total descartado é registrado assim que o escritor alcança.
+flush() enfileira um marcador e espera o escritor confirmá-lo: tudo o que entrou antes dele,
+inclusive o lote que o escritor já tinha tirado da fila, está no arquivo quando flush() retorna.
+"""
+import os
+import sys
+import time
+import queue
+import atexit
+import threading
+from datetime import datetime
+
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+MAX_QUEUE = 10000
+MAX_BATCH = 500
+MAX_BYTES = 5 * 1024 * 1024
+BACKUPS = 5
+FLUSH_TIMEOUT = 5.0
+
+
+class AsyncLogWriter:
+
+    def __init__(self, path, tag, level="DEBUG", level_getter=None, echo=False,
+                 max_bytes=MAX_BYTES, backups=BACKUPS, max_queue=MAX_QUEUE):
+        """
+        level_getter: função que devolve o nível mínimo atual (ex: lido do config), consultada a cada log.
+        echo: também imprime no stdout (execução em console).
+        """
+        self.path = path
+        self.tag = tag
+        self.level = level
+        self.level_getter = level_getter
+        self.echo = echo
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._file = None
+        self._file_day = None
+        self._write_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._writer_loop, name=f"log-{tag.lower()}", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def min_level(self):
+        level = self.level
+        if self.level_getter:
+            try:
+                level = self.level_getter() or level
+            except Exception:
+                pass
+        return LOG_LEVELS.get(str(level).upper(), 20)
+
+    def log(self, message, level="INFO"):
+        if LOG_LEVELS.get(level.upper(), 20) < self.min_level():
+            return
+        try:
+            self._queue.put_nowait((time.time(), level, message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _format(self, record):
+        ts, level, message = record
+        timestamp = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+        return f"{timestamp} [{level.upper()}] [{self.tag}] - {message}\n"
+
+    def _open(self):
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            self._file_day = datetime.now().date()
+            if os.path.getsize(self.path) > 0:
+                try:
+                    self._file_day = datetime.fromtimestamp(os.path.getmtime(self.path)).date()
+                except OSError:
+                    pass
+        return self._file
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if os.path.exists(self.path):
+            if self.backups > 0:
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                os.remove(self.path)
+        # Retenção: remove sobras de configurações antigas com mais backups
+        index = self.backups + 1
+        while os.path.exists(f"{self.path}.{index}"):
+            try: os.remove(f"{self.path}.{index}")
+            except OSError: break
+            index += 1
+
+    def _needs_rotation(self):
+        if self._file is None:
+            return False
+        if self._file_day != datetime.now().date():
+            return True
+        return self._file.tell() >= self.max_bytes
+
+    def _write_batch(self, records):
+        lines = [self._format(r) for r in records]
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines.append(self._format((time.time(), "WARNING", f"{dropped} mensagens de log descartadas (fila cheia).")))
+        text = "".join(lines)
+        with self._write_lock:
+            try:
+                if self._needs_rotation():
+                    self._rotate()
+                f = self._open()
+                f.write(text)
+                f.flush()
+            except Exception as e:
+                try: print(f"Falha ao escrever no arquivo de log: {e}")
+                except Exception: pass
+                if self._file is not None:
+                    try: self._file.close()
+                    except Exception: pass
+                    self._file = None
+        if self.echo:
+            try: sys.stdout.write(text)
+            except Exception: pass
+
+    def _drain(self, first=None):
+        items = [first] if first is not None else []
+        while len(items) < MAX_BATCH:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        # Marcadores de flush() (Event) são confirmados depois que o lote foi gravado
+        records = [item for item in items if not isinstance(item, threading.Event)]
+        if records:
+            self._write_batch(records)
+        for item in items:
+            if isinstance(item, threading.Event):
+                item.set()
+        return len(items)
+
+    def _writer_loop(self):
+        while True:
+            try:
+                first = self._queue.get()
+                self._drain(first)
+            except Exception:
+                time.sleep(0.1)
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Grava agora tudo o que já foi logado (antes de sys.exit/os._exit)."""
+        if self._thread.is_alive() and threading.current_thread() is not self._thread:
+            marker = threading.Event()
+            try:
+                self._queue.put(marker, timeout=timeout)
+                if marker.wait(timeout):
+                    return
+            except queue.Full:
+                pass
+        # Escritor parado ou travado: drena nesta thread; o lock espera um lote que ainda esteja sendo gravado
+        while self._drain():
+            pass
+        with self._write_lock:
+            pass
@@ -0,0 +1,545 @@
+"""
+Pool de processos osquery de longa duração, compartilhado por Core (live queries) e Inventory.
+
+Cada `osqueryi.exe --json <sql>` pagava a subida inteira do motor. Aqui o osqueryi fica aberto
+em modo shell (stdin/stdout): a query é escrita no stdin seguida de uma query sentinela, e a
+saída até a sentinela é o resultado JSON. Os processos são reciclados após `max_queries`
+consultas ou acima de `max_memory` bytes de RSS, e descartados se travarem (timeout) ou morrerem.
+
+O resultado é lido em fluxo: o osqueryi imprime uma linha JSON por registro, e stream() devolve
+o texto de cada registro assim que ele chega, sem montar a saída inteira em memória (live queries
+paginadas). query() é o atalho que já devolve as linhas como dicts.
+
+A interface do processo é abstrata (EngineProcess): OsqueryShellProcess é o motor real e
+OsqueryOneShotProcess o modo antigo (um processo por query), usado como reserva se o shell
+não responder no handshake. Testes no Linux podem passar qualquer fábrica que devolva um
+EngineProcess falso.
+"""
+import json
+import time
+import queue
+import threading
+import subprocess
+
+from . import log_event
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+POOL_SIZE = 1
+MAX_QUERIES = 500
+MAX_MEMORY = 256 * 1024 * 1024
+QUERY_TIMEOUT = 30.0
+HANDSHAKE_TIMEOUT = 15.0
+SENTINEL_COLUMN = "__docit_end"
+LINE_BUFFER = 4096
+ERROR_GRACE = 2.0
+CREATE_NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+
+class EngineError(Exception):
+    """Falha do motor (processo morto, timeout, saída ilegível): o processo não deve ser reaproveitado."""
+
+
+class EngineTimeout(EngineError):
+    """A query estourou o tempo: o processo é descartado, mas a query não é refeita."""
+
+
+class QueryCancelled(EngineError):
+    """Cancelada a pedido (osquery:cancel): o processo que a executava foi encerrado."""
+
+
+class QueryError(Exception):
+    """Erro da própria query (SQL inválido, tabela inexistente): o processo continua saudável."""
+
+
+class EngineProcess:
+    """Interface de um processo de motor osquery."""
+
+    pid = None
+
+    def start(self):
+        pass
+
+    def stream(self, sql, timeout=QUERY_TIMEOUT):
+        """Gera o texto JSON de cada registro, na ordem. EngineError ou QueryError em caso de falha."""
+        raise NotImplementedError
+
+    def query(self, sql, timeout=QUERY_TIMEOUT):
+        """Devolve a lista de linhas (dicts)."""
+        return [json.loads(row) for row in self.stream(sql, timeout=timeout)]
+
+    def alive(self):
+        return True
+
+    def memory_bytes(self):
+        return None
+
+    def close(self):
+        pass
+
+    def kill(self):
+        """Interrompe na hora a query em andamento (cancelamento); a query em curso falha com EngineError."""
+        self.close()
+
+
+class CancelToken:
+    """Cancelamento de uma query: antes de começar ela nem roda; em andamento, o motor dela é morto."""
+
+    def __init__(self):
+        self.cancelled = False
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def attach(self, engine):
+        with self._lock:
+            self._engine = engine
+            cancelled = self.cancelled
+        if cancelled:
+            engine.kill()
+
+    def detach(self):
+        with self._lock:
+            self._engine = None
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled = True
+            engine = self._engine
+        if engine is not None:
+            try: engine.kill()
+            except Exception: pass
+
+
+class RowScanner:
+    """
+    Separa a saída do osqueryi --json em registros. O formato é "[", um registro por linha
+    (separados por vírgula) e "]"; qualquer outra linha é mensagem do shell (ex: erro de SQL).
+    Se a saída vier formatada em várias linhas, finish() faz o parse do texto acumulado.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.other = []
+        self._text = []
+
+    def feed(self, line):
+        """Devolve o texto do registro contido na linha, ou None."""
+        text = line.strip()
+        if text.endswith(","):
+            text = text[:-1]
+        if text.startswith("{") and text.endswith("}"):
+            self.rows += 1
+            return text
+        self._text.append(line)
+        if text and text not in ("[", "]", "[]"):
+            self.other.append(line)
+        return None
+
+    def finish(self):
+        """Registros que sobraram no texto não reconhecido; QueryError se ele não for JSON."""
+        if not self.other:
+            return []
+        if self.rows:
+            return []
+        output = "".join(self._text).strip()
+        if output.endswith("[") and len(output) > 1:
+            # "[" da sentinela do modo shell, que vem logo depois do resultado
+            output = output[:-1]
+        try:
+            rows = json.loads(output)
+        except ValueError:
+            # Texto fora de JSON no lugar do resultado: mensagem de erro do shell (ex: "Error: no such table")
+            raise QueryError("".join(self.other).strip())
+        return [json.dumps(row, ensure_ascii=False) for row in (rows if isinstance(rows, list) else [rows])]
+
+
+def flatten_sql(sql):
+    """
+    SQL em uma linha só para o shell: remove comentários (-- até o fim da linha e /* */) fora de
+    literais, porque um "--" achatado engoliria o ";" e a sentinela. Sem ";" no final.
+    """
+    out = []
+    i, n = 0, len(sql)
+    quote = None
+    while i < n:
+        ch = sql[i]
+        if quote:
+            out.append(ch)
+            if ch == quote:
+                quote = None  # aspas dobradas ('') fecham e reabrem: o resultado é o mesmo
+        elif ch in ("'", '"'):
+            quote = ch
+            out.append(ch)
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = n if end < 0 else end
+            out.append(" ")
+            continue
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = n if end < 0 else end + 2
+            out.append(" ")
+            continue
+        else:
+            out.append(" " if ch in "\r\n\t" else ch)
+        i += 1
+    return "".join(out).strip().rstrip(";").strip()
+
+
+def sentinel_value(line):
+    """
+    Valor da sentinela se a linha for exatamente o registro dela ({"__docit_end": "<marcador>"},
+    ou o par chave/valor quando a saída vem formatada em várias linhas); None para qualquer outra,
+    inclusive registros reais cujo conteúdo cite o nome da coluna.
+    """
+    if SENTINEL_COLUMN not in line:
+        return None
+    text = line.strip()
+    if text.endswith(","):
+        text = text[:-1]
+    if not text.startswith("{"):
+        text = "{" + text + "}"
+    try:
+        row = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(row, dict) or list(row) != [SENTINEL_COLUMN]:
+        return None
+    value = row[SENTINEL_COLUMN]
+    return value if isinstance(value, str) else None
+
+
+def _process_memory(pid):
+    if psutil is None or not pid:
+        return None
+    try:
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+class OsqueryOneShotProcess(EngineProcess):
+    """Modo antigo: um osqueryi por query. Reserva para quando o shell não funciona."""
+
+    def __init__(self, bin_path):
+        self.bin_path = bin_path
+        self.process = None
+
+    def stream(self, sql, timeout=QUERY_TIMEOUT):
+        self.process = process = subprocess.Popen(
+            [self.bin_path, "--json", sql], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding="utf-8", errors="replace", creationflags=CREATE_NO_WINDOW)
+        expired = threading.Event()
+
+        def expire():
+            expired.set()
+            self.kill()
+
+        watchdog = threading.Timer(timeout, expire)
+        watchdog.daemon = True
+        watchdog.start()
+        scanner = RowScanner()
+        try:
+            for line in process.stdout:
+                row = scanner.feed(line)
+                if row is not None:
+                    yield row
+            process.wait()
+        finally:
+            watchdog.cancel()
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+            self.process = None
+        if expired.is_set():
+            raise EngineTimeout(f"Timeout de {timeout:.0f}s atingido na consulta.")
+        if process.returncode != 0:
+            if process.returncode < 0 or not scanner.other:
+                raise EngineError(f"osqueryi encerrou com código {process.returncode}.")
+            raise QueryError("".join(scanner.other).strip())
+        yield from scanner.finish()
+
+    def kill(self):
+        process = self.process
+        if process is not None:
+            try: process.kill()
+            except Exception: pass
+
+
+class OsqueryShellProcess(EngineProcess):
+    """osqueryi em modo shell com saída JSON; uma query por vez, delimitada por uma sentinela."""
+
+    def __init__(self, bin_path, extra_args=()):
+        self.bin_path = bin_path
+        self.extra_args = list(extra_args)
+        self.process = None
+        self.pid = None
+        self._lines = queue.Queue()
+        self._counter = 0
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [self.bin_path, "--json"] + self.extra_args,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding="utf-8", errors="replace", bufsize=1,
+            creationflags=CREATE_NO_WINDOW)
+        self.pid = self.process.pid
+        # Fila limitada: se o consumidor atrasar, o osqueryi fica bloqueado no pipe em vez de encher a memória
+        self._lines = queue.Queue(maxsize=LINE_BUFFER)
+        threading.Thread(target=self._read_loop, args=(self.process,), name=f"osqueryi-{self.pid}",
+                         daemon=True).start()
+        self.query("SELECT 1 AS ok;", timeout=HANDSHAKE_TIMEOUT)
+
+    def _push(self, process, item):
+        while self.process is process:
+            try:
+                self._lines.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _read_loop(self, process):
+        try:
+            for line in process.stdout:
+                if not self._push(process, line):
+                    return
+        except Exception:
+            pass
+        self._push(process, None)
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def memory_bytes(self):
+        return _process_memory(self.pid)
+
+    def _next_line(self, deadline, timeout):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise EngineTimeout(f"Timeout de {timeout:.0f}s atingido na consulta.")
+        try:
+            return self._lines.get(timeout=remaining)
+        except queue.Empty:
+            raise EngineTimeout(f"Timeout de {timeout:.0f}s atingido na consulta.")
+
+    def stream(self, sql, timeout=QUERY_TIMEOUT):
+        if not self.alive():
+            raise EngineError("Processo osqueryi encerrado.")
+        self._counter += 1
+        marker = f"docit-{self.pid}-{self._counter}"
+        statement = flatten_sql(sql)
+        try:
+            self.process.stdin.write(f"{statement};\nSELECT '{marker}' AS {SENTINEL_COLUMN};\n")
+            self.process.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise EngineError(f"Falha ao escrever no osqueryi: {e}")
+
+        deadline = time.monotonic() + timeout
+        scanner = RowScanner()
+        error = None
+        while True:
+            try:
+                line = self._next_line(deadline, timeout)
+            except EngineTimeout:
+                if error:
+                    # A sentinela não veio depois do erro: a query falhou, o processo segue (sobras são ignoradas)
+                    raise QueryError(error)
+                raise
+            if line is None:
+                raise EngineError(error or "osqueryi encerrou durante a consulta.")
+            sentinel = sentinel_value(line)
+            if sentinel == marker:
+                break
+            if sentinel is not None and sentinel.startswith(f"docit-{self.pid}-"):
+                continue  # sentinela atrasada de uma query anterior que terminou em erro
+            if error is None and line.lstrip().startswith("Error"):
+                # Erro do shell encerra o resultado: só espera a sentinela por ERROR_GRACE para ressincronizar
+                error = line.strip()
+                deadline = min(deadline, time.monotonic() + ERROR_GRACE)
+                continue
+            if error:
+                continue
+            row = scanner.feed(line)
+            if row is not None:
+                yield row
+
+        # A sentinela chega como "[", {linha da sentinela}, "]": o "[" já foi ignorado, falta o "]"
+        try:
+            closing = self._lines.get(timeout=max(0.1, deadline - time.monotonic()))
+        except queue.Empty:
+            closing = "]"
+        if closing is None:
+            self.process = None
+        if error:
+            raise QueryError(error)
+        yield from scanner.finish()
+
+    def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.write(".exit\n")
+            self.process.stdin.flush()
+            self.process.wait(timeout=2)
+        except Exception:
+            try: self.process.kill()
+            except Exception: pass
+        self.process = None
+
+    def kill(self):
+        process = self.process
+        if process is not None:
+            try: process.kill()
+            except Exception: pass
+
+
+class _Worker:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.queries = 0
+
+
+class OsqueryPool:
+
+    def __init__(self, factory, fallback_factory=None, size=POOL_SIZE, max_queries=MAX_QUERIES,
+                 max_memory=MAX_MEMORY, on_spawn=None, on_exit=None):
+        """
+        factory(): cria um EngineProcess (ainda não iniciado).
+        fallback_factory(): usado se o factory falhar no start (ex: shell sem resposta).
+        on_spawn(engine) / on_exit(engine): ganchos (ex: registro de PIDs).
+        """
+        self.factory = factory
+        self.fallback_factory = fallback_factory
+        self.size = max(1, size)
+        self.max_queries = max_queries
+        self.max_memory = max_memory
+        self.on_spawn = on_spawn
+        self.on_exit = on_exit
+        self.spawned = 0
+        self.recycled = 0
+        self.queries = 0
+        self._use_fallback = False
+        self._idle = queue.Queue()
+        self._slots = threading.Semaphore(self.size)
+        self._lock = threading.Lock()
+        self._workers = set()
+
+    def _hook(self, hook, engine):
+        if hook:
+            try: hook(engine)
+            except Exception: pass
+
+    def _spawn(self):
+        factory = self.fallback_factory if self._use_fallback else self.factory
+        engine = factory()
+        try:
+            engine.start()
+        except Exception as e:
+            self._discard(_Worker(engine))
+            if self._use_fallback or not self.fallback_factory:
+                raise EngineError(f"Falha ao iniciar o motor osquery: {e}")
+            log_event(f"osqueryi em modo shell não respondeu ({e}). Usando um processo por query.", "WARNING")
+            self._use_fallback = True
+            engine = self.fallback_factory()
+            engine.start()
+        self.spawned += 1
+        self._hook(self.on_spawn, engine)
+        worker = _Worker(engine)
+        with self._lock:
+            self._workers.add(worker)
+        return worker
+
+    def _discard(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+        try: worker.engine.close()
+        except Exception: pass
+        self._hook(self.on_exit, worker.engine)
+
+    def _acquire(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return self._spawn()
+            if worker.engine.alive():
+                return worker
+            self._discard(worker)
+
+    def _release(self, worker):
+        memory = worker.engine.memory_bytes()
+        if worker.queries >= self.max_queries or (memory and memory > self.max_memory):
+            self.recycled += 1
+            log_event(f"Reciclando processo osquery (PID {worker.engine.pid}, {worker.queries} queries, "
+                      f"{(memory or 0) // (1024 * 1024)} MB).", "DEBUG")
+            self._discard(worker)
+        else:
+            self._idle.put(worker)
+
+    def stream(self, sql, timeout=QUERY_TIMEOUT, token=None):
+        """
+        Gera o texto JSON de cada registro, em um processo do pool. Um motor que morreu antes do
+        primeiro registro é trocado e a query refeita uma vez.
+        token (CancelToken) permite cancelar: QueryCancelled é levantada no lugar do resto do resultado.
+        Fechar o gerador antes do fim (ex: limite de linhas) encerra o processo que ainda estava respondendo.
+        """
+        with self._slots:
+            for attempt in range(2):
+                if token is not None and token.cancelled:
+                    raise QueryCancelled("Consulta cancelada.")
+                worker = self._acquire()
+                if token is not None:
+                    token.attach(worker.engine)
+                yielded = False
+                try:
+                    for row in worker.engine.stream(sql, timeout=timeout):
+                        yielded = True
+                        yield row
+                except QueryError:
+                    worker.queries += 1
+                    self._release(worker)
+                    raise
+                except EngineError as e:
+                    self._discard(worker)
+                    if token is not None and token.cancelled:
+                        raise QueryCancelled("Consulta cancelada.")
+                    if attempt or yielded or isinstance(e, EngineTimeout):
+                        raise
+                    continue
+                except GeneratorExit:
+                    # O resto da saída ainda está no pipe: o processo não pode atender outra query
+                    worker.engine.kill()
+                    self._discard(worker)
+                    raise
+                finally:
+                    if token is not None:
+                        token.detach()
+                worker.queries += 1
+                self.queries += 1
+                self._release(worker)
+                return
+
+    def query(self, sql, timeout=QUERY_TIMEOUT, token=None):
+        """Executa a query e devolve as linhas como dicts (resultados pequenos, ex: Inventory)."""
+        return [json.loads(row) for row in self.stream(sql, timeout=timeout, token=token)]
+
+    def close(self):
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            self._discard(worker)
+        while not self._idle.empty():
+            try: self._idle.get_nowait()
+            except queue.Empty: break
+
+    def stats(self):
+        with self._lock:
+            running = len(self._workers)
+        return {"running": running, "spawned": self.spawned, "recycled": self.recycled,
+                "queries": self.queries, "oneShot": self._use_fallback}
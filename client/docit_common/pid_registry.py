@@ -0,0 +1,126 @@
+"""
+Registro de PIDs dos processos do agente (módulos e osqueryi), mantido pelo Core.
+
+Antes, Core, GUI e Updater varriam psutil.process_iter (todos os processos da máquina) para
+saber se um módulo estava de pé ou para matá-lo. O Core já sabe o PID de tudo o que cria:
+aqui ele registra PID + horário de criação do processo, expõe o registro por IPC
+(action "get_pids") e o espelha em um arquivo de estado para quando o Core não responde
+(e para achar fantasmas de uma execução anterior).
+
+O horário de criação protege contra reuso de PID: um PID só é considerado do agente se o
+processo com esse número nasceu no mesmo instante registrado. Checar ou matar vira uma
+consulta O(1) por PID em vez de uma varredura da tabela de processos.
+"""
+import os
+import json
+import threading
+
+import psutil
+
+from . import log_event
+
+STATE_FILE = "Doc-IT-pids.json"
+CREATE_TIME_TOLERANCE = 0.05
+
+
+def _create_time(pid):
+    try:
+        return psutil.Process(pid).create_time()
+    except Exception:
+        return None
+
+
+def process_for(entry):
+    """psutil.Process do registro, ou None se morreu ou se o PID foi reaproveitado por outro processo."""
+    try:
+        proc = psutil.Process(int(entry["pid"]))
+    except Exception:
+        return None
+    expected = entry.get("create_time")
+    if expected is None:
+        return proc
+    try:
+        if abs(proc.create_time() - expected) > CREATE_TIME_TOLERANCE:
+            return None
+    except psutil.AccessDenied:
+        # Sem permissão para consultar (ex: GUI olhando processo do SYSTEM): o PID existir basta
+        return proc
+    except Exception:
+        return None
+    return proc
+
+
+def entries_for(snapshot, name):
+    return [e for e in (snapshot or {}).values() if e.get("name") == name]
+
+
+def is_alive(snapshot, name):
+    return any(process_for(e) is not None for e in entries_for(snapshot, name))
+
+
+def kill_entries(snapshot, name=None):
+    """Mata os processos do registro (todos ou só os de um nome). Retorna quantos foram mortos."""
+    killed = 0
+    for entry in (snapshot or {}).values():
+        if name is not None and entry.get("name") != name:
+            continue
+        proc = process_for(entry)
+        if proc is None:
+            continue
+        try:
+            proc.kill()
+            killed += 1
+        except Exception as e:
+            log_event(f"Falha ao encerrar {entry.get('name')} (PID {entry.get('pid')}): {e}", "WARNING")
+    return killed
+
+
+def load_state(path=STATE_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        return snapshot if isinstance(snapshot, dict) else {}
+    except Exception:
+        return {}
+
+
+class PidRegistry:
+
+    def __init__(self, state_path=STATE_FILE):
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def register(self, name, pid, exe=None):
+        if not pid:
+            return
+        entry = {"name": name, "pid": int(pid), "create_time": _create_time(pid), "exe": exe}
+        with self._lock:
+            self._entries[str(pid)] = entry
+            self._persist()
+
+    def unregister(self, pid):
+        with self._lock:
+            if self._entries.pop(str(pid), None) is not None:
+                self._persist()
+
+    def snapshot(self):
+        with self._lock:
+            return {pid: dict(entry) for pid, entry in self._entries.items()}
+
+    def is_alive(self, name):
+        return is_alive(self.snapshot(), name)
+
+    def kill(self, name=None):
+        return kill_entries(self.snapshot(), name)
+
+    def _persist(self):
+        if not self.state_path:
+            return
+        try:
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.state_path)
+        except Exception as e:
+            log_event(f"Falha ao espelhar registro de PIDs em {self.state_path}: {e}", "DEBUG")
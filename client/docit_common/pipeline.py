@@ -0,0 +1,165 @@
+"""
+Pipeline de estágios para o streaming de tela (captura -> conversão/escala -> codificação -> envio).
+
+Cada estágio roda na sua thread e recebe o item do anterior por uma fila de uma posição
+(LatestSlot): se o estágio seguinte ainda não pegou o item e chega um mais novo, o velho é
+descartado. Assim a latência por frame é a do estágio mais lento, e não a soma de todos, e
+nenhum estágio trabalha em cima de um frame que já ficou para trás. A codificação do PIL solta
+o GIL, então captura e codificação se sobrepõem de fato em máquinas com mais de um núcleo.
+
+A fonte (captura) roda na thread que chama run(): o mss precisa ser usado na thread que o criou.
+Ela mede o próprio tempo com record() (as esperas de fps/créditos não contam como captura).
+stats() traz o tempo de cada estágio e os descartes; o estágio com maior tempo médio é o que
+limita o fps naquele endpoint.
+"""
+import time
+import threading
+
+from . import log_event
+from .input_queue import LatencyStats
+
+
+class LatestSlot:
+    """Fila de uma posição: put() substitui o item ainda não consumido e devolve o descartado."""
+
+    def __init__(self):
+        self._item = None
+        self._has_item = False
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def put(self, item):
+        with self._cond:
+            dropped = self._item if self._has_item else None
+            self._item, self._has_item = item, True
+            self._cond.notify()
+            return dropped
+
+    def get(self):
+        """Bloqueia até haver item. Retorna (True, item), ou (False, None) se a fila foi fechada."""
+        with self._cond:
+            while not self._has_item and not self._closed:
+                self._cond.wait()
+            if not self._has_item:
+                return False, None
+            item, self._item, self._has_item = self._item, None, False
+            return True, item
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class FramePipeline:
+
+    def __init__(self, stages, on_drop=None, name="pipeline"):
+        """
+        stages: lista de (nome, função). função(item) -> item do próximo estágio (no último, qualquer
+        valor verdadeiro indica sucesso), ou None para descartar.
+        on_drop(nome_do_estágio, item, motivo): item descartado; motivo "stale" (substituído por um
+        mais novo antes de o estágio pegá-lo), "rejected" (a função devolveu None) ou "error".
+        """
+        self.stages = list(stages)
+        self.on_drop = on_drop
+        self.name = name
+        self.timings = LatencyStats()
+        self.completed = 0
+        self.dropped = {stage: 0 for stage, _ in self.stages}
+        self._slots = [LatestSlot() for _ in self.stages]
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._running = False
+        self._started_at = None
+
+    @property
+    def in_flight(self):
+        """Itens já capturados que ainda não terminaram o último estágio nem foram descartados."""
+        return self._in_flight
+
+    def record(self, stage, seconds):
+        self.timings.record(stage, seconds)
+
+    def _finish(self, stage, item, reason=None):
+        with self._lock:
+            self._in_flight -= 1
+            if reason:
+                self.dropped[stage] += 1
+            else:
+                self.completed += 1
+        if reason and self.on_drop:
+            try: self.on_drop(stage, item, reason)
+            except Exception: pass
+
+    def _feed(self, index, item):
+        stage = self.stages[index][0]
+        stale = self._slots[index].put(item)
+        if stale is not None:
+            self._finish(stage, stale, "stale")
+
+    def _stage_loop(self, index):
+        stage, func = self.stages[index]
+        last = index == len(self.stages) - 1
+        try:
+            self._run_stage(index, stage, func, last)
+        finally:
+            # Encerramento em cascata: o próximo estágio só fecha depois que este entregou o último item
+            if not last:
+                self._slots[index + 1].close()
+
+    def _run_stage(self, index, stage, func, last):
+        while True:
+            ok, item = self._slots[index].get()
+            if not ok:
+                return
+            started = time.perf_counter()
+            try:
+                result = func(item)
+            except Exception as e:
+                log_event(f"Erro no estágio '{stage}' do {self.name}: {e}", "ERROR")
+                self._finish(stage, item, "error")
+                continue
+            self.timings.record(stage, time.perf_counter() - started)
+            if result is None:
+                self._finish(stage, item, "rejected")
+            elif last:
+                self._finish(stage, result)
+            else:
+                self._feed(index + 1, result)
+
+    def run(self, source, keep_running):
+        """
+        Roda a fonte na thread atual enquanto keep_running() for verdadeiro. source() devolve o
+        próximo item, ou None quando não há o que enviar (ex: tela estática).
+        """
+        self._running = True
+        self._started_at = time.monotonic()
+        threads = [threading.Thread(target=self._stage_loop, args=(index,), name=f"{self.name}-{stage}", daemon=True)
+                   for index, (stage, _) in enumerate(self.stages)]
+        for thread in threads:
+            thread.start()
+        try:
+            while keep_running():
+                item = source()
+                if item is None:
+                    continue
+                with self._lock:
+                    self._in_flight += 1
+                self._feed(0, item)
+        finally:
+            self._running = False
+            # Os estágios drenam o que já está no pipeline e fecham o seguinte ao sair
+            self._slots[0].close()
+
+    def stats(self):
+        timings = self.timings.snapshot()
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0
+        busiest = max(timings, key=lambda stage: timings[stage]["avg_ms"]) if timings else None
+        with self._lock:
+            return {
+                "stages": timings,
+                "dropped": dict(self.dropped),
+                "completed": self.completed,
+                "fps": round(self.completed / elapsed, 2) if elapsed > 0 else 0.0,
+                "bottleneck": busiest,
+            }
@@ -0,0 +1,200 @@
+"""
+Controle adaptativo de qualidade/resolução/fps do Remote Desktop.
+
+O perfil escolhido no desktop:start (low/medium/high/ultra) passa a ser o teto da sessão. Abaixo
+dele há uma escada de níveis, cada um um pouco mais barato que o anterior, alternando entre
+qualidade JPEG (-5), fps (x0.8) e escala da imagem (x0.85) até os pisos. A cada intervalo de
+controle (1s) o nível sobe ou desce conforme o que foi medido:
+  - RTT dos acks (do CreditWindow do Core) acima de 1.5x o mínimo da sessão -> fila crescendo na rede;
+  - taxa de envio exigida acima da taxa de entrega medida pelos acks -> banda insuficiente;
+  - captura travada por falta de créditos em boa parte dos frames -> janela cheia;
+  - conversão ou codificação (estágios do pipeline, que rodam em paralelo) tomando mais de 90%
+    do intervalo entre frames -> CPU do endpoint.
+Qualquer um desses desce o nível (2 de uma vez se o RTT passar de 2x o mínimo). Sem nenhum por
+`STABLE_INTERVALS` intervalos seguidos, sobe um nível. Após descer, espera HOLD_INTERVALS antes de subir.
+"""
+import time
+import threading
+from collections import OrderedDict, deque
+
+MIN_QUALITY = 20
+MIN_FPS = 5
+MIN_SCALE = 0.5
+QUALITY_STEP = 5
+FPS_FACTOR = 0.8
+SCALE_FACTOR = 0.85
+CONTROL_INTERVAL = 1.0
+STABLE_INTERVALS = 3
+HOLD_INTERVALS = 2
+RTT_QUEUE_FACTOR = 1.5
+RTT_SEVERE_FACTOR = 2.0
+RTT_SLACK = 0.03
+STALL_RATIO = 0.3
+CPU_BUDGET = 0.9
+RATE_SAMPLES = 5
+
+
+def build_ladder(quality, fps, min_quality=MIN_QUALITY, min_fps=MIN_FPS, min_scale=MIN_SCALE):
+    """Níveis (qualidade, escala, fps) do perfil até os pisos, alternando a dimensão que cai."""
+    min_quality = min(min_quality, quality)
+    min_fps = min(min_fps, fps)
+    level = (quality, 1.0, float(fps))
+    ladder = [level]
+    dimension = 0
+    while True:
+        q, scale, f = level
+        for _ in range(3):
+            candidate = None
+            if dimension == 0 and q > min_quality:
+                candidate = (max(min_quality, q - QUALITY_STEP), scale, f)
+            elif dimension == 1 and f > min_fps:
+                candidate = (q, scale, max(float(min_fps), round(f * FPS_FACTOR, 2)))
+            elif dimension == 2 and scale > min_scale:
+                candidate = (q, max(min_scale, round(scale * SCALE_FACTOR, 3)), f)
+            dimension = (dimension + 1) % 3
+            if candidate:
+                break
+        if not candidate:
+            return ladder
+        level = candidate
+        ladder.append(level)
+
+
+class AdaptiveQuality:
+
+    def __init__(self, quality, fps, min_quality=MIN_QUALITY, min_fps=MIN_FPS, min_scale=MIN_SCALE,
+                 interval=CONTROL_INTERVAL):
+        self.ladder = build_ladder(quality, fps, min_quality, min_fps, min_scale)
+        self.level = 0
+        self.interval = interval
+        self.changes = 0
+        self.last_reason = None
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()   # seq -> bytes, até o ack
+        self._acked = 0
+        self._min_rtt = None
+        self._rtt = None
+        self._rates = deque(maxlen=RATE_SAMPLES)
+        self._reset_interval(time.monotonic())
+        self._stable = 0
+        self._hold = 0
+
+    def _reset_interval(self, now):
+        self._interval_start = now
+        self._frames = 0
+        self._stalls = 0
+        self._sent_bytes = 0
+        self._delivered_bytes = 0
+        self._work = {}
+
+    # --- Parâmetros atuais (lidos pelos estágios do pipeline) ---
+    @property
+    def quality(self):
+        return self.ladder[self.level][0]
+
+    @property
+    def scale(self):
+        return self.ladder[self.level][1]
+
+    @property
+    def fps(self):
+        return self.ladder[self.level][2]
+
+    @property
+    def frame_interval(self):
+        return 1.0 / self.fps
+
+    # --- Medições ---
+    def on_stall(self):
+        """A captura não saiu por falta de créditos."""
+        with self._lock:
+            self._stalls += 1
+
+    def on_work(self, stage, seconds):
+        """Tempo de um estágio de processamento (conversão, codificação) em um frame."""
+        with self._lock:
+            total, count = self._work.get(stage, (0.0, 0))
+            self._work[stage] = (total + seconds, count + 1)
+
+    def on_sent(self, seq, size):
+        with self._lock:
+            self._frames += 1
+            self._sent_bytes += size
+            self._sizes[seq] = size
+
+    def on_credits(self, acked, rtt):
+        """Estado de créditos empurrado pelo Core: ack cumulativo e RTT suavizado."""
+        with self._lock:
+            while self._sizes and next(iter(self._sizes)) <= acked:
+                _, size = self._sizes.popitem(last=False)
+                self._delivered_bytes += size
+            self._acked = max(self._acked, acked)
+            if rtt:
+                self._rtt = rtt
+                self._min_rtt = rtt if self._min_rtt is None else min(self._min_rtt, rtt)
+
+    # --- Controle ---
+    def update(self, now=None):
+        """Chamado a cada captura; decide no máximo uma vez por intervalo. True se o nível mudou."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            elapsed = now - self._interval_start
+            if elapsed < self.interval:
+                return False
+            if not self._frames and not self._stalls:
+                # Tela parada: sem frames não há medida nova (o RTT seria o do último ack)
+                self._reset_interval(now)
+                return False
+            reason, severe = self._congestion(elapsed)
+            self._reset_interval(now)
+            previous = self.level
+            if reason:
+                self._stable = 0
+                self._hold = HOLD_INTERVALS
+                self.level = min(len(self.ladder) - 1, self.level + (2 if severe else 1))
+            else:
+                self._stable += 1
+                if self._hold:
+                    self._hold -= 1
+                elif self._stable >= STABLE_INTERVALS and self.level > 0:
+                    self._stable = 0
+                    self.level -= 1
+                    reason = "folga"
+            if self.level != previous:
+                self.changes += 1
+                self.last_reason = reason
+                return True
+            return False
+
+    def _congestion(self, elapsed):
+        """Motivo para descer de nível (ou None) e se é severo."""
+        if self._delivered_bytes:
+            self._rates.append(self._delivered_bytes / elapsed)
+        if self._rtt and self._min_rtt:
+            if self._rtt > RTT_SEVERE_FACTOR * self._min_rtt + RTT_SLACK:
+                return "rtt", True
+            if self._rtt > RTT_QUEUE_FACTOR * self._min_rtt + RTT_SLACK:
+                return "rtt", False
+        attempts = self._frames + self._stalls
+        if attempts and self._stalls / attempts > STALL_RATIO:
+            return "créditos", False
+        if self._rates and self._sent_bytes / elapsed > max(self._rates) * 1.1 and self._stalls:
+            return "banda", False
+        if any(total / count > CPU_BUDGET * self.frame_interval for total, count in self._work.values()):
+            return "cpu", False
+        return None, False
+
+    def state(self):
+        with self._lock:
+            return {
+                "level": self.level,
+                "levels": len(self.ladder),
+                "quality": self.quality,
+                "scale": self.scale,
+                "fps": self.fps,
+                "changes": self.changes,
+                "lastReason": self.last_reason,
+                "rtt": self._rtt,
+                "minRtt": self._min_rtt,
+                "deliveryRate": round(max(self._rates)) if self._rates else None,
+            }
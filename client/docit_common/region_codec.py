@@ -0,0 +1,452 @@
+"""
+Codificação por regiões do Remote Desktop: só os blocos que mudaram, cada um no codec adequado.
+
+A detecção roda na captura, sobre o BGRA cru (track): o frame é dividido numa grade de TILE x TILE
+pixels e comparado com a captura anterior, que fica guardada por referência (a fonte entrega um
+buffer novo a cada frame), sem tobytes nem cópia. Cada captura ganha um ticket com a sua grade de
+blocos sujos; encode(frame, quality, ticket) junta as grades de todos os tickets até o seu (frames
+descartados no meio do pipeline não perdem a mudança), transforma em retângulos, leva para a
+escala do frame convertido e codifica só essas regiões. Cada retângulo é classificado pela
+quantidade de cores:
+  - "flat"  (até 256 cores: interface, fundos, texto sem suavização) -> PNG com paleta, sem perdas;
+  - "text"  (até 2048 cores: texto suavizado sobre fundo liso)        -> WebP (JPEG se não houver);
+  - "photo" (acima disso: fotos, vídeo, gradientes)                   -> JPEG.
+O mapeamento classe -> codec é a política (dict) e pode vir do modo benchmark, que
+compara os codecs num conjunto de telas capturadas e grava a recomendação em POLICY_FILE.
+
+Keyframes (tela inteira numa região só) saem no início, a cada KEYFRAME_INTERVAL segundos, quando
+a resolução muda ou quando pedidos (frame perdido, visualizador pediu resync).
+Com NumPy a grade de blocos sujos sai de frame_ops.TileDiff (vetorizado); sem, de dirty_tiles.
+O frame convertido pode ser uma imagem PIL ou um array RGBX do frame_ops.FrameScaler; do array, a
+imagem de cada região é mapeada sem cópia (region_image).
+
+Uso do benchmark:
+    python -m docit_common.region_codec <pasta com capturas .png/.bmp> [qualidade]
+    python -m docit_common.region_codec --synthetic <pasta> [capturas] [qualidade]
+A opção --synthetic preenche a pasta vazia com telas da SyntheticCapture (bancada no Linux, sem tela).
+"""
+import io
+import os
+import sys
+import json
+import math
+import time
+import threading
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+    features = None
+
+from . import frame_ops
+
+TILE = 64
+KEYFRAME_INTERVAL = 30.0
+FULL_FRAME_RATIO = 0.5
+MAX_PENDING = 64
+FLAT_COLORS = 256
+TEXT_COLORS = 2048
+POLICY_FILE = "Doc-IT-codecs.json"
+BENCHMARK_BLOCK = 256
+LOSSLESS_MARGIN = 1.5
+
+CODEC_JPEG = 0
+CODEC_PNG = 1
+CODEC_WEBP = 2
+CODEC_IDS = {"jpeg": CODEC_JPEG, "png": CODEC_PNG, "webp": CODEC_WEBP}
+CLASSES = ("flat", "text", "photo")
+
+
+def webp_available():
+    try:
+        return features is not None and features.check("webp")
+    except Exception:
+        return False
+
+
+def default_policy():
+    return {"flat": "png", "text": "webp" if webp_available() else "jpeg", "photo": "jpeg"}
+
+
+def load_policy(path):
+    """Política gravada pelo benchmark; codecs indisponíveis (WebP sem suporte) voltam ao padrão."""
+    policy = default_policy()
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            saved = json.load(f).get("policy", {})
+    except (OSError, ValueError):
+        return policy
+    for region_class, codec in saved.items():
+        if region_class in policy and codec in CODEC_IDS and (codec != "webp" or webp_available()):
+            policy[region_class] = codec
+    return policy
+
+
+def classify(img):
+    """Classe da região pela quantidade de cores distintas (getcolors para no limite)."""
+    colors = img.getcolors(TEXT_COLORS)
+    if colors is None:
+        return "photo"
+    return "flat" if len(colors) <= FLAT_COLORS else "text"
+
+
+def region_image(frame, box=None):
+    """
+    Imagem PIL de uma região (x0, y0, x1, y1) do frame. Imagem PIL: crop (cópia). Array RGBX do
+    FrameScaler: imagem mapeada sobre o array, com o passo da linha inteira (sem cópia).
+    """
+    if isinstance(frame, Image.Image):
+        return frame if box is None else frame.crop(box)
+    height, width = frame.shape[:2]
+    x0, y0, x1, y1 = box or (0, 0, width, height)
+    return Image.frombuffer("RGBX", (x1 - x0, y1 - y0), frame_ops.region_buffer(frame, x0, y0),
+                            "raw", "RGBX", frame.strides[0], 1)
+
+
+def frame_size(frame):
+    return frame.size if isinstance(frame, Image.Image) else (frame.shape[1], frame.shape[0])
+
+
+def encode_image(img, codec, quality, buffer=None):
+    """Bytes da região no codec. buffer: BytesIO reaproveitado entre chamadas (esvaziado aqui)."""
+    if buffer is None:
+        buffer = io.BytesIO()
+    else:
+        buffer.seek(0)
+        buffer.truncate()
+    if codec == "png":
+        # Até 256 cores a paleta adaptativa é exata: PNG sem perdas e pequeno
+        if img.mode != "RGB":
+            img = img.convert("RGB")  # a quantização não aceita RGBX
+        img.convert("P", palette=Image.Palette.ADAPTIVE, colors=FLAT_COLORS).save(
+            buffer, format="PNG", compress_level=1)
+    elif codec == "webp":
+        img.save(buffer, format="WEBP", quality=quality, method=0)
+    else:
+        img.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def dirty_tiles(current, previous, width, height, bytes_per_pixel=3, tile=TILE):
+    """
+    Grade de blocos que mudaram entre dois buffers de pixels do mesmo tamanho.
+    Compara primeiro a linha inteira (memcmp); só as linhas diferentes são checadas bloco a bloco.
+    Retorna lista de linhas da grade, cada uma uma lista de bool por coluna.
+    """
+    row_bytes = width * bytes_per_pixel
+    tile_bytes = tile * bytes_per_pixel
+    cols = (width + tile - 1) // tile
+    rows = (height + tile - 1) // tile
+    grid = [[False] * cols for _ in range(rows)]
+    for y in range(height):
+        start = y * row_bytes
+        end = start + row_bytes
+        if current[start:end] == previous[start:end]:
+            continue
+        grid_row = grid[y // tile]
+        for col in range(cols):
+            if grid_row[col]:
+                continue
+            a = start + col * tile_bytes
+            b = min(end, a + tile_bytes)
+            if current[a:b] != previous[a:b]:
+                grid_row[col] = True
+    return grid
+
+
+def scale_rect(rect, source_size, size):
+    """Retângulo da captura levado para a escala do frame convertido, com 1 pixel de folga (filtro da redução)."""
+    x, y, w, h = rect
+    if source_size == size:
+        return rect
+    sx, sy = size[0] / source_size[0], size[1] / source_size[1]
+    x0 = max(0, math.floor(x * sx) - 1)
+    y0 = max(0, math.floor(y * sy) - 1)
+    x1 = min(size[0], math.ceil((x + w) * sx) + 1)
+    y1 = min(size[1], math.ceil((y + h) * sy) + 1)
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def merge_tiles(grid, width, height, tile=TILE):
+    """Junta blocos sujos em retângulos: sequências na mesma linha e, depois, linhas iguais seguidas."""
+    rects = []
+    open_runs = {}
+    for row, flags in enumerate(grid):
+        runs = []
+        col = 0
+        while col < len(flags):
+            if flags[col]:
+                start = col
+                while col < len(flags) and flags[col]:
+                    col += 1
+                runs.append((start, col))
+            else:
+                col += 1
+        next_open = {}
+        for run in runs:
+            if run in open_runs:
+                rect = open_runs[run]
+                rect[3] = row + 1
+            else:
+                rect = [run[0], row, run[1], row + 1]
+                rects.append(rect)
+            next_open[run] = rect
+        open_runs = next_open
+    result = []
+    for c0, r0, c1, r1 in rects:
+        x, y = c0 * tile, r0 * tile
+        result.append((x, y, min(width, c1 * tile) - x, min(height, r1 * tile) - y))
+    return result
+
+
+class CodecStats:
+    """Bytes crus x codificados e tempo por codec (taxa de compressão e custo de cada um)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def record(self, codec, raw_bytes, encoded_bytes, seconds):
+        with self._lock:
+            entry = self._data.setdefault(codec, [0, 0, 0, 0.0])
+            entry[0] += 1
+            entry[1] += raw_bytes
+            entry[2] += encoded_bytes
+            entry[3] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {codec: {"regions": count,
+                            "ratio": round(raw / encoded, 2) if encoded else None,
+                            "bytes": encoded,
+                            "avg_ms": round(1000 * seconds / count, 2)}
+                    for codec, (count, raw, encoded, seconds) in self._data.items()}
+
+
+class RegionEncoder:
+
+    def __init__(self, policy=None, tile=TILE, keyframe_interval=KEYFRAME_INTERVAL):
+        self.policy = policy or default_policy()
+        self.tile = tile
+        self.keyframe_interval = keyframe_interval
+        self.stats = CodecStats()
+        self.keyframes = 0
+        self.delta_frames = 0
+        # Estado da captura (track, thread da captura)
+        self._previous = None
+        self._previous_size = None
+        self._tickets = 0
+        self._tile_diff = frame_ops.TileDiff(tile) if frame_ops.available() else None
+        # Grades ainda não codificadas: (ticket, tamanho da captura, grade ou None = tudo mudou)
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        # Estado da codificação (encode, thread do encode)
+        self._output_size = None
+        self._last_keyframe = 0.0
+        self._force_keyframe = True
+        self._scratch = io.BytesIO()
+
+    def request_keyframe(self):
+        """Próximo frame sai inteiro (frame perdido no caminho ou resync pedido pelo visualizador)."""
+        self._force_keyframe = True
+
+    def track(self, raw, width, height, bytes_per_pixel=4):
+        """
+        Compara a captura (BGRA cru) com a anterior e guarda a grade de blocos sujos. Devolve o ticket
+        a passar para encode(). `raw` fica guardado como referência até a próxima captura (sem cópia).
+        """
+        size = (width, height)
+        grid = None
+        if self._previous is not None and size == self._previous_size:
+            if self._tile_diff:
+                grid = self._tile_diff.grid(raw, self._previous, width, height, bytes_per_pixel)
+            else:
+                grid = dirty_tiles(raw, self._previous, width, height, bytes_per_pixel, tile=self.tile)
+        self._previous, self._previous_size = raw, size
+        with self._pending_lock:
+            self._tickets += 1
+            if len(self._pending) >= MAX_PENDING:
+                # Codificação parada (ex: sem créditos por muito tempo): o acumulado vira "tudo mudou"
+                self._pending = [(self._pending[-1][0], size, None)]
+            self._pending.append((self._tickets, size, grid))
+            return self._tickets
+
+    def _take(self, ticket):
+        """Remove e junta as grades de todos os tickets até `ticket`. Devolve (tamanho, grade) ou None."""
+        with self._pending_lock:
+            taken = [entry for entry in self._pending if entry[0] <= ticket]
+            self._pending = [entry for entry in self._pending if entry[0] > ticket]
+        if not taken:
+            return None
+        size = taken[-1][1]
+        merged = None
+        for _, entry_size, grid in taken:
+            if grid is None or entry_size != size:
+                return size, None
+            if merged is None:
+                merged = [list(row) for row in grid]
+            else:
+                for merged_row, row in zip(merged, grid):
+                    for col, dirty in enumerate(row):
+                        if dirty:
+                            merged_row[col] = True
+        return size, merged
+
+    def _encode_region(self, frame, box, quality):
+        region = region_image(frame, box)
+        codec = self.policy.get(classify(region), "jpeg")
+        started = time.perf_counter()
+        data = encode_image(region, codec, quality, self._scratch)
+        self.stats.record(codec, region.width * region.height * 3, len(data), time.perf_counter() - started)
+        return CODEC_IDS[codec], data
+
+    def encode(self, frame, quality, ticket):
+        """
+        Codifica o frame convertido (imagem PIL ou array RGBX) da captura `ticket`. Retorna
+        (keyframe, [(x, y, w, h, codec, bytes)]) em coordenadas do frame; lista vazia se nada mudou.
+        """
+        size = frame_size(frame)
+        taken = self._take(ticket)
+        now = time.monotonic()
+        keyframe = (self._force_keyframe or size != self._output_size
+                    or now - self._last_keyframe >= self.keyframe_interval
+                    or (taken is not None and taken[1] is None))
+        self._output_size = size
+
+        if keyframe:
+            self._force_keyframe = False
+            self._last_keyframe = now
+            self.keyframes += 1
+            codec, data = self._encode_region(frame, None, quality)
+            return True, [(0, 0, size[0], size[1], codec, data)]
+        if taken is None:
+            return False, []
+
+        source_size, grid = taken
+        rects = merge_tiles(grid, source_size[0], source_size[1], tile=self.tile)
+        # Mudou mais da metade da tela: uma região só sai mais barato que muitos cabeçalhos
+        if sum(w * h for _, _, w, h in rects) > FULL_FRAME_RATIO * source_size[0] * source_size[1]:
+            rects = [(0, 0, source_size[0], source_size[1])]
+        regions = []
+        for rect in rects:
+            x, y, w, h = scale_rect(rect, source_size, size)
+            if w <= 0 or h <= 0:
+                continue
+            codec, data = self._encode_region(frame, (x, y, x + w, y + h), quality)
+            regions.append((x, y, w, h, codec, data))
+        if regions:
+            self.delta_frames += 1
+        return False, regions
+
+    def state(self):
+        return {"keyframes": self.keyframes, "deltaFrames": self.delta_frames,
+                "policy": self.policy, "vectorized": self._tile_diff is not None, "codecs": self.stats.snapshot()}
+
+
+# --- Modo benchmark ---
+
+def benchmark(paths, quality=50, block=BENCHMARK_BLOCK):
+    """
+    Codifica blocos de cada captura com todos os codecs disponíveis e agrega por classe de região.
+    PNG só entra nos blocos "flat" (nos outros a paleta perderia cores). Retorna resultados e a
+    política recomendada: menor tamanho médio por classe, mas o PNG (sem perdas, texto nítido)
+    fica com os blocos "flat" enquanto não passar de LOSSLESS_MARGIN x o melhor codec com perdas.
+    """
+    codecs = ["jpeg", "png"] + (["webp"] if webp_available() else [])
+    results = {region_class: {codec: CodecStats() for codec in codecs} for region_class in CLASSES}
+    blocks = 0
+    for path in paths:
+        img = Image.open(path).convert("RGB")
+        for top in range(0, img.height, block):
+            for left in range(0, img.width, block):
+                region = img.crop((left, top, min(img.width, left + block), min(img.height, top + block)))
+                region_class = classify(region)
+                blocks += 1
+                for codec in codecs:
+                    if codec == "png" and region_class != "flat":
+                        continue
+                    started = time.perf_counter()
+                    data = encode_image(region, codec, quality)
+                    results[region_class][codec].record(codec, region.width * region.height * 3, len(data),
+                                                        time.perf_counter() - started)
+
+    report = {}
+    policy = default_policy()
+    for region_class, per_codec in results.items():
+        report[region_class] = {}
+        best = None
+        for codec, stats in per_codec.items():
+            snapshot = stats.snapshot().get(codec)
+            if not snapshot:
+                continue
+            snapshot["avg_bytes"] = round(snapshot["bytes"] / snapshot["regions"])
+            report[region_class][codec] = snapshot
+            if codec != "png" and (best is None or snapshot["avg_bytes"] < report[region_class][best]["avg_bytes"]):
+                best = codec
+        png = report[region_class].get("png")
+        if png and (best is None or png["avg_bytes"] <= LOSSLESS_MARGIN * report[region_class][best]["avg_bytes"]):
+            best = "png"
+        if best:
+            policy[region_class] = best
+    return {"images": len(paths), "blocks": blocks, "quality": quality, "results": report, "policy": policy}
+
+
+def capture_corpus(source, folder, count, interval=0.0, monitor_index=1):
+    """Grava `count` capturas da fonte (CaptureSource ainda fechada) como PNG na pasta."""
+    os.makedirs(folder, exist_ok=True)
+    with source:
+        monitors = source.monitors()
+        monitor = monitors[monitor_index if monitor_index < len(monitors) else 0]
+        for index in range(count):
+            if index and interval:
+                time.sleep(interval)
+            shot = source.grab(monitor)
+            Image.frombuffer("RGB", shot.size, shot.raw, "raw", "BGRX", 0, 1).save(
+                os.path.join(folder, f"screen-{index:03d}.png"))
+    return corpus_paths(folder)
+
+
+def corpus_paths(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder)
+                  if name.lower().endswith((".png", ".bmp")))
+
+
+def run_benchmark(folder, output=POLICY_FILE, quality=50):
+    """Benchmark sobre as capturas da pasta; grava o resultado (com a política) em `output`."""
+    paths = corpus_paths(folder)
+    if not paths:
+        raise ValueError(f"Nenhuma captura .png/.bmp em {folder}.")
+    result = benchmark(paths, quality=quality)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, ensure_ascii=False)
+    return result
+
+
+def main(argv):
+    if Image is None:
+        print("Pillow não instalado.")
+        return 1
+    if not argv:
+        print(__doc__)
+        return 1
+    if argv[0] == "--synthetic" and len(argv) > 1:
+        from .capture import SyntheticCapture
+        folder = argv[1]
+        count = int(argv[2]) if len(argv) > 2 else 10
+        if not os.path.isdir(folder) or not corpus_paths(folder):
+            # Relógio muda a cada frame e há uma área de vídeo: o corpus cobre as três classes
+            capture_corpus(SyntheticCapture(clock_every=1, video=(700, 380, 320, 180)), folder, count)
+        argv = [folder] + argv[3:]
+    try:
+        result = run_benchmark(argv[0], quality=int(argv[1]) if len(argv) > 1 else 50)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"Política recomendada gravada em {POLICY_FILE}: {result['policy']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
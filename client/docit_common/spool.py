@@ -0,0 +1,155 @@
+"""
+Spool durável (em disco, cifrado) para payloads que não puderam ser entregues ao servidor.
+
+Cada entrada é um arquivo próprio "<timestamp_ns>-<tipo>.spool", gravado de forma atômica
+e cifrado pela mesma função do Doc-IT.dat. Limites:
+  - idade: entradas mais velhas que max_age são descartadas;
+  - tamanho: acima de max_bytes, as mais antigas saem primeiro;
+  - coalescência: um tipo coalescente (ex: inventário) guarda só a versão mais nova,
+    já que um inventário novo substitui por completo o anterior.
+replay() reenvia em lotes com pausa entre eles, parando na primeira falha. O timestamp do nome
+é o da coleta (put(stamp=...)), e vai junto para send(): quem entrega pode descartar uma entrada
+mais velha que algo já entregue por outro caminho.
+"""
+import os
+import json
+import time
+import threading
+
+from . import log_event
+
+MAX_BYTES = 20 * 1024 * 1024
+MAX_AGE = 7 * 24 * 3600
+REPLAY_BATCH = 5
+REPLAY_INTERVAL = 2.0
+
+
+class Spool:
+
+    def __init__(self, directory, encrypt, decrypt, finalize=None,
+                 max_bytes=MAX_BYTES, max_age=MAX_AGE, coalesce_kinds=("inventory",)):
+        self.directory = directory
+        self.encrypt = encrypt
+        self.decrypt = decrypt
+        self.finalize = finalize
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.coalesce_kinds = set(coalesce_kinds)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def _entries(self):
+        """Lista (caminho, tipo, timestamp_ns, tamanho), da mais antiga para a mais nova."""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return entries
+        for name in names:
+            if not name.endswith(".spool"):
+                continue
+            stamp, _, kind = name[:-len(".spool")].partition("-")
+            try:
+                path = os.path.join(self.directory, name)
+                entries.append((path, kind, int(stamp), os.path.getsize(path)))
+            except (ValueError, OSError):
+                continue
+        entries.sort(key=lambda e: e[2])
+        return entries
+
+    def _remove(self, path):
+        try: os.remove(path)
+        except OSError: pass
+
+    def _enforce_limits(self):
+        entries = self._entries()
+        cutoff = time.time_ns() - int(self.max_age * 1e9)
+        total = sum(e[3] for e in entries)
+        for path, kind, stamp, size in entries:
+            if stamp < cutoff or total > self.max_bytes:
+                self._remove(path)
+                total -= size
+                self.dropped += 1
+                log_event(f"Spool: entrada '{kind}' descartada por limite de idade/tamanho.", "WARNING")
+
+    def put(self, kind, payload, stamp=None):
+        """
+        Grava um payload não entregue. stamp: time_ns da coleta (padrão: agora). Tipos coalescentes
+        guardam só a entrada de stamp mais novo.
+        """
+        stamp = stamp or time.time_ns()
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                data = self.encrypt(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+                path = os.path.join(self.directory, f"{stamp}-{kind}.spool")
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(data)
+                if self.finalize:
+                    try: self.finalize(tmp_path)
+                    except Exception: pass
+                os.replace(tmp_path, path)
+            except Exception as e:
+                log_event(f"Falha ao gravar no spool offline: {e}", "ERROR")
+                return False
+
+            if kind in self.coalesce_kinds:
+                same_kind = [e for e in self._entries() if e[1] == kind]
+                newest = max(e[2] for e in same_kind)
+                for old_path, _, old_stamp, _ in same_kind:
+                    if old_stamp < newest:
+                        self._remove(old_path)
+            self._enforce_limits()
+        log_event(f"Payload '{kind}' guardado no spool offline para reenvio.", "INFO")
+        return True
+
+    def discard(self, kind, up_to=None):
+        """
+        Remove entradas de um tipo (ex: inventário entregue por outro caminho tornou o spool obsoleto).
+        up_to: só as de stamp até esse valor (uma coleta mais nova que a entregue continua no spool).
+        """
+        with self._lock:
+            for path, entry_kind, stamp, _ in self._entries():
+                if entry_kind == kind and (up_to is None or stamp <= up_to):
+                    self._remove(path)
+
+    def __len__(self):
+        return len(self._entries())
+
+    def _load(self, path):
+        with open(path, "rb") as f:
+            return json.loads(self.decrypt(f.read()).decode("utf-8"))
+
+    def replay(self, send, batch_size=REPLAY_BATCH, interval=REPLAY_INTERVAL):
+        """
+        Reenvia as entradas (mais antigas primeiro) chamando send(kind, payload, stamp) -> bool.
+        Para na primeira falha; retorna quantas foram entregues.
+        """
+        with self._lock:
+            self._enforce_limits()
+            entries = self._entries()
+        delivered = 0
+        for index, (path, kind, stamp, _) in enumerate(entries):
+            if index and index % batch_size == 0:
+                time.sleep(interval)
+            if not os.path.exists(path):
+                continue
+            try:
+                payload = self._load(path)
+            except Exception as e:
+                log_event(f"Spool: entrada ilegível descartada ({e}).", "WARNING")
+                self._remove(path)
+                continue
+            try:
+                ok = send(kind, payload, stamp)
+            except Exception as e:
+                log_event(f"Spool: falha ao reenviar '{kind}': {e}", "WARNING")
+                ok = False
+            if not ok:
+                break
+            self._remove(path)
+            delivered += 1
+        if delivered:
+            log_event(f"Spool offline: {delivered} payload(s) reenviado(s) ao servidor.", "INFO")
+        return delivered
@@ -0,0 +1,200 @@
+"""
+Supervisor de submódulos orientado a eventos.
+
+Em vez de consultar poll() de cada processo a cada 20s, cada filho ganha uma thread que
+fica bloqueada em handle.wait() (WaitForSingleObject no Windows, waitpid no Linux) e avisa
+o supervisor pela fila de eventos assim que o processo morre. O supervisor dorme na fila
+até o próximo evento ou o próximo restart agendado.
+
+Reinício:
+  - backoff exponencial (base * 2^n, até max_backoff) entre crashes seguidos;
+  - um processo que ficou de pé por stable_after segundos zera o backoff;
+  - crash_limit saídas dentro de crash_window = crash loop: o módulo passa a ser
+    reiniciado só no intervalo máximo e o estado é reportado no heartbeat.
+
+A criação de processos fica atrás de ProcessLauncher, então o supervisor pode ser exercitado
+no Linux com SubprocessLauncher e processos filhos de teste.
+"""
+import time
+import queue
+import subprocess
+import threading
+
+from . import log_event
+
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+STABLE_AFTER = 60.0
+CRASH_WINDOW = 300.0
+CRASH_LIMIT = 5
+LAUNCH_RETRY = 20.0
+
+
+class ProcessLauncher:
+    """Interface: launch(name) devolve um handle com wait(), kill() e pid, ou None se não deu para iniciar agora."""
+
+    def launch(self, name):
+        raise NotImplementedError
+
+
+class SubprocessLauncher(ProcessLauncher):
+    """Lançador genérico via subprocess.Popen (Linux, modo dev e testes)."""
+
+    def __init__(self, commands, **popen_kwargs):
+        self.commands = commands
+        self.popen_kwargs = popen_kwargs
+
+    def launch(self, name):
+        return subprocess.Popen(self.commands[name], **self.popen_kwargs)
+
+
+class ModuleState:
+
+    def __init__(self, name):
+        self.name = name
+        self.handle = None
+        self.generation = 0
+        self.started_at = 0.0
+        self.next_start = 0.0
+        self.backoff_level = 0
+        self.restarts = 0
+        self.exits = []
+        self.last_exit_code = None
+        self.crash_loop = False
+
+    def as_dict(self):
+        return {
+            "running": self.handle is not None,
+            "restarts": self.restarts,
+            "lastExitCode": self.last_exit_code,
+            "crashLoop": self.crash_loop,
+        }
+
+
+class ModuleSupervisor:
+
+    def __init__(self, launcher, modules, base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF,
+                 stable_after=STABLE_AFTER, crash_window=CRASH_WINDOW, crash_limit=CRASH_LIMIT,
+                 launch_retry=LAUNCH_RETRY, on_start=None, on_exit=None):
+        """on_start(name, handle) / on_exit(name, handle, code): ganchos opcionais (ex: registro de PIDs)."""
+        self.launcher = launcher
+        self.on_start = on_start
+        self.on_exit = on_exit
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.stable_after = stable_after
+        self.crash_window = crash_window
+        self.crash_limit = crash_limit
+        self.launch_retry = launch_retry
+        self.modules = {name: ModuleState(name) for name in modules}
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    # --- API pública ---
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="module-supervisor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Para de supervisionar (sem matar nada). Use kill_all() em seguida para encerrar os filhos."""
+        self._running = False
+        self._events.put(None)
+
+    def kill_all(self):
+        with self._lock:
+            handles = [m.handle for m in self.modules.values() if m.handle is not None]
+        for handle in handles:
+            try: handle.kill()
+            except Exception: pass
+
+    def handle(self, name):
+        with self._lock:
+            module = self.modules.get(name)
+            return module.handle if module else None
+
+    def stats(self):
+        with self._lock:
+            return {name: m.as_dict() for name, m in self.modules.items()}
+
+    # --- Loop ---
+    def _notify(self, hook, *args):
+        if hook is None:
+            return
+        try:
+            hook(*args)
+        except Exception as e:
+            log_event(f"Erro no gancho do supervisor para {args[0]}: {e}", "WARNING")
+
+    def _watch(self, name, generation, handle):
+        try:
+            code = handle.wait()
+        except Exception:
+            code = None
+        self._events.put((name, generation, code))
+
+    def _launch(self, module, now):
+        try:
+            handle = self.launcher.launch(module.name)
+        except Exception as e:
+            log_event(f"Erro ao instanciar módulo {module.name}: {e}", "ERROR")
+            handle = None
+        if handle is None:
+            # Sem executável ou sem sessão de usuário: tenta de novo mais tarde, sem contar como crash
+            module.next_start = now + self.launch_retry
+            return
+        with self._lock:
+            module.handle = handle
+            module.generation += 1
+            module.started_at = now
+        self._notify(self.on_start, module.name, handle)
+        threading.Thread(target=self._watch, args=(module.name, module.generation, handle),
+                         name=f"watch-{module.name}", daemon=True).start()
+
+    def _on_exit(self, name, generation, code, now):
+        module = self.modules.get(name)
+        if module is None or generation != module.generation or module.handle is None:
+            return
+        uptime = now - module.started_at
+        self._notify(self.on_exit, name, module.handle, code)
+        with self._lock:
+            module.handle = None
+            module.last_exit_code = code
+            module.restarts += 1
+        if uptime >= self.stable_after:
+            module.backoff_level = 0
+        module.exits = [t for t in module.exits if now - t < self.crash_window] + [now]
+
+        was_crash_loop = module.crash_loop
+        module.crash_loop = len(module.exits) >= self.crash_limit
+        if module.crash_loop:
+            delay = self.max_backoff
+            if not was_crash_loop:
+                log_event(f"Módulo {name} em crash loop ({len(module.exits)} saídas em {self.crash_window:.0f}s). "
+                          f"Reinícios espaçados em {delay:.0f}s.", "CRITICAL")
+        else:
+            delay = min(self.max_backoff, self.base_backoff * (2 ** module.backoff_level))
+            module.backoff_level += 1
+        module.next_start = now + delay
+        log_event(f"Módulo {name} encerrou (código {code}, {uptime:.0f}s de vida). Reiniciando em {delay:.0f}s.", "WARNING")
+
+    def _run(self):
+        while self._running:
+            now = time.monotonic()
+            for module in self.modules.values():
+                if module.handle is None and module.next_start <= now:
+                    self._launch(module, now)
+
+            pending = [m.next_start for m in self.modules.values() if m.handle is None]
+            timeout = max(0.0, min(pending) - time.monotonic()) if pending else None
+            try:
+                event = self._events.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            if event is None:
+                continue
+            self._on_exit(*event, time.monotonic())
@@ -0,0 +1,136 @@
+"""
+Descoberta de versão dos binários do agente com cache por identidade de arquivo.
+
+O heartbeat do Core, a bandeja (a cada 5s) e o Updater liam ProductVersion de cada .exe
+(GetFileVersionInfoW) e executavam `osqueryi --version` repetidamente. O cache guarda o
+resultado por caminho + tamanho + mtime e persiste num arquivo ao lado dos executáveis,
+compartilhado entre os processos. Se o arquivo muda (update, rollback), a chave muda e o
+resolvedor roda de novo.
+
+Os resolvedores são plugáveis: VersionCache(resolver=...) ou get(path, resolver=...),
+o que permite testar o cache no Linux com binários falsos.
+"""
+import os
+import json
+import ctypes
+import threading
+import subprocess
+
+from . import log_event
+
+SIDECAR_NAME = "Doc-IT-versions.cache"
+
+
+def read_pe_product_version(path):
+    """Lê a versão (ProductVersion) diretamente dos metadados do executável via API do Windows."""
+    if not os.path.exists(path):
+        return None
+    try:
+        size = ctypes.windll.version.GetFileVersionInfoSizeW(path, None)
+        if not size: return None
+        buffer = ctypes.create_string_buffer(size)
+        ctypes.windll.version.GetFileVersionInfoW(path, None, size, buffer)
+        length = ctypes.c_uint()
+        ptr = ctypes.c_void_p()
+        # Tenta obter a informação de tradução (idioma/codepage)
+        ctypes.windll.version.VerQueryValueW(buffer, '\\VarFileInfo\\Translation', ctypes.byref(ptr), ctypes.byref(length))
+        if length.value >= 4:
+            data = ctypes.string_at(ptr, 4)
+            lang = data[1] << 8 | data[0]
+            cp = data[3] << 8 | data[2]
+            key = f'\\StringFileInfo\\{lang:04x}{cp:04x}\\ProductVersion'
+            ctypes.windll.version.VerQueryValueW(buffer, key, ctypes.byref(ptr), ctypes.byref(length))
+            if length.value > 0:
+                return ctypes.wstring_at(ptr, length.value).strip('\x00')
+    except Exception as e:
+        log_event(f"Erro ao extrair versão de {path}: {e}", "WARNING")
+    return None
+
+
+def read_osquery_version(path):
+    """Executa `osqueryi --version` ("osqueryi version 5.x.y"). Levanta exceção se o binário não responder."""
+    flags = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+    output = subprocess.check_output([path, "--version"], text=True, creationflags=flags, timeout=15)
+    parts = output.strip().split(" ")
+    return parts[2] if len(parts) > 2 else parts[1]
+
+
+class VersionCache:
+
+    def __init__(self, sidecar_path=None, resolver=read_pe_product_version):
+        self.sidecar_path = sidecar_path
+        self.resolver = resolver
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = None
+
+    @staticmethod
+    def _identity(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+
+    def _read_sidecar(self):
+        if not self.sidecar_path:
+            return {}
+        try:
+            with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except Exception:
+            return {}
+
+    def _persist(self):
+        if not self.sidecar_path:
+            return
+        try:
+            # Outros processos podem ter gravado entradas novas: mescla antes de substituir
+            merged = self._read_sidecar()
+            merged.update(self._entries)
+            tmp_path = f"{self.sidecar_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(merged, f)
+            os.replace(tmp_path, self.sidecar_path)
+            self._entries = merged
+        except Exception as e:
+            # Sem permissão de escrita (ex: GUI como usuário comum): o cache segue só em memória
+            log_event(f"Cache de versões não persistido em {self.sidecar_path}: {e}", "DEBUG")
+
+    def get(self, path, resolver=None):
+        """Versão do binário em path, ou None se não existir / não puder ser lida."""
+        resolver = resolver or self.resolver
+        key = os.path.normcase(os.path.abspath(path))
+        try:
+            identity = self._identity(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._read_sidecar()
+            entry = self._entries.get(key)
+            if entry and entry.get("id") == identity and entry.get("resolver") == resolver.__name__:
+                self.hits += 1
+                return entry.get("version")
+
+        self.misses += 1
+        try:
+            version = resolver(path)
+        except Exception as e:
+            log_event(f"Falha ao resolver versão de {path}: {e}", "WARNING")
+            version = None
+
+        with self._lock:
+            # Mesmo uma falha fica registrada para esta identidade: binário corrompido não é reexecutado a cada ciclo
+            self._entries[key] = {"id": identity, "resolver": resolver.__name__, "version": version}
+            self._persist()
+        return version
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if self._entries is None:
+                return
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.normcase(os.path.abspath(path)), None)
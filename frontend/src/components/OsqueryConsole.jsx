@@ -13,7 +13,8 @@ import {
     Trash2,
     Table as TableIcon,
     BookOpen,
-    Settings2
+    Settings2,
+    XCircle
 } from 'lucide-react';
 import './OsqueryConsole.css';
 
@@ -33,6 +34,12 @@ const OsqueryConsole = () => {
     const [history, setHistory] = useState([]);
     const [templates, setTemplates] = useState([]);
     const [isModalOpen, setIsModalOpen] = useState(false);
+    // queryId da consulta em andamento: resultados de outras consultas (ou já canceladas) são ignorados
+    const currentQueryRef = useRef(null);
+    // Páginas recebidas da consulta em andamento (o agente manda o resultado em partes)
+    const pageRowsRef = useRef([]);
+    const [receivedRows, setReceivedRows] = useState(0);
+    const [summary, setSummary] = useState(null);
 
     // Fetch dynamic templates from API
     const fetchTemplates = async () => {
@@ -69,14 +76,24 @@ const OsqueryConsole = () => {
 
         const handleAgentList = (list) => setOnlineAgents(list);
         const handleResults = (data) => {
+            if (data.queryId && data.queryId !== currentQueryRef.current) return;
             if (data.agentId === selectedAgent || !selectedAgent) {
+                if (data.page !== undefined) {
+                    pageRowsRef.current.push(...JSON.parse(data.rows));
+                    setReceivedRows(pageRowsRef.current.length);
+                    return;
+                }
+                currentQueryRef.current = null;
                 if (data.error) {
                     setError(data.error);
                     setResults(null);
                 } else {
-                    setResults(data.results);
+                    // Agente antigo manda tudo de uma vez em `results`
+                    setResults(data.results || pageRowsRef.current);
+                    setSummary(data.done ? data : null);
                     setError(null);
                 }
+                pageRowsRef.current = [];
                 setLoading(false);
             }
         };
@@ -100,12 +117,28 @@ const OsqueryConsole = () => {
         setLoading(true);
         setError(null);
         setResults(null);
+        setSummary(null);
+        setReceivedRows(0);
+        pageRowsRef.current = [];
 
-        socket.emit('osquery:query', { agentId: selectedAgent, sql });
+        const queryId = window.crypto?.randomUUID
+            ? window.crypto.randomUUID()
+            : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+        currentQueryRef.current = queryId;
+        socket.emit('osquery:query', { agentId: selectedAgent, sql, queryId });
 
         setHistory(prev => [{ sql, timestamp: new Date() }, ...prev].slice(0, 10));
     };
 
+    const cancelQuery = () => {
+        if (!currentQueryRef.current) return;
+        socket.emit('osquery:cancel', { queryId: currentQueryRef.current });
+        currentQueryRef.current = null;
+        pageRowsRef.current = [];
+        setLoading(false);
+        setError('Consulta cancelada.');
+    };
+
     const downloadResults = () => {
         if (!results) return;
         const blob = new Blob([JSON.stringify(results, null, 2)], { type: 'application/json' });
@@ -270,6 +303,8 @@ const OsqueryConsole = () => {
                             <TableIcon size={18} />
                             <span>RESULTADOS DA QUERY</span>
                             {results && <span className="osq-badge">{results.length} linhas</span>}
+                            {summary && <span className="osq-badge">{summary.durationMs} ms</span>}
+                            {summary?.truncated && <span className="osq-badge warning">Truncado no limite de linhas</span>}
                         </div>
                         <div className="osq-actions">
                             {results && (
@@ -288,7 +323,11 @@ const OsqueryConsole = () => {
                             <div className="osq-state-box loading-state">
                                 <div className="osq-loader-ring"></div>
                                 <h4>Consultando agente remotamente...</h4>
-                                <p>Aguardando resposta do cliente via mTLS.</p>
+                                <p>{receivedRows > 0 ? `${receivedRows} linhas recebidas...` : 'Aguardando resposta do cliente via mTLS.'}</p>
+                                <button onClick={cancelQuery} className="osq-btn-icon danger osq-btn-cancel" title="Cancelar consulta">
+                                    <XCircle size={16} />
+                                    <span>Cancelar</span>
+                                </button>
                             </div>
                         )}
 
@@ -3,6 +3,55 @@ import { useSocket } from '../context/SocketContext';
 import { Play, Square, Loader, Maximize2, Monitor, Eye, EyeOff, MouseOff, Mouse, WifiOff } from 'lucide-react';
 import './RemoteDesktop.css';
 
+// Cabeçalho binário do frame (docit_common/frames.py), little-endian:
+// [u8 versão][u32 streamId][u32 seq][u16 largura][u16 altura][u64 timestamp ms]
+// Versão 1: [JPEG da tela inteira]
+// Versão 2: [u8 flags (bit 0: keyframe)][u16 n] + n x [u16 x][u16 y][u16 w][u16 h][u8 codec][u32 tamanho][imagem]
+const FRAME_VERSION = 1;
+const REGION_FRAME_VERSION = 2;
+const FRAME_HEADER_SIZE = 21;
+const REGION_HEADER_SIZE = 13;
+const CODEC_MIME = ['image/jpeg', 'image/png', 'image/webp'];
+
+const parseFrameHeader = (frame) => {
+    if (!frame) return null;
+    const bytes = frame instanceof Uint8Array ? frame : new Uint8Array(frame);
+    if (bytes.byteLength < FRAME_HEADER_SIZE) return null;
+    const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+    const version = view.getUint8(0);
+    if (version !== FRAME_VERSION && version !== REGION_FRAME_VERSION) return null;
+    const header = {
+        streamId: view.getUint32(1, true),
+        seq: view.getUint32(5, true),
+        width: view.getUint16(9, true),
+        height: view.getUint16(11, true),
+        timestamp: view.getUint32(13, true) + view.getUint32(17, true) * 2 ** 32,
+    };
+    if (version === FRAME_VERSION) {
+        header.keyframe = true;
+        header.regions = [{ x: 0, y: 0, width: header.width, height: header.height, mime: 'image/jpeg', data: bytes.subarray(FRAME_HEADER_SIZE) }];
+        return header;
+    }
+    let offset = FRAME_HEADER_SIZE;
+    header.keyframe = (view.getUint8(offset) & 1) === 1;
+    const count = view.getUint16(offset + 1, true);
+    offset += 3;
+    header.regions = [];
+    for (let i = 0; i < count; i++) {
+        const size = view.getUint32(offset + 9, true);
+        header.regions.push({
+            x: view.getUint16(offset, true),
+            y: view.getUint16(offset + 2, true),
+            width: view.getUint16(offset + 4, true),
+            height: view.getUint16(offset + 6, true),
+            mime: CODEC_MIME[view.getUint8(offset + 8)] || 'image/jpeg',
+            data: bytes.subarray(offset + REGION_HEADER_SIZE, offset + REGION_HEADER_SIZE + size),
+        });
+        offset += REGION_HEADER_SIZE + size;
+    }
+    return header;
+};
+
 const RemoteDesktop = ({ agentId, deviceName, isAgentOnline = true }) => {
     const { socket, isConnected } = useSocket();
     const canvasRef = useRef(null);
@@ -18,6 +67,11 @@ const RemoteDesktop = ({ agentId, deviceName, isAgentOnline = true }) => {
 
     // Watchdog de Sinal: se não recebermos frames por X segundos, consideramos sinal perdido
     const isViewingRef = useRef(false);
+    // Frames por região só valem sobre o anterior: desenho em fila, na ordem de chegada,
+    // e o último frame aplicado (streamId/seq) para detectar buracos e pedir keyframe
+    const drawChainRef = useRef(Promise.resolve());
+    const frameBaseRef = useRef(null);
+    const keyframeRequestRef = useRef(0);
     const lastFrameReceivedRef = useRef(Date.now());
     const [isSignalLost, setIsSignalLost] = useState(false);
 
@@ -38,7 +92,7 @@ const RemoteDesktop = ({ agentId, deviceName, isAgentOnline = true }) => {
         socket.emit('desktop:get_monitors', { agentId });
 
         const handleDesktopFrame = async (data) => {
-            // data: { agentId, imageB64, width, height }
+            // data: { agentId, frame } — frame é binário: cabeçalho compacto + JPEG
             if (data.agentId !== agentId) return;
 
             // Isolamento Básico Colaborativo:
@@ -55,28 +109,39 @@ const RemoteDesktop = ({ agentId, deviceName, isAgentOnline = true }) => {
             if (!canvas) return;
             const ctx = canvas.getContext('2d');
 
+            const header = parseFrameHeader(data.frame);
+            if (!header) return;
+
+            drawChainRef.current = drawChainRef.current.then(() => drawFrame(canvas, ctx, header));
+        };
+
+        const drawFrame = async (canvas, ctx, header) => {
             try {
-                // Decodifica o Base64 manualmente para Blobs nativos. 
-                // Isso EVITA o spam monstruoso de "data:image" na aba Network do DevTools
-                // e é mais gentil com o Garbage Collector do DOM.
-                const byteCharacters = atob(data.imageB64);
-                const byteNumbers = new Array(byteCharacters.length);
-                for (let i = 0; i < byteCharacters.length; i++) {
-                    byteNumbers[i] = byteCharacters.charCodeAt(i);
+                const base = frameBaseRef.current;
+                if (!header.keyframe && (!base || base.streamId !== header.streamId || base.seq + 1 !== header.seq)) {
+                    // Delta sem o frame anterior (perdido/reconexão): descarta e pede a tela inteira
+                    frameBaseRef.current = null;
+                    if (Date.now() - keyframeRequestRef.current > 1000) {
+                        keyframeRequestRef.current = Date.now();
+                        socket.emit('desktop:keyframe', { agentId });
+                    }
+                    return;
                 }
-                const byteArray = new Uint8Array(byteNumbers);
-                const blob = new Blob([byteArray], { type: 'image/jpeg' });
 
-                // createImageBitmap processa a imagem em background (off-main-thread)
-                const bitmap = await createImageBitmap(blob);
+                // Cada região vai direto para um Blob (sem base64/atob) e é decodificada fora da main thread
+                const bitmaps = await Promise.all(header.regions.map(region =>
+                    createImageBitmap(new Blob([region.data], { type: region.mime }))));
 
-                // Redimensiona o canvas para bater com a proporção nativa vinda do Python
-                if (canvas.width !== data.width || canvas.height !== data.height) {
-                    canvas.width = data.width;
-                    canvas.height = data.height;
+                // Redimensiona o canvas para bater com a proporção nativa vinda do Python (só keyframes cobrem a tela toda)
+                if (header.keyframe && (canvas.width !== header.width || canvas.height !== header.height)) {
+                    canvas.width = header.width;
+                    canvas.height = header.height;
                 }
-                ctx.drawImage(bitmap, 0, 0, data.width, data.height);
-                bitmap.close(); // Libera IMEDIATAMENTE a memoria bitmap pro GC
+                header.regions.forEach((region, i) => {
+                    ctx.drawImage(bitmaps[i], region.x, region.y, region.width, region.height);
+                    bitmaps[i].close(); // Libera IMEDIATAMENTE a memoria bitmap pro GC
+                });
+                frameBaseRef.current = { streamId: header.streamId, seq: header.seq };
 
                 // Calcular FPS
                 setFrameStats(prev => {
@@ -88,6 +153,9 @@ const RemoteDesktop = ({ agentId, deviceName, isAgentOnline = true }) => {
                 });
             } catch (err) {
                 console.error("Erro ao desenhar frame remoto:", err);
+            } finally {
+                // Ack cumulativo: devolve o crédito ao agente (controle de fluxo por janela)
+                socket.emit('desktop:ack', { agentId, streamId: header.streamId, seq: header.seq });
             }
         };
 
@@ -166,9 +234,9 @@ const RemoteDesktop = ({ agentId, deviceName, isAgentOnline = true }) => {
     useEffect(() => {
         let reconnectInterval = null;
 
-        // Watchdog loop: verifica a cada 1s se o sinal parou
+        // Watchdog loop: verifica a cada 1s se o sinal parou (com a aba escondida o agente pausa de propósito)
         const watchdogInterval = setInterval(() => {
-            if (isViewingRef.current && streamActive && !isSignalLost) {
+            if (isViewingRef.current && streamActive && !isSignalLost && !document.hidden) {
                 const timeSinceLastFrame = Date.now() - lastFrameReceivedRef.current;
                 if (timeSinceLastFrame > 5000) { // 5 segundos sem frame = sinal perdido
                     console.warn('[RemoteDesktop] Watchdog: Sinal de vídeo interrompido (5s timeout).');
@@ -206,6 +274,18 @@ const RemoteDesktop = ({ agentId, deviceName, isAgentOnline = true }) => {
         };
     }, [isAgentOnline, socket, isConnected, agentId, streamActive, isSignalLost]);
 
+    // Aba escondida: avisa o agente para pausar a captura (e retomar quando voltar)
+    useEffect(() => {
+        if (!socket) return;
+        const handleVisibility = () => {
+            if (!isViewingRef.current) return;
+            if (!document.hidden) lastFrameReceivedRef.current = Date.now(); // não conta a pausa como sinal perdido
+            socket.emit('desktop:visibility', { agentId, hidden: document.hidden });
+        };
+        document.addEventListener('visibilitychange', handleVisibility);
+        return () => document.removeEventListener('visibilitychange', handleVisibility);
+    }, [socket, agentId]);
+
     // Efeito dedicado apenas para parar a stream quando o componente é desmontado (sair da página)
     useEffect(() => {
         return () => {
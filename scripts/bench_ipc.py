@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+=== Doc-IT Bench: Canal IPC persistente ===
+Teste de carga do protocolo IPC (docit_common.ipc) sobre Unix Domain Sockets, sem precisar
+de Windows: simula o Remote empurrando frames + eventos de input e pedidos get_config.
+
+Uso: python scripts/bench_ipc.py [segundos] [tamanho_frame_kb]
+"""
+import os
+import sys
+import time
+import threading
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from docit_common import ipc
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    frame_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 80
+
+    sock_path = os.path.join(tempfile.mkdtemp(prefix="docit-ipc-"), "DocIT_Core_IPC.sock")
+    transport = ipc.UnixSocketTransport(sock_path)
+    stats = {"frames": 0, "bytes": 0, "events": 0}
+
+    def core_handler(conn, message, blob):
+        action = message.get("action")
+        if action == "desktop_frame":
+            stats["frames"] += 1
+            stats["bytes"] += len(blob)
+        elif action == "get_config":
+            return {"status": "success", "config": {"log_level": "INFO"}}
+        else:
+            stats["events"] += 1
+
+    server = ipc.IPCServer(transport, core_handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    time.sleep(0.2)
+
+    client = ipc.IPCClient(transport, "remote")
+    frame = os.urandom(frame_kb * 1024)
+    latencies = []
+    start = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - start < duration:
+        client.send_event({"action": "desktop_frame", "data": {"width": 1280, "height": 720}}, blob=frame)
+        for _ in range(10):
+            client.send_event({"action": "input_echo", "data": {"x": sent, "y": sent}})
+        t0 = time.perf_counter()
+        client.request({"action": "get_config"}, timeout=5.0)
+        latencies.append(time.perf_counter() - t0)
+        sent += 1
+
+    time.sleep(0.2)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print("=== Doc-IT Bench: IPC ===")
+    print(f"Frames: {stats['frames']} ({stats['frames'] / elapsed:.1f}/s, {stats['bytes'] / elapsed / 1024 / 1024:.1f} MiB/s)")
+    print(f"Eventos: {stats['events']} ({stats['events'] / elapsed:.0f}/s)")
+    print(f"get_config RTT: p50={latencies[len(latencies) // 2] * 1000:.3f}ms p99={latencies[int(len(latencies) * 0.99)] * 1000:.3f}ms")
+    client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,15 @@
-import win32pipe
 import win32file
 import win32security
 import win32con
 import pywintypes
-import json
 import time
 import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from docit_common import ipc
 
 CORE_PIPE = r'\\.\pipe\DocIT_Core_IPC'
-REMOTE_PIPE = r'\\.\pipe\DocIT_Remote_IPC'
 
 def test_pipe_access(pipe_name):
     print(f"\n[TEST] Verificando acesso ao Pipe: {pipe_name}")
@@ -44,30 +45,21 @@ def test_token_validation(pipe_name, valid_token):
     for p in payloads:
         print(f"  --> Testando: {p['desc']}")
         try:
-            handle = win32file.CreateFile(
-                pipe_name,
-                win32file.GENERIC_READ | win32file.GENERIC_WRITE,
-                0, None,
-                win32file.OPEN_EXISTING,
-                0, None
-            )
-            win32pipe.SetNamedPipeHandleState(handle, win32pipe.PIPE_READMODE_MESSAGE, None, None)
-            win32file.WriteFile(handle, json.dumps(p['data']).encode('utf-8'))
+            stream = ipc.NamedPipeTransport(pipe_name).connect(timeout=2.0)
+            stream.write(ipc.encode_frame(ipc.KIND_REQUEST, 1, p['data']))
             
             # Tenta ler resposta (Core envia resposta para get_config)
             if pipe_name == CORE_PIPE and p['desc'] == "Token Válido":
                 try:
-                    resp, data = win32file.ReadFile(handle, 65536)
-                    print(f"      [RESULT] Resposta recebida (Tamanho: {len(data)} bytes)")
-                    # Tenta parsear pra validar que é JSON valido
-                    parsed = json.loads(data.decode('utf-8'))
+                    _, _, parsed, _ = ipc.read_frame(stream)
+                    print("      [RESULT] Resposta recebida")
                     print(f"      [RESULT] Status do get_config: {parsed.get('status')}")
                 except Exception as read_ex:
                     print(f"      [RESULT] Nenhuma resposta válida (Erro: {read_ex})")
             elif pipe_name == CORE_PIPE:
-                print(f"      [RESULT] Esperando recusa (Sem resposta ativa programada)")
+                print("      [RESULT] Esperando recusa (Sem resposta ativa programada)")
             
-            win32file.CloseHandle(handle)
+            stream.close()
         except Exception as e:
             print(f"      [FAIL] Erro ao enviar payload: {e}")
 
@@ -76,7 +68,6 @@ if __name__ == "__main__":
     
     # Testa acesso básico
     test_pipe_access(CORE_PIPE)
-    test_pipe_access(REMOTE_PIPE)
     
     if len(sys.argv) > 1:
         token = sys.argv[1]
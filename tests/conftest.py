@@ -0,0 +1,10 @@
+"""
+Testes da biblioteca compartilhada do agente (client/docit_common) no Linux.
+
+Os scripts Doc-IT-*.py dependem de pywin32 e ficam de fora; os componentes de docit_common
+carregam sem ele (transporte por Unix socket, motores e fontes de captura falsos).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
@@ -0,0 +1,97 @@
+import threading
+import time
+
+from docit_common.capture import CaptureSource, Frame, SyntheticCapture
+from docit_common.change_detect import ChangeDetector
+from docit_common.pipeline import FramePipeline
+
+
+def changed_rows(a, b, width):
+    stride = width * 4
+    return {row for row in range(len(a) // stride) if a[row * stride:(row + 1) * stride] != b[row * stride:(row + 1) * stride]}
+
+
+def test_synthetic_frames_are_fresh_deterministic_bgra_buffers():
+    with SyntheticCapture(320, 200, seed=3) as source:
+        monitor = source.monitors()[1]
+        first, second = source.grab(monitor), source.grab(monitor)
+    assert isinstance(first, Frame) and first.size == (320, 200)
+    assert len(first.raw) == 320 * 200 * 4
+    assert first.raw is not second.raw  # o anterior continua valendo como referência do diff
+
+    with SyntheticCapture(320, 200, seed=3) as again:
+        assert again.grab(again.monitors()[1]).raw == first.raw
+
+
+def test_synthetic_changes_are_small_and_local():
+    source = SyntheticCapture(640, 360, clock_every=4)
+    monitor = source.monitors()[1]
+    shots = [source.grab(monitor).raw for _ in range(5)]
+    # Só o cursor pisca entre frames seguidos; o relógio muda no 4º
+    assert changed_rows(shots[0], shots[1], 640) == set(range(80, 96))
+    assert changed_rows(shots[3], shots[4], 640) >= set(range(360 - 28, 360 - 8))
+    assert shots[0] == shots[2]
+
+
+def test_static_and_video_modes():
+    static = SyntheticCapture(160, 120, static=True)
+    monitor = static.monitors()[1]
+    assert static.grab(monitor).raw == static.grab(monitor).raw
+
+    video = SyntheticCapture(160, 120, video=(10, 10, 40, 30))
+    a, b = video.grab(monitor).raw, video.grab(monitor).raw
+    assert changed_rows(a, b, 160) >= set(range(10, 40))
+
+
+def test_capture_source_is_a_context_manager():
+    events = []
+
+    class Probe(CaptureSource):
+        def open(self):
+            events.append("open")
+            return self
+
+        def close(self):
+            events.append("close")
+
+    with Probe() as probe:
+        assert isinstance(probe, Probe)
+    assert events == ["open", "close"]
+
+
+def test_pipeline_driven_by_synthetic_source_skips_static_frames():
+    source = SyntheticCapture(320, 200, clock_every=1000)
+    detector = ChangeDetector()
+    sent = []
+    grabs = {"n": 0}
+    done = threading.Event()
+
+    def capture():
+        grabs["n"] += 1
+        if grabs["n"] > 12:
+            done.set()
+            return None
+        shot = source.grab(monitor)
+        if not detector.check(shot.raw, shot.width, shot.height):
+            return None
+        detector.commit()
+        return shot
+
+    with source:
+        monitor = source.monitors()[1]
+        pipeline = FramePipeline([("encode", lambda shot: bytes(shot.raw[:16])), ("transmit", lambda data: sent.append(data) or True)])
+        # Com o relógio parado, só o cursor muda: frames pares e ímpares alternam, nenhum é estático
+        pipeline.run(capture, lambda: not done.is_set())
+    assert detector.frames == 12 and detector.unchanged == 0
+    deadline = time.monotonic() + 2.0
+    while pipeline.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert pipeline.in_flight == 0 and pipeline.completed == len(sent) >= 1
+
+    static = SyntheticCapture(320, 200, static=True)
+    detector = ChangeDetector()
+    for _ in range(5):
+        shot = static.grab(static.monitors()[1])
+        if detector.check(shot.raw, shot.width, shot.height):
+            detector.commit()
+    assert detector.unchanged == 4
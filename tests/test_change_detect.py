@@ -0,0 +1,67 @@
+from docit_common.change_detect import ChangeDetector
+
+WIDTH, HEIGHT = 64, 32
+
+
+def frame(fill=0):
+    return bytearray([fill]) * (WIDTH * HEIGHT * 4)
+
+
+def poke(raw, x, y, value=255):
+    """Altera um pixel (BGRA) e devolve um novo buffer, como faria a próxima captura."""
+    copy = bytearray(raw)
+    copy[(y * WIDTH + x) * 4] = value
+    return copy
+
+
+def test_first_frame_changes_and_same_frame_does_not():
+    detector = ChangeDetector(row_step=8)
+    assert detector.check(frame(), WIDTH, HEIGHT)
+    detector.commit()
+    assert not detector.check(frame(), WIDTH, HEIGHT)
+    assert detector.stats() == {"frames": 2, "unchanged": 1, "fullCompares": 1}
+
+
+def test_change_in_sampled_row_skips_the_full_compare():
+    detector = ChangeDetector(row_step=8)
+    base = frame()
+    detector.check(base, WIDTH, HEIGHT)
+    detector.commit()
+    assert detector.check(poke(base, 10, 4), WIDTH, HEIGHT)  # linha 4: amostrada (row_step // 2)
+    assert detector.full_compares == 0
+
+
+def test_change_outside_sampled_rows_is_caught_by_the_full_compare():
+    detector = ChangeDetector(row_step=8)
+    base = frame()
+    detector.check(base, WIDTH, HEIGHT)
+    detector.commit()
+    # cursor piscando numa linha fora da amostra: hash igual, memcmp diferente
+    assert detector.check(poke(base, 10, 5), WIDTH, HEIGHT)
+    assert detector.full_compares == 1 and detector.unchanged == 0
+
+
+def test_reference_only_advances_on_commit():
+    detector = ChangeDetector()
+    base = frame()
+    detector.check(base, WIDTH, HEIGHT)
+    detector.commit()
+    changed = poke(base, 0, 4)
+    assert detector.check(changed, WIDTH, HEIGHT)
+    # envio falhou (sem commit): o próximo frame igual ainda é mudança em relação ao Core
+    assert detector.check(changed, WIDTH, HEIGHT)
+    detector.commit()
+    assert not detector.check(poke(base, 0, 4), WIDTH, HEIGHT)
+
+
+def test_size_change_and_reset_force_a_frame():
+    detector = ChangeDetector()
+    detector.check(frame(), WIDTH, HEIGHT)
+    detector.commit()
+    # mesmo conteúdo, outra geometria (troca de monitor/resolução)
+    assert detector.check(frame(), WIDTH * 2, HEIGHT // 2)
+    detector.commit()
+    assert not detector.check(frame(), WIDTH * 2, HEIGHT // 2)
+    detector.commit()
+    detector.reset()
+    assert detector.check(frame(), WIDTH * 2, HEIGHT // 2)
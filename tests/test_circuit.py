@@ -0,0 +1,95 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from docit_common import circuit
+from docit_common.circuit import CircuitBreaker, CircuitRegistry
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code}")
+        self.response = response
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.monotonic do módulo controlado pelo teste."""
+    now = [1000.0]
+    monkeypatch.setattr(circuit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_opens_after_threshold_with_jittered_backoff(clock):
+    breaker = CircuitBreaker("srv", threshold=2, base_backoff=10)
+    breaker.record_failure()
+    assert breaker.state == circuit.CLOSED and breaker.available()
+    breaker.record_failure()
+    assert breaker.state == circuit.OPEN and not breaker.available()
+    assert 5 <= breaker.remaining() <= 10
+
+
+def test_half_open_allows_a_single_trial(clock):
+    breaker = CircuitBreaker("srv", threshold=1, base_backoff=10, trial_timeout=30)
+    breaker.record_failure()
+    clock[0] += 10
+    assert breaker.state == circuit.HALF_OPEN
+    assert breaker.available()          # primeiro chamador leva o teste
+    assert not breaker.available()      # os outros esperam o resultado
+    clock[0] += 30
+    assert breaker.available()          # teste nunca registrado: libera outro
+    breaker.record_success()
+    assert breaker.state == circuit.CLOSED and breaker.opens == 0
+
+
+def test_failed_trial_reopens_with_a_longer_backoff(clock):
+    breaker = CircuitBreaker("srv", threshold=1, base_backoff=10, max_backoff=25)
+    breaker.record_failure()
+    for ceiling in (20, 25, 25):
+        clock[0] = breaker.open_until
+        assert breaker.available()
+        breaker.record_failure()
+        assert breaker.state == circuit.OPEN
+        assert ceiling / 2 <= breaker.remaining() <= ceiling
+
+
+def test_retry_after_sets_the_minimum_and_opens_immediately(clock):
+    breaker = CircuitBreaker("srv", threshold=5, base_backoff=1)
+    breaker.record_failure(retry_after=120)
+    assert breaker.state == circuit.OPEN and breaker.remaining() == 120
+
+
+def test_parse_retry_after():
+    assert circuit.parse_retry_after("30") == 30.0
+    assert circuit.parse_retry_after("-5") == 0.0
+    assert circuit.parse_retry_after(None) is None
+    assert circuit.parse_retry_after("amanhã") is None
+    assert 50 <= circuit.parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+
+def test_only_connection_errors_5xx_and_429_are_server_failures():
+    assert circuit.is_server_failure(ConnectionError("recusado"))
+    assert circuit.is_server_failure(Response(503))
+    assert circuit.is_server_failure(HTTPError(Response(429)))
+    assert not circuit.is_server_failure(Response(404))
+    assert not circuit.is_server_failure(HTTPError(Response(401)))
+    assert not circuit.is_server_failure(Response(200))
+    assert circuit.retry_after_from(HTTPError(Response(503, {"Retry-After": "7"}))) == 7.0
+    assert circuit.retry_after_from(ConnectionError()) is None
+
+
+def test_registry_keeps_one_breaker_per_url(clock):
+    registry = CircuitRegistry(threshold=1, base_backoff=10)
+    assert registry.available("https://a")  # URL nunca vista não cria breaker
+    assert registry.states() == {}
+    registry.record_failure("https://a")
+    registry.record_success("https://b")
+    assert registry.states() == {"https://a": circuit.OPEN, "https://b": circuit.CLOSED}
+    assert not registry.available("https://a") and registry.available("https://b")
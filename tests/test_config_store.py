@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+from docit_common import config_store
+from docit_common.config_store import ConfigStore
+
+
+def reverse(data):
+    return data[::-1]  # "cifragem" reversível, só para conferir que o arquivo passou por encrypt
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return json.loads(reverse(f.read()))
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_saves_within_the_window_coalesce_into_one_write(tmp_path):
+    path = str(tmp_path / "Doc-IT.dat")
+    store = ConfigStore(path, reverse, window=0.05)
+    for index in range(10):
+        assert store.save({"server_url": f"https://srv{index}"})
+    assert store.dirty and not os.path.exists(path)
+    assert wait_for(lambda: not store.dirty)
+    assert store.writes == 1 and store.changes == 10
+    assert read(path) == {"server_url": "https://srv9"}
+
+
+def test_identical_content_is_not_written(tmp_path):
+    path = str(tmp_path / "Doc-IT.dat")
+    store = ConfigStore(path, reverse, window=10)
+    store.seed(ConfigStore.serialize({"a": 1}))
+    assert store.save({"a": 1}) is False
+    assert store.save({"a": 2})
+    assert store.save({"a": 2}) is False  # igual ao pendente
+    assert store.flush() and store.writes == 1
+    assert store.save({"a": 2}, immediate=True) is False
+    assert store.writes == 1
+
+
+def test_immediate_write_is_atomic_and_finalized(tmp_path):
+    path = str(tmp_path / "Doc-IT.dat")
+    finalized = []
+    store = ConfigStore(path, reverse, finalize=finalized.append, window=10)
+    assert store.save({"token": "x"}, immediate=True)
+    assert read(path) == {"token": "x"}
+    assert finalized == [f"{path}.tmp"] and not os.path.exists(f"{path}.tmp")
+
+
+def test_failed_write_keeps_the_old_file_and_retries(tmp_path, monkeypatch):
+    path = str(tmp_path / "Doc-IT.dat")
+    store = ConfigStore(path, reverse, window=0.01)
+    assert store.save({"v": 1}, immediate=True)
+
+    real_replace = os.replace
+    failures = {"left": 2}
+
+    def flaky_replace(src, dst):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise OSError("disco cheio")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(config_store.os, "replace", flaky_replace)
+    assert store.save({"v": 2}, immediate=True) is False
+    assert read(path) == {"v": 1} and not os.path.exists(f"{path}.tmp")
+    assert store.dirty and store.failures == 1
+    # O retry agendado pelo próprio flush grava sem novo save()
+    assert wait_for(lambda: not store.dirty)
+    assert read(path) == {"v": 2} and store.failures == 0 and store.writes == 2
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from docit_common.circuit import CircuitRegistry
+from docit_common.endpoints import EndpointSelector
+
+PRIMARY, BACKUP, DR = "https://primario", "https://backup", "https://dr"
+
+
+class FakeServers:
+    """probe(url, timeout): atraso e resultado por URL; URL ausente = morta até o timeout."""
+
+    def __init__(self, **behaviour):
+        self.behaviour = behaviour
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, url, timeout):
+        with self.lock:
+            self.calls.append(url)
+        delay, ok = self.behaviour.get(url, (timeout, False))
+        time.sleep(delay)
+        return ok
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def test_untested_urls_keep_the_configured_order_after_healthy_ones():
+    selector = EndpointSelector(FakeServers())
+    selector.record_success(DR, 0.05)
+    selector.record_success(BACKUP, 0.01)
+    selector.record_failure(PRIMARY)
+    assert selector.ordered([PRIMARY, BACKUP, DR, "https://novo"]) == [BACKUP, DR, "https://novo", PRIMARY]
+    selector.record_success(PRIMARY, 0.2)
+    # Primária saudável volta para a frente mesmo mais lenta
+    assert selector.ordered([PRIMARY, BACKUP, DR]) == [PRIMARY, BACKUP, DR]
+
+
+def test_ordered_races_when_nothing_is_known_healthy():
+    servers = FakeServers(**{BACKUP: (0.0, True), DR: (0.0, True)})
+    selector = EndpointSelector(servers, stagger=0.05, probe_timeout=0.3)
+    started = time.monotonic()
+    # Primária morta (fica pendurada até o timeout): o backup entra após o escalonamento e ganha
+    assert selector.ordered([PRIMARY, BACKUP, DR, BACKUP, ""])[0] == BACKUP
+    assert time.monotonic() - started < 0.3
+    assert servers.calls[:2] == [PRIMARY, BACKUP] and DR not in servers.calls
+    assert selector.scores()[BACKUP]["failures"] == 0
+
+
+def test_race_returns_none_when_every_server_is_down():
+    servers = FakeServers(**{PRIMARY: (0.0, False), BACKUP: (0.0, False)})
+    selector = EndpointSelector(servers, stagger=0.05, probe_timeout=0.2)
+    assert selector.race([PRIMARY, BACKUP]) is None
+    assert all(score["failures"] == 1 for score in selector.scores().values())
+
+
+def test_probe_exceptions_count_as_failures():
+    def probe(url, timeout):
+        raise ConnectionError("recusado")
+
+    selector = EndpointSelector(probe, stagger=0.01, probe_timeout=0.1)
+    assert selector.race([PRIMARY]) is None
+    assert selector.scores()[PRIMARY]["failures"] == 1
+
+
+def test_latency_is_smoothed():
+    selector = EndpointSelector(FakeServers())
+    selector.record_success(PRIMARY, 0.100)
+    selector.record_success(PRIMARY, 0.200)
+    assert selector.scores()[PRIMARY]["latencyMs"] == 130.0
+
+
+def test_open_circuits_are_left_out_and_4xx_is_not_a_failure():
+    breakers = CircuitRegistry(threshold=1, base_backoff=60)
+    selector = EndpointSelector(FakeServers(), breakers=breakers)
+    selector.record_success(BACKUP)
+    selector.record_error(PRIMARY, Response(404))
+    assert breakers.states()[PRIMARY] == "closed" and PRIMARY not in selector.scores()
+    selector.record_error(PRIMARY, Response(503))
+    assert selector.ordered([PRIMARY, BACKUP]) == [BACKUP]
+    selector.record_failure(BACKUP)
+    assert selector.ordered([PRIMARY, BACKUP]) == []
+
+
+def test_reprobe_promotes_the_recovered_primary():
+    servers = FakeServers(**{BACKUP: (0.0, True)})
+    selector = EndpointSelector(servers, probe_timeout=0.05)
+    selector.record_success(BACKUP)
+    selector.record_failure(PRIMARY)
+    assert selector.ordered([PRIMARY, BACKUP]) == [BACKUP, PRIMARY]
+    servers.behaviour[PRIMARY] = (0.0, True)
+    selector.start_reprobe(lambda: [PRIMARY, BACKUP], interval=0.02)
+    deadline = time.monotonic() + 2.0
+    while selector.ordered([PRIMARY, BACKUP])[0] != PRIMARY and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert selector.ordered([PRIMARY, BACKUP]) == [PRIMARY, BACKUP]
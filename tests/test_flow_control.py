@@ -0,0 +1,59 @@
+from docit_common.flow_control import MAX_RTO, MIN_RTO, CreditWindow
+
+
+def simulate(window, frames, interval, rtt, size=10000, stream_id=1, start=100.0):
+    """Frames enviados a cada `interval` e confirmados `rtt` depois, em ordem."""
+    events = []
+    for seq in range(1, frames + 1):
+        sent = start + seq * interval
+        events.append((sent, 0, seq))
+        events.append((sent + rtt, 1, seq))
+    for now, kind, seq in sorted(events):
+        if kind == 0:
+            window.on_sent(stream_id, seq, size, now=now)
+        else:
+            window.on_ack(stream_id, seq, now=now)
+
+
+def test_window_follows_bandwidth_delay_product():
+    fast = CreditWindow(gain=2.0)
+    simulate(fast, 100, interval=0.01, rtt=0.04)
+    # 100 frames/s x 40 ms = 4 frames em voo; ganho 2 -> 8 (+1 do arredondamento para cima)
+    assert 8 <= fast.window <= 9
+    state = fast.state()
+    assert state["acked"] == 100 and abs(state["rtt"] - 0.04) < 1e-3
+
+    slow = CreditWindow(gain=2.0)
+    simulate(slow, 100, interval=0.01, rtt=0.5)
+    assert slow.window == slow.max_window
+
+
+def test_cumulative_ack_covers_lost_acks_and_ignores_repeats():
+    window = CreditWindow()
+    for seq in range(1, 6):
+        window.on_sent(1, seq, 1000, now=float(seq))
+    assert window.on_ack(1, 3, now=10.0)
+    assert window.delivered == 3000 and window.acked == 3
+    assert not window.on_ack(1, 2, now=11.0)   # atrasado
+    assert not window.on_ack(2, 5, now=11.0)   # outro stream
+    assert window.on_ack(1, 5, now=12.0) and window.delivered == 5000
+
+
+def test_rto_bounds():
+    window = CreditWindow()
+    assert window.rto == MAX_RTO  # sem amostra ainda
+    simulate(window, 20, interval=0.01, rtt=0.01)
+    assert window.rto == MIN_RTO
+
+
+def test_new_stream_and_reset():
+    window = CreditWindow(initial_window=3)
+    simulate(window, 50, interval=0.01, rtt=0.04)
+    window.on_sent(1, 51, 10000, now=200.0)
+    learned = window.window
+    window.reset()
+    assert window.acked == 51 and window.window == learned  # reconexão: mesmo stream, sem frames em voo
+    window.on_sent(2, 1, 5000, now=201.0)
+    assert window.state() == {"streamId": 2, "acked": 0, "window": 3, "rto": MAX_RTO, "rtt": None}
+    window.reset(stream_id=3)
+    assert window.stream_id == 3 and window.highest_sent == 0
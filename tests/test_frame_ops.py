@@ -0,0 +1,76 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from docit_common import frame_ops
+from docit_common.capture import SyntheticCapture
+
+
+def grab(source):
+    return source.grab(source.monitors()[1])
+
+
+def test_factor_one_converts_bgrx_to_rgbx_like_pil():
+    shot = grab(SyntheticCapture(200, 120, video=(20, 20, 60, 40)))
+    scaler = frame_ops.FrameScaler()
+    out = scaler.downscale(shot.raw, shot.width, shot.height, 1)
+    assert out.shape == (120, 200, 4)
+    expected = np.asarray(Image.frombuffer("RGB", shot.size, shot.raw, "raw", "BGRX", 0, 1))
+    assert np.array_equal(out[:, :, :3], expected)
+    assert (out[:, :, 3] == 255).all()
+
+
+def test_downscale_is_rounded_area_average():
+    raw = bytearray(4 * 4 * 4)
+    for index, value in enumerate((10, 20, 30, 41)):  # B de um bloco 2 x 2: média 25,25 -> 25
+        y, x = divmod(index, 2)
+        raw[(y * 4 + x) * 4] = value
+    out = frame_ops.FrameScaler().downscale(raw, 4, 4, 2)
+    assert out.shape == (2, 2, 4)
+    assert tuple(out[0, 0]) == (0, 0, 25, 255)
+
+
+def test_output_arrays_are_pooled_and_released():
+    shot = grab(SyntheticCapture(160, 90))
+    scaler = frame_ops.FrameScaler(pool_size=2)
+    first = scaler.downscale(shot.raw, 160, 90, 2)
+    second = scaler.downscale(shot.raw, 160, 90, 2)
+    assert first is not second and scaler.allocations == 2
+    scaler.release(first)
+    scaler.release(first)  # repetido não duplica no pool
+    assert scaler.downscale(shot.raw, 160, 90, 2) is first
+    assert scaler.downscale(shot.raw, 160, 90, 2) is not second and scaler.allocations == 3
+    # Tamanho novo: o pool antigo é descartado e arrays velhos não voltam
+    scaler.downscale(shot.raw, 160, 90, 1)
+    scaler.release(second)
+    assert scaler.stats()["allocations"] == 4
+
+
+def test_region_buffer_maps_regions_without_copy():
+    shot = grab(SyntheticCapture(128, 64, video=(0, 0, 128, 64)))
+    scaler = frame_ops.FrameScaler()
+    out = scaler.downscale(shot.raw, 128, 64, 1)
+    # Região encostada na borda inferior: precisa da linha extra do pool
+    region = Image.frombuffer("RGBX", (30, 20), frame_ops.region_buffer(out, 90, 44),
+                              "raw", "RGBX", out.strides[0], 1)
+    assert np.array_equal(np.asarray(region), out[44:64, 90:120])
+    out[44, 90, 0] ^= 0xff
+    assert region.getpixel((0, 0))[0] == out[44, 90, 0]
+
+
+def test_tile_diff_on_raw_capture_matches_python_fallback():
+    from docit_common import region_codec
+
+    source = SyntheticCapture(300, 200, clock_every=1)
+    a, b = grab(source), grab(source)
+    grid = frame_ops.TileDiff(64).grid(b.raw, a.raw, 300, 200, 4)
+    assert grid == region_codec.dirty_tiles(b.raw, a.raw, 300, 200, 4, tile=64)
+    assert grid[1][0] and grid[2][3] and grid[2][4]  # cursor e relógio
+    assert sum(map(sum, grid)) == 3
+
+
+def test_area_factor():
+    assert frame_ops.area_factor(1920, 1080, 1280, 720) == 1
+    assert frame_ops.area_factor(2560, 1440, 1280, 720) == 2
+    assert frame_ops.area_factor(3840, 2160, 854, 480) == 4
@@ -0,0 +1,108 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from docit_common import frames
+
+FRONTEND = os.path.join(os.path.dirname(__file__), "..", "frontend", "src", "components", "RemoteDesktop.jsx")
+
+
+def parse_in_browser(frame_list):
+    """Roda o parseFrameHeader do RemoteDesktop.jsx (no Node) sobre os frames e devolve os cabeçalhos."""
+    node = shutil.which("node")
+    if node is None:
+        pytest.skip("node não instalado")
+    with open(FRONTEND, encoding="utf-8") as f:
+        source = f.read()
+    start = source.index("const FRAME_VERSION")
+    end = source.index("const RemoteDesktop")
+    script = source[start:end] + """
+const frames = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+const parsed = frames.map((hex) => {
+    const header = parseFrameHeader(Buffer.from(hex, 'hex'));
+    if (!header) return null;
+    header.regions = header.regions.map((r) => ({ ...r, data: Buffer.from(r.data).toString('hex') }));
+    return header;
+});
+process.stdout.write(JSON.stringify(parsed));
+"""
+    result = subprocess.run([node, "-e", script], input=json.dumps([bytes(f).hex() for f in frame_list]),
+                            capture_output=True, text=True, timeout=30, check=True)
+    return json.loads(result.stdout)
+
+
+def test_header_round_trip():
+    header = frames.pack_header(0x1_0000_0005, 7, 1280, 720, timestamp_ms=1_700_000_000_123)
+    assert len(header) == frames.FRAME_HEADER.size == 21
+    parsed, offset = frames.unpack_header(header + b"jpeg")
+    assert offset == 21
+    assert parsed == {"streamId": 5, "seq": 7, "width": 1280, "height": 720,
+                      "timestamp": 1_700_000_000_123, "version": frames.FRAME_VERSION}
+
+
+def test_pack_header_into_reserved_buffer():
+    buffer = bytearray(frames.FRAME_HEADER.size) + b"JPEG"
+    frames.pack_header_into(buffer, 3, 9, 854, 480, timestamp_ms=42, version=frames.REGION_FRAME_VERSION)
+    parsed, offset = frames.unpack_header(buffer)
+    assert parsed["version"] == frames.REGION_FRAME_VERSION and parsed["seq"] == 9
+    assert buffer[offset:] == b"JPEG"
+
+
+def test_unknown_version_is_rejected():
+    header = bytearray(frames.pack_header(1, 1, 10, 10))
+    header[0] = 9
+    with pytest.raises(ValueError):
+        frames.unpack_header(header)
+
+
+def test_browser_parses_the_same_header():
+    jpeg = b"\xff\xd8jpeg\xff\xd9"
+    frame = frames.pack_header(77, 2 ** 32 + 3, 1920, 1080, timestamp_ms=2 ** 40 + 5) + jpeg
+    bad = bytearray(frame)
+    bad[0] = 9
+    parsed, unknown, short = parse_in_browser([frame, bad, frame[:20]])
+    assert {k: parsed[k] for k in ("streamId", "seq", "width", "height", "timestamp", "keyframe")} == {
+        "streamId": 77, "seq": 3, "width": 1920, "height": 1080, "timestamp": 2 ** 40 + 5, "keyframe": True}
+    assert parsed["regions"] == [{"x": 0, "y": 0, "width": 1920, "height": 1080,
+                                  "mime": "image/jpeg", "data": jpeg.hex()}]
+    assert unknown is None and short is None
+
+
+def region_frame(regions, keyframe, seq=4):
+    stream = io.BytesIO()
+    stream.write(bytes(frames.FRAME_HEADER.size))
+    frames.write_regions(stream, regions, keyframe)
+    buffer = stream.getbuffer()
+    frames.pack_header_into(buffer, 12, seq, 1280, 720, timestamp_ms=99, version=frames.REGION_FRAME_VERSION)
+    data = bytes(buffer)
+    del buffer
+    return data
+
+
+# (x, y, largura, altura, codec, bytes); codec 0/1/2 = JPEG/PNG/WebP (region_codec.CODEC_IDS)
+REGIONS = [(0, 0, 64, 64, 0, b"\xff\xd8a\xff\xd9"), (64, 32, 16, 8, 1, b"\x89PNG"), (1200, 700, 80, 20, 2, b"")]
+
+
+def test_region_block_round_trip():
+    frame = region_frame(REGIONS, keyframe=False)
+    parsed, offset = frames.unpack_header(frame)
+    assert parsed["version"] == frames.REGION_FRAME_VERSION and offset == frames.FRAME_HEADER.size
+    keyframe, regions = frames.read_regions(frame)
+    assert not keyframe
+    assert [(*region[:5], bytes(region[5])) for region in regions] == REGIONS
+    assert len(frame) == (frames.FRAME_HEADER.size + frames.REGIONS_HEADER.size
+                          + sum(frames.REGION_HEADER.size + len(region[5]) for region in REGIONS))
+    assert frames.read_regions(region_frame([], keyframe=True)) == (True, [])
+
+
+def test_browser_parses_the_same_regions():
+    delta, key = parse_in_browser([region_frame(REGIONS, keyframe=False), region_frame(REGIONS[:1], keyframe=True)])
+    assert (delta["streamId"], delta["seq"], delta["timestamp"], delta["keyframe"]) == (12, 4, 99, False)
+    mime = ["image/jpeg", "image/png", "image/webp"]
+    assert delta["regions"] == [{"x": x, "y": y, "width": w, "height": h, "mime": mime[codec], "data": data.hex()}
+                                for x, y, w, h, codec, data in REGIONS]
+    assert key["keyframe"] and len(key["regions"]) == 1
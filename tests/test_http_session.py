@@ -0,0 +1,82 @@
+import gzip
+import json
+
+import pytest
+
+pytest.importorskip("requests")
+
+from docit_common import http_session
+
+
+@pytest.fixture
+def credentials(tmp_path):
+    paths = {name: tmp_path / f"{name}.pem" for name in ("cert", "key", "ca")}
+    for path in paths.values():
+        path.write_text("-----")
+    return {name: str(path) for name, path in paths.items()}
+
+
+def test_resolve_credentials_uses_only_files_that_exist(credentials, tmp_path):
+    cert, verify = http_session.resolve_credentials(credentials["cert"], credentials["key"], credentials["ca"])
+    assert cert == (credentials["cert"], credentials["key"]) and verify == credentials["ca"]
+    missing = str(tmp_path / "faltando.pem")
+    assert http_session.resolve_credentials(credentials["cert"], missing, missing) == (None, True)
+    assert http_session.resolve_credentials() == (None, True)
+
+
+def test_session_is_reused_until_credentials_change(credentials):
+    manager = http_session.MTLSSessionManager(pool_maxsize=2)
+    first = manager.get(credentials["cert"], credentials["key"], credentials["ca"])
+    assert manager.get(credentials["cert"], credentials["key"], credentials["ca"]) is first
+    assert first.cert == (credentials["cert"], credentials["key"]) and first.verify == credentials["ca"]
+    assert first.get_adapter("https://backend").poolmanager.connection_pool_kw["maxsize"] == 2
+
+    other = manager.get(credentials["cert"], credentials["key"])
+    assert other is not first and other.verify is True
+    assert manager.builds == 2
+
+
+def test_invalidate_forces_a_new_pool(credentials):
+    manager = http_session.MTLSSessionManager()
+    first = manager.get(credentials["cert"], credentials["key"], credentials["ca"])
+    manager.invalidate()
+    assert manager.get(credentials["cert"], credentials["key"], credentials["ca"]) is not first
+    assert manager.builds == 2
+
+
+def test_encode_body_follows_what_the_server_accepts(monkeypatch):
+    body = b'{"software":[' + b'{"name":"App","version":"1.0"},' * 500 + b"]}"
+    assert http_session.encode_body(body) == (body, None)
+    assert http_session.encode_body(b"{}", ("gzip",)) == (b"{}", None)  # abaixo do limite
+    data, encoding = http_session.encode_body(body, ("gzip",))
+    assert encoding == "gzip" and gzip.decompress(data) == body and len(data) < len(body) // 10
+    assert http_session.encode_body(body, ("br",)) == (body, None)
+    # Servidor aceita zstd mas o agente não tem o módulo: cai para gzip
+    monkeypatch.setattr(http_session, "zstandard", None)
+    assert http_session.encode_body(body, ("zstd", "gzip"))[1] == "gzip"
+    assert http_session.encode_body(body, ("zstd",)) == (body, None)
+
+
+def test_encode_body_with_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    body = b"x" * 10000
+    data, encoding = http_session.encode_body(body, ("zstd", "gzip"))
+    assert encoding == "zstd" and zstandard.ZstdDecompressor().decompress(data) == body
+
+
+def test_post_json_sets_content_encoding():
+    calls = []
+
+    class Session:
+        def post(self, url, data, headers, timeout):
+            calls.append((url, data, headers, timeout))
+            return "ok"
+
+    payload = {"hostname": "PC-01", "software": ["App"] * 2000}
+    assert http_session.post_json(Session(), "https://backend/checkin", payload, ("gzip",), timeout=3) == "ok"
+    url, data, headers, timeout = calls[0]
+    assert headers == {"Content-Type": "application/json", "Content-Encoding": "gzip"} and timeout == 3
+    assert json.loads(gzip.decompress(data)) == payload
+
+    http_session.post_json(Session(), "https://backend/checkin", {"a": 1})
+    assert calls[1][2] == {"Content-Type": "application/json"} and calls[1][1] == b'{"a":1}'
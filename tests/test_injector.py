@@ -0,0 +1,103 @@
+import threading
+import time
+
+from docit_common.injector import WHEEL_DELTA, InputInjector, RecordingBackend
+
+
+class GatedBackend(RecordingBackend):
+    """Segura o primeiro lote até o gate abrir: tudo o que chegar enquanto isso vira um lote só."""
+
+    def __init__(self):
+        super().__init__()
+        self.busy = threading.Event()
+        self.gate = threading.Event()
+
+    def inject(self, events):
+        super().inject(events)
+        if len(self.batches) == 1:
+            self.busy.set()
+            self.gate.wait(2.0)
+
+
+def to_screen(data):
+    return data["x"], data["y"]
+
+
+def run_all(injector):
+    injector.close()
+    injector._thread.join(2.0)
+    assert not injector._thread.is_alive()
+
+
+def test_events_arriving_during_a_batch_go_out_together_in_order():
+    backend = GatedBackend()
+    injector = InputInjector(backend, to_screen, tick=0)
+    injector.submit("mouse_move", {"x": 1, "y": 1})
+    assert backend.busy.wait(2.0)
+    injector.submit("mouse_move", {"x": 5, "y": 5})
+    injector.submit("mouse_move", {"x": 9, "y": 9})
+    injector.submit("mouse_down", {"x": 9, "y": 9, "button": "right"})
+    injector.submit("mouse_up", {"x": 10, "y": 9, "button": "right"})
+    injector.submit("mouse_scroll", {"clicks": 2})
+    injector.submit("key_down", {"key": "Enter"})
+    backend.gate.set()
+    run_all(injector)
+    assert backend.batches == [
+        [("move", 1, 1)],
+        # Movimentos seguidos no mesmo lote: só o último; o clique já está na posição
+        [("move", 9, 9), ("button", "right", True), ("move", 10, 9), ("button", "right", False),
+         ("wheel", -2 * WHEEL_DELTA), ("key", "Enter", True), ("key", "Enter", False)],
+    ]
+    stats = injector.stats()
+    assert stats["batches"] == 2 and stats["events"] == 8 and stats["skippedMoves"] == 2
+    assert set(stats["latency"]) == {"mouse_move", "mouse_down", "mouse_up", "mouse_scroll", "key_down"}
+
+
+def test_moves_to_the_current_cursor_position_are_skipped():
+    backend = RecordingBackend()
+    backend.cursor = (50, 50)
+    injector = InputInjector(backend, to_screen, tick=0)
+    injector.submit("mouse_move", {"x": 50, "y": 50})
+    injector.submit("mouse_down", {"x": 50, "y": 50})
+    run_all(injector)
+    assert backend.events == [("button", "left", True)]
+    assert injector.skipped_moves == 2
+
+
+def test_control_commands_run_in_queue_order():
+    backend = RecordingBackend()
+    order = []
+    injector = InputInjector(backend, to_screen, tick=0,
+                             passthrough=lambda cmd, data: order.append((cmd, len(backend.events))))
+    for x in range(3):
+        injector.submit("mouse_move", {"x": x, "y": 0})
+    injector.submit("stop_desktop", {})
+    injector.submit("key_down", {"key": "a"})
+    run_all(injector)
+    # O que veio antes do comando já foi injetado quando ele roda
+    assert order and order[0][0] == "stop_desktop"
+    assert backend.events[:order[0][1]][-1] == ("move", 2, 0)
+    assert backend.events[-2:] == [("key", "a", True), ("key", "a", False)]
+
+
+def test_invalid_events_and_backend_failures_do_not_stop_the_injector():
+    class FailingBackend(RecordingBackend):
+        def inject(self, events):
+            super().inject(events)
+            if len(self.batches) == 1:
+                raise OSError("SendInput bloqueado")
+
+        def cursor_position(self):
+            return None  # sem leitura do cursor real: vale o cache do injetor
+
+    backend = FailingBackend()
+    injector = InputInjector(backend, to_screen, tick=0)
+    injector.submit("mouse_move", {"x": 3, "y": 3})
+    deadline = time.monotonic() + 2.0
+    while not backend.batches and time.monotonic() < deadline:
+        time.sleep(0.005)
+    injector.submit("mouse_move", {"sem": "coordenadas"})
+    injector.submit("mouse_move", {"x": 3, "y": 3})  # cursor desconhecido após a falha: reinjeta
+    run_all(injector)
+    assert backend.batches == [[("move", 3, 3)], [("move", 3, 3)]]
+    assert not injector.submit("mouse_move", {"x": 1, "y": 1})
@@ -0,0 +1,124 @@
+import random
+import threading
+import time
+
+from docit_common.input_queue import InputQueue, LatencyStats
+
+
+class Recorder:
+
+    def __init__(self):
+        self.items = []
+        self.done = threading.Event()
+
+    def __call__(self, cmd, data):
+        self.items.append((cmd, data))
+
+    def wait_for(self, count, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while len(self.items) < count and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return self.items
+
+
+def session_events():
+    """Arrasto com cliques e teclas: a ordem relativa entre botões/teclas é o que importa."""
+    events = [("mouse_move", {"x": 1})]
+    events += [("mouse_down", {"button": "left"})]
+    events += [("mouse_move", {"x": x}) for x in range(2, 12)]
+    events += [("mouse_up", {"button": "left"}), ("key_down", {"key": "a"}), ("key_down", {"key": "b"}),
+               ("mouse_scroll", {"clicks": -1}), ("mouse_down", {"button": "right"}),
+               ("mouse_up", {"button": "right"}), ("mouse_move", {"x": 99})]
+    return [(cmd, dict(data, seq=seq)) for seq, (cmd, data) in enumerate(events, start=1)]
+
+
+def test_shuffled_arrival_is_dispatched_in_sequence_order():
+    events = session_events()
+    discrete = [(cmd, data) for cmd, data in events if cmd != "mouse_move"]
+    for seed in range(20):
+        shuffled = events[:]
+        random.Random(seed).shuffle(shuffled)
+        recorder = Recorder()
+        queue = InputQueue(recorder, move_rate=None, reorder_window=1.0)
+        for cmd, data in shuffled:
+            queue.put(cmd, data, seq=data["seq"])
+        queue.close()
+        queue._thread.join(2.0)
+
+        assert [item for item in recorder.items if item[0] != "mouse_move"] == discrete
+        seqs = [data["seq"] for _, data in recorder.items]
+        assert seqs == sorted(seqs)
+        assert recorder.items[-1] == events[-1]  # a posição final do mouse nunca se perde
+
+
+def test_concurrent_handler_threads_keep_button_order():
+    # Mesma situação do cliente Socket.IO: cada evento chega por uma thread própria
+    events = session_events()
+    recorder = Recorder()
+    queue = InputQueue(recorder, move_rate=None)
+    threads = [threading.Thread(target=queue.put, args=(cmd, data, data["seq"])) for cmd, data in events]
+    for thread in reversed(threads):
+        thread.start()
+    for thread in threads:
+        thread.join()
+    items = recorder.wait_for(len([e for e in events if e[0] != "mouse_move"]) + 1)
+    assert [i for i in items if i[0] != "mouse_move"] == [e for e in events if e[0] != "mouse_move"]
+    queue.close()
+
+
+def test_gap_is_skipped_after_reorder_window_and_late_events_handled():
+    recorder = Recorder()
+    queue = InputQueue(recorder, move_rate=None, reorder_window=0.05)
+    queue.put("mouse_down", {"n": 2}, seq=2)  # seq 1 se perdeu
+    queue.put("mouse_up", {"n": 3}, seq=3)
+    assert [cmd for cmd, _ in recorder.wait_for(2)] == ["mouse_down", "mouse_up"]
+    assert queue.skipped == 1
+
+    queue.put("mouse_move", {"n": 1}, seq=1)  # movimento atrasado: descartado
+    queue.put("key_down", {"n": 1}, seq=1)    # tecla atrasada: ainda é despachada
+    assert [cmd for cmd, _ in recorder.wait_for(3)] == ["mouse_down", "mouse_up", "key_down"]
+    assert queue.late == 2
+    queue.close()
+
+
+def test_consecutive_moves_coalesce_and_unsequenced_events_keep_arrival_order():
+    gate = threading.Event()
+    recorder = Recorder()
+
+    def dispatch(cmd, data):
+        gate.wait(2.0)
+        recorder(cmd, data)
+
+    queue = InputQueue(dispatch, move_rate=None)
+    queue.put("key_down", {"key": "x"})
+    time.sleep(0.05)  # despachante preso no primeiro evento
+    for x in range(50):
+        queue.put("mouse_move", {"x": x})
+    queue.put("mouse_down", {"button": "left"})
+    gate.set()
+    items = recorder.wait_for(3)
+    assert items == [("key_down", {"key": "x"}), ("mouse_move", {"x": 49}), ("mouse_down", {"button": "left"})]
+    assert queue.coalesced == 49
+    queue.close()
+
+
+def test_move_rate_limits_dispatch_frequency():
+    recorder = Recorder()
+    queue = InputQueue(recorder, move_rate=20)
+    start = time.monotonic()
+    for x in range(3):
+        queue.put("mouse_move", {"x": x})
+        time.sleep(0.06)
+    recorder.wait_for(3)
+    assert time.monotonic() - start >= 0.1
+    queue.close()
+
+
+def test_latency_stats_snapshot():
+    stats = LatencyStats(window=4)
+    for ms in (1, 2, 3, 4, 100):
+        stats.record("mouse_down", ms / 1000)
+    snapshot = stats.snapshot()["mouse_down"]
+    assert snapshot["count"] == 5
+    assert snapshot["max_ms"] == 100
+    assert snapshot["avg_ms"] == round((2 + 3 + 4 + 100) / 4, 2)
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from docit_common.inventory_delta import apply_ops, canonical, content_hash, diff
+
+
+def inventory(**changes):
+    doc = {
+        "hostname": "PC-01",
+        "hardware": {"ram_gb": 16, "disks": [{"name": "C:", "size": 256}, {"name": "D:", "size": 1000}]},
+        "software": [{"name": f"App {n}", "version": "1.0"} for n in range(10)],
+    }
+    doc.update(changes)
+    return doc
+
+
+def test_identical_documents_have_no_ops():
+    assert diff(inventory(), inventory()) == []
+
+
+def test_nested_keys_and_lists_become_small_ops():
+    old = inventory()
+    new = inventory(hostname="PC-02")
+    new["hardware"]["ram_gb"] = 32
+    new["software"] = old["software"][1:] + [{"name": "App novo", "version": "2.0"}]
+    del new["hardware"]["disks"]
+    new["gpos"] = ["Senhas"]
+    ops = diff(old, new)
+    assert {"op": "set", "path": ["hostname"], "value": "PC-02"} in ops
+    assert {"op": "set", "path": ["hardware", "ram_gb"], "value": 32} in ops
+    assert {"op": "del", "path": ["hardware", "disks"]} in ops
+    assert {"op": "set", "path": ["gpos"], "value": ["Senhas"]} in ops
+    assert {"op": "list", "path": ["software"], "add": [{"name": "App novo", "version": "2.0"}],
+            "remove": [{"name": "App 0", "version": "1.0"}]} in ops
+    assert content_hash(apply_ops(old, ops)) == content_hash(new)
+
+
+def test_list_that_changed_almost_entirely_is_sent_whole():
+    old = {"software": [1, 2, 3]}
+    assert diff(old, {"software": [4, 5, 3]}) == [{"op": "set", "path": ["software"], "value": [4, 5, 3]}]
+
+
+def test_type_change_is_a_set():
+    assert diff({"a": 1}, {"a": 1.0}) == [{"op": "set", "path": ["a"], "value": 1.0}]
+    assert diff({"a": {"b": True}}, {"a": {"b": 1}}) == [{"op": "set", "path": ["a", "b"], "value": 1}]
+    assert diff([1], {"a": 1}) == [{"op": "set", "path": [], "value": {"a": 1}}]
+
+
+def test_apply_is_a_multiset_and_does_not_touch_the_input():
+    old = {"items": ["a", "b", "a"]}
+    result = apply_ops(old, [{"op": "list", "path": ["items"], "add": ["c"], "remove": ["a"]}])
+    assert result == {"items": ["b", "a", "c"]}
+    assert old == {"items": ["a", "b", "a"]}
+
+
+def test_random_inventories_round_trip_by_hash():
+    rng = random.Random(7)
+    for _ in range(50):
+        old = inventory()
+        new = inventory()
+        for _ in range(rng.randint(1, 5)):
+            choice = rng.random()
+            if choice < 0.3 and new["software"]:
+                new["software"].pop(rng.randrange(len(new["software"])))
+            elif choice < 0.6:
+                new["software"].append({"name": f"App {rng.randint(0, 30)}", "version": str(rng.randint(1, 3))})
+            elif choice < 0.8:
+                new["hardware"]["disks"][0]["size"] = rng.randint(100, 500)
+            else:
+                new[f"extra{rng.randint(0, 3)}"] = rng.random()
+        applied = apply_ops(old, diff(old, new))
+        # Listas são conjuntos: a ordem pode mudar, o conteúdo não
+        assert sorted(map(canonical, applied["software"])) == sorted(map(canonical, new["software"]))
+        assert {k: v for k, v in applied.items() if k != "software"} == {k: v for k, v in new.items() if k != "software"}
+
+
+def test_invalid_paths_and_ops_raise_value_error():
+    with pytest.raises(ValueError):
+        apply_ops({"a": 1}, [{"op": "set", "path": ["x", "y"], "value": 1}])
+    with pytest.raises(ValueError):
+        apply_ops({"a": 1}, [{"op": "list", "path": ["a"], "add": [2]}])
+    with pytest.raises(ValueError):
+        apply_ops({"a": 1}, [{"op": "del", "path": []}])
+    with pytest.raises(ValueError):
+        apply_ops({"a": 1}, [{"op": "move", "path": ["a"]}])
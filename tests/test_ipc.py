@@ -0,0 +1,127 @@
+import socket
+import threading
+
+import pytest
+
+from docit_common import ipc
+
+
+def socket_pair():
+    a, b = socket.socketpair()
+    return ipc.SocketStream(a), ipc.SocketStream(b)
+
+
+def test_frame_round_trip_with_json_and_blob():
+    left, right = socket_pair()
+    try:
+        left.write(ipc.encode_frame(ipc.KIND_REQUEST, 7, {"action": "ping", "data": "ç"}, b"\x00\xffcru"))
+        left.write(ipc.encode_frame(ipc.KIND_EVENT, 0, None))
+        assert ipc.read_frame(right) == (ipc.KIND_REQUEST, 7, {"action": "ping", "data": "ç"}, b"\x00\xffcru")
+        assert ipc.read_frame(right) == (ipc.KIND_EVENT, 0, None, b"")
+    finally:
+        left.close()
+        right.close()
+
+
+def test_frame_with_invalid_size_is_rejected():
+    left, right = socket_pair()
+    try:
+        left.write(ipc._HEADER.pack(ipc.MAX_MESSAGE_SIZE + 1, ipc.KIND_EVENT, 0, 0))
+        with pytest.raises(ipc.IPCError):
+            ipc.read_frame(right)
+        left.write(ipc._HEADER.pack(9, ipc.KIND_EVENT, 0, 50))  # JSON maior que o quadro
+        with pytest.raises(ipc.IPCError):
+            ipc.read_frame(right)
+    finally:
+        left.close()
+        right.close()
+
+
+def test_read_on_closed_peer_raises_connection_closed():
+    left, right = socket_pair()
+    left.close()
+    with pytest.raises(ipc.IPCConnectionClosed):
+        right.read_exactly(1)
+    right.close()
+
+
+def test_make_transport_maps_pipe_name_to_unix_socket(monkeypatch, tmp_path):
+    monkeypatch.setattr(ipc.sys, "platform", "linux")
+    monkeypatch.setenv("DOCIT_IPC_DIR", str(tmp_path))
+    transport = ipc.make_transport(r"\\.\pipe\DocIT_Core")
+    assert isinstance(transport, ipc.UnixSocketTransport)
+    assert transport.path == str(tmp_path / "DocIT_Core.sock")
+
+
+@pytest.fixture
+def server(tmp_path):
+    received = []
+
+    def handler(conn, message, blob):
+        received.append((conn.module, message, blob))
+        if message.get("action") == "echo":
+            return {"status": "success", "echo": message["data"], "size": len(blob)}
+        if message.get("action") == "fail":
+            raise ValueError("falhou")
+        return None
+
+    transport = ipc.UnixSocketTransport(str(tmp_path / "core.sock"))
+    core = ipc.IPCServer(transport, handler)
+    core._listener = transport.listen()  # pronto antes dos clientes conectarem
+    threading.Thread(target=core.serve_forever, daemon=True).start()
+    core.received = received
+    yield core
+    core._listener.close()
+
+
+def test_request_reply_and_events_over_unix_socket(server):
+    client = ipc.IPCClient(server.transport, "remote")
+    try:
+        assert client.request({"action": "echo", "data": 42}) == {"status": "success", "echo": 42, "size": 0}
+        assert server.connection("remote") is not None  # registrado pelo hello
+        # Pedido sem retorno do handler vira success; exceção vira erro com a mensagem
+        assert client.request({"action": "noop"}) == {"status": "success"}
+        assert client.request({"action": "fail"}) == {"status": "error", "message": "falhou"}
+        assert client.send_event({"action": "frame"}, b"x" * 100000)
+        # Ordem preservada na conexão: o evento chega antes da resposta do pedido seguinte
+        client.request({"action": "echo", "data": 1})
+        assert ("remote", {"action": "frame"}, b"x" * 100000) in server.received
+    finally:
+        client.close()
+
+
+def test_server_to_module_event_and_reconnect(server):
+    got = threading.Event()
+    seen = []
+
+    def on_command(conn, message, blob):
+        seen.append(message)
+        got.set()
+
+    client = ipc.IPCClient(server.transport, "remote", handler=on_command)
+    try:
+        client.request({"action": "echo", "data": 0})
+        assert server.send_to("remote", {"cmd": "mouse_move"})
+        assert got.wait(2.0) and seen == [{"cmd": "mouse_move"}]
+        assert not server.send_to("inventory", {"cmd": "x"})  # módulo não conectado
+
+        first = client._conn
+        first.close()
+        assert client.request({"action": "echo", "data": 2})["echo"] == 2
+        assert client._conn is not first
+    finally:
+        client.close()
+
+
+def test_request_times_out_and_unblocks_on_close():
+    left, right = socket_pair()
+    conn = ipc.IPCConnection(left).start()
+    try:
+        with pytest.raises(ipc.IPCTimeout):
+            conn.request({"action": "lento"}, timeout=0.05)
+        threading.Timer(0.05, right.close).start()
+        with pytest.raises(ipc.IPCConnectionClosed):
+            conn.request({"action": "lento"}, timeout=2.0)
+        assert conn.closed
+    finally:
+        conn.close()
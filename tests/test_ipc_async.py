@@ -0,0 +1,106 @@
+import os
+import threading
+import time
+
+import pytest
+
+from docit_common import ipc
+from docit_common.ipc_async import AsyncIPCServer
+
+
+def start_server(tmp_path, handler, **kwargs):
+    path = str(tmp_path / "core.sock")
+    server = AsyncIPCServer(ipc.UnixSocketTransport(path), handler, **kwargs)
+    server.start()
+    deadline = time.monotonic() + 2.0
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return server
+
+
+def test_fast_actions_run_on_the_loop_in_order(tmp_path):
+    seen = []
+
+    def handler(conn, message, blob):
+        seen.append((message["action"], threading.current_thread().name, len(blob)))
+        return {"status": "success", "n": len(seen)}
+
+    server = start_server(tmp_path, handler)
+    client = ipc.IPCClient(server.transport, "remote")
+    try:
+        for index in range(20):
+            assert client.send_event({"action": "desktop_frame"}, bytes(index))
+        assert client.request({"action": "get_config"})["n"] == 21
+        assert [entry[2] for entry in seen[:20]] == list(range(20))
+        assert {entry[1] for entry in seen} == {"core-ipc-loop"}
+        assert server.connection("remote") is not None
+    finally:
+        client.close()
+
+
+def test_blocking_actions_get_busy_when_the_queue_is_full(tmp_path):
+    started, release = threading.Event(), threading.Event()
+
+    def handler(conn, message, blob):
+        if message["action"] == "inventory_ready":
+            started.set()
+            release.wait(2.0)
+        return {"status": "success", "thread": threading.current_thread().name}
+
+    server = start_server(tmp_path, handler, blocking_actions=("inventory_ready",), max_workers=1, max_queue=0)
+    first, second = ipc.IPCClient(server.transport, "inventory"), ipc.IPCClient(server.transport, "gui")
+    replies = []
+    try:
+        worker = threading.Thread(target=lambda: replies.append(first.request({"action": "inventory_ready"})))
+        worker.start()
+        assert started.wait(2.0)
+        assert second.request({"action": "inventory_ready"})["status"] == "busy"
+        # Ações rápidas continuam sendo atendidas com o pool ocupado
+        assert second.request({"action": "get_config"})["status"] == "success"
+        release.set()
+        worker.join(2.0)
+        assert replies[0]["thread"].startswith("core-ipc-work")
+        assert server.stats["busy_replies"] == 1
+    finally:
+        release.set()
+        first.close()
+        second.close()
+
+
+def test_connections_over_the_limit_are_refused(tmp_path):
+    server = start_server(tmp_path, lambda conn, message, blob: None, max_connections=1)
+    first, second = ipc.IPCClient(server.transport, "remote"), ipc.IPCClient(server.transport, "gui")
+    try:
+        assert first.request({"action": "ping"}) == {"status": "success"}
+        with pytest.raises(ipc.IPCConnectionClosed):
+            second.request({"action": "ping"}, timeout=1.0)
+        assert server.stats["refused_connections"] == 1
+        first.close()
+        deadline = time.monotonic() + 2.0
+        while server.active_connections and time.monotonic() < deadline:
+            time.sleep(0.01)
+        second._next_attempt = 0
+        assert second.request({"action": "ping"}) == {"status": "success"}
+    finally:
+        first.close()
+        second.close()
+
+
+def test_writes_from_other_threads_reach_the_module(tmp_path):
+    server = start_server(tmp_path, lambda conn, message, blob: None)
+    got = []
+    done = threading.Event()
+
+    def on_command(conn, message, blob):
+        got.append(message["n"])
+        if len(got) == 50:
+            done.set()
+
+    client = ipc.IPCClient(server.transport, "remote", handler=on_command)
+    try:
+        client.request({"action": "ping"})
+        for n in range(50):
+            assert server.send_to("remote", {"cmd": "key", "n": n})
+        assert done.wait(2.0) and got == list(range(50))
+    finally:
+        client.close()
@@ -0,0 +1,174 @@
+import threading
+
+from docit_common.live_query import LiveQueryScheduler
+from docit_common.osquery_pool import QueryCancelled, QueryError
+
+
+class Reports:
+    """Coleta o que o agendador manda ao servidor, por queryId."""
+
+    def __init__(self):
+        self.messages = {}
+        self._done = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, query_id, message):
+        with self._lock:
+            self.messages.setdefault(query_id, []).append(message)
+            event = self._done.setdefault(query_id, threading.Event())
+        if message.get("done"):
+            event.set()
+
+    def final(self, query_id, timeout=5.0):
+        with self._lock:
+            event = self._done.setdefault(query_id, threading.Event())
+        assert event.wait(timeout), f"{query_id} não terminou"
+        return self.messages[query_id][-1]
+
+
+def gated_run(gate, started=None):
+    """Motor falso: cada query espera o gate, como uma query lenta no osqueryi."""
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def run(query_id, sql, token):
+        with lock:
+            running.append(query_id)
+            peak.append(len(running))
+        if started is not None:
+            started.release()
+        try:
+            while not gate.wait(0.01):
+                if token.cancelled:
+                    raise QueryCancelled("Consulta cancelada.")
+            return ['{"ok":"%s"}' % query_id]
+        finally:
+            with lock:
+                running.remove(query_id)
+
+    run.peak = peak
+    return run
+
+
+def test_queries_run_off_the_caller_thread_within_the_worker_limit():
+    gate, started = threading.Event(), threading.Semaphore(0)
+    run = gated_run(gate, started)
+    reports = Reports()
+    scheduler = LiveQueryScheduler(run, reports, max_workers=2, max_queue=8)
+    for n in range(5):
+        assert scheduler.submit(f"q{n}", "SELECT 1")  # não bloqueia
+    assert started.acquire(timeout=2) and started.acquire(timeout=2)
+    assert not started.acquire(timeout=0.1)  # só 2 ao mesmo tempo
+    gate.set()
+    for n in range(5):
+        final = reports.final(f"q{n}")
+        assert final["rowCount"] == 1 and "error" not in final and final["queuedMs"] >= 0
+    assert max(run.peak) == 2 and scheduler.completed == 5 and scheduler.pending() == 0
+
+
+def test_full_queue_and_duplicate_ids_are_refused():
+    gate, started = threading.Event(), threading.Semaphore(0)
+    reports = Reports()
+    scheduler = LiveQueryScheduler(gated_run(gate, started), reports, max_workers=1, max_queue=1)
+    try:
+        assert scheduler.submit("running", "SELECT 1")
+        assert started.acquire(timeout=2)
+        assert scheduler.submit("queued", "SELECT 1")
+        assert not scheduler.submit("queued", "SELECT 1")
+        assert not scheduler.submit("extra", "SELECT 1")
+        assert "fila de live queries cheia" in reports.messages["extra"][0]["error"]
+        assert scheduler.rejected == 1 and scheduler.pending() == 2
+    finally:
+        gate.set()
+    assert "error" not in reports.final("queued")
+
+
+def test_cancel_queued_and_running_queries():
+    gate, started = threading.Event(), threading.Semaphore(0)
+    run = gated_run(gate, started)
+    reports = Reports()
+    scheduler = LiveQueryScheduler(run, reports, max_workers=1)
+    scheduler.submit("running", "SELECT 1")
+    assert started.acquire(timeout=2)
+    scheduler.submit("queued", "SELECT 1")
+    assert scheduler.cancel("queued") and scheduler.cancel("running")
+    assert not scheduler.cancel("desconhecida")
+    for query_id in ("running", "queued"):
+        final = reports.final(query_id)
+        assert final["cancelled"] and final["error"] == "Consulta cancelada."
+    assert len(run.peak) == 1  # a que estava na fila nem chegou ao motor
+    assert scheduler.cancelled == 2
+
+
+def test_engine_errors_are_reported_and_workers_survive():
+    def run(query_id, sql, token):
+        if sql == "bad":
+            raise QueryError("no such table: bad")
+        if sql == "boom":
+            raise RuntimeError("falha inesperada")
+        return ['{"a":1}']
+
+    reports = Reports()
+    scheduler = LiveQueryScheduler(run, reports, max_workers=1)
+    scheduler.submit("q1", "bad")
+    scheduler.submit("q2", "boom")
+    scheduler.submit("q3", "SELECT 1")
+    assert reports.final("q1")["error"] == "no such table: bad"
+    assert reports.final("q2")["error"] == "falha inesperada"
+    assert reports.final("q3")["rowCount"] == 1
+
+
+def rows_of(count, closed=None):
+    """Registros como o motor entrega: texto JSON, um por item."""
+    try:
+        for n in range(count):
+            yield '{"n":%d}' % n
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+def test_results_are_paged_by_rows_and_bytes():
+    reports = Reports()
+    scheduler = LiveQueryScheduler(lambda query_id, sql, token: rows_of(int(sql)), reports,
+                                   page_rows=4, page_bytes=1024)
+    scheduler.submit("rows", "10")
+    final = reports.final("rows")
+    pages = reports.messages["rows"][:-1]
+    assert [page["page"] for page in pages] == list(range(len(pages))) == list(range(final["pages"]))
+    assert [page["rowCount"] for page in pages] == [4, 4, 2]
+    assert pages[0]["rows"] == '[{"n":0},{"n":1},{"n":2},{"n":3}]'
+    assert final["rowCount"] == 10 and not final["truncated"]
+
+    # '{"n":0}' tem 7 bytes (+1 da vírgula): a 2ª linha já passa dos 10 bytes
+    scheduler.page_bytes = 10
+    scheduler.submit("bytes", "3")
+    assert reports.final("bytes")["pages"] == 2
+    assert [page["rowCount"] for page in reports.messages["bytes"][:-1]] == [2, 1]
+
+
+def test_row_limit_truncates_and_stops_the_engine():
+    closed = threading.Event()
+    reports = Reports()
+    scheduler = LiveQueryScheduler(lambda query_id, sql, token: rows_of(10 ** 9, closed), reports,
+                                   page_rows=100, max_rows=250)
+    scheduler.submit("agent-limit", "SELECT * FROM file")
+    final = reports.final("agent-limit")
+    assert final["truncated"] and final["rowCount"] == 250 and final["pages"] == 3
+    assert closed.is_set()  # o gerador foi fechado: o pool mata o osqueryi ocupado
+
+    scheduler.submit("server-limit", "SELECT * FROM file", max_rows=5)
+    assert reports.final("server-limit")["rowCount"] == 5
+    scheduler.submit("above-agent", "SELECT * FROM file", max_rows=10 ** 6)
+    assert reports.final("above-agent")["rowCount"] == 250
+
+
+def test_empty_result_sends_only_the_summary():
+    reports = Reports()
+    scheduler = LiveQueryScheduler(lambda query_id, sql, token: iter(()), reports)
+    scheduler.submit("empty", "SELECT 1 WHERE 0")
+    assert reports.final("empty") == {"done": True, "rowCount": 0, "pages": 0, "truncated": False,
+                                      "queuedMs": reports.messages["empty"][0]["queuedMs"],
+                                      "durationMs": reports.messages["empty"][0]["durationMs"]}
+    assert len(reports.messages["empty"]) == 1
@@ -0,0 +1,68 @@
+import os
+import time
+
+from docit_common.log_writer import AsyncLogWriter
+
+
+def lines(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_level_filter_format_and_flush(tmp_path):
+    path = str(tmp_path / "logs" / "core.log")
+    level = {"value": "INFO"}
+    writer = AsyncLogWriter(path, "CORE", level_getter=lambda: level["value"])
+    writer.log("invisível", "DEBUG")
+    writer.log("olá", "INFO")
+    level["value"] = "ERROR"
+    writer.log("filtrado", "WARNING")
+    writer.log("falhou", "error")
+    writer.flush()
+    content = lines(path)
+    assert len(content) == 2
+    assert content[0].endswith("[INFO] [CORE] - olá")
+    assert content[1].endswith("[ERROR] [CORE] - falhou")
+
+
+def test_flush_waits_for_everything_logged_before_it(tmp_path):
+    path = str(tmp_path / "remote.log")
+    writer = AsyncLogWriter(path, "REMOTE")
+    for n in range(3000):
+        writer.log(f"linha {n}")
+    writer.flush()
+    content = lines(path)
+    assert len(content) == 3000 and content[-1].endswith("linha 2999")
+
+
+def test_rotation_by_size_keeps_the_configured_backups(tmp_path):
+    path = str(tmp_path / "core.log")
+    for stale in (3, 4, 5):
+        with open(f"{path}.{stale}", "w") as f:
+            f.write("sobra de config antiga\n")
+    writer = AsyncLogWriter(path, "CORE", max_bytes=200, backups=2)
+    for n in range(12):
+        writer.log(f"mensagem {n:02d} " + "x" * 60)
+        writer.flush()
+    assert sorted(os.listdir(tmp_path)) == ["core.log", "core.log.1", "core.log.2"]
+    assert lines(path)[-1].endswith("x" * 60) and "mensagem 11" in lines(path)[-1]
+    assert all(os.path.getsize(f"{path}.{index}") < 300 for index in (1, 2))
+
+
+def test_full_queue_drops_and_reports_the_count(tmp_path):
+    path = str(tmp_path / "core.log")
+    writer = AsyncLogWriter(path, "CORE", max_queue=5)
+    with writer._write_lock:
+        # Escritor preso gravando o primeiro lote: a fila enche atrás dele
+        writer.log("primeira")
+        deadline = time.monotonic() + 2.0
+        while writer._queue.qsize() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for n in range(8):
+            writer.log(f"rajada {n}")
+        assert writer.dropped == 3
+    writer.flush()
+    content = lines(path)
+    assert [line.split(" - ", 1)[1] for line in content[:6]] == ["primeira"] + [f"rajada {n}" for n in range(5)]
+    assert content[-1].endswith("[WARNING] [CORE] - 3 mensagens de log descartadas (fila cheia).")
+    assert writer.dropped == 0
@@ -0,0 +1,171 @@
+import json
+import sys
+import threading
+
+import pytest
+
+from docit_common.osquery_pool import (CancelToken, EngineError, EngineTimeout, OsqueryOneShotProcess, OsqueryPool,
+                                       OsqueryShellProcess, QueryCancelled, QueryError, RowScanner, flatten_sql,
+                                       sentinel_value)
+
+# Shell falso com o protocolo do osqueryi --json: "[", um registro por linha, "]"
+FAKE_OSQUERYI = r'''
+import sys, json, re, time
+
+def emit(rows):
+    print("[\n" + ",\n".join("  " + json.dumps(r) for r in rows) + "\n]", flush=True)
+
+if len(sys.argv) > 2:  # modo antigo: osqueryi --json <sql>
+    if "bad" in sys.argv[2]:
+        print("Error: no such table: bad", flush=True)
+        sys.exit(1)
+    emit([{"oneshot": sys.argv[2]}])
+    sys.exit(0)
+if "--dead" in sys.argv:
+    sys.exit(3)
+for line in sys.stdin:
+    line = line.strip()
+    if not line:
+        continue
+    if line == ".exit":
+        break
+    match = re.match(r"SELECT '(.+)' AS __docit_end;$", line)
+    if match:
+        emit([{"__docit_end": match.group(1)}])
+        continue
+    if "bad" in line:
+        print("Error: no such table: bad", flush=True)
+        continue
+    if "slow" in line:
+        time.sleep(5)
+    if "pretty" in line:
+        print(json.dumps([{"q": line, "n": i} for i in range(3)], indent=2), flush=True)
+        continue
+    count = 5000 if "big" in line else 3
+    emit([{"q": line, "n": i} for i in range(count)])
+'''
+
+
+@pytest.fixture
+def fake_bin(tmp_path):
+    path = tmp_path / "osqueryi"
+    path.write_text(f"#!{sys.executable}\n{FAKE_OSQUERYI}")
+    path.chmod(0o755)
+    return str(path)
+
+
+@pytest.fixture
+def pool(fake_bin):
+    spawned, exited = [], []
+    engine_pool = OsqueryPool(lambda: OsqueryShellProcess(fake_bin), lambda: OsqueryOneShotProcess(fake_bin),
+                              on_spawn=spawned.append, on_exit=exited.append)
+    engine_pool.spawned_engines, engine_pool.exited_engines = spawned, exited
+    yield engine_pool
+    engine_pool.close()
+
+
+def test_flatten_sql_strips_comments_outside_literals():
+    sql = "SELECT name -- nome\nFROM processes /* todos */\nWHERE path = '--x/*y*/';\n"
+    assert flatten_sql(sql) == "SELECT name   FROM processes   WHERE path = '--x/*y*/'"
+    assert flatten_sql("SELECT 'it''s';;") == "SELECT 'it''s'"
+
+
+def test_sentinel_matches_only_its_own_row():
+    assert sentinel_value('  {"__docit_end":"docit-1-2"},\n') == "docit-1-2"
+    assert sentinel_value('  "__docit_end": "docit-1-2"\n') == "docit-1-2"  # saída formatada
+    assert sentinel_value('{"q":"SELECT \'x\' AS __docit_end","n":0}') is None
+    assert sentinel_value('{"__docit_end":"docit-1-2","outra":1}') is None
+    assert sentinel_value('{"__docit_end":3}') is None
+    assert sentinel_value('{"name":"notepad"}') is None
+
+
+def test_row_scanner():
+    scanner = RowScanner()
+    assert scanner.feed("[\n") is None
+    assert scanner.feed('  {"a":1},\n') == '{"a":1}'
+    assert scanner.feed("]\n") is None
+    assert scanner.finish() == [] and scanner.rows == 1
+
+    pretty = RowScanner()
+    for line in json.dumps([{"a": 1}, {"a": 2}], indent=2).splitlines(True):
+        pretty.feed(line + "\n")
+    assert [json.loads(row) for row in pretty.finish()] == [{"a": 1}, {"a": 2}]
+
+    error = RowScanner()
+    error.feed("Error: near \"SELEC\": syntax error\n")
+    with pytest.raises(QueryError, match="syntax error"):
+        error.finish()
+
+
+def test_shell_process_is_reused_across_queries(pool):
+    assert pool.query("SELECT * FROM os_version") == [
+        {"q": "SELECT * FROM os_version;", "n": n} for n in range(3)]
+    # Registro que cita a coluna da sentinela não encerra o resultado
+    rows = pool.query("SELECT '__docit_end' AS x")
+    assert len(rows) == 3 and "__docit_end" in rows[0]["q"]
+    assert len(pool.query("SELECT pretty")) == 3
+    assert sum(1 for _ in pool.stream("SELECT big", timeout=10)) == 5000
+    assert pool.stats() == {"running": 1, "spawned": 1, "recycled": 0, "queries": 4, "oneShot": False}
+    assert pool.spawned_engines[0].pid is not None
+
+
+def test_query_error_keeps_the_process_and_resyncs(pool):
+    pool.query("SELECT 1")
+    with pytest.raises(QueryError, match="no such table"):
+        pool.query("SELECT * FROM bad")
+    assert pool.query("SELECT 2")[0]["q"] == "SELECT 2;"
+    assert pool.stats()["spawned"] == 1
+
+
+def test_processes_are_recycled_after_max_queries(fake_bin):
+    exited = []
+    engine_pool = OsqueryPool(lambda: OsqueryShellProcess(fake_bin), max_queries=2, on_exit=exited.append)
+    try:
+        for n in range(5):
+            engine_pool.query(f"SELECT {n}")
+        assert engine_pool.stats()["spawned"] == 3 and engine_pool.recycled == 2 and len(exited) == 2
+    finally:
+        engine_pool.close()
+
+
+def test_timeout_discards_the_process(pool):
+    with pytest.raises(EngineTimeout):
+        pool.query("SELECT slow", timeout=0.3)
+    assert pool.exited_engines and pool.query("SELECT 1")[0]["n"] == 0
+    assert pool.stats()["spawned"] == 2
+
+
+def test_cancel_kills_the_running_query(pool):
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+    with pytest.raises(QueryCancelled):
+        pool.query("SELECT slow", timeout=10, token=token)
+    with pytest.raises(QueryCancelled):
+        pool.query("SELECT 1", token=token)  # já cancelado: nem roda
+    assert pool.query("SELECT 1")[0]["n"] == 0
+
+
+def test_closing_the_stream_early_kills_the_busy_process(pool):
+    rows = pool.stream("SELECT big", timeout=10)
+    assert json.loads(next(rows))["n"] == 0
+    rows.close()
+    assert pool.exited_engines and pool.stats()["running"] == 0
+    assert len(pool.query("SELECT 1")) == 3
+
+
+def test_falls_back_to_one_process_per_query(fake_bin):
+    engine_pool = OsqueryPool(lambda: OsqueryShellProcess(fake_bin, extra_args=["--dead"]),
+                              lambda: OsqueryOneShotProcess(fake_bin))
+    try:
+        assert engine_pool.query("SELECT 1") == [{"oneshot": "SELECT 1"}]
+        assert engine_pool.stats()["oneShot"]
+        with pytest.raises(QueryError, match="no such table"):
+            engine_pool.query("SELECT * FROM bad")
+    finally:
+        engine_pool.close()
+
+
+def test_engine_that_cannot_start_raises(fake_bin):
+    engine_pool = OsqueryPool(lambda: OsqueryShellProcess(fake_bin, extra_args=["--dead"]))
+    with pytest.raises(EngineError):
+        engine_pool.query("SELECT 1")
@@ -0,0 +1,67 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("psutil")
+
+from docit_common import pid_registry
+from docit_common.pid_registry import PidRegistry
+
+
+@pytest.fixture
+def child():
+    proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    yield proc
+    proc.kill()
+    proc.wait()
+
+
+def test_register_persists_and_checks_liveness(tmp_path, child):
+    state = str(tmp_path / "Doc-IT-pids.json")
+    registry = PidRegistry(state)
+    registry.register("remote", child.pid, exe="Doc-IT-Remote.exe")
+    registry.register("ignorado", 0)
+    assert registry.is_alive("remote") and not registry.is_alive("inventory")
+    snapshot = pid_registry.load_state(state)
+    assert snapshot[str(child.pid)]["name"] == "remote" and snapshot[str(child.pid)]["create_time"]
+    # Outro processo (GUI, Updater) lendo só o arquivo chega à mesma resposta
+    assert pid_registry.is_alive(snapshot, "remote")
+
+    registry.unregister(child.pid)
+    assert pid_registry.load_state(state) == {} and not registry.is_alive("remote")
+
+
+def test_reused_pid_is_not_ours(child):
+    entry = {"name": "remote", "pid": child.pid, "create_time": pid_registry._create_time(child.pid) - 100}
+    assert pid_registry.process_for(entry) is None
+    assert pid_registry.kill_entries({str(child.pid): entry}) == 0
+    assert child.poll() is None
+    assert pid_registry.process_for({"pid": child.pid}) is not None  # sem horário registrado: o PID basta
+
+
+def test_kill_by_name(tmp_path, child):
+    other = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        registry = PidRegistry(None)
+        registry.register("remote", child.pid)
+        registry.register("osqueryi", other.pid)
+        assert registry.kill("remote") == 1
+        assert child.wait(5) is not None and other.poll() is None
+        assert registry.kill() == 1  # o remote já morreu: só o osqueryi
+        assert other.wait(5) is not None
+    finally:
+        other.kill()
+        other.wait()
+
+
+def test_dead_process_and_bad_state_file(tmp_path):
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    create_time = pid_registry._create_time(proc.pid)
+    proc.wait()
+    assert pid_registry.process_for({"pid": proc.pid, "create_time": create_time}) is None
+    broken = tmp_path / "broken.json"
+    broken.write_text("[1, 2")
+    assert pid_registry.load_state(str(broken)) == {}
+    assert pid_registry.load_state(os.path.join(str(tmp_path), "faltando.json")) == {}
@@ -0,0 +1,66 @@
+import threading
+import time
+
+from docit_common.pipeline import FramePipeline, LatestSlot
+
+
+def wait_idle(pipeline, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while pipeline.in_flight and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_latest_slot_replaces_unconsumed_item_and_drains_after_close():
+    slot = LatestSlot()
+    assert slot.put(1) is None
+    assert slot.put(2) == 1
+    slot.close()
+    assert slot.get() == (True, 2)
+    assert slot.get() == (False, None)
+
+
+def test_stop_drains_items_already_in_the_pipeline():
+    started = threading.Event()
+    sent = []
+
+    def slow(item):
+        started.set()
+        time.sleep(0.1)
+        return item
+
+    pipeline = FramePipeline([("convert", slow), ("transmit", lambda item: sent.append(item) or True)])
+    items = iter([1])
+    # Para assim que o primeiro estágio pega o item: o envio ainda não viu nada
+    pipeline.run(lambda: next(items, None), lambda: not started.is_set())
+    wait_idle(pipeline)
+    assert sent == [1]
+    assert pipeline.in_flight == 0 and pipeline.completed == 1
+
+
+def test_drops_are_reported_per_stage():
+    drops = []
+    gate = threading.Event()
+    busy = threading.Event()
+
+    def blocked(item):
+        busy.set()
+        gate.wait()
+        return None if item == 3 else item
+
+    pipeline = FramePipeline([("encode", blocked), ("transmit", lambda item: True)],
+                             on_drop=lambda stage, item, reason: drops.append((stage, item, reason)))
+    items = iter([1, 2, 3])
+
+    def source():
+        item = next(items, None)
+        if item == 2:
+            busy.wait(1.0)  # 1 já está no encode
+        if item is None:
+            gate.set()
+        return item
+
+    pipeline.run(source, lambda: not gate.is_set())
+    wait_idle(pipeline)
+    # 1 está no encode; 2 é substituído por 3 na fila; 3 é rejeitado pelo encode
+    assert drops == [("encode", 2, "stale"), ("encode", 3, "rejected")]
+    assert pipeline.completed == 1 and pipeline.stats()["dropped"] == {"encode": 2, "transmit": 0}
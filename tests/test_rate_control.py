@@ -0,0 +1,102 @@
+import pytest
+
+from docit_common import rate_control
+from docit_common.rate_control import HOLD_INTERVALS, STABLE_INTERVALS, AdaptiveQuality, build_ladder
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """time.monotonic do módulo controlado pelo teste."""
+    now = [1000.0]
+    monkeypatch.setattr(rate_control.time, "monotonic", lambda: now[0])
+    return now
+
+
+class Session:
+    """Simula os intervalos de controle de uma sessão: frames enviados, acks do Core, tempos dos estágios."""
+
+    def __init__(self, control, clock):
+        self.control = control
+        self.clock = clock
+        self.seq = 0
+
+    def interval(self, frames=10, size=1000, rtt=0.05, acked=True, stalls=0, work=0.0):
+        for _ in range(frames):
+            self.seq += 1
+            self.control.on_sent(self.seq, size)
+            self.control.on_work("encode", work)
+            if acked:
+                self.control.on_credits(self.seq, rtt)
+        for _ in range(stalls):
+            self.control.on_stall()
+        self.clock[0] += self.control.interval
+        return self.control.update()
+
+
+def test_ladder_steps_down_one_dimension_at_a_time_to_the_floors():
+    ladder = build_ladder(60, 10)
+    assert ladder[0] == (60, 1.0, 10.0)
+    assert ladder[-1] == (rate_control.MIN_QUALITY, rate_control.MIN_SCALE, float(rate_control.MIN_FPS))
+    for previous, level in zip(ladder, ladder[1:]):
+        changed = [a != b for a, b in zip(previous, level)]
+        assert sum(changed) == 1 and all(b <= a for a, b in zip(previous, level))
+    # Perfil abaixo do piso: o próprio perfil vira o piso daquela dimensão
+    assert all(quality == 15 for quality, _, _ in build_ladder(15, 10))
+
+
+def test_rtt_growth_steps_down_and_severe_growth_steps_down_twice(clock):
+    control = AdaptiveQuality(60, 10)
+    session = Session(control, clock)
+    assert not session.interval(rtt=0.05)
+    assert session.interval(rtt=0.12) and control.level == 1 and control.last_reason == "rtt"
+    assert session.interval(rtt=0.2) and control.level == 3
+    state = control.state()
+    assert state["minRtt"] == 0.05 and state["quality"] == control.ladder[3][0] and state["changes"] == 2
+
+
+def test_recovers_one_level_after_hold_and_stable_intervals(clock):
+    control = AdaptiveQuality(60, 10)
+    session = Session(control, clock)
+    session.interval()
+    session.interval(rtt=0.2)
+    assert control.level == 2
+    for _ in range(max(HOLD_INTERVALS, STABLE_INTERVALS) - 1):
+        assert not session.interval()
+    assert session.interval() and control.level == 1 and control.last_reason == "folga"
+    for _ in range(STABLE_INTERVALS - 1):
+        assert not session.interval()
+    assert session.interval() and control.level == 0
+    assert not session.interval()  # já no teto do perfil
+
+
+def test_credit_stalls_bandwidth_and_cpu_step_down(clock):
+    control = AdaptiveQuality(60, 10)
+    session = Session(control, clock)
+    assert session.interval(frames=5, stalls=5) and control.last_reason == "créditos"
+
+    control = AdaptiveQuality(60, 10)
+    session = Session(control, clock)
+    session.interval(size=1000)  # entrega medida: 10 KB/s
+    # 50 KB/s sem acks, com a captura travando às vezes (abaixo do limite de créditos)
+    assert session.interval(size=5000, acked=False, stalls=1) and control.last_reason == "banda"
+    assert control.state()["deliveryRate"] == 10000
+
+    control = AdaptiveQuality(60, 10)
+    session = Session(control, clock)
+    assert not session.interval(work=0.05)
+    assert session.interval(work=0.095) and control.last_reason == "cpu"  # 10 fps: 100 ms por frame
+
+
+def test_decides_at_most_once_per_interval_and_ignores_idle_screens(clock):
+    control = AdaptiveQuality(60, 10)
+    session = Session(control, clock)
+    session.interval()
+    control.on_sent(1000, 1000)
+    control.on_credits(1000, 0.5)
+    clock[0] += control.interval / 2
+    assert not control.update() and control.level == 0  # intervalo ainda aberto
+    clock[0] += control.interval / 2
+    assert control.update() and control.level == 2
+    # Tela parada: sem frames nem travas, o RTT antigo não conta como medida nova
+    clock[0] += control.interval * 5
+    assert not control.update() and control.level == 2
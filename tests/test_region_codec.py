@@ -0,0 +1,107 @@
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from docit_common import frame_ops, region_codec
+from docit_common.capture import SyntheticCapture
+
+
+def grab(source):
+    return source.grab(source.monitors()[1])
+
+
+def decode(data):
+    return np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+
+
+def test_merge_tiles_joins_runs_and_equal_rows():
+    grid = [
+        [True, True, False],
+        [True, True, False],
+        [False, False, True],
+    ]
+    assert region_codec.merge_tiles(grid, 150, 130, tile=64) == [(0, 0, 128, 128), (128, 128, 22, 2)]
+    assert region_codec.merge_tiles([[False] * 3] * 3, 150, 130, tile=64) == []
+
+
+def test_scale_rect_covers_the_source_rect():
+    assert region_codec.scale_rect((64, 64, 64, 64), (640, 360), (640, 360)) == (64, 64, 64, 64)
+    assert region_codec.scale_rect((64, 0, 64, 64), (640, 360), (320, 180)) == (31, 0, 34, 33)
+    assert region_codec.scale_rect((0, 320, 640, 40), (640, 360), (320, 180)) == (0, 159, 320, 21)
+
+
+def test_encode_image_png_from_rgbx_is_lossless():
+    frame = frame_ops.FrameScaler().downscale(grab(SyntheticCapture(128, 64)).raw, 128, 64, 1)
+    img = region_codec.region_image(frame, (10, 10, 90, 60))
+    assert img.mode == "RGBX"
+    data = region_codec.encode_image(img, "png", 50, io.BytesIO(b"lixo de antes"))
+    assert np.array_equal(decode(data), frame[10:60, 10:90, :3])
+
+
+def test_encoder_tracks_raw_capture_and_sends_only_dirty_regions():
+    source = SyntheticCapture(320, 192, clock_every=1000)
+    scaler = frame_ops.FrameScaler()
+    encoder = region_codec.RegionEncoder(tile=32)
+
+    def step():
+        shot = grab(source)
+        ticket = encoder.track(shot.raw, shot.width, shot.height)
+        frame = scaler.downscale(shot.raw, shot.width, shot.height, 1)
+        return frame, encoder.encode(frame, 50, ticket)
+
+    _, (keyframe, regions) = step()
+    assert keyframe and [r[:4] for r in regions] == [(0, 0, 320, 192)]
+
+    frame, (keyframe, regions) = step()  # só o cursor (x 46-47, y 80-95) piscou
+    assert not keyframe and [r[:4] for r in regions] == [(32, 64, 32, 32)]
+    x, y, w, h, codec, data = regions[0]
+    assert codec == region_codec.CODEC_PNG
+    assert np.array_equal(decode(data), frame[y:y + h, x:x + w, :3])
+    assert encoder.delta_frames == 1
+
+
+def test_encoder_merges_grids_of_dropped_frames():
+    source = SyntheticCapture(320, 192, clock_every=2)
+    encoder = region_codec.RegionEncoder(tile=32)
+    shot = grab(source)
+    encoder.encode(Image.new("RGB", shot.size), 50, encoder.track(shot.raw, 320, 192))
+
+    tickets = []
+    for _ in range(2):
+        shot = grab(source)
+        tickets.append(encoder.track(shot.raw, 320, 192))
+    # O primeiro (cursor) foi descartado no pipeline; o segundo (relógio) leva as duas mudanças
+    img = Image.frombuffer("RGB", shot.size, shot.raw, "raw", "BGRX", 0, 1)
+    keyframe, regions = encoder.encode(img, 50, tickets[-1])
+    assert not keyframe
+    assert {r[:4] for r in regions} == {(32, 64, 32, 32), (224, 160, 96, 32)}
+    assert encoder.encode(img, 50, tickets[-1]) == (False, [])
+
+
+def test_encoder_scales_rects_and_keyframes_on_resize():
+    source = SyntheticCapture(320, 192, clock_every=1000)
+    scaler = frame_ops.FrameScaler()
+    encoder = region_codec.RegionEncoder(tile=32)
+    for factor, expect_keyframe in ((2, True), (2, False), (1, True)):
+        shot = grab(source)
+        ticket = encoder.track(shot.raw, 320, 192)
+        frame = scaler.downscale(shot.raw, 320, 192, factor)
+        keyframe, regions = encoder.encode(frame, 50, ticket)
+        assert keyframe is expect_keyframe
+        if not keyframe:
+            assert [r[:4] for r in regions] == [(15, 31, 18, 18)]
+
+
+def test_encoder_collapses_a_stalled_backlog_into_a_keyframe():
+    source = SyntheticCapture(128, 64)
+    encoder = region_codec.RegionEncoder(tile=32)
+    shot = grab(source)
+    encoder.encode(Image.new("RGB", shot.size), 50, encoder.track(shot.raw, 128, 64))
+    for _ in range(region_codec.MAX_PENDING + 5):
+        shot = grab(source)
+        ticket = encoder.track(shot.raw, 128, 64)
+    keyframe, _ = encoder.encode(Image.new("RGB", shot.size), 50, ticket)
+    assert keyframe
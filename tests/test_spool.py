@@ -0,0 +1,92 @@
+import os
+import time
+
+from docit_common.spool import Spool
+
+
+def xor(data):
+    return bytes(b ^ 0x5a for b in data)  # "cifragem" reversível do teste
+
+
+def make_spool(tmp_path, **kwargs):
+    return Spool(str(tmp_path / "spool"), xor, xor, **kwargs)
+
+
+def replay_all(spool, fail_on=None):
+    sent = []
+
+    def send(kind, payload, stamp):
+        if payload == fail_on:
+            return False
+        sent.append((kind, payload, stamp))
+        return True
+
+    return spool.replay(send, interval=0), sent
+
+
+def test_entries_are_encrypted_and_replayed_oldest_first(tmp_path):
+    spool = make_spool(tmp_path)
+    now = time.time_ns()
+    assert spool.put("tamper", {"n": 2}, stamp=now + 2)
+    assert spool.put("event", {"n": 1}, stamp=now + 1)
+    with open(os.path.join(spool.directory, f"{now + 1}-event.spool"), "rb") as f:
+        assert b'"n"' not in f.read()
+    # Mais velha que max_age: sai já na gravação
+    assert spool.put("event", {"n": 0}, stamp=1000)
+    assert spool.dropped == 1
+    delivered, sent = replay_all(spool)
+    assert delivered == 2 and sent == [("event", {"n": 1}, now + 1), ("tamper", {"n": 2}, now + 2)]
+    assert len(spool) == 0
+
+
+def test_coalescing_kind_keeps_only_the_newest_collection(tmp_path):
+    spool = make_spool(tmp_path)
+    base = time.time_ns()
+    spool.put("inventory", {"v": 2}, stamp=base + 2)
+    spool.put("inventory", {"v": 1}, stamp=base + 1)  # coleta mais velha chegando depois
+    spool.put("tamper", {"t": 1}, stamp=base + 3)
+    _, sent = replay_all(spool)
+    assert [(kind, payload) for kind, payload, _ in sent] == [("inventory", {"v": 2}), ("tamper", {"t": 1})]
+
+
+def test_replay_stops_at_the_first_failure(tmp_path):
+    spool = make_spool(tmp_path, coalesce_kinds=())
+    base = time.time_ns()
+    for n in range(4):
+        spool.put("event", {"n": n}, stamp=base + n)
+    delivered, sent = replay_all(spool, fail_on={"n": 2})
+    assert delivered == 2 and [payload["n"] for _, payload, _ in sent] == [0, 1]
+    assert len(spool) == 2
+    delivered, _ = replay_all(spool)
+    assert delivered == 2 and len(spool) == 0
+
+
+def test_size_limit_drops_the_oldest(tmp_path):
+    spool = make_spool(tmp_path, coalesce_kinds=(), max_bytes=250)
+    base = time.time_ns()
+    for n in range(5):
+        spool.put("event", {"n": n, "pad": "x" * 80}, stamp=base + n)
+    _, sent = replay_all(spool)
+    assert [payload["n"] for _, payload, _ in sent] == [3, 4]
+    assert spool.dropped == 3
+
+
+def test_unreadable_entry_is_discarded(tmp_path):
+    spool = make_spool(tmp_path)
+    base = time.time_ns()
+    spool.put("event", {"ok": True}, stamp=base + 1)
+    with open(os.path.join(spool.directory, f"{base}-event.spool"), "wb") as f:
+        f.write(b"\x00lixo")
+    delivered, sent = replay_all(spool)
+    assert delivered == 1 and sent[0][1] == {"ok": True} and len(spool) == 0
+
+
+def test_discard_up_to_keeps_newer_collections(tmp_path):
+    spool = make_spool(tmp_path, coalesce_kinds=())
+    base = time.time_ns()
+    for n in range(3):
+        spool.put("inventory", {"n": n}, stamp=base + n)
+    spool.put("tamper", {}, stamp=base)
+    spool.discard("inventory", up_to=base + 1)
+    _, sent = replay_all(spool)
+    assert [(kind, payload) for kind, payload, _ in sent] == [("tamper", {}), ("inventory", {"n": 2})]
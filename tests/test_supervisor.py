@@ -0,0 +1,125 @@
+import sys
+import threading
+import time
+
+from docit_common.supervisor import ModuleSupervisor, SubprocessLauncher
+
+
+class FakeHandle:
+    _pids = iter(range(1000, 100000))
+
+    def __init__(self, code):
+        self.pid = next(self._pids)
+        self.code = code
+        self.exited = threading.Event()
+        if code is not None:
+            self.exited.set()
+
+    def wait(self):
+        self.exited.wait()
+        return self.code
+
+    def kill(self):
+        self.code = -9
+        self.exited.set()
+
+
+class FakeLauncher:
+    """Cada launch() devolve o próximo código de saída do roteiro (None = fica de pé)."""
+
+    def __init__(self, script):
+        self.script = {name: list(codes) for name, codes in script.items()}
+        self.launches = []
+
+    def launch(self, name):
+        codes = self.script[name]
+        code = codes.pop(0) if codes else None
+        if code == "indisponível":
+            return None
+        self.launches.append((name, time.monotonic()))
+        return FakeHandle(code)
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    return condition()
+
+
+def test_crashes_restart_with_exponential_backoff():
+    launcher = FakeLauncher({"remote": [1, 1, 1, None]})
+    supervisor = ModuleSupervisor(launcher, ["remote"], base_backoff=0.05, crash_limit=10)
+    supervisor.start()
+    try:
+        assert wait_for(lambda: len(launcher.launches) == 4)
+        times = [t for _, t in launcher.launches]
+        gaps = [b - a for a, b in zip(times, times[1:])]
+        assert gaps[0] >= 0.05 and gaps[1] >= 0.1 and gaps[2] >= 0.2
+        stats = supervisor.stats()["remote"]
+        assert stats == {"running": True, "restarts": 3, "lastExitCode": 1, "crashLoop": False}
+    finally:
+        supervisor.stop()
+        supervisor.kill_all()
+
+
+def test_crash_loop_spaces_restarts_at_the_maximum():
+    launcher = FakeLauncher({"inventory": [2, 2, 2, None]})
+    supervisor = ModuleSupervisor(launcher, ["inventory"], base_backoff=0.0, max_backoff=0.3,
+                                  crash_limit=3, crash_window=60)
+    supervisor.start()
+    try:
+        assert wait_for(lambda: supervisor.stats()["inventory"]["crashLoop"])
+        assert len(launcher.launches) == 3
+        assert wait_for(lambda: len(launcher.launches) == 4)
+        assert launcher.launches[3][1] - launcher.launches[2][1] >= 0.3
+    finally:
+        supervisor.stop()
+        supervisor.kill_all()
+
+
+def test_stable_uptime_resets_the_backoff():
+    launcher = FakeLauncher({"remote": [1, 1, 1, None]})
+    supervisor = ModuleSupervisor(launcher, ["remote"], base_backoff=0.05, stable_after=0.0, crash_limit=10)
+    supervisor.start()
+    try:
+        assert wait_for(lambda: len(launcher.launches) == 4)
+        times = [t for _, t in launcher.launches]
+        assert times[-1] - times[0] < 0.3  # sempre o degrau base, sem dobrar
+        assert supervisor.modules["remote"].backoff_level == 1
+    finally:
+        supervisor.stop()
+        supervisor.kill_all()
+
+
+def test_unavailable_launch_is_retried_without_counting_a_crash():
+    launcher = FakeLauncher({"gui": ["indisponível", None]})
+    supervisor = ModuleSupervisor(launcher, ["gui"], launch_retry=0.05)
+    supervisor.start()
+    try:
+        assert wait_for(lambda: supervisor.stats()["gui"]["running"])
+        assert supervisor.stats()["gui"]["restarts"] == 0
+    finally:
+        supervisor.stop()
+        supervisor.kill_all()
+
+
+def test_real_subprocess_exit_and_hooks():
+    events = []
+    launcher = SubprocessLauncher({
+        "updater": [sys.executable, "-c", "import sys; sys.exit(3)"],
+        "remote": [sys.executable, "-c", "import time; time.sleep(30)"],
+    })
+    supervisor = ModuleSupervisor(launcher, ["updater", "remote"], base_backoff=60,
+                                  on_start=lambda name, handle: events.append(("start", name, handle.pid)),
+                                  on_exit=lambda name, handle, code: events.append(("exit", name, code)))
+    supervisor.start()
+    try:
+        assert wait_for(lambda: ("exit", "updater", 3) in events)
+        assert supervisor.stats()["updater"]["lastExitCode"] == 3
+        assert supervisor.handle("remote") is not None
+        assert {name for kind, name, _ in events if kind == "start"} == {"updater", "remote"}
+    finally:
+        supervisor.stop()
+        supervisor.kill_all()
+    assert wait_for(lambda: supervisor.handle("remote").poll() is not None)
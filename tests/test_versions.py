@@ -0,0 +1,76 @@
+import json
+import os
+
+from docit_common.versions import VersionCache
+
+
+def fake_resolver(calls):
+    def read_fake_version(path):
+        calls.append(path)
+        with open(path, encoding="utf-8") as f:
+            return f.read().strip()
+    return read_fake_version
+
+
+def test_version_is_cached_by_file_identity(tmp_path):
+    binary = tmp_path / "Doc-IT-Core.exe"
+    binary.write_text("1.0.0")
+    calls = []
+    cache = VersionCache(resolver=fake_resolver(calls))
+    assert cache.get(str(binary)) == "1.0.0"
+    assert cache.get(str(binary)) == "1.0.0"
+    assert len(calls) == 1 and (cache.hits, cache.misses) == (1, 1)
+
+    # Update troca o arquivo: tamanho/mtime mudam e o resolvedor roda de novo
+    binary.write_text("1.10.0")
+    assert cache.get(str(binary)) == "1.10.0" and len(calls) == 2
+
+
+def test_missing_file_and_failing_resolver(tmp_path):
+    calls = []
+
+    def broken(path):
+        calls.append(path)
+        raise OSError("binário corrompido")
+
+    cache = VersionCache(resolver=broken)
+    assert cache.get(str(tmp_path / "nao-existe.exe")) is None and calls == []
+    binary = tmp_path / "osqueryi"
+    binary.write_text("x")
+    assert cache.get(str(binary)) is None
+    assert cache.get(str(binary)) is None
+    assert len(calls) == 1  # a falha também fica em cache para esta identidade
+
+
+def test_sidecar_is_shared_between_processes(tmp_path):
+    sidecar = str(tmp_path / "Doc-IT-versions.cache")
+    core, remote = tmp_path / "core.exe", tmp_path / "remote.exe"
+    core.write_text("2.0")
+    remote.write_text("3.0")
+    first_calls, second_calls = [], []
+    first = VersionCache(sidecar, resolver=fake_resolver(first_calls))
+    second = VersionCache(sidecar, resolver=fake_resolver(second_calls))
+    assert first.get(str(core)) == "2.0"
+    assert second.get(str(remote)) == "3.0"
+    # O segundo mesclou a entrada do primeiro antes de gravar
+    with open(sidecar, encoding="utf-8") as f:
+        assert len(json.load(f)) == 2
+    assert VersionCache(sidecar, resolver=fake_resolver(second_calls)).get(str(core)) == "2.0"
+    assert second_calls == [str(remote)]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_resolver_change_and_invalidate(tmp_path):
+    binary = tmp_path / "Doc-IT-Core.exe"
+    binary.write_text("1.0")
+    calls = []
+    cache = VersionCache(resolver=fake_resolver(calls))
+    cache.get(str(binary))
+
+    def other_resolver(path):
+        return "outro"
+
+    assert cache.get(str(binary), resolver=other_resolver) == "outro"
+    cache.invalidate(str(binary))
+    cache.get(str(binary))
+    assert len(calls) == 2